@@ -0,0 +1,38 @@
+"""Add incremental ETL watermarks
+
+Revision ID: add_etl_watermarks
+Revises: add_health_sync_states
+Create Date: 2024-03-08 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_etl_watermarks'
+down_revision = 'add_health_sync_states'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('etl_watermarks',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('job_id', sa.String(length=100), nullable=False),
+        sa.Column('source_table', sa.String(length=100), nullable=False),
+        sa.Column('last_updated_at', sa.DateTime(), nullable=True),
+        sa.Column('last_id', sa.Integer(), nullable=True),
+        sa.Column('last_run_at', sa.DateTime(), nullable=True),
+        sa.Column('rows_extracted', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('job_id', 'source_table', name='uq_etl_watermarks_job_table')
+    )
+    op.create_index(op.f('ix_etl_watermarks_id'), 'etl_watermarks', ['id'], unique=False)
+    # Keyset scans of the rollups the analytics ETL reads
+    op.create_index('ix_health_metric_rollups_updated', 'health_metric_rollups', ['updated_at', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_health_metric_rollups_updated', table_name='health_metric_rollups')
+    op.drop_index(op.f('ix_etl_watermarks_id'), table_name='etl_watermarks')
+    op.drop_table('etl_watermarks')
@@ -0,0 +1,25 @@
+"""Add health data (user, type, timestamp) index for bulk ingestion
+
+Revision ID: add_health_data_ingest_index
+Revises: add_peer_baselines
+Create Date: 2024-02-29 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_health_data_ingest_index'
+down_revision = 'add_peer_baselines'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Serves duplicate checks and per-type window scans
+    op.create_index('ix_health_data_user_type_timestamp', 'health_data',
+                    ['user_id', 'data_type', 'timestamp'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_health_data_user_type_timestamp', table_name='health_data')
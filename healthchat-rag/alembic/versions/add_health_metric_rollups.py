@@ -0,0 +1,70 @@
+"""Add health metric rollups
+
+Revision ID: add_health_metric_rollups
+Revises: add_notification_models
+Create Date: 2024-02-01 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_health_metric_rollups'
+down_revision = 'add_notification_models'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Create health_metric_rollups table
+    op.create_table('health_metric_rollups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('data_type', sa.String(length=50), nullable=False),
+        sa.Column('component', sa.String(length=20), nullable=False),
+        sa.Column('granularity', sa.String(length=10), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(), nullable=False),
+        sa.Column('bucket_end', sa.DateTime(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.Column('total', sa.Float(), nullable=False),
+        sa.Column('total_sq', sa.Float(), nullable=False),
+        sa.Column('minimum', sa.Float(), nullable=True),
+        sa.Column('maximum', sa.Float(), nullable=True),
+        sa.Column('first_timestamp', sa.DateTime(), nullable=True),
+        sa.Column('first_value', sa.Float(), nullable=True),
+        sa.Column('last_timestamp', sa.DateTime(), nullable=True),
+        sa.Column('last_value', sa.Float(), nullable=True),
+        sa.Column('digest', sa.JSON(), nullable=True),
+        sa.Column('late_count', sa.Integer(), nullable=False),
+        sa.Column('revision', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'data_type', 'component', 'granularity', 'bucket_start',
+                            name='uq_health_metric_rollups_bucket')
+    )
+    op.create_index(op.f('ix_health_metric_rollups_id'), 'health_metric_rollups', ['id'], unique=False)
+    op.create_index('ix_health_metric_rollups_lookup', 'health_metric_rollups',
+                    ['user_id', 'granularity', 'data_type', 'bucket_start'], unique=False)
+
+    # Create health_rollup_batches table
+    op.create_table('health_rollup_batches',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('batch_key', sa.String(length=64), nullable=False),
+        sa.Column('point_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'batch_key', name='uq_health_rollup_batches_key')
+    )
+    op.create_index(op.f('ix_health_rollup_batches_id'), 'health_rollup_batches', ['id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_health_rollup_batches_id'), table_name='health_rollup_batches')
+    op.drop_table('health_rollup_batches')
+    op.drop_index('ix_health_metric_rollups_lookup', table_name='health_metric_rollups')
+    op.drop_index(op.f('ix_health_metric_rollups_id'), table_name='health_metric_rollups')
+    op.drop_table('health_metric_rollups')
@@ -0,0 +1,55 @@
+"""Add materialized health score snapshots
+
+Revision ID: add_health_score_snapshots
+Revises: add_health_metric_rollups
+Create Date: 2024-02-15 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_health_score_snapshots'
+down_revision = 'add_health_metric_rollups'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Create health_score_snapshots table
+    op.create_table('health_score_snapshots',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=50), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('input_mark', sa.Integer(), nullable=True),
+        sa.Column('computed_at', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'kind', name='uq_health_score_snapshots_kind')
+    )
+    op.create_index(op.f('ix_health_score_snapshots_id'), 'health_score_snapshots', ['id'], unique=False)
+
+    # Create health_score_invalidations table
+    op.create_table('health_score_invalidations',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('reason', sa.String(length=50), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sqlite_autoincrement=True
+    )
+    op.create_index(op.f('ix_health_score_invalidations_id'), 'health_score_invalidations', ['id'], unique=False)
+    op.create_index(op.f('ix_health_score_invalidations_user_id'), 'health_score_invalidations', ['user_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_health_score_invalidations_user_id'), table_name='health_score_invalidations')
+    op.drop_index(op.f('ix_health_score_invalidations_id'), table_name='health_score_invalidations')
+    op.drop_table('health_score_invalidations')
+    op.drop_index(op.f('ix_health_score_snapshots_id'), table_name='health_score_snapshots')
+    op.drop_table('health_score_snapshots')
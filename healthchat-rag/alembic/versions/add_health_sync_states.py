@@ -0,0 +1,47 @@
+"""Add health sync states and natural reading keys
+
+Revision ID: add_health_sync_states
+Revises: add_health_data_ingest_index
+Create Date: 2024-03-01 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_health_sync_states'
+down_revision = 'add_health_data_ingest_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('health_data', sa.Column('reading_key', sa.String(length=64), nullable=True))
+    op.add_column('health_data', sa.Column('content_hash', sa.String(length=40), nullable=True))
+    # Conflict target for synced upserts; existing rows keep a NULL key
+    op.create_index('uq_health_data_user_reading_key', 'health_data',
+                    ['user_id', 'reading_key'], unique=True)
+
+    op.create_table('health_sync_states',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('source', sa.String(length=50), nullable=False),
+        sa.Column('data_type', sa.String(length=50), nullable=False),
+        sa.Column('high_water_mark', sa.DateTime(), nullable=True),
+        sa.Column('last_synced_at', sa.DateTime(), nullable=True),
+        sa.Column('last_fetched', sa.Integer(), nullable=False),
+        sa.Column('last_inserted', sa.Integer(), nullable=False),
+        sa.Column('last_updated', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'source', 'data_type', name='uq_health_sync_states_stream')
+    )
+    op.create_index(op.f('ix_health_sync_states_id'), 'health_sync_states', ['id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_health_sync_states_id'), table_name='health_sync_states')
+    op.drop_table('health_sync_states')
+    op.drop_index('uq_health_data_user_reading_key', table_name='health_data')
+    op.drop_column('health_data', 'content_hash')
+    op.drop_column('health_data', 'reading_key')
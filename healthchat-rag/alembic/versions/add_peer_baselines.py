@@ -0,0 +1,40 @@
+"""Add peer group baselines
+
+Revision ID: add_peer_baselines
+Revises: add_health_score_snapshots
+Create Date: 2024-02-22 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_peer_baselines'
+down_revision = 'add_health_score_snapshots'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Create peer_baselines table
+    op.create_table('peer_baselines',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('age_band', sa.String(length=10), nullable=False),
+        sa.Column('gender', sa.String(length=20), nullable=False),
+        sa.Column('activity_level', sa.String(length=30), nullable=False),
+        sa.Column('data_type', sa.String(length=50), nullable=False),
+        sa.Column('component', sa.String(length=20), nullable=False),
+        sa.Column('user_count', sa.Integer(), nullable=False),
+        sa.Column('mean', sa.Float(), nullable=True),
+        sa.Column('digest', sa.JSON(), nullable=False),
+        sa.Column('built_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('age_band', 'gender', 'activity_level', 'data_type', 'component',
+                            name='uq_peer_baselines_group')
+    )
+    op.create_index(op.f('ix_peer_baselines_id'), 'peer_baselines', ['id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_peer_baselines_id'), table_name='peer_baselines')
+    op.drop_table('peer_baselines')
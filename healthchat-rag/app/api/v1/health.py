@@ -10,6 +10,7 @@ from fastapi import APIRouter, Depends, HTTPException, status, Response, Query,
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 import time
+import logging
 from datetime import datetime
 
 from app.database import get_db
@@ -26,8 +27,13 @@ from app.utils.pagination import (
 )
 from app.utils.compression import compress_response, get_acceptable_encoding
 from app.utils.audit_logging import audit_log
+from app.services.enhanced.health_score_store import readings_changed, readings_stored
+from app.services.enhanced.health_timeseries import decrypt_value
 
+logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/health", tags=["Health v1"])
+
+
 security = HTTPBearer()
 
 @router.post("/data", response_model=Dict[str, Any])
@@ -70,6 +76,13 @@ async def create_health_data(
         db.commit()
         db.refresh(db_health_data)
         
+        # Rollups are keyed by row id, so retries are no-ops
+        readings_stored(
+            db, current_user.id,
+            [(db_health_data.data_type, db_health_data.timestamp, health_data.value, db_health_data.unit)],
+            batch_key=f"health_data:{db_health_data.id}"
+        )
+        
         # Prepare optimized response
         response_data = {
             "id": db_health_data.id,
@@ -324,6 +337,7 @@ async def update_health_data(
             )
         
         # Update fields
+        previous_reading = (health_data.data_type, health_data.timestamp)
         update_data = health_data_update.dict(exclude_unset=True)
         for field, value in update_data.items():
             setattr(health_data, field, value)
@@ -331,6 +345,12 @@ async def update_health_data(
         db.commit()
         db.refresh(health_data)
         
+        if update_data.keys() & {"data_type", "value", "timestamp"}:
+            readings_changed(
+                db, current_user.id, [previous_reading, (health_data.data_type, health_data.timestamp)],
+                updated=[(health_data.data_type, health_data.timestamp, decrypt_value(health_data.value), health_data.unit)]
+            )
+        
         # Prepare optimized response
         response_data = {
             "id": health_data.id,
@@ -418,6 +438,8 @@ async def delete_health_data(
         db.delete(health_data)
         db.commit()
         
+        readings_changed(db, current_user.id, [(health_data.data_type, health_data.timestamp)])
+        
         # Audit log
         audit_log(
             event_type="health_data_deleted",
@@ -9,10 +9,14 @@ This module provides:
 """
 
 import os
+import time
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import task_prerun, task_postrun, worker_ready, worker_process_shutdown
 import logging
 
+from app.utils.metrics_registry import mark_process_dead, metrics_registry, start_metrics_server
+
 logger = logging.getLogger(__name__)
 
 # Get Redis URL from environment
@@ -76,6 +80,14 @@ celery_app.conf.update(
             "task": "app.tasks.analytics_tasks.compute_analytics",
             "schedule": crontab(minute="0", hour="*/2"),  # Every 2 hours
         },
+        "health-score-refresh": {
+            "task": "app.tasks.analytics_tasks.refresh_health_scores",
+            "schedule": crontab(minute="*/1"),  # Every minute
+        },
+        "peer-baseline-build": {
+            "task": "app.tasks.analytics_tasks.build_peer_baselines",
+            "schedule": crontab(minute="30", hour="3"),  # Daily at 3:30 AM
+        },
         "database-cleanup": {
             "task": "app.tasks.maintenance_tasks.cleanup_old_data",
             "schedule": crontab(minute="0", hour="2"),  # Daily at 2 AM
@@ -92,6 +104,10 @@ celery_app.conf.update(
             "task": "app.tasks.notification_tasks.process_notification_queue",
             "schedule": crontab(minute="*/1"),  # Every minute
         },
+        "reconcile-notification-budgets": {
+            "task": "app.tasks.notification_tasks.reconcile_notification_budgets",
+            "schedule": crontab(minute="*/15"),  # Every 15 minutes
+        },
     },
     
     # Task retry configuration
@@ -354,4 +370,31 @@ def monitor_task_health():
         
     except Exception as e:
         logger.error(f"Task health monitoring failed: {e}")
-        return {"status": "error", "error": str(e)} 
\ No newline at end of file
+        return {"status": "error", "error": str(e)} 
+
+# Task metrics (Prometheus)
+_task_start_times = {}
+
+@task_prerun.connect
+def record_task_start(task_id=None, **kwargs):
+    """Remember when a task started so its runtime can be observed."""
+    _task_start_times[task_id] = time.perf_counter()
+
+@task_postrun.connect
+def record_task_finish(task_id=None, task=None, state=None, **kwargs):
+    """Record task outcome and runtime in the metrics registry."""
+    start_time = _task_start_times.pop(task_id, None)
+    duration = time.perf_counter() - start_time if start_time is not None else None
+    metrics_registry.observe_celery_task(getattr(task, "name", "unknown"), state or "UNKNOWN", duration)
+
+@worker_ready.connect
+def start_worker_metrics_server(**kwargs):
+    """Expose worker metrics for the healthmate-celery scrape job."""
+    port = os.getenv("HEALTHMATE_CELERY_METRICS_PORT")
+    if port:
+        start_metrics_server(int(port))
+
+@worker_process_shutdown.connect
+def release_worker_metrics(pid=None, **kwargs):
+    """Release a prefork child's live gauges in multi-process mode."""
+    mark_process_dead(pid or os.getpid())
@@ -83,6 +83,80 @@ class Settings(BaseSettings):
     response_validation_enabled: bool = True
     validation_strict_mode: bool = False
     
+    # Redis
+    redis_url: str = "redis://localhost:6379/0"
+    
+    # WebSocket scaling
+    websocket_backplane: str = "none"  # none, memory, redis
+    websocket_presence_ttl: int = 90  # seconds
+    websocket_max_connections: int = 1000
+    
+    # Request tracing
+    tracing_enabled: bool = True
+    tracing_sample_rate: float = 0.1  # share of traces whose full breakdown is kept
+    tracing_opentelemetry: bool = False  # mirror spans to the OpenTelemetry SDK
+    
+    # Health metric rollups
+    rollup_hourly_retention_days: int = 35  # older readings only update daily/weekly/monthly rollups
+    
+    # Batch analytics
+    analytics_cohort_size: int = 500  # users per cohort analytics batch
+    health_score_refresh_batch_size: int = 200  # users recomputed per materialized score refresh
+    
+    # Dashboard charts
+    dashboard_max_points: int = 500  # points per trend series after LTTB downsampling
+    dashboard_cache_ttl: int = 300  # seconds; keys also carry the user's data version
+    
+    # Time-series resolution
+    series_default_points: int = 500  # point budget when a request gives none
+    series_max_points: int = 5000  # largest point budget or bucket count a request may ask for
+    series_raw_scan_limit: int = 20000  # beyond this many readings, serve rollup tiers
+    
+    # Metric correlations
+    correlation_bucket_seconds: int = 86400  # grid bucket series are resampled onto
+    correlation_fill_limit: int = 1  # buckets a reading is carried forward into gaps
+    correlation_max_lag: int = 7  # largest lag, in buckets, for cross-correlations
+    correlation_cache_ttl: int = 3600  # seconds; keys also carry the user's data version
+    
+    # Peer baselines
+    peer_baseline_days: int = 90  # window of readings behind each user's mean
+    peer_baseline_min_users: int = 20  # smaller groups fall back to a broader one
+    peer_baseline_reload_seconds: int = 3600  # how often a process re-reads the nightly build
+    
+    # Bulk ingestion
+    bulk_ingest_max_readings: int = 10000  # readings accepted per request
+    bulk_ingest_chunk_size: int = 1000  # rows per multi-row INSERT
+    
+    # Wearable sync
+    health_sync_initial_days: int = 30  # history fetched on a stream's first sync
+    health_sync_overlap_hours: int = 48  # re-fetched before the high-water mark for late or revised readings
+    
+    # Streaming processing pipeline
+    processing_chunk_size: int = 500  # data points per chunk flowing between stages
+    processing_queue_size: int = 2  # chunks buffered between two stages before the upstream one waits
+    
+    # Event streaming
+    event_log_dir: Optional[str] = None  # embedded event log directory; Kafka is used when unset
+    event_log_partitions: int = 4  # partitions of a new event log topic
+    event_log_segment_bytes: int = 16 * 1024 * 1024  # size at which an event log segment file rolls over
+    event_stream_batch_size: int = 500  # events per publish and per consumed batch
+    
+    # Threshold alerts on ingest
+    threshold_alert_batch_size: int = 1000  # metrics evaluated per micro-batch
+    threshold_alert_max_wait_ms: int = 100  # time a micro-batch waits to fill after its first reading
+    threshold_alert_cooldown_minutes: int = 60  # an alert is not repeated at the same or lower severity within this
+    threshold_alert_hysteresis: float = 0.05  # fraction of the normal range a value must recover by to clear a level
+    threshold_alert_max_age_hours: int = 24  # older readings update rule state without alerting
+    
+    # Per-user notification sweeps
+    notification_sweep_chunk_size: int = 500  # users per fanned-out sweep subtask
+    notification_sweep_concurrency: int = 4  # users processed at once within a subtask (each holds a DB connection)
+    
+    # Notification budgets
+    notification_budget_backend: str = "redis"  # redis, memory (single process only)
+    notification_budget_retention_hours: int = 48  # must cover a day and the longest trigger window
+    notification_budget_reconcile_page_size: int = 1000  # users rebuilt per store round trip
+    
     # Logging
     log_level: str = "INFO"
     log_format: str = "json"
@@ -10,7 +10,7 @@ from .validation_exceptions import ValidationError, SchemaValidationError, Input
 from .auth_exceptions import AuthenticationError, AuthorizationError, TokenError
 from .database_exceptions import DatabaseError, ConnectionError, QueryError
 from .external_api_exceptions import ExternalAPIError, APIError, RateLimitError
-from .health_exceptions import HealthDataError, MedicalDataError
+from .health_exceptions import HealthDataError, MedicalDataError, DataProcessingError, AnalyticsError
 from .chat_exceptions import ChatError, ConversationError
 from .notification_exceptions import NotificationError, EmailError, SMSError
 
@@ -43,6 +43,8 @@ __all__ = [
     # Health exceptions
     "HealthDataError",
     "MedicalDataError",
+    "DataProcessingError",
+    "AnalyticsError",
     
     # Chat exceptions
     "ChatError",
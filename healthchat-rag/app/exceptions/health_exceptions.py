@@ -58,6 +58,40 @@ class MedicalDataError(HealthDataError):
         self.severity = severity 
 
 
+class DataProcessingError(HealthDataError):
+    """Exception raised when a health data processing or pipeline run fails."""
+    
+    def __init__(
+        self,
+        message: str,
+        data_type: Optional[str] = None,
+        user_id: Optional[int] = None,
+        details: Optional[Dict[str, Any]] = None
+    ):
+        super().__init__(
+            message=message,
+            data_type=data_type,
+            user_id=user_id,
+            details=details
+        )
+
+
+class AnalyticsError(HealthDataError):
+    """Exception raised when a health analytics run fails."""
+    
+    def __init__(
+        self,
+        message: str,
+        user_id: Optional[int] = None,
+        details: Optional[Dict[str, Any]] = None
+    ):
+        super().__init__(
+            message=message,
+            user_id=user_id,
+            details=details
+        )
+
+
 class BusinessIntelligenceError(HealthMateException):
     """Exception raised for business intelligence related errors"""
     def __init__(self, message: str, error_code: str = "BI_ERROR", details: Dict[str, Any] = None):
@@ -65,6 +99,7 @@ class BusinessIntelligenceError(HealthMateException):
         self.error_type = "BusinessIntelligenceError"
 
 
+
 class MLDataPreparationError(HealthMateException):
     """Exception raised for ML data preparation related errors"""
     def __init__(self, message: str, error_code: str = "ML_DATA_PREP_ERROR", details: Dict[str, Any] = None):
@@ -35,7 +35,7 @@ os.environ.setdefault("PINECONE_INDEX_NAME", "dummy_index")
 os.environ.setdefault("POSTGRES_URI", "sqlite:///./test.db")
 os.environ.setdefault("SECRET_KEY", "dummy_secret_key_for_development")
 
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Request, Response, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from app.database import get_db
@@ -48,6 +48,9 @@ from app.routers.ml_data_preparation import ml_data_router
 from app.routers.backup_disaster_recovery import router as backup_dr_router
 from app.services.vector_store import VectorStore
 from app.services.knowledge_base import MedicalKnowledgeBase
+from app.services.enhanced.data_integration import close_client_sessions
+from app.services.threshold_alerts import threshold_monitor
+from app.websocket.connection_manager import connection_manager
 from app.config import settings
 from app.utils.input_sanitization_middleware import InputSanitizationMiddleware
 from app.utils.rate_limiting import RateLimitingMiddleware, RateLimiter
@@ -57,6 +60,9 @@ from app.utils.exception_handlers import setup_exception_handlers
 from contextlib import asynccontextmanager
 from app.utils.correlation_id_middleware import CorrelationIdMiddleware
 from app.utils.api_audit_middleware import APIAuditMiddleware
+from app.utils.performance_monitoring import PerformanceMetricsMiddleware
+from app.utils.tracing import TracingMiddleware
+from app.utils.metrics_registry import metrics_registry
 
 logger = logging.getLogger(__name__)
 
@@ -75,18 +81,34 @@ async def lifespan(app):
         app.state.knowledge_base = None
         logger.info("Application will continue without AI features")
     
+    threshold_monitor.start()
+    await connection_manager.start_backplane()
     logger.info("HealthMate application started successfully")
     yield
     logger.info("Shutting down HealthMate application...")
+    await threshold_monitor.stop()
+    await connection_manager.stop_backplane()
+    await close_client_sessions()
 
 app = FastAPI(title="HealthChat RAG API", version="1.0.0", lifespan=lifespan)
 
+# Add per-stage tracing for the chat pipelines. Starlette wraps later
+# middleware around earlier ones, so adding this before the correlation ID
+# middleware runs it inside it and traces inherit the correlation id.
+app.add_middleware(TracingMiddleware, routes={
+    "/chat/message": "chat.message",
+    "/enhanced-chat/message": "enhanced_chat.message",
+})
+
 # Add correlation ID middleware first
 app.add_middleware(CorrelationIdMiddleware)
 
 # Add API audit middleware
 app.add_middleware(APIAuditMiddleware)
 
+# Add request timing middleware (feeds PerformanceMonitor and /metrics)
+app.add_middleware(PerformanceMetricsMiddleware)
+
 # Setup exception handlers
 setup_exception_handlers(app)
 
@@ -164,6 +186,12 @@ async def health_check():
         "timestamp": "2024-01-01T00:00:00Z"  # In production, use actual timestamp
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """Prometheus/OpenMetrics exposition of all performance metrics."""
+    payload, content_type = metrics_registry.generate_latest(request.headers.get("accept", ""))
+    return Response(content=payload, media_type=content_type)
+
 @app.get("/health/simple")
 async def simple_health_check():
     """Simple health check that doesn't depend on external services."""
@@ -5,7 +5,9 @@ from .user import User, Conversation
 from .health_data import HealthData, SymptomLog, MedicationLog, HealthGoal, HealthAlert
 from .enhanced_health_models import (
     UserHealthProfile, EnhancedMedication, MedicationDoseLog, EnhancedSymptomLog,
-    HealthMetricsAggregation, ConversationHistory, AIResponseCache, UserPreference, UserFeedback
+    HealthMetricsAggregation, HealthMetricRollup, HealthRollupBatch,
+    HealthScoreSnapshot, HealthScoreInvalidation, PeerBaseline, HealthSyncState,
+    EtlWatermark, ConversationHistory, AIResponseCache, UserPreference, UserFeedback
 )
 from .notification_models import (
     Notification, NotificationTemplate, NotificationDeliveryAttempt,
@@ -27,6 +29,13 @@ __all__ = [
     "MedicationDoseLog",
     "EnhancedSymptomLog",
     "HealthMetricsAggregation",
+    "HealthMetricRollup",
+    "HealthRollupBatch",
+    "HealthScoreSnapshot",
+    "HealthScoreInvalidation",
+    "PeerBaseline",
+    "HealthSyncState",
+    "EtlWatermark",
     # AI and conversation models
     "ConversationHistory",
     "AIResponseCache",
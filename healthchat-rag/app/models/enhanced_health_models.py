@@ -9,7 +9,7 @@ This module provides comprehensive health data models including:
 - AI interaction models
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, ForeignKey, Float, JSON, Date, Enum
+from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, ForeignKey, Float, JSON, Date, Enum, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 from datetime import datetime, date
@@ -752,6 +752,227 @@ class HealthMetricsAggregation(Base):
         return metrics_dict 
 
 
+class HealthMetricRollup(Base):
+    """Mergeable running aggregate of one metric over one time bucket"""
+    __tablename__ = "health_metric_rollups"
+    __table_args__ = (
+        UniqueConstraint('user_id', 'data_type', 'component', 'granularity', 'bucket_start',
+                         name='uq_health_metric_rollups_bucket'),
+        Index('ix_health_metric_rollups_lookup', 'user_id', 'granularity', 'data_type', 'bucket_start'),
+        Index('ix_health_metric_rollups_updated', 'updated_at', 'id'),  # Incremental ETL scans
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    data_type = Column(String(50), nullable=False)
+    component = Column(String(20), nullable=False, default="value")  # value, systolic, diastolic
+    
+    # Bucket
+    granularity = Column(String(10), nullable=False)  # hourly, daily, weekly, monthly
+    bucket_start = Column(DateTime, nullable=False)
+    bucket_end = Column(DateTime, nullable=False)
+    
+    # Running aggregates
+    count = Column(Integer, nullable=False, default=0)
+    total = Column(Float, nullable=False, default=0.0)
+    total_sq = Column(Float, nullable=False, default=0.0)
+    minimum = Column(Float, nullable=True)
+    maximum = Column(Float, nullable=True)
+    first_timestamp = Column(DateTime, nullable=True)
+    first_value = Column(Float, nullable=True)
+    last_timestamp = Column(DateTime, nullable=True)
+    last_value = Column(Float, nullable=True)
+    digest = Column(JSON, nullable=True)  # Serialized t-digest for quantiles
+    
+    # Late data bookkeeping
+    late_count = Column(Integer, nullable=False, default=0)  # Points merged after the bucket closed
+    revision = Column(Integer, nullable=False, default=0)  # Incremented on every merge
+    
+    # Timestamps
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        """Convert to dictionary"""
+        mean = self.total / self.count if self.count else None
+        return {
+            'data_type': self.data_type,
+            'component': self.component,
+            'granularity': self.granularity,
+            'bucket_start': self.bucket_start.isoformat() if self.bucket_start else None,
+            'bucket_end': self.bucket_end.isoformat() if self.bucket_end else None,
+            'count': self.count,
+            'sum': self.total,
+            'mean': mean,
+            'min': self.minimum,
+            'max': self.maximum,
+            'late_count': self.late_count,
+            'revision': self.revision,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+
+class HealthRollupBatch(Base):
+    """Ingest batches already merged into rollups, for idempotent replays"""
+    __tablename__ = "health_rollup_batches"
+    __table_args__ = (
+        UniqueConstraint('user_id', 'batch_key', name='uq_health_rollup_batches_key'),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    batch_key = Column(String(64), nullable=False)
+    point_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class HealthScoreSnapshot(Base):
+    """Materialized health score or risk assessment for one user"""
+    __tablename__ = "health_score_snapshots"
+    __table_args__ = (
+        UniqueConstraint('user_id', 'kind', name='uq_health_score_snapshots_kind'),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    kind = Column(String(50), nullable=False)  # health_score, analytics_score, cardiovascular_risk, ...
+    payload = Column(JSON, nullable=False)
+    
+    # Versioning
+    version = Column(Integer, nullable=False, default=0)  # Incremented on every recomputation
+    input_mark = Column(Integer, nullable=True)  # Highest invalidation id the payload reflects
+    computed_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    
+    # Timestamps
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'kind': self.kind,
+            'payload': self.payload,
+            'version': self.version,
+            'computed_at': self.computed_at.isoformat() if self.computed_at else None
+        }
+
+
+class HealthScoreInvalidation(Base):
+    """Pending recomputation of a user's materialized scores (the dirty set)"""
+    __tablename__ = "health_score_invalidations"
+    __table_args__ = {'sqlite_autoincrement': True}  # Ids are watermarks; never reuse them
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    reason = Column(String(50), nullable=True)  # readings, profile
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class PeerBaseline(Base):
+    """Population distribution of one metric's per-user means within one peer group"""
+    __tablename__ = "peer_baselines"
+    __table_args__ = (
+        UniqueConstraint('age_band', 'gender', 'activity_level', 'data_type', 'component',
+                         name='uq_peer_baselines_group'),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    
+    # Peer group; "all" matches any value
+    age_band = Column(String(10), nullable=False)  # e.g. 30-39
+    gender = Column(String(20), nullable=False)
+    activity_level = Column(String(30), nullable=False)
+    
+    # Metric
+    data_type = Column(String(50), nullable=False)
+    component = Column(String(20), nullable=False, default="value")
+    
+    # Distribution
+    user_count = Column(Integer, nullable=False, default=0)
+    mean = Column(Float, nullable=True)
+    digest = Column(JSON, nullable=False)  # Serialized t-digest of per-user means
+    
+    # Timestamps
+    built_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'age_band': self.age_band,
+            'gender': self.gender,
+            'activity_level': self.activity_level,
+            'data_type': self.data_type,
+            'component': self.component,
+            'user_count': self.user_count,
+            'mean': self.mean,
+            'built_at': self.built_at.isoformat() if self.built_at else None
+        }
+
+
+class HealthSyncState(Base):
+    """Sync progress of one external source for one user and data type"""
+    __tablename__ = "health_sync_states"
+    __table_args__ = (
+        UniqueConstraint('user_id', 'source', 'data_type', name='uq_health_sync_states_stream'),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    source = Column(String(50), nullable=False)  # fitbit, apple_health, ...
+    data_type = Column(String(50), nullable=False)
+    
+    # Latest reading timestamp received; the next sync fetches from here
+    high_water_mark = Column(DateTime, nullable=True)
+    
+    # Last run
+    last_synced_at = Column(DateTime, nullable=True)
+    last_fetched = Column(Integer, nullable=False, default=0)
+    last_inserted = Column(Integer, nullable=False, default=0)
+    last_updated = Column(Integer, nullable=False, default=0)
+    
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'source': self.source,
+            'data_type': self.data_type,
+            'high_water_mark': self.high_water_mark.isoformat() if self.high_water_mark else None,
+            'last_synced_at': self.last_synced_at.isoformat() if self.last_synced_at else None,
+            'last_fetched': self.last_fetched,
+            'last_inserted': self.last_inserted,
+            'last_updated': self.last_updated
+        }
+
+
+class EtlWatermark(Base):
+    """Incremental ETL progress of one job over one source table"""
+    __tablename__ = "etl_watermarks"
+    __table_args__ = (
+        UniqueConstraint('job_id', 'source_table', name='uq_etl_watermarks_job_table'),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(String(100), nullable=False)
+    source_table = Column(String(100), nullable=False)
+    
+    # Last row loaded, as its (updated_at, id) keyset position; the next run extracts after it
+    last_updated_at = Column(DateTime, nullable=True)
+    last_id = Column(Integer, nullable=True)
+    
+    last_run_at = Column(DateTime, nullable=True)
+    rows_extracted = Column(Integer, nullable=False, default=0)  # Total over all runs
+    
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'job_id': self.job_id,
+            'source_table': self.source_table,
+            'last_updated_at': self.last_updated_at.isoformat() if self.last_updated_at else None,
+            'last_id': self.last_id,
+            'last_run_at': self.last_run_at.isoformat() if self.last_run_at else None,
+            'rows_extracted': self.rows_extracted
+        }
+
+
 class ConversationHistory(Base):
     """Enhanced conversation history storage model"""
     __tablename__ = "conversation_histories"
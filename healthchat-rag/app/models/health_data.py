@@ -2,7 +2,7 @@
 Health Data Models for HealthMate
 Provides database models for health data with encryption for sensitive fields
 """
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, ForeignKey, Float, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, ForeignKey, Float, JSON, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.base import Base
@@ -11,6 +11,10 @@ from app.utils.encryption_utils import field_encryption
 class HealthData(Base):
     """Health data model for tracking various health metrics"""
     __tablename__ = "health_data"
+    __table_args__ = (
+        Index('ix_health_data_user_type_timestamp', 'user_id', 'data_type', 'timestamp'),
+        Index('uq_health_data_user_reading_key', 'user_id', 'reading_key', unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -21,6 +25,8 @@ class HealthData(Base):
     notes = Column(Text, nullable=True)  # Encrypted
     source = Column(String(100), nullable=True)  # manual, device, api
     confidence = Column(Float, nullable=True)  # 0.0 to 1.0
+    reading_key = Column(String(64), nullable=True)  # Natural key of synced/bulk readings (hashed)
+    content_hash = Column(String(40), nullable=True)  # Hash of value, unit and confidence, to detect revisions
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -13,6 +13,7 @@ from app.models.user import User
 from app.utils.auth_middleware import get_current_user
 from app.services.health_analytics import HealthAnalyticsService
 from app.services.health_insights_service import HealthInsightsService
+from app.services.enhanced.health_correlation import get_health_correlation_engine
 from app.utils.audit_logging import AuditLogger
 import json
 
@@ -184,134 +185,45 @@ async def get_health_correlations(
 ):
     """Analyze correlations between different health data types"""
     try:
-        from app.models.health_data import HealthData
-        from sqlalchemy import and_
-        import statistics
-        
-        start_date = datetime.utcnow() - timedelta(days=days)
-        
-        # Get primary data
-        primary_data = db.query(HealthData).filter(
-            and_(
-                HealthData.user_id == current_user.id,
-                HealthData.data_type == primary_data_type,
-                HealthData.timestamp >= start_date
-            )
-        ).order_by(HealthData.timestamp.asc()).all()
+        data_types = [primary_data_type] + list(secondary_data_types or [])
+        result = get_health_correlation_engine(db).get_correlations(
+            current_user.id, days, data_types=data_types if secondary_data_types else None
+        )
         
-        if not primary_data:
+        if primary_data_type not in result["metrics"]:
             raise HTTPException(status_code=404, detail=f"No {primary_data_type} data found")
         
-        # Decrypt and extract primary values
-        for data in primary_data:
-            data.decrypt_sensitive_fields()
-        
-        primary_values = []
-        primary_timestamps = []
-        
-        for data in primary_data:
-            try:
-                if data.value.startswith('{'):
-                    parsed = json.loads(data.value)
-                    if isinstance(parsed, dict):
-                        for key in ['value', 'systolic', 'diastolic', 'reading']:
-                            if key in parsed and isinstance(parsed[key], (int, float)):
-                                primary_values.append(float(parsed[key]))
-                                primary_timestamps.append(data.timestamp)
-                                break
-                else:
-                    primary_values.append(float(data.value))
-                    primary_timestamps.append(data.timestamp)
-            except (ValueError, json.JSONDecodeError, KeyError):
-                continue
-        
-        if len(primary_values) < 2:
-            raise HTTPException(status_code=400, detail="Insufficient primary data for correlation analysis")
-        
-        # Get secondary data types if not specified
-        if not secondary_data_types:
-            available_types = db.query(HealthData.data_type).filter(
-                and_(
-                    HealthData.user_id == current_user.id,
-                    HealthData.data_type != primary_data_type
-                )
-            ).distinct().all()
-            secondary_data_types = [dt[0] for dt in available_types]
-        
-        # Analyze correlations
+        # Pairs involving the primary type, oriented so lags are relative to it
         correlations = {}
-        for secondary_type in secondary_data_types:
-            try:
-                secondary_data = db.query(HealthData).filter(
-                    and_(
-                        HealthData.user_id == current_user.id,
-                        HealthData.data_type == secondary_type,
-                        HealthData.timestamp >= start_date
-                    )
-                ).order_by(HealthData.timestamp.asc()).all()
-                
-                if not secondary_data:
-                    continue
-                
-                # Decrypt and extract secondary values
-                for data in secondary_data:
-                    data.decrypt_sensitive_fields()
-                
-                secondary_values = []
-                secondary_timestamps = []
-                
-                for data in secondary_data:
-                    try:
-                        if data.value.startswith('{'):
-                            parsed = json.loads(data.value)
-                            if isinstance(parsed, dict):
-                                for key in ['value', 'systolic', 'diastolic', 'reading']:
-                                    if key in parsed and isinstance(parsed[key], (int, float)):
-                                        secondary_values.append(float(parsed[key]))
-                                        secondary_timestamps.append(data.timestamp)
-                                        break
-                        else:
-                            secondary_values.append(float(data.value))
-                            secondary_timestamps.append(data.timestamp)
-                    except (ValueError, json.JSONDecodeError, KeyError):
-                        continue
-                
-                if len(secondary_values) < 2:
-                    continue
-                
-                # Calculate correlation (simplified approach)
-                # For production, use proper statistical correlation methods
-                correlation_strength = self._calculate_correlation_strength(
-                    primary_values, secondary_values
-                )
-                
-                correlations[secondary_type] = {
-                    "correlation_strength": correlation_strength,
-                    "data_points": min(len(primary_values), len(secondary_values)),
-                    "interpretation": self._interpret_correlation(correlation_strength)
-                }
-                
-            except Exception as e:
-                logger.warning(f"Failed to analyze correlation with {secondary_type}: {e}")
-                correlations[secondary_type] = {"error": str(e)}
+        for pair in result["pairs"]:
+            if primary_data_type not in (pair["metric_a"], pair["metric_b"]):
+                continue
+            flipped = pair["metric_b"] == primary_data_type
+            secondary_type = pair["metric_a"] if flipped else pair["metric_b"]
+            correlation_strength = pair["pearson"] if pair["pearson"] is not None else 0.0
+            correlations[secondary_type] = {
+                "correlation_strength": correlation_strength,
+                "spearman": pair["spearman"],
+                "data_points": pair["observations"],
+                "best_lag_days": -pair["best_lag"] if flipped else pair["best_lag"],
+                "lag_correlation": pair["lag_correlation"],
+                "interpretation": _interpret_correlation(correlation_strength)
+            }
         
         correlation_analysis = {
             "primary_data_type": primary_data_type,
-            "secondary_data_types": secondary_data_types,
+            "secondary_data_types": sorted(correlations),
             "correlations": correlations,
             "analysis_period_days": days,
-            "primary_data_summary": {
-                "data_points": len(primary_values),
-                "average": round(statistics.mean(primary_values), 2),
-                "range": f"{round(min(primary_values), 2)} - {round(max(primary_values), 2)}"
-            }
+            "bucket_seconds": result["bucket_seconds"],
+            "data_version": result["data_version"]
         }
         
         AuditLogger.log_health_event(
             event_type="correlation_analysis_requested",
             user_id=current_user.id,
             primary_data_type=primary_data_type,
-            secondary_types_count=len(secondary_data_types),
+            secondary_types_count=len(correlations),
             success=True
         )
         
@@ -328,48 +240,18 @@ async def get_health_correlations(
             error=str(e)
         )
         raise HTTPException(status_code=500, detail="Failed to get health correlations")
-    
-    def _calculate_correlation_strength(self, values1: List[float], values2: List[float]) -> float:
-        """Calculate correlation strength between two sets of values"""
-        try:
-            # Use the shorter list length
-            min_length = min(len(values1), len(values2))
-            if min_length < 2:
-                return 0.0
-            
-            # Take the first min_length values from each list
-            v1 = values1[:min_length]
-            v2 = values2[:min_length]
-            
-            # Calculate correlation coefficient
-            mean1 = statistics.mean(v1)
-            mean2 = statistics.mean(v2)
-            
-            numerator = sum((x - mean1) * (y - mean2) for x, y in zip(v1, v2))
-            denominator1 = sum((x - mean1) ** 2 for x in v1)
-            denominator2 = sum((y - mean2) ** 2 for y in v2)
-            
-            if denominator1 == 0 or denominator2 == 0:
-                return 0.0
-            
-            correlation = numerator / (denominator1 * denominator2) ** 0.5
-            return round(correlation, 3)
-            
-        except Exception as e:
-            logger.error(f"Error calculating correlation: {e}")
-            return 0.0
-    
-    def _interpret_correlation(self, correlation: float) -> str:
-        """Interpret correlation strength"""
-        abs_corr = abs(correlation)
-        if abs_corr >= 0.7:
-            return "Strong correlation"
-        elif abs_corr >= 0.4:
-            return "Moderate correlation"
-        elif abs_corr >= 0.2:
-            return "Weak correlation"
-        else:
-            return "No significant correlation"
+
+def _interpret_correlation(correlation: float) -> str:
+    """Interpret correlation strength"""
+    abs_corr = abs(correlation)
+    if abs_corr >= 0.7:
+        return "Strong correlation"
+    elif abs_corr >= 0.4:
+        return "Moderate correlation"
+    elif abs_corr >= 0.2:
+        return "Weak correlation"
+    else:
+        return "No significant correlation"
 
 @router.get("/predictions")
 async def get_health_predictions(
@@ -12,6 +12,7 @@ from app.database import get_db
 from app.models.user import User
 from app.utils.auth_middleware import get_current_user
 from app.services.health_analytics import HealthAnalyticsService
+from app.services.enhanced.health_score_store import ScoreKind, get_health_score_store
 from app.utils.audit_logging import AuditLogger
 
 logger = logging.getLogger(__name__)
@@ -33,13 +34,14 @@ class AnalyticsResponse(BaseModel):
 async def get_health_trends(
     data_type: str,
     days: int = Query(30, ge=1, le=365, description="Number of days to analyze"),
+    max_points: Optional[int] = Query(None, ge=2, le=5000, description="Maximum trend points returned"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get health data trends analysis"""
     try:
         analytics_service = HealthAnalyticsService(db)
-        trend_data = analytics_service.get_health_trends(current_user.id, data_type, days)
+        trend_data = analytics_service.get_health_trends(current_user.id, data_type, days, max_points=max_points)
         
         AuditLogger.log_health_event(
             event_type="trend_analysis_requested",
@@ -142,10 +144,15 @@ async def get_health_score(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get overall health score and analysis"""
+    """Get overall health score and analysis (materialized; recomputed when inputs change)"""
     try:
-        analytics_service = HealthAnalyticsService(db)
-        health_score_data = analytics_service.get_health_score(current_user.id)
+        snapshot = await get_health_score_store(db).get_or_compute(current_user.id, ScoreKind.HEALTH_SCORE)
+        health_score_data = {
+            **snapshot.payload,
+            "computed_at": snapshot.computed_at.isoformat(),
+            "version": snapshot.version,
+            "stale": snapshot.stale
+        }
         
         AuditLogger.log_health_event(
             event_type="health_score_requested",
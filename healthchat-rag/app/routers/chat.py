@@ -6,6 +6,7 @@ from app.models.user import User, Conversation
 from app.services.openai_agent import HealthAgent
 from app.config import settings
 from app.utils.jwt_utils import jwt_manager
+from app.utils.tracing import tracer
 from pydantic import BaseModel
 import json
 import openai
@@ -28,11 +29,13 @@ class FeedbackRequest(BaseModel):
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
     token = credentials.credentials
     try:
-        payload = jwt_manager.verify_token(token, "access")
+        with tracer.span("auth.verify_token"):
+            payload = jwt_manager.verify_token(token, "access")
         user_id = payload.get("user_id")
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid token")
-        user = db.query(User).filter(User.id == user_id).first()
+        with tracer.span("auth.user_lookup"):
+            user = db.query(User).filter(User.id == user_id).first()
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
         return user
@@ -42,7 +45,8 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
 def moderate_response(response_text: str) -> bool:
     """Returns True if the response is safe, False if flagged as unsafe."""
     client = openai.OpenAI(api_key=settings.openai_api_key)
-    moderation = client.moderations.create(input=response_text)
+    with tracer.span("moderation", **{"llm.operation": "moderation"}):
+        moderation = client.moderations.create(input=response_text)
     flagged = moderation.results[0].flagged
     return not flagged
 
@@ -60,7 +64,8 @@ async def chat_message(data: ChatMessage, user: User = Depends(get_current_user)
         "medications": user.medications
     }
     # Get relevant context
-    context = knowledge_base.get_relevant_context(data.message, user_profile)
+    with tracer.span("retrieval"):
+        context = knowledge_base.get_relevant_context(data.message, user_profile)
     # Get AI response (may be dict or string)
     response = health_agent.chat_with_context(data.message, context, user_profile)
     # If response is a dict (function call), handle emergency/routine
@@ -71,8 +76,9 @@ async def chat_message(data: ChatMessage, user: User = Depends(get_current_user)
             response=response.get("message", ""),
             context_used=context
         )
-        db.add(new_convo)
-        db.commit()
+        with tracer.span("db.insert_conversation"):
+            db.add(new_convo)
+            db.commit()
         response_with_id = dict(response)
         response_with_id["id"] = new_convo.id
         return response_with_id
@@ -85,8 +91,9 @@ async def chat_message(data: ChatMessage, user: User = Depends(get_current_user)
         response=response,
         context_used=context
     )
-    db.add(new_convo)
-    db.commit()
+    with tracer.span("db.insert_conversation"):
+        db.add(new_convo)
+        db.commit()
     return {"response": response + DISCLAIMER, "id": new_convo.id}
 
 @router.post("/feedback")
@@ -13,6 +13,7 @@ from app.models.user import User
 from app.utils.auth_middleware import get_current_user
 from app.services.enhanced_chat_service import EnhancedChatService
 from app.utils.audit_logging import AuditLogger
+from app.utils.tracing import tracer
 from app.config import settings
 from sqlalchemy import and_
 
@@ -57,7 +58,8 @@ async def enhanced_chat_message(
         
         if knowledge_base:
             # Get medical knowledge context
-            medical_context = knowledge_base.get_relevant_context(data.message, {})
+            with tracer.span("retrieval"):
+                medical_context = knowledge_base.get_relevant_context(data.message, {})
         else:
             logger.warning("Knowledge base not available, proceeding without medical context")
         
@@ -72,15 +74,17 @@ async def enhanced_chat_message(
         )
         
         # Save conversation
-        conversation_id = chat_service.save_conversation(
-            current_user.id,
-            data.message,
-            chat_result["response"],
-            medical_context
-        )
+        with tracer.span("db.insert_conversation"):
+            conversation_id = chat_service.save_conversation(
+                current_user.id,
+                data.message,
+                chat_result["response"],
+                medical_context
+            )
         
         # Get personalized suggestions
-        suggestions = chat_service.get_chat_suggestions(current_user.id)
+        with tracer.span("suggestions"):
+            suggestions = chat_service.get_chat_suggestions(current_user.id)
         
         AuditLogger.log_health_event(
             event_type="enhanced_chat_message",
@@ -3,7 +3,7 @@ Health Data Management Router
 Comprehensive endpoints for health data CRUD operations
 """
 import logging
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
@@ -14,6 +14,8 @@ from app.models.user import User
 from app.utils.auth_middleware import get_current_user
 from app.utils.encryption_utils import encryption_manager
 from app.utils.audit_logging import AuditLogger
+from app.services.enhanced.health_ingestion import BatchTooLargeError, get_health_data_ingestor, parse_readings
+from app.services.enhanced.health_score_store import readings_changed, readings_stored
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/health-data", tags=["Health Data"])
@@ -100,6 +102,13 @@ async def create_health_data(
         db.commit()
         db.refresh(health_data)
         
+        # Rollups are keyed by row id, so retries are no-ops
+        readings_stored(
+            db, current_user.id,
+            [(health_data.data_type, health_data.timestamp, data.value, health_data.unit)],
+            batch_key=f"health_data:{health_data.id}"
+        )
+        
         # Decrypt for response
         health_data.decrypt_sensitive_fields()
         
@@ -123,6 +132,57 @@ async def create_health_data(
         )
         raise HTTPException(status_code=500, detail="Failed to create health data")
 
+@router.post("/bulk")
+async def create_health_data_bulk(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Create many health data entries in one request.
+    
+    The body is a JSON array of readings, ``{"readings": [...]}``, or NDJSON
+    (``Content-Type: application/x-ndjson``). Invalid readings are reported
+    by index; readings already stored for the same type, timestamp and
+    source are skipped.
+    """
+    try:
+        readings = parse_readings(await request.body(), request.headers.get("content-type"))
+        result = get_health_data_ingestor(db).ingest(current_user.id, readings)
+    except BatchTooLargeError as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error bulk creating health data: {e}")
+        AuditLogger.log_health_data_access(
+            action="bulk_create",
+            user_id=current_user.id,
+            user_email=current_user.email,
+            data_type="bulk",
+            success=False,
+            details={"error": str(e)},
+            request=request
+        )
+        raise HTTPException(status_code=500, detail="Failed to create health data")
+    
+    # One audit event per batch
+    AuditLogger.log_health_data_access(
+        action="bulk_create",
+        user_id=current_user.id,
+        user_email=current_user.email,
+        data_type=",".join(result.data_types) or "bulk",
+        success=True,
+        details={
+            "received": result.received,
+            "inserted": result.inserted,
+            "duplicates": result.duplicates,
+            "rejected": len(result.rejected)
+        },
+        request=request
+    )
+    return result.to_dict()
+
 @router.get("/", response_model=List[HealthDataResponse])
 async def get_health_data(
     data_type: Optional[str] = Query(None, description="Filter by data type"),
@@ -215,6 +275,12 @@ async def update_health_data(
         db.commit()
         db.refresh(health_data)
         
+        if data.value is not None:
+            readings_changed(
+                db, current_user.id, [(health_data.data_type, health_data.timestamp)],
+                updated=[(health_data.data_type, health_data.timestamp, data.value, health_data.unit)]
+            )
+        
         health_data.decrypt_sensitive_fields()
         
         AuditLogger.log_health_event(
@@ -255,9 +321,12 @@ async def delete_health_data(
         if not health_data:
             raise HTTPException(status_code=404, detail="Health data not found")
         
+        data_type, timestamp = health_data.data_type, health_data.timestamp
         db.delete(health_data)
         db.commit()
         
+        readings_changed(db, current_user.id, [(data_type, timestamp)])
+        
         AuditLogger.log_health_event(
             event_type="health_data_deleted",
             user_id=current_user.id,
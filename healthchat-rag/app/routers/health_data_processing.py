@@ -8,6 +8,7 @@ from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
 import logging
+from dataclasses import asdict
 
 from app.database import get_db
 from app.utils.auth_middleware import get_current_user
@@ -22,7 +23,8 @@ from app.schemas.enhanced_health_schemas import (
     HealthDataProcessingRequest, HealthDataProcessingResponse,
     HealthAnalyticsRequest, HealthAnalyticsResponse
 )
-from app.exceptions.health_exceptions import HealthDataError, BusinessIntelligenceError
+from app.services.enhanced.health_score_store import ScoreKind, get_health_score_store
+from app.exceptions.health_exceptions import HealthDataError, BusinessIntelligenceError, DataProcessingError
 
 logger = logging.getLogger(__name__)
 
@@ -266,32 +268,20 @@ async def get_health_score(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get current health score for the user"""
+    """Get current health score for the user (materialized; recomputed when readings change)"""
     try:
-        # Get analytics engine
-        analytics_engine = get_health_analytics_engine(db)
-        
-        # In a real implementation, you'd calculate actual health score
-        # For now, return mock score
-        mock_score = {
-            "overall_score": 0.85,
-            "category": "good",
-            "component_scores": {
-                "heart_rate": 0.9,
-                "steps": 0.8,
-                "sleep": 0.7,
-                "weight": 0.9
-            },
-            "factors": ["Good heart rate", "Adequate sleep"],
-            "recommendations": ["Increase daily steps", "Maintain current habits"],
-            "last_updated": datetime.utcnow().isoformat()
-        }
+        snapshot = await get_health_score_store(db).get_or_compute(current_user.id, ScoreKind.ANALYTICS_SCORE)
         
         return {
             "user_id": current_user.id,
-            "health_score": mock_score
+            "health_score": snapshot.payload,
+            "computed_at": snapshot.computed_at.isoformat(),
+            "version": snapshot.version,
+            "stale": snapshot.stale
         }
         
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Not enough health data to calculate a health score")
     except Exception as e:
         logger.error(f"Error getting health score: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to get health score: {str(e)}")
@@ -340,25 +330,15 @@ async def get_comparative_analysis(
         # Get analytics engine
         analytics_engine = get_health_analytics_engine(db)
         
-        # In a real implementation, you'd perform actual comparative analysis
-        # For now, return mock analysis
-        mock_comparison = [
-            {
-                "comparison_type": "heart_rate_peer_comparison",
-                "user_percentile": 75.0,
-                "peer_group": "age_gender_matched",
-                "differences": {
-                    "vs_peer_average": -5.0,
-                    "percentile": 75.0
-                },
-                "insights": ["Your heart rate is above average for your peer group"],
-                "recommendations": ["Consider improving cardiovascular fitness"]
-            }
-        ]
+        # Percentiles are lookups against the nightly peer baselines
+        results = await analytics_engine.run_comprehensive_analytics(
+            current_user.id, [AnalyticsType.COMPARATIVE_ANALYSIS]
+        )
+        comparisons = [asdict(comparison) for comparison in results.get('comparative', [])]
         
         return {
             "user_id": current_user.id,
-            "comparative_analysis": mock_comparison,
+            "comparative_analysis": comparisons,
             "analysis_date": datetime.utcnow().isoformat()
         }
         
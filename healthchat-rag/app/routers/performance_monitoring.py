@@ -106,6 +106,100 @@ async def get_system_performance_summary(
             detail=f"Failed to get system performance summary: {str(e)}"
         )
 
+@router.get("/custom/summary", response_model=Dict[str, Any])
+async def get_custom_performance_summary(
+    current_user: User = Depends(require_role([UserRole.ADMIN, UserRole.HEALTHCARE_PROVIDER])),
+    hours: int = 1,
+    db: Session = Depends(get_db)
+):
+    """
+    Get custom metric summaries (count, average, p50/p95/p99) for the last N hours.
+    
+    Args:
+        hours: Number of hours to look back (default: 1)
+    """
+    try:
+        summary = performance_monitor.get_custom_performance_summary(hours=hours)
+        
+        return {
+            "message": "Custom performance summary retrieved successfully",
+            "data": summary,
+            "hours": hours
+        }
+        
+    except Exception as e:
+        logger.error(f"Failed to get custom performance summary: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get custom performance summary: {str(e)}"
+        )
+
+@router.get("/traces/summary", response_model=Dict[str, Any])
+async def get_trace_summary(
+    current_user: User = Depends(require_role([UserRole.ADMIN, UserRole.HEALTHCARE_PROVIDER])),
+    hours: int = 1,
+    name: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Get per-stage latency summaries (p50/p95/p99) of traced requests.
+    
+    Args:
+        hours: Number of hours to look back (default: 1)
+        name: Restrict to one trace name, e.g. "chat.message"
+    """
+    try:
+        summary = performance_monitor.get_trace_summary(hours=hours, name=name)
+        
+        return {
+            "message": "Trace summary retrieved successfully",
+            "data": summary,
+            "hours": hours
+        }
+        
+    except Exception as e:
+        logger.error(f"Failed to get trace summary: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get trace summary: {str(e)}"
+        )
+
+@router.get("/traces/samples", response_model=Dict[str, Any])
+async def get_trace_samples(
+    current_user: User = Depends(require_role([UserRole.ADMIN, UserRole.HEALTHCARE_PROVIDER])),
+    name: Optional[str] = None,
+    min_duration_ms: float = 0,
+    limit: int = 20,
+    db: Session = Depends(get_db)
+):
+    """
+    Get recent sampled per-span breakdowns of traced requests.
+    
+    Args:
+        name: Restrict to one trace name
+        min_duration_ms: Only return traces at least this slow
+        limit: Maximum number of traces to return (default: 20)
+    """
+    try:
+        samples = performance_monitor.get_trace_samples(
+            name=name,
+            min_duration_ms=min_duration_ms,
+            limit=limit
+        )
+        
+        return {
+            "message": "Trace samples retrieved successfully",
+            "data": samples,
+            "count": len(samples)
+        }
+        
+    except Exception as e:
+        logger.error(f"Failed to get trace samples: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get trace samples: {str(e)}"
+        )
+
 @router.get("/alerts", response_model=Dict[str, Any])
 async def get_performance_alerts(
     current_user: User = Depends(require_role([UserRole.ADMIN, UserRole.HEALTHCARE_PROVIDER])),
@@ -10,6 +10,7 @@ from datetime import datetime
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from fastapi.security import HTTPBearer
+from sqlalchemy.orm import Session
 
 from app.schemas.enhanced_health_schemas import (
     RiskAssessmentRequest, RiskAssessmentResponse, PredictionType, RiskLevel,
@@ -20,6 +21,8 @@ from app.services.enhanced.predictive_analytics import (
     get_predictive_analytics_backend, RiskAssessment, HealthTrend,
     EarlyWarning, PreventiveRecommendation
 )
+from app.services.enhanced.health_score_store import ScoreKind, ScoreSnapshot, get_health_score_store
+from app.database import get_db
 from app.utils.auth_middleware import get_current_user
 from app.models.user import User
 from app.config import settings
@@ -32,10 +35,27 @@ router = APIRouter(prefix="/predictive-analytics", tags=["Predictive Analytics B
 # Initialize predictive analytics backend
 predictive_analytics = get_predictive_analytics_backend()
 
+def _risk_response(snapshot: ScoreSnapshot, include_recommendations: bool = True) -> RiskAssessmentResponse:
+    """Build a risk assessment response from a materialized assessment"""
+    payload = snapshot.payload
+    return RiskAssessmentResponse(
+        risk_type=payload['risk_type'],
+        risk_level=payload['risk_level'],
+        risk_score=payload['risk_score'],
+        confidence=payload['confidence'],
+        factors=payload['factors'],
+        recommendations=payload['recommendations'] if include_recommendations else [],
+        assessment_date=payload['assessment_date'],
+        next_assessment_date=payload['next_assessment_date'],
+        version=snapshot.version,
+        stale=snapshot.stale
+    )
+
 @router.post("/risk-assessment", response_model=RiskAssessmentResponse)
 async def assess_health_risk(
     request: RiskAssessmentRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
 ):
     """
     Assess health risk for various conditions
@@ -51,13 +71,10 @@ async def assess_health_risk(
     try:
         start_time = time.time()
         
-        # Perform risk assessment based on type
-        if request.risk_type == PredictionType.CARDIOVASCULAR_RISK:
-            assessment = await predictive_analytics.assess_cardiovascular_risk(current_user.id)
-        elif request.risk_type == PredictionType.DIABETES_RISK:
-            assessment = await predictive_analytics.assess_diabetes_risk(current_user.id)
-        elif request.risk_type == PredictionType.MENTAL_HEALTH_RISK:
-            assessment = await predictive_analytics.assess_mental_health_risk(current_user.id)
+        # Serve the materialized assessment for the requested type
+        if request.risk_type in (PredictionType.CARDIOVASCULAR_RISK, PredictionType.DIABETES_RISK,
+                                 PredictionType.MENTAL_HEALTH_RISK):
+            snapshot = await get_health_score_store(db).get_or_compute(current_user.id, ScoreKind(request.risk_type.value))
         else:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -68,17 +85,10 @@ async def assess_health_risk(
         
         logger.info(f"Risk assessment completed for user {current_user.id} in {processing_time:.3f}s")
         
-        return RiskAssessmentResponse(
-            risk_type=assessment.risk_type,
-            risk_level=assessment.risk_level,
-            risk_score=assessment.risk_score,
-            confidence=assessment.confidence,
-            factors=assessment.factors,
-            recommendations=assessment.recommendations if request.include_recommendations else [],
-            assessment_date=assessment.assessment_date,
-            next_assessment_date=assessment.next_assessment_date
-        )
+        return _risk_response(snapshot, request.include_recommendations)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in risk assessment: {e}")
         raise HTTPException(
@@ -88,7 +98,8 @@ async def assess_health_risk(
 
 @router.get("/risk-assessment/cardiovascular", response_model=RiskAssessmentResponse)
 async def assess_cardiovascular_risk(
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
 ):
     """
     Assess cardiovascular disease risk
@@ -105,22 +116,13 @@ async def assess_cardiovascular_risk(
     try:
         start_time = time.time()
         
-        assessment = await predictive_analytics.assess_cardiovascular_risk(current_user.id)
+        snapshot = await get_health_score_store(db).get_or_compute(current_user.id, ScoreKind.CARDIOVASCULAR_RISK)
         
         processing_time = time.time() - start_time
         
         logger.info(f"Cardiovascular risk assessment completed for user {current_user.id} in {processing_time:.3f}s")
         
-        return RiskAssessmentResponse(
-            risk_type=assessment.risk_type,
-            risk_level=assessment.risk_level,
-            risk_score=assessment.risk_score,
-            confidence=assessment.confidence,
-            factors=assessment.factors,
-            recommendations=assessment.recommendations,
-            assessment_date=assessment.assessment_date,
-            next_assessment_date=assessment.next_assessment_date
-        )
+        return _risk_response(snapshot)
         
     except Exception as e:
         logger.error(f"Error in cardiovascular risk assessment: {e}")
@@ -131,7 +133,8 @@ async def assess_cardiovascular_risk(
 
 @router.get("/risk-assessment/diabetes", response_model=RiskAssessmentResponse)
 async def assess_diabetes_risk(
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
 ):
     """
     Assess diabetes risk
@@ -149,22 +152,13 @@ async def assess_diabetes_risk(
     try:
         start_time = time.time()
         
-        assessment = await predictive_analytics.assess_diabetes_risk(current_user.id)
+        snapshot = await get_health_score_store(db).get_or_compute(current_user.id, ScoreKind.DIABETES_RISK)
         
         processing_time = time.time() - start_time
         
         logger.info(f"Diabetes risk assessment completed for user {current_user.id} in {processing_time:.3f}s")
         
-        return RiskAssessmentResponse(
-            risk_type=assessment.risk_type,
-            risk_level=assessment.risk_level,
-            risk_score=assessment.risk_score,
-            confidence=assessment.confidence,
-            factors=assessment.factors,
-            recommendations=assessment.recommendations,
-            assessment_date=assessment.assessment_date,
-            next_assessment_date=assessment.next_assessment_date
-        )
+        return _risk_response(snapshot)
         
     except Exception as e:
         logger.error(f"Error in diabetes risk assessment: {e}")
@@ -175,7 +169,8 @@ async def assess_diabetes_risk(
 
 @router.get("/risk-assessment/mental-health", response_model=RiskAssessmentResponse)
 async def assess_mental_health_risk(
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
 ):
     """
     Assess mental health risk
@@ -192,22 +187,13 @@ async def assess_mental_health_risk(
     try:
         start_time = time.time()
         
-        assessment = await predictive_analytics.assess_mental_health_risk(current_user.id)
+        snapshot = await get_health_score_store(db).get_or_compute(current_user.id, ScoreKind.MENTAL_HEALTH_RISK)
         
         processing_time = time.time() - start_time
         
         logger.info(f"Mental health risk assessment completed for user {current_user.id} in {processing_time:.3f}s")
         
-        return RiskAssessmentResponse(
-            risk_type=assessment.risk_type,
-            risk_level=assessment.risk_level,
-            risk_score=assessment.risk_score,
-            confidence=assessment.confidence,
-            factors=assessment.factors,
-            recommendations=assessment.recommendations,
-            assessment_date=assessment.assessment_date,
-            next_assessment_date=assessment.next_assessment_date
-        )
+        return _risk_response(snapshot)
         
     except Exception as e:
         logger.error(f"Error in mental health risk assessment: {e}")
@@ -12,6 +12,7 @@ from app.database import get_db
 from app.models.user import User
 from app.utils.auth_middleware import get_current_user
 from app.services.health_visualization import HealthVisualizationService
+from app.services.enhanced.health_resolution import get_series_resolution_service
 from app.utils.audit_logging import AuditLogger
 
 logger = logging.getLogger(__name__)
@@ -108,6 +109,51 @@ async def get_specific_chart(
         )
         raise HTTPException(status_code=500, detail="Failed to get chart data")
 
+@router.get("/series/{data_type}", response_model=ChartDataResponse)
+async def get_series(
+    data_type: str,
+    days: int = Query(30, ge=1, le=3650, description="Number of days of data"),
+    max_points: Optional[int] = Query(None, ge=2, le=5000, description="Maximum points returned"),
+    bucket: Optional[str] = Query(None, description="Bucket size: hourly, daily, weekly, monthly or seconds"),
+    mode: str = Query("buckets", description="buckets (min/max/mean per bucket) or lttb"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get one metric's time series at a bounded resolution"""
+    try:
+        end_date = datetime.utcnow()
+        series_data = get_series_resolution_service(db).get_series(
+            current_user.id, data_type, end_date - timedelta(days=days), end_date,
+            max_points=max_points, bucket=bucket, mode=mode
+        )
+        
+        AuditLogger.log_health_event(
+            event_type="series_requested",
+            user_id=current_user.id,
+            data_type=data_type,
+            days=days,
+            success=True
+        )
+        
+        return ChartDataResponse(
+            success=True,
+            data=series_data,
+            message="Series data retrieved successfully"
+        )
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error getting series: {e}")
+        AuditLogger.log_health_event(
+            event_type="series_requested",
+            user_id=current_user.id,
+            data_type=data_type,
+            success=False,
+            error=str(e)
+        )
+        raise HTTPException(status_code=500, detail="Failed to get series data")
+
 @router.get("/available-charts")
 async def get_available_charts(
     current_user: User = Depends(get_current_user),
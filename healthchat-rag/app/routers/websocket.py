@@ -229,6 +229,39 @@ async def reconnect_user_connections(user_id: int):
             "timestamp": "2024-01-01T00:00:00Z"
         }
 
+# User presence endpoint
+@websocket_router.get("/ws/user/{user_id}/presence")
+async def user_presence(user_id: int):
+    """
+    Get the workers currently holding WebSocket connections for a user.
+    
+    Args:
+        user_id: User ID to look up
+        
+    Returns:
+        Presence information across all workers
+    """
+    try:
+        from app.websocket.connection_manager import connection_manager
+        
+        nodes = await connection_manager.get_user_presence(user_id)
+        
+        return {
+            "user_id": user_id,
+            "online": bool(nodes),
+            "nodes": nodes,
+            "total_connections": sum(nodes.values()),
+            "timestamp": "2024-01-01T00:00:00Z"
+        }
+    except Exception as e:
+        logger.error(f"Error getting presence for user {user_id}: {e}")
+        return {
+            "user_id": user_id,
+            "online": False,
+            "error": str(e),
+            "timestamp": "2024-01-01T00:00:00Z"
+        }
+
 # Connection management endpoint
 @websocket_router.delete("/ws/connection/{connection_id}")
 async def disconnect_connection(connection_id: str, reason: str = "Admin disconnect"):
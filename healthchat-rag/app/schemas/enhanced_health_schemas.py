@@ -1379,6 +1379,8 @@ class RiskAssessmentResponse(BaseModel):
     recommendations: List[str] = Field(default_factory=list, description="Health recommendations")
     assessment_date: datetime = Field(..., description="Assessment date")
     next_assessment_date: datetime = Field(..., description="Recommended next assessment date")
+    version: Optional[int] = Field(None, description="Materialized assessment version")
+    stale: bool = Field(False, description="Inputs changed since the assessment; a recomputation is queued")
 
     class Config:
         schema_extra = {
@@ -3,8 +3,8 @@ Health Data Pydantic Schemas
 Comprehensive schemas for health data, metrics, and medical information
 """
 from typing import Optional, List, Dict, Any, Union
-from pydantic import BaseModel, Field, field_validator, ConfigDict
-from datetime import datetime, date
+from pydantic import BaseModel, Field, field_validator, model_validator, ConfigDict, ValidationInfo
+from datetime import datetime, date, timezone
 from enum import Enum
 
 class BloodType(str, Enum):
@@ -70,6 +70,66 @@ class HealthGoalStatus(str, Enum):
     ABANDONED = "abandoned"
     ON_HOLD = "on_hold"
 
+# Data types accepted for health readings
+HEALTH_DATA_TYPES = [
+    'blood_pressure', 'heart_rate', 'temperature', 'weight', 'height',
+    'blood_glucose', 'oxygen_saturation', 'respiratory_rate',
+    'pain_level', 'mood', 'sleep_hours', 'steps', 'calories',
+    'medication_taken', 'symptom_log', 'appointment'
+]
+
+def validate_reading_data_type(data_type: str) -> str:
+    """Validate a reading's data type"""
+    if data_type not in HEALTH_DATA_TYPES:
+        raise ValueError(f"Invalid data type. Must be one of: {', '.join(HEALTH_DATA_TYPES)}")
+    return data_type
+
+def validate_reading_value(data_type: str, v: Any) -> Any:
+    """Validate a reading's value against the plausible range for its data type"""
+    if data_type in ['blood_pressure']:
+        if not isinstance(v, dict) or 'systolic' not in v or 'diastolic' not in v:
+            raise ValueError("Blood pressure must be a dict with 'systolic' and 'diastolic' values")
+        if not (70 <= v['systolic'] <= 200 and 40 <= v['diastolic'] <= 130):
+            raise ValueError("Blood pressure values out of valid range")
+    
+    elif data_type in ['heart_rate', 'respiratory_rate']:
+        if not isinstance(v, (int, float)) or not (30 <= v <= 200):
+            raise ValueError("Heart rate/respiratory rate must be between 30 and 200")
+    
+    elif data_type == 'temperature':
+        if not isinstance(v, (int, float)) or not (30 <= v <= 45):
+            raise ValueError("Temperature must be between 30 and 45 degrees")
+    
+    elif data_type in ['weight', 'height']:
+        if not isinstance(v, (int, float)) or v <= 0:
+            raise ValueError("Weight/height must be positive numbers")
+    
+    elif data_type == 'blood_glucose':
+        if not isinstance(v, (int, float)) or not (20 <= v <= 600):
+            raise ValueError("Blood glucose must be between 20 and 600 mg/dL")
+    
+    elif data_type == 'oxygen_saturation':
+        if not isinstance(v, (int, float)) or not (70 <= v <= 100):
+            raise ValueError("Oxygen saturation must be between 70 and 100%")
+    
+    elif data_type == 'pain_level':
+        if not isinstance(v, int) or not (0 <= v <= 10):
+            raise ValueError("Pain level must be between 0 and 10")
+    
+    elif data_type == 'sleep_hours':
+        if not isinstance(v, (int, float)) or not (0 <= v <= 24):
+            raise ValueError("Sleep hours must be between 0 and 24")
+    
+    elif data_type == 'steps':
+        if not isinstance(v, int) or v < 0:
+            raise ValueError("Steps must be a non-negative integer")
+    
+    elif data_type == 'calories':
+        if not isinstance(v, (int, float)) or v < 0:
+            raise ValueError("Calories must be a non-negative number")
+    
+    return v
+
 class HealthDataCreate(BaseModel):
     """Health data creation schema"""
     user_id: int = Field(..., description="User ID")
@@ -84,67 +144,14 @@ class HealthDataCreate(BaseModel):
     @field_validator('data_type')
     def validate_data_type(cls, v):
         """Validate data type"""
-        valid_types = [
-            'blood_pressure', 'heart_rate', 'temperature', 'weight', 'height',
-            'blood_glucose', 'oxygen_saturation', 'respiratory_rate',
-            'pain_level', 'mood', 'sleep_hours', 'steps', 'calories',
-            'medication_taken', 'symptom_log', 'appointment'
-        ]
-        if v not in valid_types:
-            raise ValueError(f"Invalid data type. Must be one of: {', '.join(valid_types)}")
-        return v
+        return validate_reading_data_type(v)
 
     @field_validator('value')
-    def validate_value(cls, v, values):
+    def validate_value(cls, v, info: ValidationInfo):
         """Validate value based on data type"""
-        if 'data_type' not in values:
+        if 'data_type' not in info.data:
             return v
-        
-        data_type = values['data_type']
-        
-        if data_type in ['blood_pressure']:
-            if not isinstance(v, dict) or 'systolic' not in v or 'diastolic' not in v:
-                raise ValueError("Blood pressure must be a dict with 'systolic' and 'diastolic' values")
-            if not (70 <= v['systolic'] <= 200 and 40 <= v['diastolic'] <= 130):
-                raise ValueError("Blood pressure values out of valid range")
-        
-        elif data_type in ['heart_rate', 'respiratory_rate']:
-            if not isinstance(v, (int, float)) or not (30 <= v <= 200):
-                raise ValueError("Heart rate/respiratory rate must be between 30 and 200")
-        
-        elif data_type == 'temperature':
-            if not isinstance(v, (int, float)) or not (30 <= v <= 45):
-                raise ValueError("Temperature must be between 30 and 45 degrees")
-        
-        elif data_type in ['weight', 'height']:
-            if not isinstance(v, (int, float)) or v <= 0:
-                raise ValueError("Weight/height must be positive numbers")
-        
-        elif data_type == 'blood_glucose':
-            if not isinstance(v, (int, float)) or not (20 <= v <= 600):
-                raise ValueError("Blood glucose must be between 20 and 600 mg/dL")
-        
-        elif data_type == 'oxygen_saturation':
-            if not isinstance(v, (int, float)) or not (70 <= v <= 100):
-                raise ValueError("Oxygen saturation must be between 70 and 100%")
-        
-        elif data_type == 'pain_level':
-            if not isinstance(v, int) or not (0 <= v <= 10):
-                raise ValueError("Pain level must be between 0 and 10")
-        
-        elif data_type == 'sleep_hours':
-            if not isinstance(v, (int, float)) or not (0 <= v <= 24):
-                raise ValueError("Sleep hours must be between 0 and 24")
-        
-        elif data_type == 'steps':
-            if not isinstance(v, int) or v < 0:
-                raise ValueError("Steps must be a non-negative integer")
-        
-        elif data_type == 'calories':
-            if not isinstance(v, (int, float)) or v < 0:
-                raise ValueError("Calories must be a non-negative number")
-        
-        return v
+        return validate_reading_value(info.data['data_type'], v)
 
     model_config = {
         "json_json_schema_extra": {
@@ -161,6 +168,34 @@ class HealthDataCreate(BaseModel):
         }
     }
 
+class HealthReadingIn(BaseModel):
+    """One reading in a bulk ingestion request"""
+    data_type: str = Field(..., description="Type of health data")
+    value: Any = Field(..., description="Health data value")
+    unit: Optional[str] = Field(None, max_length=20, description="Unit of measurement")
+    timestamp: datetime = Field(..., description="Data timestamp")
+    notes: Optional[str] = Field(None, max_length=1000, description="Additional notes")
+    source: Optional[str] = Field(None, max_length=100, description="Data source")
+    confidence: Optional[float] = Field(None, ge=0.0, le=1.0, description="Data confidence level")
+    
+    @field_validator('data_type')
+    def validate_data_type(cls, v):
+        """Validate data type"""
+        return validate_reading_data_type(v)
+    
+    @field_validator('timestamp')
+    def validate_timestamp(cls, v):
+        """Store timestamps as naive UTC, as the health_data table does"""
+        if v.tzinfo is not None:
+            v = v.astimezone(timezone.utc).replace(tzinfo=None)
+        return v
+    
+    @model_validator(mode='after')
+    def validate_value(self):
+        """Validate value based on data type"""
+        validate_reading_value(self.data_type, self.value)
+        return self
+
 class HealthDataUpdate(BaseModel):
     """Health data update schema"""
     value: Optional[Any] = Field(None, description="Health data value")
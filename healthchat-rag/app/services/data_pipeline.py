@@ -15,7 +15,7 @@ import asyncio
 import logging
 import json
 import time
-from typing import Dict, List, Any, Optional, Union, Callable
+from typing import Dict, List, Any, Optional, Union, Callable, Tuple, Iterator
 from datetime import datetime, timedelta
 from dataclasses import dataclass, field
 from enum import Enum
@@ -25,7 +25,8 @@ from abc import ABC, abstractmethod
 
 import pandas as pd
 import numpy as np
-from sqlalchemy import create_engine, text
+from sqlalchemy import MetaData, Table, and_, create_engine, insert, or_, select, text
+from sqlalchemy.engine import Connection, Engine
 from sqlalchemy.orm import Session
 import psycopg2
 from psycopg2.extras import RealDictCursor
@@ -45,7 +46,6 @@ except ImportError:
 
 # Kafka imports (optional)
 try:
-    from kafka import KafkaProducer, KafkaConsumer
     from kafka.admin import KafkaAdminClient, NewTopic
     from kafka.errors import TopicAlreadyExistsError
     KAFKA_AVAILABLE = True
@@ -54,15 +54,22 @@ except ImportError:
     logger = logging.getLogger(__name__)
     logger.warning("Apache Kafka not available. Streaming will be disabled.")
 
+from app.config import settings
 from app.database import get_db
 from app.models.enhanced_health_models import (
     UserHealthProfile, HealthMetricsAggregation, EnhancedMedication,
-    EnhancedSymptomLog, ConversationHistory, AIResponseCache
+    EnhancedSymptomLog, ConversationHistory, AIResponseCache, EtlWatermark
 )
 from app.services.enhanced.data_integration import (
     DataIntegrationService, HealthDataPoint, DataType, DataSourceType
 )
-from app.exceptions.health_exceptions import DataProcessingError, ValidationError
+from app.services.enhanced.event_stream import EventRecord, EventStream, KafkaEventStream, LogEventStream
+from app.services.enhanced.health_sync import dialect_insert
+from app.services.enhanced.health_validation import (
+    RangeRule, ReasonCode, check_range, to_datetime64, value_kinds
+)
+from app.exceptions.health_exceptions import DataProcessingError
+from app.exceptions.validation_exceptions import ValidationError
 from app.utils.audit_logging import AuditLogger
 
 logger = logging.getLogger(__name__)
@@ -131,6 +138,45 @@ class DataLineageInfo:
     metadata: Dict[str, Any] = field(default_factory=dict)
 
 
+class _RecordColumns:
+    """Per-field columns of a list of records, extracted once and shared by the quality checks"""
+    
+    def __init__(self, data: List[Dict[str, Any]]):
+        self.data = data
+        self._cache: Dict[Tuple[str, str], Any] = {}
+    
+    def _cached(self, key: Tuple[str, str], build: Callable[[], Any]) -> Any:
+        if key not in self._cache:
+            self._cache[key] = build()
+        return self._cache[key]
+    
+    def values(self, field: str) -> List[Any]:
+        return self._cached(('values', field), lambda: [record.get(field) for record in self.data])
+    
+    def has(self, field: str) -> np.ndarray:
+        return self._cached(('has', field), lambda: np.fromiter(
+            (field in record for record in self.data), bool, len(self.data)))
+    
+    def present(self, field: str) -> np.ndarray:
+        return self._cached(('present', field), lambda: np.fromiter(
+            (value is not None for value in self.values(field)), bool, len(self.data)))
+    
+    def is_instance(self, field: str, expected_type: type) -> np.ndarray:
+        return self._cached(('type', f"{field}:{expected_type.__name__}"), lambda: np.fromiter(
+            (isinstance(value, expected_type) for value in self.values(field)), bool, len(self.data)))
+    
+    def numbers(self, field: str) -> Tuple[np.ndarray, np.ndarray]:
+        return self._cached(('numbers', field), lambda: value_kinds(self.values(field)))
+    
+    def non_numeric(self, field: str) -> np.ndarray:
+        return np.isnan(self.numbers(field)[1])
+    
+    def range_codes(self, field: str, range_rules: Dict[str, Any]) -> np.ndarray:
+        kinds, values = self.numbers(field)
+        rule = RangeRule(range_rules.get('min_value', -np.inf), range_rules.get('max_value', np.inf))
+        return check_range(values, kinds, rule)
+
+
 class DataValidator:
     """Data validation and quality assessment"""
     
@@ -203,60 +249,66 @@ class DataValidator:
             )
         
         rules = self.validation_rules.get(data_type, {})
-        total_records = len(data)
-        valid_records = 0
+        columns = _RecordColumns(data)
         issues = []
-        recommendations = []
         
-        # Check completeness
-        completeness_scores = []
-        for record in data:
-            required_fields = rules.get('required_fields', [])
-            present_fields = sum(1 for field in required_fields if field in record and record[field] is not None)
-            completeness_scores.append(present_fields / len(required_fields) if required_fields else 1.0)
+        # Check completeness: share of required fields present across all records
+        required_fields = rules.get('required_fields', [])
+        if required_fields:
+            completeness = float(np.mean([columns.present(field).mean() for field in required_fields]))
+        else:
+            completeness = 1.0
         
-        completeness = np.mean(completeness_scores) if completeness_scores else 0.0
+        # Check validity one field at a time, reporting each failed rule once with its count
+        record_valid = np.ones(len(data), dtype=bool)
+        for field, expected_type in rules.get('data_types', {}).items():
+            wrong_type = columns.has(field) & ~columns.is_instance(field, expected_type)
+            if wrong_type.any():
+                record_valid &= ~wrong_type
+                issues.append(f"Invalid data type for {field}: expected {expected_type} "
+                              f"({int(wrong_type.sum())} records)")
         
-        # Check validity
-        validity_scores = []
-        for record in data:
-            record_valid = True
-            for field, expected_type in rules.get('data_types', {}).items():
-                if field in record:
-                    try:
-                        if not isinstance(record[field], expected_type):
-                            record_valid = False
-                            issues.append(f"Invalid data type for {field}: expected {expected_type}")
-                    except Exception:
-                        record_valid = False
-                        issues.append(f"Data type validation failed for {field}")
-            
-            # Check value ranges
-            for field, range_rules in rules.items():
-                if field in record and isinstance(range_rules, dict):
-                    if 'min_value' in range_rules and record[field] < range_rules['min_value']:
-                        record_valid = False
-                        issues.append(f"{field} value {record[field]} below minimum {range_rules['min_value']}")
-                    if 'max_value' in range_rules and record[field] > range_rules['max_value']:
-                        record_valid = False
-                        issues.append(f"{field} value {record[field]} above maximum {range_rules['max_value']}")
-            
-            if record_valid:
-                valid_records += 1
-            validity_scores.append(1.0 if record_valid else 0.0)
+        for field, range_rules in self._range_rules(rules):
+            codes = columns.range_codes(field, range_rules)
+            for failed, message in (
+                (columns.has(field) & columns.non_numeric(field), "non-numeric values"),
+                ((codes & ReasonCode.BELOW_MIN) != 0, f"values below minimum {range_rules.get('min_value')}"),
+                ((codes & ReasonCode.ABOVE_MAX) != 0, f"values above maximum {range_rules.get('max_value')}")
+            ):
+                if failed.any():
+                    record_valid &= ~failed
+                    issues.append(f"{field}: {int(failed.sum())} {message}")
         
-        validity = np.mean(validity_scores) if validity_scores else 0.0
+        validity = float(record_valid.mean())
         
         # Check consistency
-        consistency = self._check_data_consistency(data, rules)
+        consistency = self._check_data_consistency(data, rules, columns)
         
         # Check timeliness
-        timeliness = self._check_data_timeliness(data)
+        timeliness = self._check_data_timeliness(data, columns)
         
         # Calculate accuracy (simplified)
         accuracy = validity * 0.8 + consistency * 0.2
         
-        # Overall score
+        return self._build_metrics(completeness, accuracy, consistency, timeliness, validity, issues)
+    
+    def combine_quality_metrics(self, parts: List[Tuple[int, DataQualityMetrics]]) -> Optional[DataQualityMetrics]:
+        """Combine metrics of chunks validated separately, weighting each by its record count"""
+        total = sum(count for count, _ in parts)
+        if not total:
+            return None
+        
+        def mean(name: str) -> float:
+            return float(sum(count * getattr(metrics, name) for count, metrics in parts) / total)
+        
+        issues = [issue for _, metrics in parts for issue in metrics.issues]
+        return self._build_metrics(mean('completeness'), mean('accuracy'), mean('consistency'),
+                                   mean('timeliness'), mean('validity'), list(dict.fromkeys(issues)))
+    
+    @staticmethod
+    def _build_metrics(completeness: float, accuracy: float, consistency: float, timeliness: float,
+                       validity: float, issues: List[str]) -> DataQualityMetrics:
+        """Overall score, quality level and recommendations from the component scores"""
         overall_score = (completeness + accuracy + consistency + timeliness + validity) / 5.0
         
         # Determine quality level
@@ -272,6 +324,7 @@ class DataValidator:
             quality_level = DataQualityLevel.UNUSABLE
         
         # Generate recommendations
+        recommendations = []
         if completeness < 0.8:
             recommendations.append("Improve data completeness by ensuring all required fields are populated")
         if validity < 0.8:
@@ -293,67 +346,51 @@ class DataValidator:
             recommendations=recommendations
         )
     
-    def _check_data_consistency(self, data: List[Dict[str, Any]], rules: Dict[str, Any]) -> float:
+    def _check_data_consistency(self, data: List[Dict[str, Any]], rules: Dict[str, Any],
+                                columns: Optional['_RecordColumns'] = None) -> float:
         """Check data consistency"""
         if not data:
             return 0.0
         
+        columns = columns or _RecordColumns(data)
         consistency_scores = []
         
         # Check for consistent data types
         for field, expected_type in rules.get('data_types', {}).items():
-            type_consistency = sum(
-                1 for record in data 
-                if field in record and isinstance(record[field], expected_type)
-            ) / len(data)
-            consistency_scores.append(type_consistency)
+            consistency_scores.append((columns.has(field) & columns.is_instance(field, expected_type)).mean())
         
         # Check for consistent value ranges
-        for field, range_rules in rules.items():
-            if isinstance(range_rules, dict) and ('min_value' in range_rules or 'max_value' in range_rules):
-                range_consistency = sum(
-                    1 for record in data
-                    if field in record and self._is_in_range(record[field], range_rules)
-                ) / len(data)
-                consistency_scores.append(range_consistency)
+        for field, range_rules in self._range_rules(rules):
+            in_range = columns.has(field) & ~columns.non_numeric(field) & (columns.range_codes(field, range_rules) == 0)
+            consistency_scores.append(in_range.mean())
         
-        return np.mean(consistency_scores) if consistency_scores else 1.0
+        return float(np.mean(consistency_scores)) if consistency_scores else 1.0
     
-    def _check_data_timeliness(self, data: List[Dict[str, Any]]) -> float:
+    def _check_data_timeliness(self, data: List[Dict[str, Any]],
+                               columns: Optional['_RecordColumns'] = None) -> float:
         """Check data timeliness"""
         if not data:
             return 0.0
         
-        now = datetime.utcnow()
-        timeliness_scores = []
-        
-        for record in data:
-            if 'timestamp' in record:
-                try:
-                    if isinstance(record['timestamp'], str):
-                        timestamp = datetime.fromisoformat(record['timestamp'].replace('Z', '+00:00'))
-                    else:
-                        timestamp = record['timestamp']
-                    
-                    age_hours = (now - timestamp).total_seconds() / 3600
-                    
-                    # Score based on age (fresher data gets higher score)
-                    if age_hours <= 1:
-                        timeliness_scores.append(1.0)
-                    elif age_hours <= 24:
-                        timeliness_scores.append(0.9)
-                    elif age_hours <= 168:  # 1 week
-                        timeliness_scores.append(0.7)
-                    elif age_hours <= 720:  # 1 month
-                        timeliness_scores.append(0.5)
-                    else:
-                        timeliness_scores.append(0.3)
-                except Exception:
-                    timeliness_scores.append(0.0)
-            else:
-                timeliness_scores.append(0.0)
+        columns = columns or _RecordColumns(data)
+        timestamps = to_datetime64(columns.values('timestamp'))
+        age_hours = (np.datetime64(datetime.utcnow(), 's') - timestamps) / np.timedelta64(1, 'h')
         
-        return np.mean(timeliness_scores) if timeliness_scores else 0.0
+        # Score based on age (fresher data gets higher score); missing or unparseable timestamps score 0
+        scores = np.select(
+            [np.isnat(timestamps), age_hours <= 1, age_hours <= 24, age_hours <= 168, age_hours <= 720],
+            [0.0, 1.0, 0.9, 0.7, 0.5],
+            default=0.3
+        )
+        return float(scores.mean())
+    
+    @staticmethod
+    def _range_rules(rules: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+        """Fields with a min_value or max_value rule"""
+        return [
+            (field, range_rules) for field, range_rules in rules.items()
+            if isinstance(range_rules, dict) and ('min_value' in range_rules or 'max_value' in range_rules)
+        ]
     
     def _is_in_range(self, value: Any, range_rules: Dict[str, Any]) -> bool:
         """Check if value is within specified range"""
@@ -479,145 +516,302 @@ class DataTransformer:
             return value
 
 
+@dataclass
+class WarehouseMapping:
+    """How changed rows of a source table become rows of a warehouse table"""
+    target_table: str
+    to_row: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]
+    conflict_columns: Tuple[str, ...] = ()  # Upsert key; rows are appended when empty
+    data_type: Optional[str] = 'health_metrics'  # Validation and transformation rules; None when validated upstream
+
+
+def _rollup_metric_row(record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """aggregated_health_metrics row for one health_metric_rollups row"""
+    count = record.get('count') or 0
+    component = record.get('component') or 'value'
+    return {
+        'user_id': record['user_id'],
+        'metric_type': record['data_type'] if component == 'value' else f"{record['data_type']}_{component}",
+        'metric_value': record['total'] / count if count else None,
+        'metric_unit': None,
+        'aggregation_period': record['granularity'],
+        'period_start': record['bucket_start'],
+        'period_end': record['bucket_end'],
+        'source_count': count,
+        'updated_at': datetime.utcnow()
+    }
+
+
+WAREHOUSE_MAPPINGS: Dict[str, WarehouseMapping] = {
+    'health_metric_rollups': WarehouseMapping(
+        'aggregated_health_metrics', _rollup_metric_row,
+        ('user_id', 'metric_type', 'aggregation_period', 'period_start'),
+        data_type=None  # Aggregates of readings validated on ingestion
+    ),
+}
+
+
+@dataclass
+class TableRunResult:
+    """Outcome of one incremental run over one source table"""
+    table: str
+    records_extracted: int = 0
+    chunks: int = 0
+    load_results: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    quality: List[Tuple[int, DataQualityMetrics]] = field(default_factory=list)
+    watermark: Optional[Tuple[datetime, int]] = None
+
+
 class BatchDataProcessor:
     """Batch data processing with Apache Airflow integration"""
     
-    def __init__(self, db_session: Session):
+    def __init__(self, db_session: Session, warehouse_engine: Optional[Engine] = None):
         self.db = db_session
+        self.warehouse_engine = warehouse_engine  # Load target; the application database when None
         self.validator = DataValidator()
         self.transformer = DataTransformer()
         self.audit_logger = AuditLogger()
         self.data_integration = DataIntegrationService()
+        self._tables: Dict[Tuple[str, str], Table] = {}
     
     async def process_batch_data(self, job_config: ETLJobConfig) -> Dict[str, Any]:
-        """Process batch data according to ETL job configuration"""
+        """
+        Move rows changed since this job's last run from its source tables to its targets.
+        
+        Source tables are extracted in parallel, up to job_config.parallel_workers
+        at once, each on its own connection. Rows stream from a server-side
+        cursor in job_config.batch_size chunks that are validated, transformed
+        and loaded one at a time, so memory is bounded by the chunk size. A
+        table's watermark advances after every loaded chunk.
+        """
         start_time = datetime.utcnow()
         
         try:
-            # Extract data from source tables
-            source_data = await self._extract_data(job_config.source_tables)
-            
-            # Validate data quality
-            quality_metrics = self.validator.validate_data_quality(
-                source_data, 'health_metrics'
-            )
+            workers = asyncio.Semaphore(max(job_config.parallel_workers, 1))
             
-            # Check if quality meets threshold
-            if quality_metrics.overall_score < job_config.data_quality_threshold:
-                raise DataProcessingError(
-                    f"Data quality score {quality_metrics.overall_score} below threshold "
-                    f"{job_config.data_quality_threshold}"
-                )
+            async def run_table(table_name: str) -> TableRunResult:
+                async with workers:
+                    return await asyncio.to_thread(self._run_table, job_config, table_name, start_time)
             
-            # Transform data
-            transformed_data = self.transformer.transform_data(
-                source_data, 'health_metrics'
+            outcomes = await asyncio.gather(
+                *(run_table(table_name) for table_name in job_config.source_tables), return_exceptions=True
             )
+            failures = [outcome for outcome in outcomes if isinstance(outcome, Exception)]
+            if failures:
+                raise failures[0]
             
-            # Load data to target tables
-            load_results = await self._load_data(
-                transformed_data, job_config.target_tables
+            records_processed = sum(outcome.records_extracted for outcome in outcomes)
+            quality_metrics = self.validator.combine_quality_metrics(
+                [part for outcome in outcomes for part in outcome.quality]
             )
+            load_results = self._merge_load_results([outcome.load_results for outcome in outcomes])
             
             # Track data lineage
-            lineage_info = await self._track_data_lineage(
-                job_config, source_data, transformed_data
-            )
+            lineage_info = await self._track_data_lineage(job_config, records_processed, records_processed)
             
             processing_time = (datetime.utcnow() - start_time).total_seconds()
             
-            # Log audit trail
-            self.audit_logger.log_system_action(
-                action="batch_data_processing",
-                details={
-                    "job_id": job_config.job_id,
-                    "job_name": job_config.job_name,
-                    "records_processed": len(source_data),
-                    "quality_score": quality_metrics.overall_score,
-                    "processing_time": processing_time,
-                    "success": True
-                }
-            )
+            logger.info(f"Batch job {job_config.job_id} ({job_config.job_name}) processed {records_processed} "
+                        f"records in {processing_time:.1f}s")
             
             return {
                 "success": True,
                 "job_id": job_config.job_id,
-                "records_processed": len(source_data),
+                "records_processed": records_processed,
                 "quality_metrics": quality_metrics,
                 "processing_time": processing_time,
                 "lineage_info": lineage_info,
-                "load_results": load_results
+                "load_results": load_results,
+                "watermarks": {
+                    outcome.table: outcome.watermark[0].isoformat() if outcome.watermark else None
+                    for outcome in outcomes
+                }
             }
             
         except Exception as e:
             processing_time = (datetime.utcnow() - start_time).total_seconds()
             
-            # Log failure
-            self.audit_logger.log_system_action(
-                action="batch_data_processing_failed",
-                details={
-                    "job_id": job_config.job_id,
-                    "job_name": job_config.job_name,
-                    "error": str(e),
-                    "processing_time": processing_time
-                }
-            )
+            logger.error(f"Batch job {job_config.job_id} ({job_config.job_name}) failed after "
+                         f"{processing_time:.1f}s: {e}")
             
             raise DataProcessingError(f"Batch processing failed: {str(e)}")
     
-    async def _extract_data(self, source_tables: List[str]) -> List[Dict[str, Any]]:
-        """Extract data from source tables"""
-        all_data = []
+    def _run_table(self, job_config: ETLJobConfig, table_name: str, until: datetime) -> TableRunResult:
+        """Extract, validate, transform and load one table's changed rows chunk by chunk (runs in a worker thread)"""
+        source_engine = self.db.get_bind()
+        target_engine = self.warehouse_engine or source_engine
+        mapping = WAREHOUSE_MAPPINGS.get(table_name)
+        data_type = mapping.data_type if mapping else 'health_metrics'
+        # Mapped tables load only into their analytics table, other tables into the remaining targets
+        mapped_targets = {m.target_table for m in WAREHOUSE_MAPPINGS.values()}
+        targets = [
+            table for table in job_config.target_tables
+            if (table == mapping.target_table if mapping else table not in mapped_targets)
+        ]
+        result = TableRunResult(table_name, watermark=self._load_watermark(source_engine, job_config.job_id, table_name))
         
-        for table in source_tables:
-            try:
-                # Execute query to extract data
-                query = f"SELECT * FROM {table} WHERE updated_at >= NOW() - INTERVAL '1 day'"
-                result = self.db.execute(text(query))
+        with source_engine.connect() as source:
+            for chunk in self._extract_data(source, table_name, result.watermark, until, job_config.batch_size):
+                if data_type:
+                    quality_metrics = self.validator.validate_data_quality(chunk, data_type)
+                    if quality_metrics.overall_score < job_config.data_quality_threshold:
+                        raise DataProcessingError(
+                            f"Data quality score {quality_metrics.overall_score} below threshold "
+                            f"{job_config.data_quality_threshold} in {table_name}"
+                        )
+                    result.quality.append((len(chunk), quality_metrics))
+                    chunk = self.transformer.transform_data(chunk, data_type)
                 
-                # Convert to list of dictionaries
-                table_data = [dict(row) for row in result]
-                all_data.extend(table_data)
+                loaded = self._load_data(target_engine, chunk, targets, mapping)
+                failed = [f"{table}: {'; '.join(load['errors'])}" for table, load in loaded.items() if not load['success']]
+                if failed:
+                    raise DataProcessingError(f"Loading {table_name} failed: {', '.join(failed)}")
                 
-                logger.info(f"Extracted {len(table_data)} records from {table}")
+                result.watermark = (chunk[-1]['updated_at'], chunk[-1]['id'])
+                self._save_watermark(source_engine, job_config.job_id, table_name, result.watermark, len(chunk))
                 
-            except Exception as e:
-                logger.error(f"Error extracting data from {table}: {e}")
-                continue
+                result.records_extracted += len(chunk)
+                result.chunks += 1
+                result.load_results = self._merge_load_results([result.load_results, loaded])
         
-        return all_data
+        logger.info(f"Extracted {result.records_extracted} changed records from {table_name} "
+                    f"in {result.chunks} chunks")
+        return result
     
-    async def _load_data(self, data: List[Dict[str, Any]], target_tables: List[str]) -> Dict[str, Any]:
-        """Load data to target tables"""
+    def _extract_data(self, connection: Connection, table_name: str, watermark: Optional[Tuple[datetime, int]],
+                      until: datetime, chunk_size: int) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Stream a table's rows changed after a watermark, in (updated_at, id) order.
+        
+        Args:
+            connection: Connection held open while the cursor is read
+            table_name: Source table, with updated_at and id columns
+            watermark: (updated_at, id) of the last row already loaded
+            until: Rows updated after this are left for the next run
+            chunk_size: Rows fetched from the server-side cursor at a time
+        
+        Yields:
+            Chunks of rows as dictionaries
+        """
+        table = self._reflect(connection, table_name)
+        changed = table.c.updated_at <= until
+        if watermark:
+            last_updated_at, last_id = watermark
+            changed = and_(changed, or_(
+                table.c.updated_at > last_updated_at,
+                and_(table.c.updated_at == last_updated_at, table.c.id > last_id)
+            ))
+        
+        query = select(table).where(changed).order_by(table.c.updated_at, table.c.id)
+        result = connection.execution_options(yield_per=chunk_size).execute(query)
+        for rows in result.mappings().partitions():
+            yield [dict(row) for row in rows]
+    
+    def _load_data(self, engine: Engine, data: List[Dict[str, Any]], target_tables: List[str],
+                   mapping: Optional[WarehouseMapping] = None) -> Dict[str, Any]:
+        """
+        Bulk load records into target tables.
+        
+        A target named by the source table's mapping gets mapped rows, upserted on
+        the mapping's key so reloading a chunk is harmless; other targets get the
+        record fields matching their columns, appended.
+        """
         results = {}
         
-        for table in target_tables:
+        for table_name in target_tables:
             try:
-                # This would implement actual data loading logic
-                # For now, just simulate the process
-                records_loaded = len(data)
+                table = self._reflect(engine, table_name)
+                if mapping and mapping.target_table == table_name:
+                    rows = [row for row in map(mapping.to_row, data) if row]
+                    conflict_columns = mapping.conflict_columns
+                else:
+                    columns = set(table.c.keys()) - {'id'}
+                    rows = [row for row in ({k: v for k, v in record.items() if k in columns} for record in data) if row]
+                    conflict_columns = ()
                 
-                results[table] = {
-                    "records_loaded": records_loaded,
+                if rows:
+                    with engine.begin() as connection:
+                        if conflict_columns:
+                            statement = dialect_insert(connection)(table)
+                            statement = statement.on_conflict_do_update(
+                                index_elements=[table.c[column] for column in conflict_columns],
+                                set_={column: statement.excluded[column] for column in rows[0]
+                                      if column not in conflict_columns}
+                            )
+                        else:
+                            statement = insert(table)
+                        connection.execute(statement, rows)
+                
+                results[table_name] = {
+                    "records_loaded": len(rows),
                     "success": True,
                     "errors": []
                 }
                 
-                logger.info(f"Loaded {records_loaded} records to {table}")
+                logger.info(f"Loaded {len(rows)} records to {table_name}")
                 
             except Exception as e:
-                results[table] = {
+                results[table_name] = {
                     "records_loaded": 0,
                     "success": False,
                     "errors": [str(e)]
                 }
-                logger.error(f"Error loading data to {table}: {e}")
+                logger.error(f"Error loading data to {table_name}: {e}")
         
         return results
     
+    def _reflect(self, bind: Union[Connection, Engine], table_name: str) -> Table:
+        """Reflected table, cached per database"""
+        key = (str(bind.engine.url), table_name)
+        if key not in self._tables:
+            self._tables[key] = Table(table_name, MetaData(), autoload_with=bind, resolve_fks=False)
+        return self._tables[key]
+    
+    @staticmethod
+    def _load_watermark(engine: Engine, job_id: str, table_name: str) -> Optional[Tuple[datetime, int]]:
+        """(updated_at, id) of the last row a job loaded from a table"""
+        watermarks = EtlWatermark.__table__
+        with engine.connect() as connection:
+            row = connection.execute(
+                select(watermarks.c.last_updated_at, watermarks.c.last_id).where(
+                    watermarks.c.job_id == job_id, watermarks.c.source_table == table_name
+                )
+            ).first()
+        return (row.last_updated_at, row.last_id) if row and row.last_updated_at else None
+    
+    @staticmethod
+    def _save_watermark(engine: Engine, job_id: str, table_name: str, watermark: Tuple[datetime, int],
+                        rows: int) -> None:
+        watermarks = EtlWatermark.__table__
+        with engine.begin() as connection:
+            statement = dialect_insert(connection)(watermarks).values(
+                job_id=job_id, source_table=table_name, last_updated_at=watermark[0], last_id=watermark[1],
+                last_run_at=datetime.utcnow(), rows_extracted=rows
+            )
+            connection.execute(statement.on_conflict_do_update(
+                index_elements=[watermarks.c.job_id, watermarks.c.source_table],
+                set_={
+                    'last_updated_at': statement.excluded.last_updated_at,
+                    'last_id': statement.excluded.last_id,
+                    'last_run_at': statement.excluded.last_run_at,
+                    'rows_extracted': watermarks.c.rows_extracted + statement.excluded.rows_extracted
+                }
+            ))
+    
+    @staticmethod
+    def _merge_load_results(results: List[Dict[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+        merged: Dict[str, Dict[str, Any]] = {}
+        for result in results:
+            for table_name, load in result.items():
+                target = merged.setdefault(table_name, {"records_loaded": 0, "success": True, "errors": []})
+                target["records_loaded"] += load["records_loaded"]
+                target["success"] = target["success"] and load["success"]
+                target["errors"].extend(load["errors"])
+        return merged
+    
     async def _track_data_lineage(self, job_config: ETLJobConfig, 
-                                source_data: List[Dict[str, Any]], 
-                                transformed_data: List[Dict[str, Any]]) -> DataLineageInfo:
+                                source_records: int, 
+                                transformed_records: int) -> DataLineageInfo:
         """Track data lineage information"""
         lineage_id = str(uuid.uuid4())
         
@@ -632,8 +826,8 @@ class BatchDataProcessor:
             created_at=datetime.utcnow(),
             updated_at=datetime.utcnow(),
             metadata={
-                "source_records": len(source_data),
-                "transformed_records": len(transformed_data),
+                "source_records": source_records,
+                "transformed_records": transformed_records,
                 "pipeline_type": job_config.pipeline_type.value
             }
         )
@@ -718,101 +912,162 @@ class BatchDataProcessor:
 
 
 class StreamingDataProcessor:
-    """Real-time data streaming with Kafka integration"""
+    """Real-time data streaming over an event stream (Kafka, or the embedded event log)"""
     
-    def __init__(self, kafka_config: Dict[str, Any]):
+    def __init__(self, kafka_config: Dict[str, Any], event_stream: Optional[EventStream] = None):
         self.kafka_config = kafka_config
-        self.producer = None
-        self.consumer = None
+        self.batch_size = kafka_config.get('batch_size', settings.event_stream_batch_size)
+        self.poll_timeout = kafka_config.get('poll_timeout', 1.0)
         self.validator = DataValidator()
         self.transformer = DataTransformer()
         self.audit_logger = AuditLogger()
-        
-        if KAFKA_AVAILABLE:
-            self._setup_kafka()
+        self.stream = event_stream or self._setup_stream()
     
-    def _setup_kafka(self):
-        """Setup Kafka producer and consumer"""
-        try:
-            # Setup producer
-            self.producer = KafkaProducer(
-                bootstrap_servers=self.kafka_config.get('bootstrap_servers', ['localhost:9092']),
-                value_serializer=lambda v: json.dumps(v).encode('utf-8'),
-                key_serializer=lambda k: k.encode('utf-8') if k else None
+    def _setup_stream(self) -> Optional[EventStream]:
+        """Embedded event log when a log directory is configured, else Kafka when available"""
+        log_dir = self.kafka_config.get('log_dir') or settings.event_log_dir
+        if log_dir:
+            return LogEventStream(
+                log_dir,
+                partitions=self.kafka_config.get('partitions', settings.event_log_partitions),
+                segment_bytes=settings.event_log_segment_bytes
             )
-            
-            # Setup consumer
-            self.consumer = KafkaConsumer(
-                self.kafka_config.get('topics', ['healthmate-data']),
-                bootstrap_servers=self.kafka_config.get('bootstrap_servers', ['localhost:9092']),
-                value_deserializer=lambda m: json.loads(m.decode('utf-8')),
-                auto_offset_reset='latest',
-                enable_auto_commit=True,
-                group_id=self.kafka_config.get('consumer_group', 'healthmate-processors')
-            )
-            
-            logger.info("Kafka producer and consumer setup completed")
-            
+        if not KAFKA_AVAILABLE:
+            return None
+        try:
+            stream = KafkaEventStream(self.kafka_config)
+            logger.info("Kafka event stream setup completed")
+            return stream
         except Exception as e:
             logger.error(f"Error setting up Kafka: {e}")
+            return None
     
     async def stream_data(self, topic: str, data: Dict[str, Any]) -> bool:
-        """Stream data to Kafka topic"""
-        if not KAFKA_AVAILABLE or not self.producer:
-            logger.warning("Kafka not available. Cannot stream data.")
-            return False
+        """Stream one record to a topic"""
+        return await self.stream_batch(topic, [data]) == 1
+    
+    async def stream_batch(self, topic: str, records: List[Dict[str, Any]], key_field: str = 'user_id') -> int:
+        """
+        Stream records to a topic in batches.
+        
+        Args:
+            topic: Destination topic
+            records: Records to publish
+            key_field: Field whose value partitions the records, keeping each user's records in order
         
+        Returns:
+            Number of records published
+        """
+        if self.stream is None:
+            logger.warning("No event stream available. Cannot stream data.")
+            return 0
+        
+        published = 0
         try:
-            # Add metadata
-            data['_streamed_at'] = datetime.utcnow().isoformat()
-            data['_stream_id'] = str(uuid.uuid4())
-            
-            # Send to Kafka
-            future = self.producer.send(topic, value=data)
-            record_metadata = future.get(timeout=10)
+            streamed_at = datetime.utcnow().isoformat()
+            for offset in range(0, len(records), self.batch_size):
+                events = []
+                for record in records[offset:offset + self.batch_size]:
+                    key = record.get(key_field)
+                    events.append((
+                        str(key) if key is not None else None,
+                        {**record, '_streamed_at': streamed_at, '_stream_id': str(uuid.uuid4())}
+                    ))
+                stored = await self.stream.publish(topic, events)
+                published += len(stored)
             
-            logger.info(f"Data streamed to topic {topic}, partition {record_metadata.partition}, "
-                       f"offset {record_metadata.offset}")
-            
-            return True
+            logger.info(f"Streamed {published} records to topic {topic}")
+            return published
             
         except Exception as e:
-            logger.error(f"Error streaming data to Kafka: {e}")
-            return False
+            logger.error(f"Error streaming data to {topic} after {published} records: {e}")
+            return published
     
-    async def process_streaming_data(self, topic: str, 
-                                   processor_func: Callable[[Dict[str, Any]], Dict[str, Any]]) -> None:
-        """Process streaming data from Kafka topic"""
-        if not KAFKA_AVAILABLE or not self.consumer:
-            logger.warning("Kafka not available. Cannot process streaming data.")
-            return
+    async def process_streaming_data(self, topic: str,
+                                     processor_func: Callable[[Dict[str, Any]], Any],
+                                     group: Optional[str] = None,
+                                     stop: Optional[asyncio.Event] = None,
+                                     until_idle: bool = False) -> Dict[str, int]:
+        """
+        Consume a topic in batches and apply a function to every record.
         
-        try:
-            for message in self.consumer:
+        Offsets are committed after each batch, so a restart re-delivers at
+        most one batch. A record whose function raises is logged and skipped.
+        Synchronous functions run in a worker thread, one batch at a time.
+        
+        Args:
+            topic: Topic to consume
+            processor_func: Function, or coroutine function, taking a record's value
+            group: Consumer group (default: the configured consumer_group)
+            stop: Event ending consumption once set
+            until_idle: Return once a poll finds no new records
+        
+        Returns:
+            Counts of batches, processed records and failed records
+        """
+        counts = {"batches": 0, "processed": 0, "failed": 0}
+        if self.stream is None:
+            logger.warning("No event stream available. Cannot process streaming data.")
+            return counts
+        
+        group = group or self.kafka_config.get('consumer_group', 'healthmate-processors')
+        is_async = asyncio.iscoroutinefunction(processor_func)
+        
+        def failed(record: EventRecord, error: Exception) -> int:
+            logger.error(f"Error processing streaming message {topic}/{record.partition}:{record.offset}: {error}")
+            return 1
+        
+        def apply_all(records: List[EventRecord]) -> int:
+            failures = 0
+            for record in records:
                 try:
-                    # Process the message
-                    data = message.value
-                    processed_data = processor_func(data)
-                    
-                    # Log processing
-                    self.audit_logger.log_system_action(
-                        action="streaming_data_processed",
-                        details={
-                            "topic": topic,
-                            "partition": message.partition,
-                            "offset": message.offset,
-                            "data_type": data.get('type', 'unknown')
-                        }
-                    )
-                    
-                    logger.info(f"Processed streaming data from topic {topic}")
-                    
+                    processor_func(record.value)
                 except Exception as e:
-                    logger.error(f"Error processing streaming message: {e}")
+                    failures += failed(record, e)
+            return failures
+        
+        try:
+            while stop is None or not stop.is_set():
+                records = await self.stream.consume(topic, group, self.batch_size, timeout=self.poll_timeout)
+                if not records:
+                    if until_idle:
+                        break
                     continue
-                    
+                
+                if is_async:
+                    failures = 0
+                    for record in records:
+                        try:
+                            await processor_func(record.value)
+                        except Exception as e:
+                            failures += failed(record, e)
+                else:
+                    failures = await asyncio.to_thread(apply_all, records)
+                
+                await self.stream.commit(group, records)
+                counts["batches"] += 1
+                counts["processed"] += len(records) - failures
+                counts["failed"] += failures
+                logger.info(f"Processed {len(records)} streaming records from topic {topic} ({failures} failed)")
+                
         except Exception as e:
             logger.error(f"Error in streaming data processing: {e}")
+        
+        return counts
+    
+    async def create_topic(self, topic_name: str, partitions: Optional[int] = None) -> bool:
+        """Create a topic on the event stream"""
+        if self.stream is None:
+            logger.warning("No event stream available. Cannot create topic.")
+            return False
+        
+        try:
+            await self.stream.create_topic(topic_name, partitions)
+            logger.info(f"Created event stream topic: {topic_name}")
+            return True
+        except Exception as e:
+            logger.error(f"Error creating event stream topic {topic_name}: {e}")
+            return False
     
     def create_kafka_topic(self, topic_name: str, partitions: int = 3, replication_factor: int = 1) -> bool:
         """Create Kafka topic"""
@@ -920,8 +1175,15 @@ class DataWarehouseManager:
             );
             """
             
+            # Upsert key of incremental loads from health_metric_rollups
+            health_metrics_key = """
+            CREATE UNIQUE INDEX IF NOT EXISTS uq_aggregated_health_metrics_period
+            ON aggregated_health_metrics (user_id, metric_type, aggregation_period, period_start);
+            """
+            
             with self.engine.connect() as conn:
                 conn.execute(text(health_metrics_table))
+                conn.execute(text(health_metrics_key))
                 conn.execute(text(engagement_table))
                 conn.execute(text(performance_table))
                 conn.commit()
@@ -992,9 +1254,9 @@ class DataPipelineManager:
                  kafka_config: Optional[Dict[str, Any]] = None,
                  warehouse_config: Optional[Dict[str, Any]] = None):
         self.db = db_session
-        self.batch_processor = BatchDataProcessor(db_session)
-        self.streaming_processor = StreamingDataProcessor(kafka_config or {})
         self.warehouse_manager = DataWarehouseManager(warehouse_config or {})
+        self.batch_processor = BatchDataProcessor(db_session, self.warehouse_manager.engine)
+        self.streaming_processor = StreamingDataProcessor(kafka_config or {})
         self.audit_logger = AuditLogger()
     
     async def setup_pipeline_infrastructure(self) -> Dict[str, Any]:
@@ -1006,13 +1268,12 @@ class DataPipelineManager:
         }
         
         try:
-            # Setup Kafka topics
-            if KAFKA_AVAILABLE:
-                topics = ['healthmate-health-data', 'healthmate-user-activity', 'healthmate-system-metrics']
-                for topic in topics:
-                    success = self.streaming_processor.create_kafka_topic(topic)
-                    if success:
-                        results["kafka_setup"] = True
+            # Setup event stream topics (Kafka or the embedded event log)
+            topics = ['healthmate-health-data', 'healthmate-user-activity', 'healthmate-system-metrics']
+            for topic in topics:
+                success = await self.streaming_processor.create_topic(topic)
+                if success:
+                    results["kafka_setup"] = True
             
             # Setup data warehouse
             warehouse_result = await self.warehouse_manager.create_analytics_tables()
@@ -1046,15 +1307,7 @@ class DataPipelineManager:
             warehouse_result = await self.warehouse_manager.run_etl_job(job_config)
             results["warehouse_etl"] = warehouse_result
             
-            # Log pipeline completion
-            self.audit_logger.log_system_action(
-                action="data_pipeline_completed",
-                details={
-                    "job_id": job_config.job_id,
-                    "pipeline_type": job_config.pipeline_type.value,
-                    "results": results
-                }
-            )
+            logger.info(f"Data pipeline {job_config.job_id} ({job_config.pipeline_type.value}) completed")
             
             return results
             
@@ -9,6 +9,11 @@ from .data_integration import (
     FitbitDataProvider, AppleHealthDataProvider, data_integration_service
 )
 
+from .health_timeseries import (
+    HealthTimeSeries, HealthSeriesSet, parse_reading
+)
+from .health_cohort import CohortFrame, SegmentStats
+
 from .health_data_processing import (
     HealthDataProcessor, ProcessingResult, ProcessingStage, 
     DataQualityLevel, AnomalyDetection, get_health_data_processor
@@ -68,6 +73,15 @@ __all__ = [
     'AppleHealthDataProvider',
     'data_integration_service',
     
+    # Columnar Time Series
+    'HealthTimeSeries',
+    'HealthSeriesSet',
+    'parse_reading',
+    
+    # Cohort Analytics
+    'CohortFrame',
+    'SegmentStats',
+    
     # Health Data Processing
     'HealthDataProcessor',
     'ProcessingResult',
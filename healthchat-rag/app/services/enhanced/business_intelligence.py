@@ -24,6 +24,7 @@ from app.models.notification_models import Notification, NotificationDeliveryAtt
 from app.exceptions.health_exceptions import BusinessIntelligenceError
 from app.utils.encryption_utils import field_encryption
 from app.utils.performance_monitoring import monitor_custom_performance
+from app.services.enhanced.health_rollups import HealthRollupStore, RunningAggregate
 
 logger = logging.getLogger(__name__)
 
@@ -179,6 +180,7 @@ class BusinessIntelligenceService:
     def __init__(self, db_session: Session):
         self.db = db_session
         self.config = self._load_bi_config()
+        self.rollup_store = HealthRollupStore(db_session)
     
     def _load_bi_config(self) -> Dict[str, Any]:
         """Load business intelligence configuration"""
@@ -414,7 +416,10 @@ class BusinessIntelligenceService:
                 )
             ).all()
             
-            if not aggregations:
+            # Reading metrics come pre-merged from the streaming rollups
+            readings = self.rollup_store.summarize(user_id, start_date, end_date)
+            
+            if not aggregations and not readings:
                 logger.warning(f"No health metrics found for user {user_id} in period {period}")
                 return None
             
@@ -500,6 +505,9 @@ class BusinessIntelligenceService:
                 aggregated.overall_health_score = np.mean(health_scores)
                 aggregated.health_score_trend = health_scores[-1] - health_scores[0]
             
+            if readings:
+                self._apply_rollup_metrics(aggregated, readings)
+            
             # Calculate data quality metrics
             aggregated.data_completeness = self._calculate_data_completeness(aggregations)
             aggregated.source_count = len(set([
@@ -512,6 +520,31 @@ class BusinessIntelligenceService:
             logger.error(f"Error aggregating health metrics: {str(e)}")
             raise BusinessIntelligenceError(f"Failed to aggregate health metrics: {str(e)}")
     
+    def _apply_rollup_metrics(self, aggregated: AggregatedHealthMetrics,
+                              readings: Dict[Tuple[str, str], RunningAggregate]) -> None:
+        """Overwrite reading-derived metrics with count-weighted values from rollups"""
+        averages = {
+            'avg_blood_pressure_systolic': ('blood_pressure', 'systolic'),
+            'avg_blood_pressure_diastolic': ('blood_pressure', 'diastolic'),
+            'avg_heart_rate': ('heart_rate', 'value'),
+            'avg_weight': ('weight', 'value'),
+            'avg_blood_sugar': ('blood_glucose', 'value'),
+            'avg_temperature': ('temperature', 'value')
+        }
+        for attribute, key in averages.items():
+            aggregate = readings.get(key)
+            if aggregate and aggregate.count:
+                setattr(aggregated, attribute, aggregate.mean)
+        
+        steps = readings.get(('steps', 'value'))
+        if steps and steps.count:
+            aggregated.total_steps = int(steps.total)
+        
+        sleep = readings.get(('sleep', 'value'))
+        if sleep and sleep.count:
+            # Sleep is recorded in minutes
+            aggregated.avg_sleep_hours = sleep.mean / 60
+    
     @monitor_custom_performance("track_user_engagement")
     async def track_user_engagement(self, user_id: int, date: datetime) -> UserEngagementMetrics:
         """Track user engagement metrics for business intelligence"""
@@ -7,7 +7,9 @@ import asyncio
 import aiohttp
 import json
 import logging
-from typing import Dict, List, Any, Optional, Union
+import threading
+import weakref
+from typing import Awaitable, Callable, Dict, List, Any, Optional, Tuple, Union
 from datetime import datetime, timedelta
 from dataclasses import dataclass
 from enum import Enum
@@ -62,6 +64,8 @@ class DataSourceConfig:
     enabled: bool = True
     custom_headers: Optional[Dict[str, str]] = None
     custom_params: Optional[Dict[str, Any]] = None
+    max_concurrent_requests: int = 8  # Pooled connections per provider
+    window_days: int = 30  # Longer date ranges are split into parallel requests
 
 @dataclass
 class HealthDataPoint:
@@ -77,54 +81,123 @@ class HealthDataPoint:
     metadata: Optional[Dict[str, Any]] = None
     raw_data: Optional[Dict[str, Any]] = None
 
+class TokenBucket:
+    """
+    Request budget for one provider, shared by every user and task in the process.
+    
+    Tokens refill continuously at the provider's per-minute rate up to a
+    burst capacity. A caller takes a token immediately and, if that leaves
+    the bucket in debt, sleeps until its token would have refilled, so
+    concurrent callers queue fairly without holding a lock while waiting.
+    """
+    
+    def __init__(self, rate_per_minute: int, burst: Optional[int] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(burst or max(1, rate_per_minute // 6))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def reserve(self, tokens: float = 1.0) -> float:
+        """Take tokens and return the seconds to wait before using them"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= tokens
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+    
+    async def acquire(self, tokens: float = 1.0):
+        """Wait for tokens"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+# Provider budgets and pooled sessions, shared across users
+_token_buckets: Dict[Tuple[str, str], TokenBucket] = {}
+_client_sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, str], aiohttp.ClientSession]]" = \
+    weakref.WeakKeyDictionary()
+_pool_lock = threading.Lock()
+
+def _provider_key(config: DataSourceConfig) -> Tuple[str, str]:
+    return (config.source_type.value, config.base_url)
+
+def get_token_bucket(config: DataSourceConfig) -> TokenBucket:
+    """Get the process-wide request budget for a provider"""
+    with _pool_lock:
+        bucket = _token_buckets.get(_provider_key(config))
+        if bucket is None:
+            bucket = _token_buckets[_provider_key(config)] = TokenBucket(config.rate_limit_per_minute)
+        return bucket
+
+def get_client_session(config: DataSourceConfig) -> aiohttp.ClientSession:
+    """
+    Get the pooled keep-alive session for a provider on the running event loop.
+    
+    Sessions are bound to an event loop, so each loop keeps its own; the
+    connection limit caps concurrent requests to the provider.
+    """
+    loop = asyncio.get_running_loop()
+    with _pool_lock:
+        sessions = _client_sessions.setdefault(loop, {})
+        session = sessions.get(_provider_key(config))
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=config.max_concurrent_requests, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=config.timeout_seconds)
+            )
+            sessions[_provider_key(config)] = session
+        return session
+
+async def close_client_sessions():
+    """Close the pooled sessions of the running event loop"""
+    with _pool_lock:
+        sessions = _client_sessions.pop(asyncio.get_running_loop(), {})
+    for session in sessions.values():
+        await session.close()
+
+def split_date_range(start_date: datetime, end_date: datetime, window_days: int) -> List[Tuple[datetime, datetime]]:
+    """
+    Split a date range into consecutive windows of at most window_days days.
+    
+    Windows are inclusive on both ends and step by whole days, matching
+    provider endpoints that take an inclusive start and end date.
+    """
+    windows = []
+    step = timedelta(days=max(window_days, 1))
+    window_start = start_date
+    while window_start <= end_date:
+        windows.append((window_start, min(window_start + step - timedelta(days=1), end_date)))
+        window_start += step
+    return windows
+
 class BaseDataProvider(ABC):
     """Abstract base class for data providers"""
     
     def __init__(self, config: DataSourceConfig):
         self.config = config
         self.session: Optional[aiohttp.ClientSession] = None
-        self.last_request_time = 0
-        self.request_count = 0
-        self.rate_limit_reset_time = time.time() + 60
+        self.rate_limiter = get_token_bucket(config)
     
     async def __aenter__(self):
-        """Async context manager entry"""
-        self.session = aiohttp.ClientSession(
-            timeout=aiohttp.ClientTimeout(total=self.config.timeout_seconds)
-        )
+        """Async context manager entry; binds the provider's pooled session"""
+        self.session = get_client_session(self.config)
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        """Async context manager exit"""
-        if self.session:
-            await self.session.close()
+        """Async context manager exit; the pooled session stays open for reuse"""
+        pass
     
     async def _rate_limit_check(self):
-        """Check and enforce rate limiting"""
-        current_time = time.time()
-        
-        # Reset counter if minute has passed
-        if current_time > self.rate_limit_reset_time:
-            self.request_count = 0
-            self.rate_limit_reset_time = current_time + 60
-        
-        # Check if we're at the limit
-        if self.request_count >= self.config.rate_limit_per_minute:
-            sleep_time = self.rate_limit_reset_time - current_time
-            if sleep_time > 0:
-                logger.warning(f"Rate limit reached, sleeping for {sleep_time:.2f} seconds")
-                await asyncio.sleep(sleep_time)
-                self.request_count = 0
-                self.rate_limit_reset_time = time.time() + 60
-        
-        # Ensure minimum delay between requests
-        time_since_last = current_time - self.last_request_time
-        min_delay = 60.0 / self.config.rate_limit_per_minute
-        if time_since_last < min_delay:
-            await asyncio.sleep(min_delay - time_since_last)
-        
-        self.last_request_time = time.time()
-        self.request_count += 1
+        """Wait for the provider's shared request budget"""
+        await self.rate_limiter.acquire()
+    
+    async def _fetch_windows(self, fetch: Callable[[int, datetime, datetime], Awaitable[List[HealthDataPoint]]],
+                             user_id: int, start_date: datetime, end_date: datetime) -> List[HealthDataPoint]:
+        """Run fetch over the date range in parallel windows of config.window_days"""
+        windows = split_date_range(start_date, end_date, self.config.window_days)
+        results = await asyncio.gather(*(fetch(user_id, start, end) for start, end in windows))
+        return [point for points in results for point in points]
     
     async def _make_request(self, method: str, url: str, **kwargs) -> Dict[str, Any]:
         """Make HTTP request with retry logic and error handling"""
@@ -205,23 +278,27 @@ class FitbitDataProvider(BaseDataProvider):
         if not await self.authenticate():
             raise ExternalAPIError("Failed to authenticate with Fitbit")
         
-        data_points = []
+        fetchers = {
+            DataType.HEART_RATE: self._fetch_heart_rate,
+            DataType.STEPS: self._fetch_steps,
+            DataType.SLEEP: self._fetch_sleep,
+            DataType.WEIGHT: self._fetch_weight,
+            # Add more data types as needed
+        }
+        supported = [data_type for data_type in data_types if data_type in fetchers]
+        
+        # Every data type and date window in flight at once, paced by the shared budget
+        results = await asyncio.gather(
+            *(self._fetch_windows(fetchers[data_type], user_id, start_date, end_date) for data_type in supported),
+            return_exceptions=True
+        )
         
-        for data_type in data_types:
-            try:
-                if data_type == DataType.HEART_RATE:
-                    data_points.extend(await self._fetch_heart_rate(user_id, start_date, end_date))
-                elif data_type == DataType.STEPS:
-                    data_points.extend(await self._fetch_steps(user_id, start_date, end_date))
-                elif data_type == DataType.SLEEP:
-                    data_points.extend(await self._fetch_sleep(user_id, start_date, end_date))
-                elif data_type == DataType.WEIGHT:
-                    data_points.extend(await self._fetch_weight(user_id, start_date, end_date))
-                # Add more data types as needed
-                
-            except Exception as e:
-                logger.error(f"Failed to fetch {data_type} from Fitbit: {str(e)}")
+        data_points = []
+        for data_type, result in zip(supported, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to fetch {data_type} from Fitbit: {str(result)}")
                 continue
+            data_points.extend(result)
         
         return data_points
     
@@ -374,9 +451,8 @@ class DataIntegrationService:
     async def fetch_user_health_data(self, user_id: int, data_types: List[DataType], 
                                    sources: List[DataSourceType], 
                                    start_date: datetime, end_date: datetime) -> List[HealthDataPoint]:
-        """Fetch health data from multiple sources"""
-        all_data_points = []
-        
+        """Fetch health data from multiple sources concurrently"""
+        providers = []
         for source_type in sources:
             if source_type not in self.providers:
                 logger.warning(f"No provider registered for source: {source_type}")
@@ -386,18 +462,26 @@ class DataIntegrationService:
             if not provider.config.enabled:
                 logger.info(f"Provider {source_type} is disabled, skipping")
                 continue
-            
-            try:
-                async with provider as p:
-                    data_points = await p.fetch_health_data(user_id, data_types, start_date, end_date)
-                    all_data_points.extend(data_points)
-                    logger.info(f"Fetched {len(data_points)} data points from {source_type}")
-                    
-            except Exception as e:
-                logger.error(f"Failed to fetch data from {source_type}: {str(e)}")
-                continue
+            providers.append(provider)
         
-        return all_data_points
+        # Total time is that of the slowest provider
+        results = await asyncio.gather(
+            *(self._fetch_from(provider, user_id, data_types, start_date, end_date) for provider in providers)
+        )
+        return [point for points in results for point in points]
+    
+    async def _fetch_from(self, provider: BaseDataProvider, user_id: int, data_types: List[DataType],
+                          start_date: datetime, end_date: datetime) -> List[HealthDataPoint]:
+        """Fetch from one provider, logging rather than raising failures"""
+        source_type = provider.config.source_type
+        try:
+            async with provider as p:
+                data_points = await p.fetch_health_data(user_id, data_types, start_date, end_date)
+                logger.info(f"Fetched {len(data_points)} data points from {source_type}")
+                return data_points
+        except Exception as e:
+            logger.error(f"Failed to fetch data from {source_type}: {str(e)}")
+            return []
     
     async def process_and_validate_data(self, data_points: List[HealthDataPoint]) -> List[HealthDataPoint]:
         """Process and validate health data points"""
@@ -0,0 +1,402 @@
+"""
+Event Streams
+Partitioned, batched event streams behind one interface: an embedded append-only log and Kafka
+"""
+
+import asyncio
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from dataclasses import dataclass
+
+# Kafka imports (optional)
+try:
+    from kafka import KafkaConsumer, KafkaProducer, TopicPartition
+    from kafka.admin import KafkaAdminClient, NewTopic
+    from kafka.errors import TopicAlreadyExistsError
+    from kafka.structs import OffsetAndMetadata
+    KAFKA_AVAILABLE = True
+except ImportError:
+    KAFKA_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+Event = Tuple[Optional[str], Dict[str, Any]]  # (partition key, value)
+
+
+@dataclass
+class EventRecord:
+    """An event stored in a topic partition"""
+    topic: str
+    partition: int
+    offset: int
+    key: Optional[str]
+    value: Dict[str, Any]
+    timestamp: float  # Publish time, seconds since the epoch
+
+
+def partition_for(key: Optional[str], partitions: int, fallback: int = 0) -> int:
+    """Stable partition of a key, so one user's events stay in order; keyless events use the fallback."""
+    if key is None:
+        return fallback % partitions
+    return zlib.crc32(key.encode('utf-8')) % partitions
+
+
+class EventStream(ABC):
+    """
+    A partitioned event stream.
+
+    Consumers read in batches per consumer group and commit offsets after
+    handling a batch, so delivery is at-least-once: events read but not
+    committed are read again by the group's next consumer.
+    """
+
+    @abstractmethod
+    async def create_topic(self, topic: str, partitions: Optional[int] = None) -> None:
+        """Create a topic if it does not exist."""
+
+    @abstractmethod
+    async def publish(self, topic: str, events: Sequence[Event]) -> List[EventRecord]:
+        """Append a batch of events and wait until they are stored."""
+
+    @abstractmethod
+    async def consume(self, topic: str, group: str, max_records: int = 500,
+                      timeout: float = 1.0) -> List[EventRecord]:
+        """Read the group's next events, waiting up to ``timeout`` seconds for some to arrive."""
+
+    @abstractmethod
+    async def commit(self, group: str, records: Sequence[EventRecord]) -> None:
+        """Mark records, and everything before them in their partitions, as handled by the group."""
+
+    async def close(self) -> None:
+        """Release connections and file handles."""
+
+
+class _LogPartition:
+    """
+    One partition of a log topic: numbered segment files of JSON lines.
+
+    A segment is named after the offset of its first event. Appends go to
+    the last segment and roll to a new one past ``segment_bytes``.
+    Offsets become visible to readers only once their lines are written
+    and flushed, so a reader never sees a partial line.
+    """
+
+    def __init__(self, path: str, segment_bytes: int, fsync: bool):
+        self.path = path
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.lock = threading.Lock()
+        self.segments: List[int] = []  # Base offsets, ascending
+        self.next_offset = 0
+        self._active_size = 0
+        self._read_hint: Optional[Tuple[int, int, int]] = None  # (offset, segment, byte position) of the last read
+        os.makedirs(path, exist_ok=True)
+        self._recover()
+
+    def _segment_path(self, base: int) -> str:
+        return os.path.join(self.path, f"{base:020d}.log")
+
+    def _recover(self) -> None:
+        self.segments = sorted(int(name[:-4]) for name in os.listdir(self.path) if name.endswith(".log"))
+        if not self.segments:
+            return
+        base = self.segments[-1]
+        with open(self._segment_path(base), "rb+") as segment:
+            data = segment.read()
+            complete = data.rfind(b"\n") + 1
+            if complete < len(data):
+                # A write interrupted mid-line; its events were never acknowledged
+                segment.truncate(complete)
+                logger.warning(f"Truncated {len(data) - complete} bytes of a partial event in {segment.name}")
+        self.next_offset = base + data[:complete].count(b"\n")
+        self._active_size = complete
+
+    def append(self, lines: List[bytes]) -> int:
+        """Write lines and return the offset of the first."""
+        with self.lock:
+            if not self.segments or self._active_size >= self.segment_bytes:
+                self.segments.append(self.next_offset)
+                self._active_size = 0
+            with open(self._segment_path(self.segments[-1]), "ab") as segment:
+                segment.write(b"".join(lines))
+                segment.flush()
+                if self.fsync:
+                    os.fsync(segment.fileno())
+            self._active_size += sum(len(line) for line in lines)
+            first = self.next_offset
+            self.next_offset += len(lines)
+            return first
+
+    def read(self, offset: int, max_records: int) -> List[Tuple[int, bytes]]:
+        """Lines from an offset on, across segments."""
+        with self.lock:
+            end = min(self.next_offset, offset + max_records)
+            segments = list(self.segments)
+            hint = self._read_hint
+        lines: List[Tuple[int, bytes]] = []
+        index = bisect.bisect_right(segments, offset) - 1
+        while offset < end and 0 <= index < len(segments):
+            base = segments[index]
+            next_base = segments[index + 1] if index + 1 < len(segments) else end
+            with open(self._segment_path(base), "rb") as segment:
+                if hint and hint[:2] == (offset, base):
+                    segment.seek(hint[2])  # Continue where the previous read stopped instead of rescanning
+                else:
+                    for _ in range(offset - base):
+                        segment.readline()
+                while offset < min(end, next_base):
+                    lines.append((offset, segment.readline()))
+                    offset += 1
+                stopped = (offset, base, segment.tell())
+            index += 1
+        if lines:
+            with self.lock:
+                self._read_hint = stopped
+        return lines
+
+
+class LogEventStream(EventStream):
+    """
+    Embedded append-only event log for tests and single-node deployments.
+
+    Layout under ``directory``::
+
+        <topic>/topic.json              partition count
+        <topic>/<partition>/<base>.log  segments of JSON lines
+        <topic>/offsets/<group>.json    committed offsets per partition
+
+    File access runs in worker threads so the event loop never blocks on
+    disk. Events go to partitions by a CRC32 of their key, so one key's
+    events keep their order across processes and restarts.
+    """
+
+    def __init__(self, directory: str, partitions: int = 4, segment_bytes: int = 16 * 1024 * 1024,
+                 fsync: bool = True, poll_interval: float = 0.05):
+        self.directory = directory
+        self.default_partitions = partitions
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.poll_interval = poll_interval
+        self._topics: Dict[str, List[_LogPartition]] = {}
+        self._positions: Dict[Tuple[str, str], List[int]] = {}  # (group, topic) -> next offset per partition
+        self._topics_lock = threading.Lock()
+        self._round_robin = 0
+        os.makedirs(directory, exist_ok=True)
+
+    async def create_topic(self, topic: str, partitions: Optional[int] = None) -> None:
+        await asyncio.to_thread(self._topic, topic, partitions)
+
+    async def publish(self, topic: str, events: Sequence[Event]) -> List[EventRecord]:
+        if not events:
+            return []
+        return await asyncio.to_thread(self._publish, topic, list(events))
+
+    async def consume(self, topic: str, group: str, max_records: int = 500,
+                      timeout: float = 1.0) -> List[EventRecord]:
+        deadline = time.monotonic() + timeout
+        while True:
+            records = await asyncio.to_thread(self._consume, topic, group, max_records)
+            remaining = deadline - time.monotonic()
+            if records or remaining <= 0:
+                return records
+            await asyncio.sleep(min(self.poll_interval, remaining))
+
+    async def commit(self, group: str, records: Sequence[EventRecord]) -> None:
+        by_topic: Dict[str, Dict[int, int]] = {}
+        for record in records:
+            offsets = by_topic.setdefault(record.topic, {})
+            offsets[record.partition] = max(offsets.get(record.partition, 0), record.offset + 1)
+        for topic, offsets in by_topic.items():
+            await asyncio.to_thread(self._commit, topic, group, offsets)
+
+    def _topic(self, topic: str, partitions: Optional[int] = None) -> List[_LogPartition]:
+        with self._topics_lock:
+            if topic not in self._topics:
+                path = os.path.join(self.directory, topic)
+                meta_path = os.path.join(path, "topic.json")
+                if os.path.exists(meta_path):
+                    with open(meta_path) as meta:
+                        count = json.load(meta)["partitions"]
+                else:
+                    count = partitions or self.default_partitions
+                    os.makedirs(path, exist_ok=True)
+                    with open(meta_path, "w") as meta:
+                        json.dump({"partitions": count}, meta)
+                self._topics[topic] = [
+                    _LogPartition(os.path.join(path, str(number)), self.segment_bytes, self.fsync)
+                    for number in range(count)
+                ]
+            return self._topics[topic]
+
+    def _publish(self, topic: str, events: List[Event]) -> List[EventRecord]:
+        partitions = self._topic(topic)
+        now = time.time()
+        grouped: Dict[int, List[Event]] = {}
+        for key, value in events:
+            self._round_robin += 1
+            grouped.setdefault(partition_for(key, len(partitions), self._round_robin), []).append((key, value))
+
+        records = []
+        for number, batch in grouped.items():
+            lines = [
+                json.dumps({"k": key, "v": value, "t": now}, default=str, separators=(",", ":")).encode("utf-8") + b"\n"
+                for key, value in batch
+            ]
+            first = partitions[number].append(lines)
+            records.extend(
+                EventRecord(topic, number, first + i, key, value, now) for i, (key, value) in enumerate(batch)
+            )
+        return records
+
+    def _consume(self, topic: str, group: str, max_records: int) -> List[EventRecord]:
+        partitions = self._topic(topic)
+        positions = self._group_positions(topic, group, len(partitions))
+        records: List[EventRecord] = []
+        for number, partition in enumerate(partitions):
+            if len(records) >= max_records:
+                break
+            for offset, line in partition.read(positions[number], max_records - len(records)):
+                event = json.loads(line)
+                records.append(EventRecord(topic, number, offset, event["k"], event["v"], event["t"]))
+                positions[number] = offset + 1
+        return records
+
+    def _group_positions(self, topic: str, group: str, partitions: int) -> List[int]:
+        key = (group, topic)
+        if key not in self._positions:
+            committed = self._read_offsets(topic, group)
+            self._positions[key] = [committed.get(str(number), 0) for number in range(partitions)]
+        return self._positions[key]
+
+    def _offsets_path(self, topic: str, group: str) -> str:
+        return os.path.join(self.directory, topic, "offsets", f"{group}.json")
+
+    def _read_offsets(self, topic: str, group: str) -> Dict[str, int]:
+        path = self._offsets_path(topic, group)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as offsets:
+            return json.load(offsets)
+
+    def _commit(self, topic: str, group: str, offsets: Dict[int, int]) -> None:
+        committed = self._read_offsets(topic, group)
+        for number, offset in offsets.items():
+            committed[str(number)] = max(committed.get(str(number), 0), offset)
+
+        path = self._offsets_path(topic, group)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.tmp", "w") as pending:
+            json.dump(committed, pending)
+            pending.flush()
+            if self.fsync:
+                os.fsync(pending.fileno())
+        os.replace(f"{path}.tmp", path)  # Atomic, so a crash leaves the previous offsets intact
+
+
+class KafkaEventStream(EventStream):
+    """
+    Kafka-backed event stream using kafka-python.
+
+    The client is synchronous, so each batch runs in a worker thread: a
+    publish sends every event and flushes once (the producer batches per
+    partition via ``linger_ms``), and a consume is one ``poll`` for up to
+    ``max_records``. Offsets are committed explicitly after a batch is
+    handled rather than auto-committed on read.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        if not KAFKA_AVAILABLE:
+            raise RuntimeError("kafka-python is not installed")
+        self.config = config
+        self.bootstrap_servers = config.get('bootstrap_servers', ['localhost:9092'])
+        self.producer = KafkaProducer(
+            bootstrap_servers=self.bootstrap_servers,
+            value_serializer=lambda v: json.dumps(v, default=str).encode('utf-8'),
+            key_serializer=lambda k: k.encode('utf-8') if k else None,
+            linger_ms=config.get('linger_ms', 20),
+            batch_size=config.get('producer_batch_bytes', 64 * 1024),
+            acks=config.get('acks', 'all')
+        )
+        self._consumers: Dict[Tuple[str, str], Any] = {}
+        self._consumer_locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+
+    async def create_topic(self, topic: str, partitions: Optional[int] = None) -> None:
+        def create() -> None:
+            admin_client = KafkaAdminClient(bootstrap_servers=self.bootstrap_servers)
+            try:
+                admin_client.create_topics([NewTopic(
+                    name=topic, num_partitions=partitions or self.config.get('partitions', 3),
+                    replication_factor=self.config.get('replication_factor', 1)
+                )])
+            except TopicAlreadyExistsError:
+                pass
+            finally:
+                admin_client.close()
+
+        await asyncio.to_thread(create)
+
+    async def publish(self, topic: str, events: Sequence[Event]) -> List[EventRecord]:
+        def send_all() -> List[EventRecord]:
+            futures = [self.producer.send(topic, key=key, value=value) for key, value in events]
+            self.producer.flush()
+            records = []
+            for future, (key, value) in zip(futures, events):
+                metadata = future.get(timeout=self.config.get('send_timeout', 10))
+                records.append(EventRecord(topic, metadata.partition, metadata.offset, key, value,
+                                           metadata.timestamp / 1000 if metadata.timestamp else time.time()))
+            return records
+
+        return await asyncio.to_thread(send_all) if events else []
+
+    async def consume(self, topic: str, group: str, max_records: int = 500,
+                      timeout: float = 1.0) -> List[EventRecord]:
+        consumer, lock = self._consumer(topic, group)
+        async with lock:
+            batches = await asyncio.to_thread(consumer.poll, timeout_ms=int(timeout * 1000),
+                                              max_records=max_records)
+        return [
+            EventRecord(message.topic, message.partition, message.offset, message.key, message.value,
+                        message.timestamp / 1000)
+            for messages in batches.values() for message in messages
+        ]
+
+    async def commit(self, group: str, records: Sequence[EventRecord]) -> None:
+        by_topic: Dict[str, Dict[Any, Any]] = {}
+        for record in records:
+            partition = TopicPartition(record.topic, record.partition)
+            offsets = by_topic.setdefault(record.topic, {})
+            if partition not in offsets or offsets[partition].offset <= record.offset:
+                offsets[partition] = OffsetAndMetadata(record.offset + 1, None)
+        for topic, offsets in by_topic.items():
+            consumer, lock = self._consumer(topic, group)
+            async with lock:
+                await asyncio.to_thread(consumer.commit, offsets)
+
+    async def close(self) -> None:
+        await asyncio.to_thread(self.producer.close)
+        for consumer in self._consumers.values():
+            await asyncio.to_thread(consumer.close)
+        self._consumers.clear()
+
+    def _consumer(self, topic: str, group: str) -> Tuple[Any, asyncio.Lock]:
+        # kafka-python consumers are not thread-safe; the lock keeps one call in flight per consumer
+        key = (group, topic)
+        if key not in self._consumers:
+            self._consumers[key] = KafkaConsumer(
+                topic,
+                bootstrap_servers=self.bootstrap_servers,
+                group_id=group,
+                value_deserializer=lambda m: json.loads(m.decode('utf-8')),
+                key_deserializer=lambda k: k.decode('utf-8') if k else None,
+                auto_offset_reset=self.config.get('auto_offset_reset', 'latest'),
+                enable_auto_commit=False
+            )
+            self._consumer_locks[key] = asyncio.Lock()
+        return self._consumers[key], self._consumer_locks[key]
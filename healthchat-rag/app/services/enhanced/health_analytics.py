@@ -5,7 +5,7 @@ Comprehensive analytics engine for health trend analysis, pattern recognition, a
 
 import asyncio
 import logging
-from typing import Dict, List, Any, Optional, Union, Tuple
+from typing import Dict, List, Any, Optional, Sequence, Union, Tuple
 from datetime import datetime, timedelta
 from dataclasses import dataclass
 from enum import Enum
@@ -18,6 +18,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import and_, func, desc, asc
 
 from app.database import get_db
+from app.models.user import User
 from app.models.enhanced_health_models import (
     UserHealthProfile, HealthMetricsAggregation, EnhancedMedication, 
     EnhancedSymptomLog, HealthMetricsAggregation
@@ -25,7 +26,12 @@ from app.models.enhanced_health_models import (
 from app.services.enhanced.data_integration import (
     DataIntegrationService, HealthDataPoint, DataType, DataSourceType
 )
-from app.exceptions.health_exceptions import HealthDataError, BusinessIntelligenceError
+from app.services.enhanced.health_timeseries import HealthSeriesSet, HealthTimeSeries
+from app.services.enhanced.health_cohort import CohortFrame
+from app.services.enhanced.health_correlation import HealthCorrelationEngine
+from app.services.enhanced.peer_baselines import Baseline, PeerGroup, get_peer_baseline_store
+from app.services.enhanced import health_kernels as kernels
+from app.exceptions.health_exceptions import AnalyticsError, HealthDataError
 from app.utils.encryption_utils import field_encryption
 
 logger = logging.getLogger(__name__)
@@ -182,6 +188,9 @@ class HealthAnalyticsEngine:
                 logger.warning(f"No health data found for user {user_id}")
                 return results
             
+            # Build columnar series once and share them across every stage
+            health_data = HealthSeriesSet.from_points(user_id, health_data)
+            
             # Run requested analytics
             for analytics_type in analytics_types:
                 try:
@@ -284,49 +293,32 @@ class HealthAnalyticsEngine:
             logger.error(f"Error fetching aggregated metrics: {str(e)}")
             return []
     
-    async def _analyze_trends(self, user_id: int, health_data: List[HealthDataPoint]) -> List[TrendAnalysis]:
+    async def _analyze_trends(self, user_id: int, health_data: HealthSeriesSet) -> List[TrendAnalysis]:
         """Analyze trends in health data"""
         trends = []
         
-        # Group data by type
-        by_type = defaultdict(list)
-        for point in health_data:
-            by_type[point.data_type].append(point)
-        
-        for data_type, points in by_type.items():
-            if len(points) < self.analytics_config['trend_analysis']['min_data_points']:
+        for data_type, series in health_data.items():
+            if len(series) < self.analytics_config['trend_analysis']['min_data_points']:
                 continue
             
-            # Sort by timestamp
-            sorted_points = sorted(points, key=lambda p: p.timestamp)
-            
             # Calculate trend
-            trend = self._calculate_trend(data_type, sorted_points)
+            trend = self._calculate_trend(data_type, series)
             if trend:
                 trends.append(trend)
         
         return trends
     
-    def _calculate_trend(self, data_type: DataType, points: List[HealthDataPoint]) -> Optional[TrendAnalysis]:
+    def _calculate_trend(self, data_type: str, series: HealthTimeSeries) -> Optional[TrendAnalysis]:
         """Calculate trend for a specific data type"""
-        if len(points) < 3:
-            return None
-        
-        # Extract values and timestamps
-        values = [p.value for p in points if isinstance(p.value, (int, float))]
-        timestamps = [p.timestamp for p in points if isinstance(p.value, (int, float))]
-        
-        if len(values) < 3:
+        if len(series) < 3:
             return None
         
-        # Convert timestamps to numeric values for regression
-        time_numeric = [(ts - timestamps[0]).total_seconds() / 86400 for ts in timestamps]  # Days since first point
-        
-        # Linear regression
-        slope, intercept, r_value, p_value, std_err = stats.linregress(time_numeric, values)
+        # Linear regression on days since first point
+        fit = kernels.linear_trend(series.elapsed_days(), series.primary)
+        slope = fit.slope
         
         # Calculate confidence
-        confidence = abs(r_value) if not np.isnan(r_value) else 0.0
+        confidence = abs(fit.r_value) if not np.isnan(fit.r_value) else 0.0
         
         # Determine direction
         if abs(slope) < self.analytics_config['trend_analysis']['trend_strength_threshold']:
@@ -337,181 +329,149 @@ class HealthAnalyticsEngine:
             direction = TrendDirection.DECREASING
         
         # Check for seasonal patterns
-        seasonal_pattern = self._detect_seasonal_pattern(values, timestamps)
+        seasonal_pattern = self._detect_seasonal_pattern(series)
         
         # Check for cyclical patterns
-        cyclical_pattern = self._detect_cyclical_pattern(values, timestamps)
+        cyclical_pattern = self._detect_cyclical_pattern(series)
         
         return TrendAnalysis(
-            data_type=data_type.value,
+            data_type=data_type,
             direction=direction,
             slope=slope,
             strength=abs(slope),
             confidence=confidence,
-            period_start=timestamps[0],
-            period_end=timestamps[-1],
-            data_points=len(values),
+            period_start=series.start,
+            period_end=series.end,
+            data_points=len(series),
             seasonal_pattern=seasonal_pattern,
             cyclical_pattern=cyclical_pattern
         )
     
-    def _detect_seasonal_pattern(self, values: List[float], timestamps: List[datetime]) -> Optional[str]:
+    def _detect_seasonal_pattern(self, series: HealthTimeSeries) -> Optional[str]:
         """Detect seasonal patterns in data"""
-        if len(values) < 30:  # Need at least 30 days
+        if len(series) < 30:  # Need at least 30 days
             return None
         
-        # Simple seasonal detection based on weekly patterns
-        weekly_avgs = defaultdict(list)
-        for i, ts in enumerate(timestamps):
-            day_of_week = ts.weekday()
-            weekly_avgs[day_of_week].append(values[i])
-        
-        # Calculate variance in weekly patterns
-        weekly_means = [statistics.mean(weekly_avgs[day]) for day in range(7) if weekly_avgs[day]]
-        
-        if len(weekly_means) == 7:
-            variance = statistics.variance(weekly_means)
-            if variance > 0.1:  # Significant weekly variation
-                return "weekly"
+        # Simple seasonal detection based on variance of weekday means
+        variance = kernels.weekly_seasonality(series.weekdays(), series.primary)
+        if variance > 0.1:  # Significant weekly variation (NaN unless all 7 days present)
+            return "weekly"
         
         return None
     
-    def _detect_cyclical_pattern(self, values: List[float], timestamps: List[datetime]) -> Optional[str]:
+    def _detect_cyclical_pattern(self, series: HealthTimeSeries) -> Optional[str]:
         """Detect cyclical patterns in data"""
-        if len(values) < 20:
+        if len(series) < 20:
             return None
         
         # Simple cyclical detection using autocorrelation
         try:
-            # Calculate autocorrelation
-            autocorr = np.correlate(values, values, mode='full')
-            autocorr = autocorr[len(values)-1:]
+            # FFT autocorrelation, O(n log n)
+            autocorr = kernels.autocorrelation(series.primary)
             
             # Find peaks in autocorrelation
-            peaks = []
-            for i in range(1, len(autocorr)-1):
-                if autocorr[i] > autocorr[i-1] and autocorr[i] > autocorr[i+1]:
-                    peaks.append(i)
+            peaks = kernels.local_maxima(autocorr)
             
-            if peaks:
+            if len(peaks) > 1:
                 # Check if there's a consistent cycle
-                cycle_lengths = [peaks[i+1] - peaks[i] for i in range(len(peaks)-1)]
-                if cycle_lengths:
-                    avg_cycle = statistics.mean(cycle_lengths)
-                    if 3 <= avg_cycle <= 30:  # Reasonable cycle length
-                        return f"{avg_cycle:.0f}_day_cycle"
+                avg_cycle = float(np.diff(peaks).mean())
+                if 3 <= avg_cycle <= 30:  # Reasonable cycle length
+                    return f"{avg_cycle:.0f}_day_cycle"
         
         except Exception as e:
             logger.warning(f"Error detecting cyclical pattern: {str(e)}")
         
         return None
-    
-    async def _recognize_patterns(self, user_id: int, health_data: List[HealthDataPoint]) -> List[PatternRecognition]:
+
+    async def _recognize_patterns(self, user_id: int, health_data: HealthSeriesSet) -> List[PatternRecognition]:
         """Recognize patterns in health data"""
         patterns = []
         
-        # Group data by type
-        by_type = defaultdict(list)
-        for point in health_data:
-            by_type[point.data_type].append(point)
-        
-        for data_type, points in by_type.items():
-            if len(points) < self.analytics_config['pattern_recognition']['min_pattern_length']:
+        for data_type, series in health_data.items():
+            if len(series) < self.analytics_config['pattern_recognition']['min_pattern_length']:
                 continue
             
-            # Sort by timestamp
-            sorted_points = sorted(points, key=lambda p: p.timestamp)
-            
             # Detect various patterns
-            type_patterns = self._detect_patterns_for_type(data_type, sorted_points)
+            type_patterns = self._detect_patterns_for_type(data_type, series)
             patterns.extend(type_patterns)
         
         # Cross-correlation patterns
-        correlation_patterns = self._detect_correlation_patterns(by_type)
+        correlation_patterns = self._detect_correlation_patterns(health_data)
         patterns.extend(correlation_patterns)
         
         return patterns
     
-    def _detect_patterns_for_type(self, data_type: DataType, points: List[HealthDataPoint]) -> List[PatternRecognition]:
+    def _detect_patterns_for_type(self, data_type: str, series: HealthTimeSeries) -> List[PatternRecognition]:
         """Detect patterns for a specific data type"""
         patterns = []
         
-        if len(points) < 3:
-            return patterns
-        
-        values = [p.value for p in points if isinstance(p.value, (int, float))]
-        timestamps = [p.timestamp for p in points if isinstance(p.value, (int, float))]
-        
-        if len(values) < 3:
+        if len(series) < 3:
             return patterns
         
         # Detect spikes
-        spike_patterns = self._detect_spike_patterns(values, timestamps, data_type)
+        spike_patterns = self._detect_spike_patterns(series, data_type)
         patterns.extend(spike_patterns)
         
         # Detect trends
-        trend_patterns = self._detect_trend_patterns(values, timestamps, data_type)
+        trend_patterns = self._detect_trend_patterns(series, data_type)
         patterns.extend(trend_patterns)
         
         # Detect cycles
-        cycle_patterns = self._detect_cycle_patterns(values, timestamps, data_type)
+        cycle_patterns = self._detect_cycle_patterns(series, data_type)
         patterns.extend(cycle_patterns)
         
         return patterns
     
-    def _detect_spike_patterns(self, values: List[float], timestamps: List[datetime], 
-                             data_type: DataType) -> List[PatternRecognition]:
+    def _detect_spike_patterns(self, series: HealthTimeSeries, data_type: str) -> List[PatternRecognition]:
         """Detect spike patterns in data"""
         patterns = []
         
-        if len(values) < 5:
+        if len(series) < 5:
             return patterns
         
-        # Calculate moving average
+        values = series.primary
+        
+        # Deviation from the centered moving average, in standard deviations
         window_size = min(5, len(values) // 2)
-        moving_avg = []
-        for i in range(len(values)):
-            start = max(0, i - window_size)
-            end = min(len(values), i + window_size + 1)
-            moving_avg.append(statistics.mean(values[start:end]))
+        moving_avg = kernels.centered_moving_mean(values, window_size)
+        z_scores = kernels.rolling_zscores(values, window_size)
         
-        # Detect spikes
+        # Detect spikes, ignoring the first and last readings
         threshold = 2.0  # Standard deviations
-        for i in range(1, len(values) - 1):
-            if moving_avg[i] > 0:
-                z_score = abs(values[i] - moving_avg[i]) / statistics.stdev(values)
-                if z_score > threshold:
-                    patterns.append(PatternRecognition(
-                        pattern_type="spike",
-                        pattern_name=f"{data_type.value}_spike",
-                        confidence=min(z_score / 4.0, 1.0),
-                        description=f"Unusual {data_type.value} spike detected",
-                        frequency="occasional",
-                        triggers=["stress", "activity", "medication"],
-                        impact="temporary"
-                    ))
+        spike_mask = (z_scores > threshold) & (moving_avg > 0)
+        spike_mask[[0, -1]] = False
+        
+        for z_score in z_scores[spike_mask].tolist():
+            patterns.append(PatternRecognition(
+                pattern_type="spike",
+                pattern_name=f"{data_type}_spike",
+                confidence=min(z_score / 4.0, 1.0),
+                description=f"Unusual {data_type} spike detected",
+                frequency="occasional",
+                triggers=["stress", "activity", "medication"],
+                impact="temporary"
+            ))
         
         return patterns
     
-    def _detect_trend_patterns(self, values: List[float], timestamps: List[datetime], 
-                             data_type: DataType) -> List[PatternRecognition]:
+    def _detect_trend_patterns(self, series: HealthTimeSeries, data_type: str) -> List[PatternRecognition]:
         """Detect trend patterns in data"""
         patterns = []
         
-        if len(values) < 7:
+        if len(series) < 7:
             return patterns
         
         # Calculate trend using linear regression
-        time_numeric = [(ts - timestamps[0]).total_seconds() / 86400 for ts in timestamps]
-        slope, intercept, r_value, p_value, std_err = stats.linregress(time_numeric, values)
+        fit = kernels.linear_trend(series.elapsed_days(), series.primary)
+        slope, r_value = fit.slope, fit.r_value
         
         if abs(r_value) > self.analytics_config['pattern_recognition']['correlation_threshold']:
             if slope > 0:
                 patterns.append(PatternRecognition(
                     pattern_type="trend",
-                    pattern_name=f"{data_type.value}_increasing_trend",
+                    pattern_name=f"{data_type}_increasing_trend",
                     confidence=abs(r_value),
-                    description=f"Consistent increase in {data_type.value}",
+                    description=f"Consistent increase in {data_type}",
                     frequency="continuous",
                     triggers=["lifestyle_change", "aging", "condition_progression"],
                     impact="long_term"
@@ -519,9 +479,9 @@ class HealthAnalyticsEngine:
             else:
                 patterns.append(PatternRecognition(
                     pattern_type="trend",
-                    pattern_name=f"{data_type.value}_decreasing_trend",
+                    pattern_name=f"{data_type}_decreasing_trend",
                     confidence=abs(r_value),
-                    description=f"Consistent decrease in {data_type.value}",
+                    description=f"Consistent decrease in {data_type}",
                     frequency="continuous",
                     triggers=["treatment_effectiveness", "lifestyle_improvement"],
                     impact="long_term"
@@ -529,97 +489,55 @@ class HealthAnalyticsEngine:
         
         return patterns
     
-    def _detect_cycle_patterns(self, values: List[float], timestamps: List[datetime], 
-                             data_type: DataType) -> List[PatternRecognition]:
+    def _detect_cycle_patterns(self, series: HealthTimeSeries, data_type: str) -> List[PatternRecognition]:
         """Detect cycle patterns in data"""
         patterns = []
         
-        if len(values) < 14:
+        if len(series) < 14:
             return patterns
         
         # Simple cycle detection
         # Check for weekly cycles
-        weekly_avgs = defaultdict(list)
-        for i, ts in enumerate(timestamps):
-            day_of_week = ts.weekday()
-            weekly_avgs[day_of_week].append(values[i])
-        
-        weekly_means = [statistics.mean(weekly_avgs[day]) for day in range(7) if weekly_avgs[day]]
-        
-        if len(weekly_means) == 7:
-            variance = statistics.variance(weekly_means)
-            if variance > 0.1:
-                patterns.append(PatternRecognition(
-                    pattern_type="cycle",
-                    pattern_name=f"{data_type.value}_weekly_cycle",
-                    confidence=min(variance, 1.0),
-                    description=f"Weekly cycle detected in {data_type.value}",
-                    frequency="weekly",
-                    triggers=["work_schedule", "weekend_activities"],
-                    impact="predictable"
-                ))
+        variance = kernels.weekly_seasonality(series.weekdays(), series.primary)
+        
+        if variance > 0.1:
+            patterns.append(PatternRecognition(
+                pattern_type="cycle",
+                pattern_name=f"{data_type}_weekly_cycle",
+                confidence=min(variance, 1.0),
+                description=f"Weekly cycle detected in {data_type}",
+                frequency="weekly",
+                triggers=["work_schedule", "weekend_activities"],
+                impact="predictable"
+            ))
         
         return patterns
-    
-    def _detect_correlation_patterns(self, by_type: Dict[DataType, List[HealthDataPoint]]) -> List[PatternRecognition]:
+
+    def _detect_correlation_patterns(self, health_data: HealthSeriesSet) -> List[PatternRecognition]:
         """Detect correlation patterns between different data types"""
         patterns = []
         
-        data_types = list(by_type.keys())
-        if len(data_types) < 2:
+        if len(health_data.data_types) < 2:
             return patterns
         
-        # Create time-aligned data series
-        for i, type1 in enumerate(data_types):
-            for type2 in data_types[i+1:]:
-                correlation = self._calculate_correlation(by_type[type1], by_type[type2])
-                
-                if abs(correlation) > self.analytics_config['pattern_recognition']['correlation_threshold']:
-                    direction = "positive" if correlation > 0 else "negative"
-                    patterns.append(PatternRecognition(
-                        pattern_type="correlation",
-                        pattern_name=f"{type1.value}_{type2.value}_correlation",
-                        confidence=abs(correlation),
-                        description=f"{direction.capitalize()} correlation between {type1.value} and {type2.value}",
-                        frequency="continuous",
-                        triggers=["physiological_relationship", "lifestyle_factors"],
-                        impact="interdependent"
-                    ))
+        # All pairs at once, on a shared grid of daily buckets
+        correlations = HealthCorrelationEngine(self.db).correlate(health_data)
+        threshold = self.analytics_config['pattern_recognition']['correlation_threshold']
+        for pair in correlations.pairs(min_abs=threshold):
+            direction = "positive" if pair.pearson > 0 else "negative"
+            patterns.append(PatternRecognition(
+                pattern_type="correlation",
+                pattern_name=f"{pair.metric_a}_{pair.metric_b}_correlation",
+                confidence=abs(pair.pearson),
+                description=f"{direction.capitalize()} correlation between {pair.metric_a} and {pair.metric_b}",
+                frequency="continuous",
+                triggers=["physiological_relationship", "lifestyle_factors"],
+                impact="interdependent"
+            ))
         
         return patterns
     
-    def _calculate_correlation(self, points1: List[HealthDataPoint], points2: List[HealthDataPoint]) -> float:
-        """Calculate correlation between two data series"""
-        try:
-            # Align data by time
-            aligned_data = self._align_data_series(points1, points2)
-            
-            if len(aligned_data) < 3:
-                return 0.0
-            
-            values1 = [d[0] for d in aligned_data]
-            values2 = [d[1] for d in aligned_data]
-            
-            correlation, _ = stats.pearsonr(values1, values2)
-            return correlation if not np.isnan(correlation) else 0.0
-            
-        except Exception as e:
-            logger.warning(f"Error calculating correlation: {str(e)}")
-            return 0.0
-    
-    def _align_data_series(self, points1: List[HealthDataPoint], points2: List[HealthDataPoint]) -> List[Tuple[float, float]]:
-        """Align two data series by time"""
-        # Create time-indexed dictionaries
-        data1 = {p.timestamp: p.value for p in points1 if isinstance(p.value, (int, float))}
-        data2 = {p.timestamp: p.value for p in points2 if isinstance(p.value, (int, float))}
-        
-        # Find common timestamps
-        common_times = set(data1.keys()) & set(data2.keys())
-        
-        # Return aligned data
-        return [(data1[ts], data2[ts]) for ts in sorted(common_times)]
-    
-    async def _calculate_health_score(self, user_id: int, health_data: List[HealthDataPoint]) -> HealthScore:
+    async def _calculate_health_score(self, user_id: int, health_data: HealthSeriesSet) -> HealthScore:
         """Calculate comprehensive health score"""
         component_scores = {}
         factors = []
@@ -644,33 +562,35 @@ class HealthAnalyticsEngine:
         overall_score = sum(score * self.scoring_weights[component] 
                            for component, score in component_scores.items())
         
-        # Determine category
-        if overall_score >= 0.9:
-            category = HealthScoreCategory.EXCELLENT
-        elif overall_score >= 0.8:
-            category = HealthScoreCategory.GOOD
-        elif overall_score >= 0.7:
-            category = HealthScoreCategory.FAIR
-        elif overall_score >= 0.6:
-            category = HealthScoreCategory.POOR
-        else:
-            category = HealthScoreCategory.CRITICAL
-        
         return HealthScore(
             overall_score=overall_score,
-            category=category,
+            category=self._score_category(overall_score),
             component_scores=component_scores,
             factors=factors,
             recommendations=recommendations,
             last_updated=datetime.utcnow()
         )
     
-    async def _calculate_component_score(self, component: str, health_data: List[HealthDataPoint]) -> float:
+    @staticmethod
+    def _score_category(overall_score: float) -> HealthScoreCategory:
+        """Map an overall score to its category"""
+        if overall_score >= 0.9:
+            return HealthScoreCategory.EXCELLENT
+        elif overall_score >= 0.8:
+            return HealthScoreCategory.GOOD
+        elif overall_score >= 0.7:
+            return HealthScoreCategory.FAIR
+        elif overall_score >= 0.6:
+            return HealthScoreCategory.POOR
+        else:
+            return HealthScoreCategory.CRITICAL
+    
+    async def _calculate_component_score(self, component: str, health_data: HealthSeriesSet) -> float:
         """Calculate score for a specific health component"""
-        # Filter data for this component
-        component_data = [p for p in health_data if p.data_type.value == component]
+        # Series for this component
+        component_data = health_data.get(component)
         
-        if not component_data:
+        if component_data is None or not len(component_data):
             return 0.5  # Default score if no data
         
         # Component-specific scoring logic
@@ -687,184 +607,152 @@ class HealthAnalyticsEngine:
         else:
             return 0.7  # Default score
     
-    def _score_heart_rate(self, data_points: List[HealthDataPoint]) -> float:
+    def _score_heart_rate(self, series: HealthTimeSeries) -> float:
         """Score heart rate data"""
-        values = [p.value for p in data_points if isinstance(p.value, (int, float))]
-        
-        if not values:
+        if not len(series):
             return 0.5
         
-        avg_hr = statistics.mean(values)
-        
-        # Score based on resting heart rate ranges
-        if 60 <= avg_hr <= 100:
-            return 0.9
-        elif 50 <= avg_hr < 60 or 100 < avg_hr <= 110:
-            return 0.7
-        elif 40 <= avg_hr < 50 or 110 < avg_hr <= 120:
-            return 0.5
-        else:
-            return 0.3
+        return float(self._heart_rate_band(series.primary.mean()))
+    
+    @staticmethod
+    def _heart_rate_band(avg_hr: Union[float, np.ndarray]) -> np.ndarray:
+        """Score average heart rate(s) against resting heart rate ranges"""
+        avg_hr = np.asarray(avg_hr, dtype=np.float64)
+        return np.select([
+            (avg_hr >= 60) & (avg_hr <= 100),
+            ((avg_hr >= 50) & (avg_hr < 60)) | ((avg_hr > 100) & (avg_hr <= 110)),
+            ((avg_hr >= 40) & (avg_hr < 50)) | ((avg_hr > 110) & (avg_hr <= 120))
+        ], [0.9, 0.7, 0.5], default=0.3)
     
-    def _score_blood_pressure(self, data_points: List[HealthDataPoint]) -> float:
+    def _score_blood_pressure(self, series: HealthTimeSeries) -> float:
         """Score blood pressure data"""
         # This would need to handle dict values for BP
         return 0.7  # Placeholder
     
-    def _score_steps(self, data_points: List[HealthDataPoint]) -> float:
+    def _score_steps(self, series: HealthTimeSeries) -> float:
         """Score steps data"""
-        values = [p.value for p in data_points if isinstance(p.value, (int, float))]
-        
-        if not values:
+        if not len(series):
             return 0.5
         
-        avg_steps = statistics.mean(values)
-        
-        # Score based on daily step count
-        if avg_steps >= 10000:
-            return 0.9
-        elif avg_steps >= 7500:
-            return 0.8
-        elif avg_steps >= 5000:
-            return 0.7
-        elif avg_steps >= 2500:
-            return 0.6
-        else:
-            return 0.4
+        return float(self._steps_band(series.primary.mean()))
+    
+    @staticmethod
+    def _steps_band(avg_steps: Union[float, np.ndarray]) -> np.ndarray:
+        """Score average daily step count(s)"""
+        avg_steps = np.asarray(avg_steps, dtype=np.float64)
+        return np.select([
+            avg_steps >= 10000,
+            avg_steps >= 7500,
+            avg_steps >= 5000,
+            avg_steps >= 2500
+        ], [0.9, 0.8, 0.7, 0.6], default=0.4)
     
-    def _score_sleep(self, data_points: List[HealthDataPoint]) -> float:
+    def _score_sleep(self, series: HealthTimeSeries) -> float:
         """Score sleep data"""
-        values = [p.value for p in data_points if isinstance(p.value, (int, float))]
-        
-        if not values:
+        if not len(series):
             return 0.5
         
-        # Convert to hours if in minutes
-        hours = [v / 60 if v > 24 else v for v in values]
-        avg_sleep = statistics.mean(hours)
-        
-        # Score based on sleep duration
-        if 7 <= avg_sleep <= 9:
-            return 0.9
-        elif 6 <= avg_sleep < 7 or 9 < avg_sleep <= 10:
-            return 0.7
-        elif 5 <= avg_sleep < 6 or 10 < avg_sleep <= 11:
-            return 0.5
-        else:
-            return 0.3
+        return float(self._sleep_band(self._sleep_hours(series.primary).mean()))
     
-    def _score_weight(self, data_points: List[HealthDataPoint]) -> float:
+    @staticmethod
+    def _sleep_hours(values: np.ndarray) -> np.ndarray:
+        """Convert sleep readings to hours if in minutes"""
+        return np.where(values > 24, values / 60, values)
+    
+    @staticmethod
+    def _sleep_band(avg_sleep: Union[float, np.ndarray]) -> np.ndarray:
+        """Score average sleep duration(s) in hours"""
+        avg_sleep = np.asarray(avg_sleep, dtype=np.float64)
+        return np.select([
+            (avg_sleep >= 7) & (avg_sleep <= 9),
+            ((avg_sleep >= 6) & (avg_sleep < 7)) | ((avg_sleep > 9) & (avg_sleep <= 10)),
+            ((avg_sleep >= 5) & (avg_sleep < 6)) | ((avg_sleep > 10) & (avg_sleep <= 11))
+        ], [0.9, 0.7, 0.5], default=0.3)
+    
+    def _score_weight(self, series: HealthTimeSeries) -> float:
         """Score weight data"""
         # This would need BMI calculation and health profile data
         return 0.7  # Placeholder
     
-    async def _perform_comparative_analysis(self, user_id: int, health_data: List[HealthDataPoint]) -> List[ComparativeAnalysis]:
+    async def _perform_comparative_analysis(self, user_id: int, health_data: HealthSeriesSet) -> List[ComparativeAnalysis]:
         """Perform comparative analysis against peer groups"""
         comparisons = []
         
         try:
             # Get user profile for peer group matching
-            user_profile = self.db.query(UserHealthProfile).filter(
-                UserHealthProfile.user_id == user_id
-            ).first()
+            row = self.db.query(User.age, UserHealthProfile.gender, UserHealthProfile.activity_level).join(
+                UserHealthProfile, UserHealthProfile.user_id == User.id
+            ).filter(User.id == user_id).first()
             
-            if not user_profile:
+            if not row:
                 return comparisons
             
-            # Get peer group data
-            peer_data = await self._get_peer_group_data(user_profile)
+            # Nightly-built peer distributions, shared across requests
+            peer_group = PeerGroup.for_user(*row)
+            baselines = get_peer_baseline_store(self.db)
             
-            # Compare each health metric
-            for data_type in set(p.data_type for p in health_data):
-                comparison = await self._compare_metric(user_id, data_type, health_data, peer_data, user_profile)
-                if comparison:
-                    comparisons.append(comparison)
+            # Compare each health metric; baselines are kept per component (systolic/diastolic)
+            for data_type, series in health_data.items():
+                for component in series.components:
+                    baseline = baselines.lookup(peer_group, data_type, component)
+                    comparison = self._compare_metric(data_type, health_data, baseline, component)
+                    if comparison:
+                        comparisons.append(comparison)
             
         except Exception as e:
             logger.error(f"Error in comparative analysis: {str(e)}")
         
         return comparisons
     
-    async def _get_peer_group_data(self, user_profile: UserHealthProfile) -> Dict[str, List[float]]:
-        """Get peer group data for comparison"""
-        # This would typically query a large dataset of users
-        # For now, return mock data
-        return {
-            'heart_rate': [65, 70, 75, 80, 85, 90, 95],
-            'steps': [5000, 7500, 10000, 12500, 15000],
-            'sleep': [6.5, 7.0, 7.5, 8.0, 8.5, 9.0],
-            'weight': [60, 65, 70, 75, 80, 85, 90]
-        }
-    
-    async def _compare_metric(self, user_id: int, data_type: DataType, health_data: List[HealthDataPoint], 
-                            peer_data: Dict[str, List[float]], user_profile: UserHealthProfile) -> Optional[ComparativeAnalysis]:
-        """Compare a specific metric against peer group"""
+    def _compare_metric(self, data_type: str, health_data: HealthSeriesSet,
+                        baseline: Optional[Baseline], component: str = "value") -> Optional[ComparativeAnalysis]:
+        """Compare a specific metric (one component of it) against peer group"""
         # Get user's average for this metric
-        user_values = [p.value for p in health_data if p.data_type == data_type and isinstance(p.value, (int, float))]
+        series = health_data.get(data_type)
         
-        if not user_values:
+        if series is None or not len(series) or baseline is None:
             return None
         
-        user_avg = statistics.mean(user_values)
-        peer_values = peer_data.get(data_type.value, [])
-        
-        if not peer_values:
-            return None
+        user_avg = float(series.component(component).mean())
+        if component != "value":
+            data_type = f"{data_type}_{component}"
         
         # Calculate percentile
-        percentile = self._calculate_percentile(user_avg, peer_values)
+        percentile = baseline.percentile(user_avg)
         
         # Calculate differences
-        peer_avg = statistics.mean(peer_values)
         differences = {
-            'vs_peer_average': user_avg - peer_avg,
+            'vs_peer_average': user_avg - baseline.mean,
+            'vs_peer_median': user_avg - baseline.quantile(50),
             'percentile': percentile
         }
         
         # Generate insights
         insights = []
         if percentile > 75:
-            insights.append(f"Your {data_type.value} is above average for your peer group")
+            insights.append(f"Your {data_type} is above average for your peer group")
         elif percentile < 25:
-            insights.append(f"Your {data_type.value} is below average for your peer group")
+            insights.append(f"Your {data_type} is below average for your peer group")
         else:
-            insights.append(f"Your {data_type.value} is within normal range for your peer group")
+            insights.append(f"Your {data_type} is within normal range for your peer group")
         
         # Generate recommendations
         recommendations = []
         if percentile < 25:
-            recommendations.append(f"Consider improving your {data_type.value} through lifestyle changes")
+            recommendations.append(f"Consider improving your {data_type} through lifestyle changes")
         elif percentile > 90:
-            recommendations.append(f"Your {data_type.value} is excellent - maintain current habits")
+            recommendations.append(f"Your {data_type} is excellent - maintain current habits")
         
         return ComparativeAnalysis(
-            comparison_type=f"{data_type.value}_peer_comparison",
+            comparison_type=f"{data_type}_peer_comparison",
             user_percentile=percentile,
-            peer_group="age_gender_matched",
+            peer_group="/".join(baseline.group),
             differences=differences,
             insights=insights,
             recommendations=recommendations
         )
     
-    def _calculate_percentile(self, value: float, data: List[float]) -> float:
-        """Calculate percentile of a value in a dataset"""
-        if not data:
-            return 50.0
-        
-        sorted_data = sorted(data)
-        position = 0
-        
-        for i, data_point in enumerate(sorted_data):
-            if value <= data_point:
-                position = i
-                break
-        else:
-            position = len(sorted_data)
-        
-        percentile = (position / len(sorted_data)) * 100
-        return percentile
-    
-    async def _assess_health_risks(self, user_id: int, health_data: List[HealthDataPoint]) -> List[RiskAssessment]:
+    async def _assess_health_risks(self, user_id: int, health_data: HealthSeriesSet) -> List[RiskAssessment]:
         """Assess health risks based on data patterns"""
         risks = []
         
@@ -889,121 +777,296 @@ class HealthAnalyticsEngine:
         
         return risks
     
-    async def _assess_cardiovascular_risk(self, user_id: int, health_data: List[HealthDataPoint]) -> Optional[RiskAssessment]:
+    async def _assess_cardiovascular_risk(self, user_id: int, health_data: HealthSeriesSet) -> Optional[RiskAssessment]:
         """Assess cardiovascular risk"""
         # Get relevant data
-        heart_rate_data = [p for p in health_data if p.data_type == DataType.HEART_RATE]
-        blood_pressure_data = [p for p in health_data if p.data_type == DataType.BLOOD_PRESSURE]
+        heart_rate_data = health_data.get(DataType.HEART_RATE)
+        blood_pressure_data = health_data.get(DataType.BLOOD_PRESSURE)
         
         risk_factors = []
         risk_score = 0.0
         
         # Heart rate analysis
-        if heart_rate_data:
-            hr_values = [p.value for p in heart_rate_data if isinstance(p.value, (int, float))]
-            if hr_values:
-                avg_hr = statistics.mean(hr_values)
-                if avg_hr > 100:
-                    risk_factors.append("Elevated resting heart rate")
-                    risk_score += 0.3
-                elif avg_hr > 80:
-                    risk_factors.append("Above-normal heart rate")
-                    risk_score += 0.1
+        if heart_rate_data is not None and len(heart_rate_data):
+            avg_hr = float(heart_rate_data.primary.mean())
+            if avg_hr > 100:
+                risk_factors.append("Elevated resting heart rate")
+                risk_score += 0.3
+            elif avg_hr > 80:
+                risk_factors.append("Above-normal heart rate")
+                risk_score += 0.1
         
         # Blood pressure analysis (placeholder)
-        if blood_pressure_data:
+        if blood_pressure_data is not None and len(blood_pressure_data):
             risk_factors.append("Blood pressure monitoring needed")
             risk_score += 0.2
         
         if risk_score > 0:
-            # Determine risk level
-            if risk_score >= self.analytics_config['risk_assessment']['risk_thresholds']['high']:
-                risk_level = "high"
-            elif risk_score >= self.analytics_config['risk_assessment']['risk_thresholds']['medium']:
-                risk_level = "medium"
-            else:
-                risk_level = "low"
-            
-            return RiskAssessment(
-                risk_type="cardiovascular",
-                risk_level=risk_level,
-                probability=risk_score,
-                severity="moderate",
-                factors=risk_factors,
-                mitigation_strategies=[
-                    "Regular cardiovascular exercise",
-                    "Blood pressure monitoring",
-                    "Heart-healthy diet"
-                ],
-                monitoring_recommendations=[
-                    "Daily heart rate monitoring",
-                    "Weekly blood pressure checks",
-                    "Annual cardiovascular screening"
-                ]
-            )
+            return self._cardiovascular_assessment(risk_score, risk_factors)
         
         return None
     
-    async def _assess_diabetes_risk(self, user_id: int, health_data: List[HealthDataPoint]) -> Optional[RiskAssessment]:
+    def _cardiovascular_assessment(self, risk_score: float, risk_factors: List[str]) -> RiskAssessment:
+        """Build a cardiovascular risk assessment from its score and factors"""
+        # Determine risk level
+        if risk_score >= self.analytics_config['risk_assessment']['risk_thresholds']['high']:
+            risk_level = "high"
+        elif risk_score >= self.analytics_config['risk_assessment']['risk_thresholds']['medium']:
+            risk_level = "medium"
+        else:
+            risk_level = "low"
+        
+        return RiskAssessment(
+            risk_type="cardiovascular",
+            risk_level=risk_level,
+            probability=risk_score,
+            severity="moderate",
+            factors=risk_factors,
+            mitigation_strategies=[
+                "Regular cardiovascular exercise",
+                "Blood pressure monitoring",
+                "Heart-healthy diet"
+            ],
+            monitoring_recommendations=[
+                "Daily heart rate monitoring",
+                "Weekly blood pressure checks",
+                "Annual cardiovascular screening"
+            ]
+        )
+    
+    async def _assess_diabetes_risk(self, user_id: int, health_data: HealthSeriesSet) -> Optional[RiskAssessment]:
         """Assess diabetes risk"""
         # Placeholder implementation
         return None
     
-    async def _assess_mental_health_risk(self, user_id: int, health_data: List[HealthDataPoint]) -> Optional[RiskAssessment]:
+    async def _assess_mental_health_risk(self, user_id: int, health_data: HealthSeriesSet) -> Optional[RiskAssessment]:
         """Assess mental health risk"""
         # Placeholder implementation
         return None
     
-    async def _generate_predictions(self, user_id: int, health_data: List[HealthDataPoint]) -> Dict[str, Any]:
+    async def _generate_predictions(self, user_id: int, health_data: HealthSeriesSet) -> Dict[str, Any]:
         """Generate health predictions"""
         predictions = {}
         
         try:
             # Simple trend-based predictions
-            for data_type in set(p.data_type for p in health_data):
-                prediction = await self._predict_metric_trend(user_id, data_type, health_data)
+            for data_type, series in health_data.items():
+                prediction = await self._predict_metric_trend(user_id, data_type, series)
                 if prediction:
-                    predictions[data_type.value] = prediction
+                    predictions[data_type] = prediction
             
         except Exception as e:
             logger.error(f"Error generating predictions: {str(e)}")
         
         return predictions
     
-    async def _predict_metric_trend(self, user_id: int, data_type: DataType, 
-                                  health_data: List[HealthDataPoint]) -> Optional[Dict[str, Any]]:
+    async def _predict_metric_trend(self, user_id: int, data_type: str,
+                                  series: HealthTimeSeries) -> Optional[Dict[str, Any]]:
         """Predict trend for a specific metric"""
-        # Filter data for this type
-        type_data = [p for p in health_data if p.data_type == data_type]
-        
-        if len(type_data) < 7:
+        if len(series) < 7:
             return None
         
-        # Sort by timestamp
-        sorted_data = sorted(type_data, key=lambda p: p.timestamp)
-        values = [p.value for p in sorted_data if isinstance(p.value, (int, float))]
-        timestamps = [p.timestamp for p in sorted_data if isinstance(p.value, (int, float))]
-        
-        if len(values) < 7:
-            return None
+        values = series.primary
         
         # Simple linear prediction
-        time_numeric = [(ts - timestamps[0]).total_seconds() / 86400 for ts in timestamps]
-        slope, intercept, r_value, p_value, std_err = stats.linregress(time_numeric, values)
+        time_numeric = series.elapsed_days()
+        slope, intercept, r_value = kernels.linear_trend(time_numeric, values)
         
         # Predict next 30 days
         future_days = 30
         future_time = time_numeric[-1] + future_days
-        predicted_value = slope * future_time + intercept
+        predicted_value = float(slope * future_time + intercept)
         
         return {
-            'current_value': values[-1],
+            'current_value': float(values[-1]),
             'predicted_value': predicted_value,
             'trend_direction': 'increasing' if slope > 0 else 'decreasing',
             'confidence': abs(r_value),
             'prediction_horizon_days': future_days
         }
 
+    # Cohort batch analytics
+    
+    async def run_cohort_analytics(self, user_ids: Sequence[int], days: int = 90,
+                                   persist: bool = True) -> Dict[int, Dict[str, Any]]:
+        """
+        Run trend, health score and risk analytics for many users in one pass.
+        
+        Readings are loaded with one query per chunk of users into a
+        CohortFrame, and every statistic is a segment reduction over the
+        whole cohort, so cost grows with total readings rather than users.
+        Results match the per-user stages over the same readings, except
+        that cyclical patterns are not detected.
+        
+        Args:
+            user_ids: Users to analyze
+            days: Days of history to analyze
+            persist: Write health scores to today's daily aggregation rows
+            
+        Returns:
+            Mapping of user id to trends, health_score and risk_assessment
+            (users without readings are omitted)
+        """
+        end_date = datetime.utcnow()
+        start_date = end_date - timedelta(days=days)
+        
+        try:
+            cohort = CohortFrame.load(self.db, user_ids, start_date, end_date)
+            
+            results = {user_id: {'trends': [], 'risk_assessment': []} for user_id in cohort.users_with_data}
+            for user_id, trend in self._cohort_trends(cohort):
+                results[user_id]['trends'].append(trend)
+            
+            overall_scores, health_scores = self._cohort_health_scores(cohort)
+            for user_id, health_score in health_scores.items():
+                if user_id in results:
+                    results[user_id]['health_score'] = health_score
+            
+            for user_id, risk in self._cohort_cardiovascular_risks(cohort):
+                results[user_id]['risk_assessment'].append(risk)
+            
+            if persist and results:
+                self._persist_cohort_scores(cohort, overall_scores, end_date)
+            
+            logger.info(f"Cohort analytics: {len(results)} of {len(cohort.user_ids)} users, "
+                        f"{len(cohort)} readings")
+            return results
+            
+        except Exception as e:
+            logger.error(f"Error in cohort analytics: {str(e)}")
+            self.db.rollback()
+            raise AnalyticsError(f"Cohort analytics failed: {str(e)}")
+    
+    def _cohort_trends(self, cohort: CohortFrame) -> List[Tuple[int, TrendAnalysis]]:
+        """Trend per (user, data type) segment with enough readings"""
+        config = self.analytics_config['trend_analysis']
+        segment_stats = cohort.stats()
+        seasonality = cohort.weekly_seasonality()
+        
+        eligible = np.flatnonzero(segment_stats.count >= max(config['min_data_points'], 3))
+        slope = segment_stats.slope[eligible]
+        direction = np.where(
+            np.abs(slope) < config['trend_strength_threshold'], 0, np.where(slope > 0, 1, -1)
+        )
+        confidence = np.nan_to_num(np.abs(segment_stats.r_value[eligible]), nan=0.0)
+        weekly = (segment_stats.count[eligible] >= 30) & (seasonality[eligible] > 0.1)
+        directions = {0: TrendDirection.STABLE, 1: TrendDirection.INCREASING, -1: TrendDirection.DECREASING}
+        
+        trends = []
+        for i, segment in enumerate(eligible):
+            trends.append((int(cohort.user_ids[cohort.segment_user[segment]]), TrendAnalysis(
+                data_type=cohort.data_types[cohort.segment_type[segment]],
+                direction=directions[int(direction[i])],
+                slope=float(slope[i]),
+                strength=float(abs(slope[i])),
+                confidence=float(confidence[i]),
+                period_start=segment_stats.start[segment].astype(datetime),
+                period_end=segment_stats.end[segment].astype(datetime),
+                data_points=int(segment_stats.count[segment]),
+                seasonal_pattern="weekly" if weekly[i] else None
+            )))
+        return trends
+    
+    def _cohort_component_scores(self, cohort: CohortFrame) -> Dict[str, np.ndarray]:
+        """Component score arrays aligned with cohort.user_ids (0.5 where a user has no data)"""
+        segment_stats = cohort.stats()
+        sleep_hours = cohort.segment_sum(self._sleep_hours(cohort.values)) / np.maximum(segment_stats.count, 1)
+        banded = {
+            'heart_rate': self._heart_rate_band(segment_stats.mean),
+            'blood_pressure': np.full(cohort.segment_count, 0.7),  # Placeholder, as _score_blood_pressure
+            'steps': self._steps_band(segment_stats.mean),
+            'sleep': self._sleep_band(sleep_hours),
+            'weight': np.full(cohort.segment_count, 0.7)  # Placeholder, as _score_weight
+        }
+        return {
+            component: cohort.per_user(banded[component], component, fill=0.5) if component in banded
+            else np.full(len(cohort.user_ids), 0.5)
+            for component in self.scoring_weights
+        }
+    
+    def _cohort_health_scores(self, cohort: CohortFrame) -> Tuple[np.ndarray, Dict[int, HealthScore]]:
+        """Overall score array aligned with cohort.user_ids, and a HealthScore per user"""
+        components = self._cohort_component_scores(cohort)
+        overall = sum(scores * self.scoring_weights[component] for component, scores in components.items())
+        
+        now = datetime.utcnow()
+        health_scores = {}
+        for i, user_id in enumerate(cohort.user_ids.tolist()):
+            component_scores = {component: float(scores[i]) for component, scores in components.items()}
+            low = [component.replace('_', ' ') for component, score in component_scores.items() if score < 0.6]
+            health_scores[user_id] = HealthScore(
+                overall_score=float(overall[i]),
+                category=self._score_category(overall[i]),
+                component_scores=component_scores,
+                factors=[f"Low {name} score" for name in low],
+                recommendations=[f"Improve {name} through lifestyle changes" for name in low],
+                last_updated=now
+            )
+        return overall, health_scores
+    
+    def _cohort_cardiovascular_risks(self, cohort: CohortFrame) -> List[Tuple[int, RiskAssessment]]:
+        """Cardiovascular risk for every user with a non-zero risk score"""
+        segment_stats = cohort.stats()
+        avg_hr = cohort.per_user(segment_stats.mean, DataType.HEART_RATE)
+        has_bp = ~np.isnan(cohort.per_user(segment_stats.mean, DataType.BLOOD_PRESSURE))
+        
+        elevated = avg_hr > 100
+        above_normal = (avg_hr > 80) & ~elevated
+        risk_scores = 0.3 * elevated + 0.1 * above_normal + 0.2 * has_bp
+        
+        risks = []
+        for i in np.flatnonzero(risk_scores > 0):
+            risk_factors = []
+            if elevated[i]:
+                risk_factors.append("Elevated resting heart rate")
+            elif above_normal[i]:
+                risk_factors.append("Above-normal heart rate")
+            if has_bp[i]:
+                risk_factors.append("Blood pressure monitoring needed")
+            risks.append((int(cohort.user_ids[i]), self._cardiovascular_assessment(float(risk_scores[i]), risk_factors)))
+        return risks
+    
+    def _persist_cohort_scores(self, cohort: CohortFrame, overall_scores: np.ndarray, as_of: datetime) -> None:
+        """Bulk upsert health scores (0-100) into each user's daily aggregation row for as_of"""
+        today = as_of.replace(hour=0, minute=0, second=0, microsecond=0)
+        yesterday = today - timedelta(days=1)
+        user_ids = cohort.users_with_data
+        positions = {user_id: i for i, user_id in enumerate(cohort.user_ids.tolist())}
+        
+        rows = self.db.query(
+            HealthMetricsAggregation.id, HealthMetricsAggregation.health_profile_id,
+            HealthMetricsAggregation.period_start, HealthMetricsAggregation.overall_health_score
+        ).filter(
+            and_(
+                HealthMetricsAggregation.health_profile_id.in_(user_ids),  # Assuming 1:1 relationship
+                HealthMetricsAggregation.aggregation_period == 'daily',
+                HealthMetricsAggregation.period_start.in_([yesterday, today])
+            )
+        ).all()
+        existing = {(row.health_profile_id, row.period_start): row for row in rows}
+        
+        updates, inserts = [], []
+        for user_id in user_ids:
+            score = float(overall_scores[positions[user_id]] * 100)
+            previous = existing.get((user_id, yesterday))
+            trend = score - previous.overall_health_score \
+                if previous is not None and previous.overall_health_score is not None else None
+            current = existing.get((user_id, today))
+            if current is not None:
+                updates.append({'id': current.id, 'overall_health_score': score, 'health_score_trend': trend,
+                                'updated_at': as_of})
+            else:
+                inserts.append({'health_profile_id': user_id, 'aggregation_period': 'daily',
+                                'period_start': today, 'period_end': today + timedelta(days=1),
+                                'overall_health_score': score, 'health_score_trend': trend,
+                                'created_at': as_of, 'updated_at': as_of})
+        
+        if updates:
+            self.db.bulk_update_mappings(HealthMetricsAggregation, updates)
+        if inserts:
+            self.db.bulk_insert_mappings(HealthMetricsAggregation, inserts)
+        self.db.commit()
+
 # Global analytics engine instance
 health_analytics_engine = None
 
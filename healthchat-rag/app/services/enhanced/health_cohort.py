@@ -0,0 +1,266 @@
+"""
+Cohort Health Data Frame
+Grouped columnar readings for many users at once, with segment reductions for set-based batch analytics
+"""
+
+import logging
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+from datetime import datetime
+from dataclasses import dataclass
+import numpy as np
+from sqlalchemy.orm import Session
+from sqlalchemy import and_
+
+from app.models.health_data import HealthData
+from app.services.enhanced.data_integration import DataType
+from app.services.enhanced.health_timeseries import components_for, decrypt_value, parse_reading
+
+logger = logging.getLogger(__name__)
+
+# Bound on user ids per IN (...) clause when loading a cohort
+COHORT_QUERY_CHUNK = 500
+
+_SECONDS_PER_DAY = 86400.0
+
+
+@dataclass
+class SegmentStats:
+    """Reductions over every (user, data_type) segment, one array entry per segment"""
+    count: np.ndarray
+    mean: np.ndarray
+    minimum: np.ndarray
+    maximum: np.ndarray
+    first: np.ndarray
+    last: np.ndarray
+    start: np.ndarray  # datetime64[s]
+    end: np.ndarray  # datetime64[s]
+    slope: np.ndarray  # OLS slope per elapsed day
+    intercept: np.ndarray  # at the segment's first reading
+    r_value: np.ndarray  # NaN when x or y is constant
+
+
+class CohortFrame:
+    """
+    Readings for a cohort of users as flat arrays sorted by (user, data_type, timestamp).
+
+    Each contiguous run of one user's readings of one data type is a
+    segment. Reductions use ``np.*.reduceat`` over segment offsets, so a
+    pass over the cohort costs O(total readings) however many users it
+    holds. Only the primary component (systolic for blood pressure) is kept.
+    """
+
+    def __init__(self, user_ids: Sequence[int], data_types: Sequence[str],
+                 user_index: np.ndarray, type_index: np.ndarray,
+                 timestamps: np.ndarray, values: np.ndarray):
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.data_types = list(data_types)
+
+        user_index = np.asarray(user_index, dtype=np.intp)
+        type_index = np.asarray(type_index, dtype=np.intp)
+        timestamps = np.asarray(timestamps, dtype="datetime64[s]")
+        values = np.asarray(values, dtype=np.float64)
+        order = np.lexsort((timestamps, type_index, user_index))
+        self.user_index = user_index[order]
+        self.type_index = type_index[order]
+        self.timestamps = timestamps[order]
+        self.values = values[order]
+
+        n = len(self.values)
+        if n:
+            boundary = np.empty(n, dtype=bool)
+            boundary[0] = True
+            boundary[1:] = (np.diff(self.user_index) != 0) | (np.diff(self.type_index) != 0)
+            self.segment_starts = np.flatnonzero(boundary)
+        else:
+            self.segment_starts = np.empty(0, dtype=np.intp)
+        self.segment_lengths = np.diff(np.append(self.segment_starts, n))
+        self.segment_user = self.user_index[self.segment_starts]
+        self.segment_type = self.type_index[self.segment_starts]
+        # Segment of every reading, for broadcasting per-segment values back
+        self.segment_of = np.repeat(np.arange(len(self.segment_starts)), self.segment_lengths)
+        self._stats: Optional[SegmentStats] = None
+
+    @classmethod
+    def from_records(cls, user_ids: Sequence[int],
+                     records: Iterable[Tuple[int, Union[str, DataType], datetime, object]]) -> "CohortFrame":
+        """
+        Build a frame from (user_id, data_type, timestamp, raw value) records.
+
+        Non-numeric readings and readings of users outside user_ids are skipped.
+        """
+        user_ids = list(dict.fromkeys(int(u) for u in user_ids))
+        user_position = {user_id: i for i, user_id in enumerate(user_ids)}
+        type_position: Dict[str, int] = {}
+        users, types, timestamps, values = [], [], [], []
+
+        for user_id, data_type, timestamp, raw_value in records:
+            position = user_position.get(user_id)
+            if position is None:
+                continue
+            key = data_type.value if isinstance(data_type, DataType) else str(data_type)
+            parsed = parse_reading(raw_value, components_for(key))
+            if parsed is None:
+                continue
+            users.append(position)
+            types.append(type_position.setdefault(key, len(type_position)))
+            timestamps.append(timestamp)
+            values.append(parsed[0])
+
+        return cls(user_ids, list(type_position), np.array(users, dtype=np.intp), np.array(types, dtype=np.intp),
+                   np.array(timestamps, dtype="datetime64[s]"), np.array(values, dtype=np.float64))
+
+    @classmethod
+    def load(cls, db: Session, user_ids: Sequence[int], start: datetime, end: Optional[datetime] = None,
+             data_types: Optional[Sequence[Union[str, DataType]]] = None,
+             chunk_size: int = COHORT_QUERY_CHUNK) -> "CohortFrame":
+        """
+        Load a cohort's readings with one query per chunk of user ids.
+
+        Args:
+            db: Database session
+            user_ids: Users in the cohort
+            start: Window start (inclusive)
+            end: Window end (exclusive, defaults to now)
+            data_types: Restrict to these data types
+            chunk_size: User ids per query
+        """
+        user_ids = list(dict.fromkeys(int(u) for u in user_ids))
+        type_keys = [t.value if isinstance(t, DataType) else str(t) for t in data_types] if data_types else None
+
+        def records():
+            for offset in range(0, len(user_ids), chunk_size):
+                filters = [
+                    HealthData.user_id.in_(user_ids[offset:offset + chunk_size]),
+                    HealthData.timestamp >= start
+                ]
+                if end is not None:
+                    filters.append(HealthData.timestamp < end)
+                if type_keys:
+                    filters.append(HealthData.data_type.in_(type_keys))
+
+                rows = db.query(
+                    HealthData.user_id, HealthData.data_type, HealthData.timestamp, HealthData.value
+                ).filter(and_(*filters)).yield_per(5000)
+                for user_id, data_type, timestamp, value in rows:
+                    yield user_id, data_type, timestamp, decrypt_value(value)
+
+        return cls.from_records(user_ids, records())
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @property
+    def segment_count(self) -> int:
+        return len(self.segment_starts)
+
+    def segment_sum(self, values: np.ndarray) -> np.ndarray:
+        """Sum of a per-reading array over each segment."""
+        if not self.segment_count:
+            return np.empty(0, dtype=np.float64)
+        return np.add.reduceat(values, self.segment_starts)
+
+    def elapsed_days(self) -> np.ndarray:
+        """Fractional days since the first reading of each reading's segment."""
+        seconds = self.timestamps.astype(np.int64)
+        first = seconds[self.segment_starts][self.segment_of]
+        return (seconds - first) / _SECONDS_PER_DAY
+
+    def weekdays(self) -> np.ndarray:
+        """Day of week per reading (Monday=0)."""
+        days = self.timestamps.astype("datetime64[D]").astype(np.int64)
+        # 1970-01-01 was a Thursday
+        return (days + 3) % 7
+
+    def stats(self) -> SegmentStats:
+        """Count, mean, extremes and OLS trend for every segment (cached)."""
+        if self._stats is None:
+            self._stats = self._compute_stats()
+        return self._stats
+
+    def _compute_stats(self) -> SegmentStats:
+        if not self.segment_count:
+            empty = np.empty(0, dtype=np.float64)
+            empty_ts = np.empty(0, dtype="datetime64[s]")
+            return SegmentStats(np.empty(0, dtype=np.int64), empty, empty, empty, empty, empty,
+                                empty_ts, empty_ts, empty, empty, empty)
+
+        starts = self.segment_starts
+        ends = starts + self.segment_lengths - 1
+        count = self.segment_lengths
+        x = self.elapsed_days()
+        y = self.values
+        x_mean = self.segment_sum(x) / count
+        y_mean = self.segment_sum(y) / count
+
+        # Centered sums per segment, as in kernels.linear_trend
+        dx = x - x_mean[self.segment_of]
+        dy = y - y_mean[self.segment_of]
+        sxx = self.segment_sum(dx * dx)
+        syy = self.segment_sum(dy * dy)
+        sxy = self.segment_sum(dx * dy)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            slope = np.where(sxx > 0, sxy / sxx, 0.0)
+            denom = np.sqrt(sxx * syy)
+            r_value = np.where(denom > 0, np.clip(sxy / denom, -1.0, 1.0), np.nan)
+
+        return SegmentStats(
+            count=count,
+            mean=y_mean,
+            minimum=np.minimum.reduceat(y, starts),
+            maximum=np.maximum.reduceat(y, starts),
+            first=y[starts],
+            last=y[ends],
+            start=self.timestamps[starts],
+            end=self.timestamps[ends],
+            slope=slope,
+            intercept=y_mean - slope * x_mean,
+            r_value=r_value
+        )
+
+    def weekly_seasonality(self) -> np.ndarray:
+        """
+        Sample variance of the seven weekday means for every segment.
+
+        NaN unless every day of the week has a reading, as in
+        kernels.weekly_seasonality.
+        """
+        bins = self.segment_of * 7 + self.weekdays()
+        size = self.segment_count * 7
+        counts = np.bincount(bins, minlength=size).reshape(-1, 7)
+        sums = np.bincount(bins, weights=self.values, minlength=size).reshape(-1, 7)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = sums / counts
+        variance = means.var(axis=1, ddof=1)
+        variance[np.any(counts == 0, axis=1)] = np.nan
+        return variance
+
+    def segments_of_type(self, data_type: Union[str, DataType]) -> np.ndarray:
+        """Indices of the segments holding one data type."""
+        key = data_type.value if isinstance(data_type, DataType) else str(data_type)
+        if key not in self.data_types:
+            return np.empty(0, dtype=np.intp)
+        return np.flatnonzero(self.segment_type == self.data_types.index(key))
+
+    def per_user(self, segment_values: np.ndarray, data_type: Union[str, DataType],
+                 fill: float = np.nan) -> np.ndarray:
+        """
+        Scatter a per-segment array for one data type into a per-user array.
+
+        Returns:
+            Array aligned with user_ids; fill where a user has no readings of the type
+        """
+        result = np.full(len(self.user_ids), fill, dtype=np.float64)
+        segments = self.segments_of_type(data_type)
+        result[self.segment_user[segments]] = segment_values[segments]
+        return result
+
+    def segment_values(self, segment: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(timestamps, values) of one segment as views."""
+        lo = self.segment_starts[segment]
+        hi = lo + self.segment_lengths[segment]
+        return self.timestamps[lo:hi], self.values[lo:hi]
+
+    @property
+    def users_with_data(self) -> List[int]:
+        return self.user_ids[np.unique(self.segment_user)].tolist()
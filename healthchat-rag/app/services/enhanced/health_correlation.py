@@ -0,0 +1,282 @@
+"""
+Health Metric Correlations
+Correlation matrices and lagged cross-correlations over a user's series resampled onto a common time grid
+"""
+
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Union
+from datetime import datetime, timedelta
+from dataclasses import dataclass
+import numpy as np
+from scipy import stats
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+
+from app.config import settings
+from app.models.health_data import HealthData
+from app.services.enhanced import health_kernels as kernels
+from app.services.enhanced.data_integration import DataType
+from app.services.enhanced.health_timeseries import HealthSeriesSet
+from app.utils.cache import CacheManager, get_cache_manager
+
+logger = logging.getLogger(__name__)
+
+# Fewest shared grid buckets for a defined correlation
+MIN_OBSERVATIONS = 3
+
+
+@dataclass
+class ResampledGrid:
+    """Primary values of several series on one fixed-width time grid"""
+    metrics: List[str]
+    timestamps: np.ndarray  # Bucket starts, datetime64[s]
+    values: np.ndarray  # (buckets, metrics); NaN where a metric has no value
+    bucket: timedelta
+
+
+@dataclass
+class MetricCorrelation:
+    """Correlation between two metrics"""
+    metric_a: str
+    metric_b: str
+    pearson: Optional[float]
+    spearman: Optional[float]
+    observations: int  # Grid buckets where both metrics have a value
+    best_lag: int  # Buckets metric_b trails metric_a by at the strongest correlation (negative: leads)
+    lag_correlation: Optional[float]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'metric_a': self.metric_a,
+            'metric_b': self.metric_b,
+            'pearson': self.pearson,
+            'spearman': self.spearman,
+            'observations': self.observations,
+            'best_lag': self.best_lag,
+            'lag_correlation': self.lag_correlation
+        }
+
+
+@dataclass
+class CorrelationResult:
+    """Correlation matrices for every metric pair on a grid"""
+    metrics: List[str]
+    bucket: timedelta
+    fill_limit: int
+    buckets: int
+    pearson: np.ndarray  # (metrics, metrics)
+    spearman: np.ndarray
+    observations: np.ndarray  # Shared buckets per pair
+    lags: np.ndarray  # Lags evaluated, -max_lag..max_lag
+    lagged: np.ndarray  # (lags, metrics, metrics): corr(a[t], b[t + lag])
+
+    def pairs(self, min_abs: float = 0.0) -> List[MetricCorrelation]:
+        """Every pair (a before b) whose |Pearson| is at least min_abs."""
+        results = []
+        for i, j in zip(*np.triu_indices(len(self.metrics), k=1)):
+            pearson = _defined(self.pearson[i, j])
+            if min_abs and (pearson is None or abs(pearson) < min_abs):
+                continue
+            strength = np.abs(np.nan_to_num(self.lagged[:, i, j], nan=0.0))
+            best = int(np.argmax(strength))
+            results.append(MetricCorrelation(
+                metric_a=self.metrics[i], metric_b=self.metrics[j],
+                pearson=pearson, spearman=_defined(self.spearman[i, j]),
+                observations=int(self.observations[i, j]),
+                best_lag=int(self.lags[best]), lag_correlation=_defined(self.lagged[best, i, j])
+            ))
+        return results
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'metrics': self.metrics,
+            'bucket_seconds': int(self.bucket.total_seconds()),
+            'fill_limit': self.fill_limit,
+            'buckets': self.buckets,
+            'pearson': _matrix(self.pearson),
+            'spearman': _matrix(self.spearman),
+            'observations': self.observations.astype(int).tolist(),
+            'pairs': [pair.to_dict() for pair in self.pairs()]
+        }
+
+
+class HealthCorrelationEngine:
+    """
+    Correlates all of a user's metrics at once.
+
+    Each series is averaged into fixed-width buckets on a grid shared by
+    every metric, and a reading is carried forward into at most
+    ``fill_limit`` following empty buckets, so readings taken at nearby
+    but unequal times still line up. Pearson and Spearman matrices then
+    come from one pairwise-complete matrix computation each, and lagged
+    cross-correlations from one per lag, with no Python work per pair.
+    Results for a user are cached under the version of their readings.
+    """
+
+    def __init__(self, db_session: Optional[Session], cache: Optional[CacheManager] = None,
+                 bucket: Optional[timedelta] = None, fill_limit: Optional[int] = None,
+                 max_lag: Optional[int] = None):
+        self.db = db_session
+        self._cache = cache
+        self.bucket = bucket or timedelta(seconds=settings.correlation_bucket_seconds)
+        self.fill_limit = fill_limit if fill_limit is not None else settings.correlation_fill_limit
+        self.max_lag = max_lag if max_lag is not None else settings.correlation_max_lag
+
+    @property
+    def cache(self) -> CacheManager:
+        if self._cache is None:
+            self._cache = get_cache_manager()
+        return self._cache
+
+    def get_correlations(self, user_id: int, days: int = 30,
+                         data_types: Optional[Sequence[Union[str, DataType]]] = None) -> Dict[str, Any]:
+        """
+        Correlate a user's metrics over the last days, served from cache when unchanged.
+
+        Args:
+            user_id: User ID
+            days: Window length
+            data_types: Restrict to these data types (default: all)
+
+        Returns:
+            CorrelationResult.to_dict() plus the window and data version
+        """
+        types = sorted({t.value if isinstance(t, DataType) else str(t) for t in data_types or []})
+        data_version = self._data_version(user_id)
+        cache_key = (f"correlations:{user_id}:{days}:{','.join(types)}:"
+                     f"{int(self.bucket.total_seconds())}:{self.fill_limit}:{self.max_lag}:{data_version}")
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        end = datetime.utcnow()
+        start = end - timedelta(days=days)
+        series_set = HealthSeriesSet.load(self.db, user_id, start, end, data_types=types or None)
+        result = self.correlate(series_set, start, end).to_dict()
+        result.update({'user_id': user_id, 'days': days, 'data_version': data_version})
+
+        self.cache.set(cache_key, result, ttl=settings.correlation_cache_ttl)
+        return result
+
+    def correlate(self, series_set: HealthSeriesSet, start: Optional[datetime] = None,
+                  end: Optional[datetime] = None) -> CorrelationResult:
+        """
+        Correlate every pair of metrics in a series set.
+
+        Args:
+            series_set: A user's series
+            start: Grid origin (default: the bucket holding the first reading)
+            end: Grid end (default: just past the last reading)
+
+        Returns:
+            CorrelationResult; entries with fewer than MIN_OBSERVATIONS shared
+            buckets or a constant metric are NaN
+        """
+        grid = resample(series_set, self.bucket, start, end, self.fill_limit)
+        values = grid.values
+        k = len(grid.metrics)
+        present = (~np.isnan(values)).astype(np.float64)
+
+        pearson = kernels.pairwise_correlation(values, MIN_OBSERVATIONS) if k else np.empty((0, 0))
+        spearman = kernels.pairwise_correlation(_ranks(values), MIN_OBSERVATIONS) if k else np.empty((0, 0))
+
+        max_lag = min(self.max_lag, max(len(values) - MIN_OBSERVATIONS, 0))
+        lags = np.arange(-max_lag, max_lag + 1)
+        lagged = np.full((len(lags), k, k), np.nan)
+        lagged[max_lag] = pearson
+        for lag in range(1, max_lag + 1):
+            # corr(a[t], b[t + lag]) for every pair, from one (n - lag, 2k) matrix
+            block = kernels.pairwise_correlation(np.hstack([values[:-lag], values[lag:]]), MIN_OBSERVATIONS)[:k, k:]
+            lagged[max_lag + lag] = block
+            lagged[max_lag - lag] = block.T
+
+        return CorrelationResult(
+            metrics=grid.metrics, bucket=grid.bucket, fill_limit=self.fill_limit, buckets=len(values),
+            pearson=pearson, spearman=spearman, observations=present.T @ present,
+            lags=lags, lagged=lagged
+        )
+
+    def _data_version(self, user_id: int) -> str:
+        """Fingerprint of the user's readings"""
+        row = self.db.query(
+            func.count(HealthData.id), func.max(HealthData.id), func.max(HealthData.updated_at)
+        ).filter(HealthData.user_id == user_id).one()
+        return hashlib.sha1(repr(tuple(row)).encode()).hexdigest()[:16]
+
+
+def resample(series_set: HealthSeriesSet, bucket: timedelta, start: Optional[datetime] = None,
+             end: Optional[datetime] = None, fill_limit: int = 0) -> ResampledGrid:
+    """
+    Average each series' primary value into fixed-width buckets on a shared grid.
+
+    Args:
+        series_set: Series to resample
+        bucket: Bucket width
+        start: Grid origin (default: the first reading, floored to the bucket width)
+        end: Grid end, exclusive (default: just past the last reading)
+        fill_limit: Empty buckets a value is carried forward into
+
+    Returns:
+        ResampledGrid; readings outside [start, end) are dropped
+    """
+    metrics = [data_type for data_type, series in series_set.items() if len(series)]
+    width = int(bucket.total_seconds())
+    if not metrics:
+        return ResampledGrid([], np.empty(0, dtype="datetime64[s]"), np.empty((0, 0)), bucket)
+
+    seconds = [series_set.get(metric).epoch_seconds() for metric in metrics]
+    origin = int(np.datetime64(start, "s").astype(np.int64)) if start else \
+        min(int(s[0]) for s in seconds) // width * width
+    stop = int(np.datetime64(end, "s").astype(np.int64)) if end else max(int(s[-1]) for s in seconds) + 1
+    n = max(-(-(stop - origin) // width), 0)
+
+    values = np.full((n, len(metrics)), np.nan)
+    for column, (metric, epoch) in enumerate(zip(metrics, seconds)):
+        index = (epoch - origin) // width
+        inside = (index >= 0) & (index < n)
+        counts = np.bincount(index[inside], minlength=n)
+        sums = np.bincount(index[inside], weights=series_set.get(metric).primary[inside], minlength=n)
+        filled = counts > 0
+        values[filled, column] = sums[filled] / counts[filled]
+
+    if fill_limit > 0 and n:
+        values = forward_fill(values, fill_limit)
+    timestamps = (origin + np.arange(n) * width).astype("datetime64[s]")
+    return ResampledGrid(metrics, timestamps, values, bucket)
+
+
+def forward_fill(values: np.ndarray, limit: int) -> np.ndarray:
+    """Carry each column's last value into at most limit following NaN rows."""
+    rows = np.arange(len(values))[:, None]
+    last = np.maximum.accumulate(np.where(~np.isnan(values), rows, -1), axis=0)
+    fill = (last >= 0) & (rows - last <= limit)
+    columns = np.broadcast_to(np.arange(values.shape[1]), values.shape)
+    return np.where(fill, values[np.maximum(last, 0), columns], np.nan)
+
+
+def _ranks(values: np.ndarray) -> np.ndarray:
+    """
+    Average ranks per column, NaN kept.
+
+    Ranks are over each metric's own values, so where two metrics' gaps
+    differ the Spearman coefficient approximates the pairwise-complete one.
+    """
+    ranks = np.full(values.shape, np.nan)
+    for column in range(values.shape[1]):
+        present = ~np.isnan(values[:, column])
+        ranks[present, column] = stats.rankdata(values[present, column])
+    return ranks
+
+
+def _defined(value: float) -> Optional[float]:
+    return None if np.isnan(value) else round(float(value), 4)
+
+
+def _matrix(matrix: np.ndarray) -> List[List[Optional[float]]]:
+    return [[_defined(value) for value in row] for row in matrix]
+
+
+def get_health_correlation_engine(db_session: Session) -> HealthCorrelationEngine:
+    """Create a health correlation engine bound to a database session"""
+    return HealthCorrelationEngine(db_session)
@@ -5,17 +5,17 @@ Comprehensive service for health data ingestion, validation, transformation, and
 
 import asyncio
 import logging
-from typing import Dict, List, Any, Optional, Union, Tuple
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple, Union
 from datetime import datetime, timedelta
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import Enum
 import json
-import statistics
 from collections import defaultdict
 import numpy as np
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, func
 
+from app.config import settings
 from app.database import get_db
 from app.models.enhanced_health_models import (
     UserHealthProfile, HealthMetricsAggregation, EnhancedMedication, 
@@ -24,6 +24,14 @@ from app.models.enhanced_health_models import (
 from app.services.enhanced.data_integration import (
     DataIntegrationService, HealthDataPoint, DataType, DataSourceType
 )
+from app.services.enhanced.health_timeseries import HealthSeriesSet, HealthTimeSeries
+from app.services.enhanced import health_kernels as kernels
+from app.services.enhanced.health_rollups import HealthRollupStore, RollupGranularity, RunningAggregate
+from app.services.enhanced.health_score_store import HealthScoreStore
+from app.services.enhanced.health_sync import UpsertedReading, merge_written_readings, upsert_readings
+from app.services.enhanced.health_validation import BatchValidator
+from app.services.enhanced.stream_pipeline import Stage, StreamingPipeline
+from app.services.threshold_alerts import threshold_monitor
 from app.exceptions.health_exceptions import HealthDataError, MedicalDataError
 from app.utils.encryption_utils import field_encryption
 
@@ -72,6 +80,62 @@ class AnomalyDetection:
     suggested_action: str
     detected_at: datetime
 
+@dataclass
+class QualityTotals:
+    """Running inputs of the quality score, accumulated chunk by chunk"""
+    count: int = 0
+    complete: int = 0  # Points with both a value and a timestamp
+    confidence_total: float = 0.0
+    confidence_count: int = 0
+    data_types: Set[Any] = field(default_factory=set)
+    units: Set[str] = field(default_factory=set)
+    sources: Set[Any] = field(default_factory=set)
+    
+    def add(self, data_points: List[HealthDataPoint]) -> None:
+        for point in data_points:
+            self.count += 1
+            self.complete += point.value is not None and point.timestamp is not None
+            if point.confidence is not None:
+                self.confidence_total += point.confidence
+                self.confidence_count += 1
+            self.data_types.add(point.data_type)
+            self.sources.add(point.source)
+            if point.unit:
+                self.units.add(point.unit)
+    
+    def score(self, valid_count: int, total_count: int) -> float:
+        """Weighted validation, completeness, consistency and accuracy score"""
+        if total_count == 0:
+            return 0.0
+        
+        validation_score = valid_count / total_count
+        completeness_score = self.complete / self.count if self.count else 0.0
+        
+        # Penalize mixed data types (unless expected) and mixed units
+        consistency_score = 1.0
+        if self.count >= 2:
+            if len(self.data_types) > 1:
+                consistency_score *= 0.8
+            if len(self.units) > 1:
+                consistency_score *= 0.9
+        
+        # Use confidence scores if available, else a default accuracy
+        if not self.count:
+            accuracy_score = 0.0
+        elif self.confidence_count:
+            accuracy_score = self.confidence_total / self.confidence_count
+        else:
+            accuracy_score = 0.8
+        
+        quality_score = (
+            validation_score * 0.4 +
+            completeness_score * 0.2 +
+            consistency_score * 0.2 +
+            accuracy_score * 0.2
+        )
+        
+        return min(quality_score, 1.0)
+
 class HealthDataProcessor:
     """Main health data processing service"""
     
@@ -79,7 +143,10 @@ class HealthDataProcessor:
         self.db = db_session
         self.data_integration = DataIntegrationService()
         self.processing_rules = self._load_processing_rules()
+        self.validator = BatchValidator.from_processing_rules(self.processing_rules)
         self.anomaly_detectors = self._initialize_anomaly_detectors()
+        self.rollup_store = HealthRollupStore(db_session)
+        self.score_store = HealthScoreStore(db_session)
     
     def _load_processing_rules(self) -> Dict[str, Any]:
         """Load data processing rules and thresholds"""
@@ -145,87 +212,59 @@ class HealthDataProcessor:
             'pattern': self._pattern_anomaly_detection
         }
     
-    async def process_health_data(self, user_id: int, data_points: List[HealthDataPoint], 
-                                stages: List[ProcessingStage] = None) -> ProcessingResult:
-        """Process health data through the complete pipeline"""
+    async def process_health_data(self, user_id: int, data_points: Union[Iterable[HealthDataPoint], AsyncIterator[HealthDataPoint]],
+                                stages: List[ProcessingStage] = None, chunk_size: Optional[int] = None,
+                                concurrency: Optional[Dict[ProcessingStage, int]] = None) -> ProcessingResult:
+        """
+        Process health data through the complete pipeline.
+        
+        Points are streamed through the stages in bounded chunks, so stages
+        overlap and memory stays flat for arbitrarily large sources.
+        
+        Args:
+            user_id: Owner of the data points
+            data_points: Points as a list, iterator or async iterator
+            stages: Stages to run (default: all)
+            chunk_size: Points per chunk (default: settings.processing_chunk_size)
+            concurrency: Chunks processed at once per stage (default: 1)
+        
+        Returns:
+            ProcessingResult with per-stage counters in its metadata
+        """
         if stages is None:
             stages = list(ProcessingStage)
         
         start_time = datetime.utcnow()
-        total_points = len(data_points)
-        valid_points = 0
-        invalid_points = 0
-        errors = []
-        warnings = []
+        totals = QualityTotals()
+        
+        async def collect(chunk: List[HealthDataPoint]) -> None:
+            totals.add(chunk)
         
         try:
-            processed_data = data_points
+            pipeline = self._build_pipeline(user_id, stages, chunk_size, concurrency or {})
+            run = await pipeline.run(data_points, sink=collect)
             
-            # Stage 1: Ingestion
-            if ProcessingStage.INGESTION in stages:
-                ingestion_result = await self._ingest_data(user_id, processed_data)
-                processed_data = ingestion_result['data']
-                errors.extend(ingestion_result['errors'])
-                warnings.extend(ingestion_result['warnings'])
-            
-            # Stage 2: Validation
-            if ProcessingStage.VALIDATION in stages:
-                validation_result = await self._validate_data(processed_data)
-                processed_data = validation_result['valid_data']
-                valid_points = len(processed_data)
-                invalid_points = total_points - valid_points
-                errors.extend(validation_result['errors'])
-                warnings.extend(validation_result['warnings'])
-            
-            # Stage 3: Transformation
-            if ProcessingStage.TRANSFORMATION in stages:
-                transformation_result = await self._transform_data(processed_data)
-                processed_data = transformation_result['data']
-                errors.extend(transformation_result['errors'])
-                warnings.extend(transformation_result['warnings'])
-            
-            # Stage 4: Enrichment
-            if ProcessingStage.ENRICHMENT in stages:
-                enrichment_result = await self._enrich_data(user_id, processed_data)
-                processed_data = enrichment_result['data']
-                errors.extend(enrichment_result['errors'])
-                warnings.extend(enrichment_result['warnings'])
-            
-            # Stage 5: Aggregation
-            if ProcessingStage.AGGREGATION in stages:
-                aggregation_result = await self._aggregate_data(user_id, processed_data)
-                errors.extend(aggregation_result['errors'])
-                warnings.extend(aggregation_result['warnings'])
-            
-            # Stage 6: Analytics
-            if ProcessingStage.ANALYTICS in stages:
-                analytics_result = await self._run_analytics(user_id, processed_data)
-                errors.extend(analytics_result['errors'])
-                warnings.extend(analytics_result['warnings'])
-            
-            # Stage 7: Storage
-            if ProcessingStage.STORAGE in stages:
-                storage_result = await self._store_data(user_id, processed_data)
-                errors.extend(storage_result['errors'])
-                warnings.extend(storage_result['warnings'])
-            
-            processing_time = (datetime.utcnow() - start_time).total_seconds()
-            quality_score = self._calculate_quality_score(processed_data, valid_points, total_points)
+            total_points = run.items_read
+            validation = run.stage(ProcessingStage.VALIDATION.value)
+            valid_points = validation.items_out if validation else 0
+            invalid_points = total_points - valid_points if validation else 0
             
             return ProcessingResult(
-                success=len(errors) == 0,
+                success=len(run.errors) == 0,
                 stage=ProcessingStage.ANALYTICS if ProcessingStage.ANALYTICS in stages else stages[-1],
                 data_points_processed=total_points,
                 data_points_valid=valid_points,
                 data_points_invalid=invalid_points,
-                quality_score=quality_score,
-                processing_time=processing_time,
-                errors=errors,
-                warnings=warnings,
+                quality_score=totals.score(valid_points, total_points),
+                processing_time=(datetime.utcnow() - start_time).total_seconds(),
+                errors=run.errors,
+                warnings=run.warnings,
                 metadata={
                     'stages_completed': stages,
-                    'data_sources': list(set(dp.source for dp in processed_data)),
-                    'data_types': list(set(dp.data_type for dp in processed_data))
+                    'data_sources': list(totals.sources),
+                    'data_types': list(totals.data_types),
+                    'stage_stats': [stats.to_dict() for stats in run.stages],
+                    'messages_dropped': run.dropped_messages
                 }
             )
             
@@ -234,9 +273,9 @@ class HealthDataProcessor:
             return ProcessingResult(
                 success=False,
                 stage=ProcessingStage.INGESTION,
-                data_points_processed=total_points,
+                data_points_processed=totals.count,
                 data_points_valid=0,
-                data_points_invalid=total_points,
+                data_points_invalid=totals.count,
                 quality_score=0.0,
                 processing_time=(datetime.utcnow() - start_time).total_seconds(),
                 errors=[str(e)],
@@ -244,6 +283,39 @@ class HealthDataProcessor:
                 metadata={}
             )
     
+    def _build_pipeline(self, user_id: int, stages: List[ProcessingStage], chunk_size: Optional[int],
+                        concurrency: Dict[ProcessingStage, int]) -> StreamingPipeline:
+        """Chain the requested stages, in pipeline order, over chunks of data points"""
+        profile_cache: Dict[int, Optional[UserHealthProfile]] = {}
+        
+        async def validate(chunk: List[HealthDataPoint]) -> Dict[str, Any]:
+            result = await self._validate_data(chunk)
+            return {'data': result['valid_data'], 'errors': result['errors'], 'warnings': result['warnings']}
+        
+        functions = {
+            ProcessingStage.INGESTION: lambda chunk: self._ingest_data(user_id, chunk),
+            ProcessingStage.VALIDATION: validate,
+            ProcessingStage.TRANSFORMATION: self._transform_data,
+            ProcessingStage.ENRICHMENT: lambda chunk: self._enrich_data(user_id, chunk, profile_cache),
+            ProcessingStage.ANALYTICS: lambda chunk: self._run_analytics(user_id, chunk),
+            ProcessingStage.STORAGE: lambda chunk: self._store_data(
+                user_id, chunk, aggregate=ProcessingStage.AGGREGATION in stages
+            )
+        }
+        
+        # Aggregation merges the rows storage actually wrote, so it runs inside the storage stage
+        if ProcessingStage.AGGREGATION in stages and ProcessingStage.STORAGE not in stages:
+            logger.warning("Aggregation requested without storage; rollups are only built from stored readings")
+        
+        return StreamingPipeline(
+            [
+                Stage(stage.value, functions[stage], concurrency.get(stage, 1))
+                for stage in ProcessingStage if stage in stages and stage in functions
+            ],
+            chunk_size=chunk_size or settings.processing_chunk_size,
+            queue_size=settings.processing_queue_size
+        )
+    
     async def _ingest_data(self, user_id: int, data_points: List[HealthDataPoint]) -> Dict[str, Any]:
         """Ingest and prepare data for processing"""
         errors = []
@@ -283,190 +355,20 @@ class HealthDataProcessor:
         }
     
     async def _validate_data(self, data_points: List[HealthDataPoint]) -> Dict[str, Any]:
-        """Validate data points against quality rules"""
-        errors = []
-        warnings = []
-        valid_data = []
-        
-        for point in data_points:
-            try:
-                validation_result = self._validate_data_point(point)
-                
-                if validation_result['is_valid']:
-                    valid_data.append(point)
-                else:
-                    errors.extend(validation_result['errors'])
-                
-                warnings.extend(validation_result['warnings'])
-                
-            except Exception as e:
-                errors.append(f"Error validating data point: {str(e)}")
-        
-        return {
-            'valid_data': valid_data,
-            'errors': errors,
-            'warnings': warnings
-        }
-    
-    def _validate_data_point(self, point: HealthDataPoint) -> Dict[str, Any]:
-        """Validate a single data point"""
-        errors = []
-        warnings = []
-        is_valid = True
-        
-        # Get validation rules for data type
-        rules = self.processing_rules.get(point.data_type.value, {})
-        
-        if not rules:
-            warnings.append(f"No validation rules found for data type: {point.data_type}")
-            return {'is_valid': True, 'errors': errors, 'warnings': warnings}
-        
-        # Type-specific validation
-        if point.data_type == DataType.HEART_RATE:
-            is_valid, type_errors, type_warnings = self._validate_heart_rate(point, rules)
-            errors.extend(type_errors)
-            warnings.extend(type_warnings)
-        
-        elif point.data_type == DataType.BLOOD_PRESSURE:
-            is_valid, type_errors, type_warnings = self._validate_blood_pressure(point, rules)
-            errors.extend(type_errors)
-            warnings.extend(type_warnings)
-        
-        elif point.data_type == DataType.STEPS:
-            is_valid, type_errors, type_warnings = self._validate_steps(point, rules)
-            errors.extend(type_errors)
-            warnings.extend(type_warnings)
-        
-        elif point.data_type == DataType.SLEEP:
-            is_valid, type_errors, type_warnings = self._validate_sleep(point, rules)
-            errors.extend(type_errors)
-            warnings.extend(type_warnings)
-        
-        elif point.data_type == DataType.WEIGHT:
-            is_valid, type_errors, type_warnings = self._validate_weight(point, rules)
-            errors.extend(type_errors)
-            warnings.extend(type_warnings)
+        """Validate data points against quality rules as one columnar batch"""
+        if not data_points:
+            return {'valid_data': [], 'errors': [], 'warnings': [], 'quality': {}}
         
-        # Confidence validation
-        if point.confidence is not None and point.confidence < 0.5:
-            warnings.append(f"Low confidence data point: {point.confidence}")
+        result = self.validator.validate_points(data_points)
+        errors, warnings = result.messages()
         
         return {
-            'is_valid': is_valid,
+            'valid_data': [data_points[i] for i in result.valid_indices()],
             'errors': errors,
-            'warnings': warnings
+            'warnings': warnings,
+            'quality': result.quality()
         }
     
-    def _validate_heart_rate(self, point: HealthDataPoint, rules: Dict[str, Any]) -> Tuple[bool, List[str], List[str]]:
-        """Validate heart rate data point"""
-        errors = []
-        warnings = []
-        is_valid = True
-        
-        if not isinstance(point.value, (int, float)):
-            errors.append("Heart rate value must be numeric")
-            is_valid = False
-        else:
-            if point.value < rules['min_value'] or point.value > rules['max_value']:
-                errors.append(f"Heart rate {point.value} outside valid range [{rules['min_value']}, {rules['max_value']}]")
-                is_valid = False
-            
-            # Check for statistical outliers
-            if point.value > 120 or point.value < 50:
-                warnings.append(f"Unusual heart rate value: {point.value}")
-        
-        return is_valid, errors, warnings
-    
-    def _validate_blood_pressure(self, point: HealthDataPoint, rules: Dict[str, Any]) -> Tuple[bool, List[str], List[str]]:
-        """Validate blood pressure data point"""
-        errors = []
-        warnings = []
-        is_valid = True
-        
-        if isinstance(point.value, dict):
-            systolic = point.value.get('systolic')
-            diastolic = point.value.get('diastolic')
-            
-            if systolic is None or diastolic is None:
-                errors.append("Blood pressure must have both systolic and diastolic values")
-                is_valid = False
-            else:
-                # Validate systolic
-                if systolic < rules['systolic']['min'] or systolic > rules['systolic']['max']:
-                    errors.append(f"Systolic {systolic} outside valid range")
-                    is_valid = False
-                
-                # Validate diastolic
-                if diastolic < rules['diastolic']['min'] or diastolic > rules['diastolic']['max']:
-                    errors.append(f"Diastolic {diastolic} outside valid range")
-                    is_valid = False
-                
-                # Validate ratio
-                if diastolic > 0 and systolic / diastolic > rules['ratio_threshold']:
-                    warnings.append(f"Unusual blood pressure ratio: {systolic}/{diastolic}")
-        else:
-            errors.append("Blood pressure value must be a dictionary with systolic and diastolic")
-            is_valid = False
-        
-        return is_valid, errors, warnings
-    
-    def _validate_steps(self, point: HealthDataPoint, rules: Dict[str, Any]) -> Tuple[bool, List[str], List[str]]:
-        """Validate steps data point"""
-        errors = []
-        warnings = []
-        is_valid = True
-        
-        if not isinstance(point.value, int):
-            errors.append("Steps value must be an integer")
-            is_valid = False
-        else:
-            if point.value < rules['min_value'] or point.value > rules['max_value']:
-                errors.append(f"Steps {point.value} outside valid range")
-                is_valid = False
-            
-            if point.value > rules['daily_threshold']:
-                warnings.append(f"Unusually high step count: {point.value}")
-        
-        return is_valid, errors, warnings
-    
-    def _validate_sleep(self, point: HealthDataPoint, rules: Dict[str, Any]) -> Tuple[bool, List[str], List[str]]:
-        """Validate sleep data point"""
-        errors = []
-        warnings = []
-        is_valid = True
-        
-        if not isinstance(point.value, (int, float)):
-            errors.append("Sleep value must be numeric")
-            is_valid = False
-        else:
-            # Convert to hours if in minutes
-            hours = point.value / 60 if point.value > 24 else point.value
-            
-            if hours < rules['min_hours'] or hours > rules['max_hours']:
-                errors.append(f"Sleep duration {hours} hours outside valid range")
-                is_valid = False
-            
-            if hours < 4 or hours > 12:
-                warnings.append(f"Unusual sleep duration: {hours} hours")
-        
-        return is_valid, errors, warnings
-    
-    def _validate_weight(self, point: HealthDataPoint, rules: Dict[str, Any]) -> Tuple[bool, List[str], List[str]]:
-        """Validate weight data point"""
-        errors = []
-        warnings = []
-        is_valid = True
-        
-        if not isinstance(point.value, (int, float)):
-            errors.append("Weight value must be numeric")
-            is_valid = False
-        else:
-            if point.value < rules['min_value'] or point.value > rules['max_value']:
-                errors.append(f"Weight {point.value} outside valid range")
-                is_valid = False
-        
-        return is_valid, errors, warnings
-    
     async def _transform_data(self, data_points: List[HealthDataPoint]) -> Dict[str, Any]:
         """Transform data points to standard format"""
         errors = []
@@ -516,20 +418,26 @@ class HealthDataProcessor:
         
         return point
     
-    async def _enrich_data(self, user_id: int, data_points: List[HealthDataPoint]) -> Dict[str, Any]:
-        """Enrich data points with additional context"""
+    async def _enrich_data(self, user_id: int, data_points: List[HealthDataPoint],
+                           profile_cache: Optional[Dict[int, Optional[UserHealthProfile]]] = None) -> Dict[str, Any]:
+        """Enrich data points with additional context; chunks of one run share profile_cache"""
         errors = []
         warnings = []
         enriched_data = []
         
         # Get user health profile for context
-        try:
-            health_profile = self.db.query(UserHealthProfile).filter(
-                UserHealthProfile.user_id == user_id
-            ).first()
-        except Exception as e:
-            errors.append(f"Error fetching health profile: {str(e)}")
-            health_profile = None
+        if profile_cache is not None and user_id in profile_cache:
+            health_profile = profile_cache[user_id]
+        else:
+            try:
+                health_profile = self.db.query(UserHealthProfile).filter(
+                    UserHealthProfile.user_id == user_id
+                ).first()
+            except Exception as e:
+                errors.append(f"Error fetching health profile: {str(e)}")
+                health_profile = None
+            if profile_cache is not None:
+                profile_cache[user_id] = health_profile
         
         for point in data_points:
             try:
@@ -583,35 +491,22 @@ class HealthDataProcessor:
         else:
             return 'fall'
     
-    async def _aggregate_data(self, user_id: int, data_points: List[HealthDataPoint]) -> Dict[str, Any]:
-        """Aggregate data points into metrics"""
+    def _aggregate_data(self, user_id: int, written: List[UpsertedReading]) -> Dict[str, Any]:
+        """Merge stored readings into the metric rollups and refresh the daily aggregations they touch"""
         errors = []
         warnings = []
         
         try:
-            # Group data by type and time period
-            grouped_data = self._group_data_for_aggregation(data_points)
+            merged = merge_written_readings(self.rollup_store, user_id, written, commit=False)
+            
+            ingest = merged['ingest']
+            if ingest and ingest['duplicate']:
+                warnings.append(f"Batch {ingest['batch_key']} already aggregated; skipped")
+            elif ingest and ingest['late_points']:
+                warnings.append(f"{ingest['late_points']} late data points merged into closed daily buckets")
             
-            # Create aggregation records
-            for period, group_data in grouped_data.items():
-                for data_type, points in group_data.items():
-                    try:
-                        metrics = self._calculate_aggregation_metrics(points)
-                        
-                        # Create or update aggregation record
-                        aggregation = HealthMetricsAggregation(
-                            health_profile_id=user_id,  # Assuming 1:1 relationship
-                            aggregation_period='daily',
-                            period_start=period,
-                            period_end=period + timedelta(days=1),
-                            **metrics
-                        )
-                        
-                        # Save to database
-                        self.db.add(aggregation)
-                        
-                    except Exception as e:
-                        errors.append(f"Error aggregating {data_type} for {period}: {str(e)}")
+            errors.extend(self._refresh_daily_aggregations(user_id, merged['touched_days']))
+            self.score_store.mark_dirty(user_id, reason="readings", commit=False)
             
             self.db.commit()
             
@@ -624,55 +519,105 @@ class HealthDataProcessor:
             'warnings': warnings
         }
     
-    def _group_data_for_aggregation(self, data_points: List[HealthDataPoint]) -> Dict[datetime, Dict[str, List[HealthDataPoint]]]:
-        """Group data points by date and type for aggregation"""
-        grouped = defaultdict(lambda: defaultdict(list))
+    def _refresh_daily_aggregations(self, user_id: int, days: List[datetime]) -> List[str]:
+        """Upsert one daily aggregation row per day from that day's rollups"""
+        errors = []
         
-        for point in data_points:
-            date_key = point.timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
-            grouped[date_key][point.data_type.value].append(point)
+        for day in days:
+            try:
+                period_end = day + timedelta(days=1)
+                aggregates = self.rollup_store.summarize(
+                    user_id, day, period_end, granularity=RollupGranularity.DAILY
+                )
+                metrics = self._calculate_aggregation_metrics(aggregates)
+                
+                aggregation = self.db.query(HealthMetricsAggregation).filter(
+                    and_(
+                        HealthMetricsAggregation.health_profile_id == user_id,  # Assuming 1:1 relationship
+                        HealthMetricsAggregation.aggregation_period == 'daily',
+                        HealthMetricsAggregation.period_start == day
+                    )
+                ).first()
+                if aggregation is None:
+                    aggregation = HealthMetricsAggregation(
+                        health_profile_id=user_id,
+                        aggregation_period='daily',
+                        period_start=day,
+                        period_end=period_end
+                    )
+                    self.db.add(aggregation)
+                
+                for field, value in metrics.items():
+                    setattr(aggregation, field, value)
+                
+            except Exception as e:
+                errors.append(f"Error aggregating {day.date()}: {str(e)}")
         
-        return grouped
+        return errors
     
-    def _calculate_aggregation_metrics(self, data_points: List[HealthDataPoint]) -> Dict[str, Any]:
-        """Calculate aggregation metrics for a group of data points"""
+    def _calculate_aggregation_metrics(self, aggregates: Dict[Tuple[str, str], RunningAggregate]) -> Dict[str, Any]:
+        """Calculate aggregation metrics from merged rollups keyed by (data_type, component)"""
         metrics = {}
         
-        if not data_points:
-            return metrics
+        def get(data_type: DataType, component: str = 'value') -> Optional[RunningAggregate]:
+            aggregate = aggregates.get((data_type.value, component))
+            return aggregate if aggregate and aggregate.count else None
+        
+        heart_rate = get(DataType.HEART_RATE)
+        if heart_rate:
+            metrics.update({
+                'avg_heart_rate': heart_rate.mean,
+                'min_heart_rate': heart_rate.minimum,
+                'max_heart_rate': heart_rate.maximum,
+                'resting_heart_rate': heart_rate.minimum  # Assume minimum is resting
+            })
         
-        data_type = data_points[0].data_type
-        values = [p.value for p in data_points if isinstance(p.value, (int, float))]
+        for component in ('systolic', 'diastolic'):
+            pressure = get(DataType.BLOOD_PRESSURE, component)
+            if pressure:
+                metrics.update({
+                    f'avg_blood_pressure_{component}': pressure.mean,
+                    f'min_blood_pressure_{component}': pressure.minimum,
+                    f'max_blood_pressure_{component}': pressure.maximum
+                })
         
-        if not values:
-            return metrics
+        steps = get(DataType.STEPS)
+        if steps:
+            # Rows are daily, so the day's total is also its per-day average
+            metrics.update({
+                'total_steps': int(steps.total),
+                'avg_steps_per_day': steps.total
+            })
         
-        if data_type == DataType.HEART_RATE:
+        sleep = get(DataType.SLEEP)
+        if sleep:
+            # Convert minutes to hours
             metrics.update({
-                'avg_heart_rate': statistics.mean(values),
-                'min_heart_rate': min(values),
-                'max_heart_rate': max(values),
-                'resting_heart_rate': min(values)  # Assume minimum is resting
+                'avg_sleep_hours': sleep.mean / 60,
+                'total_sleep_hours': sleep.total / 60
             })
         
-        elif data_type == DataType.STEPS:
+        weight = get(DataType.WEIGHT)
+        if weight:
             metrics.update({
-                'total_steps': sum(values),
-                'avg_steps_per_day': statistics.mean(values)
+                'avg_weight': weight.mean,
+                'weight_change': weight.change or 0
             })
         
-        elif data_type == DataType.SLEEP:
-            # Convert minutes to hours
-            hours = [v / 60 for v in values]
+        glucose = get(DataType.BLOOD_GLUCOSE)
+        if glucose:
             metrics.update({
-                'avg_sleep_hours': statistics.mean(hours),
-                'total_sleep_hours': sum(hours)
+                'avg_blood_sugar': glucose.mean,
+                'min_blood_sugar': glucose.minimum,
+                'max_blood_sugar': glucose.maximum
             })
         
-        elif data_type == DataType.WEIGHT:
+        temperature = get(DataType.TEMPERATURE)
+        if temperature:
             metrics.update({
-                'avg_weight': statistics.mean(values),
-                'weight_change': values[-1] - values[0] if len(values) > 1 else 0
+                'avg_temperature': temperature.mean,
+                'min_temperature': temperature.minimum,
+                'max_temperature': temperature.maximum
             })
         
         return metrics
@@ -683,11 +628,14 @@ class HealthDataProcessor:
         warnings = []
         
         try:
+            # Build columnar series once for every analytics step
+            series = HealthSeriesSet.from_points(user_id, data_points)
+            
             # Detect anomalies
-            anomalies = await self._detect_anomalies(data_points)
+            anomalies = await self._detect_anomalies(series)
             
             # Calculate trends
-            trends = await self._calculate_trends(data_points)
+            trends = await self._calculate_trends(series)
             
             # Generate insights
             insights = await self._generate_insights(user_id, data_points, trends, anomalies)
@@ -703,63 +651,66 @@ class HealthDataProcessor:
             'warnings': warnings
         }
     
-    async def _detect_anomalies(self, data_points: List[HealthDataPoint]) -> List[AnomalyDetection]:
+    async def _detect_anomalies(self, series_set: HealthSeriesSet) -> List[AnomalyDetection]:
         """Detect anomalies in health data"""
         anomalies = []
         
-        # Group by data type
-        by_type = defaultdict(list)
-        for point in data_points:
-            by_type[point.data_type].append(point)
-        
-        for data_type, points in by_type.items():
-            if len(points) < 3:  # Need at least 3 points for anomaly detection
+        for data_type, series in series_set.items():
+            if len(series) < 3:  # Need at least 3 points for anomaly detection
                 continue
             
-            values = [p.value for p in points if isinstance(p.value, (int, float))]
-            if not values:
-                continue
+            values = series.primary.tolist()
             
             # Statistical anomaly detection
-            stat_anomalies = self._statistical_anomaly_detection(values, points)
+            stat_anomalies = self._statistical_anomaly_detection(values, series)
             anomalies.extend(stat_anomalies)
             
             # Threshold anomaly detection
-            threshold_anomalies = self._threshold_anomaly_detection(values, points, data_type)
+            threshold_anomalies = self._threshold_anomaly_detection(values, series, DataType(data_type))
             anomalies.extend(threshold_anomalies)
         
         return anomalies
     
-    def _statistical_anomaly_detection(self, values: List[float], points: List[HealthDataPoint]) -> List[AnomalyDetection]:
-        """Detect statistical anomalies using z-score"""
+    def _statistical_anomaly_detection(self, values: List[float], series: HealthTimeSeries) -> List[AnomalyDetection]:
+        """Detect statistical anomalies using z-score and median absolute deviation"""
         anomalies = []
         
-        if len(values) < 3:
+        if len(series) < 3:
             return anomalies
         
-        mean = statistics.mean(values)
-        std = statistics.stdev(values)
-        
-        if std == 0:
-            return anomalies
-        
-        for i, value in enumerate(values):
-            z_score = abs((value - mean) / std)
-            
-            if z_score > 2.5:  # Threshold for anomaly
-                anomalies.append(AnomalyDetection(
-                    data_point_id=str(i),
-                    anomaly_type="statistical_outlier",
-                    severity="high" if z_score > 3.0 else "medium",
-                    confidence=min(z_score / 4.0, 1.0),
-                    description=f"Value {value} is {z_score:.2f} standard deviations from mean",
-                    suggested_action="Review data accuracy and consider medical consultation if persistent",
-                    detected_at=datetime.utcnow()
-                ))
+        readings = series.primary
+        z_scores = kernels.zscores(readings)
+        mad_scores = kernels.mad_scores(readings)
+        
+        for i in np.flatnonzero(z_scores > 2.5).tolist():  # Threshold for anomaly
+            z_score = float(z_scores[i])
+            anomalies.append(AnomalyDetection(
+                data_point_id=str(i),
+                anomaly_type="statistical_outlier",
+                severity="high" if z_score > 3.0 else "medium",
+                confidence=min(z_score / 4.0, 1.0),
+                description=f"Value {values[i]} is {z_score:.2f} standard deviations from mean",
+                suggested_action="Review data accuracy and consider medical consultation if persistent",
+                detected_at=datetime.utcnow()
+            ))
+        
+        # Outliers masked by an inflated standard deviation
+        robust_mask = (mad_scores > 3.5) & (z_scores <= 2.5)
+        for i in np.flatnonzero(robust_mask).tolist():
+            mad_score = float(mad_scores[i])
+            anomalies.append(AnomalyDetection(
+                data_point_id=str(i),
+                anomaly_type="robust_outlier",
+                severity="high" if mad_score > 5.0 else "medium",
+                confidence=min(mad_score / 7.0, 1.0),
+                description=f"Value {values[i]} deviates from the median by {mad_score:.2f} robust standard deviations",
+                suggested_action="Review data accuracy and consider medical consultation if persistent",
+                detected_at=datetime.utcnow()
+            ))
         
         return anomalies
-    
-    def _threshold_anomaly_detection(self, values: List[float], points: List[HealthDataPoint], 
+
+    def _threshold_anomaly_detection(self, values: List[float], series: HealthTimeSeries, 
                                    data_type: DataType) -> List[AnomalyDetection]:
         """Detect anomalies based on medical thresholds"""
         anomalies = []
@@ -787,41 +738,31 @@ class HealthDataProcessor:
         
         return anomalies
     
-    def _trend_anomaly_detection(self, values: List[float], points: List[HealthDataPoint]) -> List[AnomalyDetection]:
+    def _trend_anomaly_detection(self, values: List[float], series: HealthTimeSeries) -> List[AnomalyDetection]:
         """Detect trend-based anomalies"""
         # Implementation for trend detection
         return []
     
-    def _pattern_anomaly_detection(self, values: List[float], points: List[HealthDataPoint]) -> List[AnomalyDetection]:
+    def _pattern_anomaly_detection(self, values: List[float], series: HealthTimeSeries) -> List[AnomalyDetection]:
         """Detect pattern-based anomalies"""
         # Implementation for pattern detection
         return []
     
-    async def _calculate_trends(self, data_points: List[HealthDataPoint]) -> Dict[str, Any]:
+    async def _calculate_trends(self, series_set: HealthSeriesSet) -> Dict[str, Any]:
         """Calculate trends in health data"""
         trends = {}
         
-        # Group by data type
-        by_type = defaultdict(list)
-        for point in data_points:
-            by_type[point.data_type].append(point)
-        
-        for data_type, points in by_type.items():
-            if len(points) < 2:
+        for data_type, series in series_set.items():
+            if len(series) < 2:
                 continue
             
-            # Sort by timestamp
-            sorted_points = sorted(points, key=lambda p: p.timestamp)
-            values = [p.value for p in sorted_points if isinstance(p.value, (int, float))]
-            
-            if len(values) < 2:
-                continue
+            values = series.primary
             
             # Calculate linear trend
-            x = list(range(len(values)))
+            x = np.arange(len(values))
             if len(x) > 1:
-                slope, intercept = np.polyfit(x, values, 1)
-                trends[data_type.value] = {
+                slope, intercept, _ = kernels.linear_trend(x, values)
+                trends[data_type] = {
                     'slope': slope,
                     'intercept': intercept,
                     'trend_direction': 'increasing' if slope > 0 else 'decreasing' if slope < 0 else 'stable',
@@ -860,89 +801,40 @@ class HealthDataProcessor:
         
         return insights
     
-    async def _store_data(self, user_id: int, data_points: List[HealthDataPoint]) -> Dict[str, Any]:
-        """Store processed data in database"""
+    async def _store_data(self, user_id: int, data_points: List[HealthDataPoint],
+                          aggregate: bool = False) -> Dict[str, Any]:
+        """Bulk upsert processed data points into health_data on their natural keys, optionally rolling up what was written"""
         errors = []
         warnings = []
+        stored = 0
         
         try:
-            # This would typically store data points in a dedicated table
-            # For now, we'll just log the storage operation
-            logger.info(f"Storing {len(data_points)} processed data points for user {user_id}")
+            written = upsert_readings(self.db, user_id, data_points)
+            self.db.commit()
+            stored = len(written)
+            threshold_monitor.submit_readings(user_id, [(r.data_type, r.point.value, r.timestamp) for r in written])
             
         except Exception as e:
+            self.db.rollback()
             errors.append(f"Error storing data: {str(e)}")
+            written = []
+        
+        if aggregate and written:
+            aggregation = self._aggregate_data(user_id, written)
+            errors.extend(aggregation['errors'])
+            warnings.extend(aggregation['warnings'])
         
         return {
+            'stored': stored,
             'errors': errors,
             'warnings': warnings
         }
     
     def _calculate_quality_score(self, data_points: List[HealthDataPoint], valid_count: int, total_count: int) -> float:
         """Calculate overall data quality score"""
-        if total_count == 0:
-            return 0.0
-        
-        # Base score from validation
-        validation_score = valid_count / total_count
-        
-        # Additional quality factors
-        completeness_score = self._calculate_completeness_score(data_points)
-        consistency_score = self._calculate_consistency_score(data_points)
-        accuracy_score = self._calculate_accuracy_score(data_points)
-        
-        # Weighted average
-        quality_score = (
-            validation_score * 0.4 +
-            completeness_score * 0.2 +
-            consistency_score * 0.2 +
-            accuracy_score * 0.2
-        )
-        
-        return min(quality_score, 1.0)
-    
-    def _calculate_completeness_score(self, data_points: List[HealthDataPoint]) -> float:
-        """Calculate data completeness score"""
-        if not data_points:
-            return 0.0
-        
-        complete_points = sum(1 for p in data_points if p.value is not None and p.timestamp is not None)
-        return complete_points / len(data_points)
-    
-    def _calculate_consistency_score(self, data_points: List[HealthDataPoint]) -> float:
-        """Calculate data consistency score"""
-        if len(data_points) < 2:
-            return 1.0
-        
-        # Check for consistent data types and units
-        data_types = set(p.data_type for p in data_points)
-        units = set(p.unit for p in data_points if p.unit)
-        
-        consistency_score = 1.0
-        
-        # Penalize mixed data types (unless expected)
-        if len(data_types) > 1:
-            consistency_score *= 0.8
-        
-        # Penalize mixed units
-        if len(units) > 1:
-            consistency_score *= 0.9
-        
-        return consistency_score
-    
-    def _calculate_accuracy_score(self, data_points: List[HealthDataPoint]) -> float:
-        """Calculate data accuracy score"""
-        if not data_points:
-            return 0.0
-        
-        # Use confidence scores if available
-        confidence_scores = [p.confidence for p in data_points if p.confidence is not None]
-        
-        if confidence_scores:
-            return statistics.mean(confidence_scores)
-        else:
-            # Default accuracy score
-            return 0.8
+        totals = QualityTotals()
+        totals.add(data_points)
+        return totals.score(valid_count, total_count)
 
 # Global processor instance
 health_data_processor = None
@@ -0,0 +1,261 @@
+"""
+Bulk Health Data Ingestion
+Batch validation, encryption, deduplication and multi-row insertion of health readings
+"""
+
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from datetime import datetime
+from dataclasses import dataclass, field
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, insert
+
+from app.config import settings
+from app.models.health_data import HealthData
+from app.schemas.health_schemas import HealthReadingIn
+from app.services.enhanced.health_rollups import HealthRollupStore
+from app.services.enhanced.health_score_store import HealthScoreStore
+from app.services.threshold_alerts import threshold_monitor
+from app.utils.encryption_utils import encryption_manager
+from app.utils.metrics_registry import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+# Source recorded for readings that do not name one
+DEFAULT_SOURCE = "api"
+
+ReadingKey = Tuple[str, datetime, str]  # (data_type, timestamp, source)
+
+
+class BatchTooLargeError(ValueError):
+    """Raised when a request carries more readings than one batch allows"""
+
+
+@dataclass
+class RejectedReading:
+    """A reading that failed validation"""
+    index: int  # Position in the request
+    error: str
+
+
+@dataclass
+class BulkIngestResult:
+    """Outcome of one bulk ingestion request"""
+    received: int
+    inserted_ids: List[int] = field(default_factory=list)
+    duplicates: int = 0
+    rejected: List[RejectedReading] = field(default_factory=list)
+    data_types: List[str] = field(default_factory=list)
+    elapsed_ms: float = 0.0
+
+    @property
+    def inserted(self) -> int:
+        return len(self.inserted_ids)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'received': self.received,
+            'inserted': self.inserted,
+            'duplicates': self.duplicates,
+            'rejected': len(self.rejected),
+            'errors': [{'index': r.index, 'error': r.error} for r in self.rejected],
+            'data_types': self.data_types,
+            'processing_time_ms': round(self.elapsed_ms, 2)
+        }
+
+
+class HealthDataIngestor:
+    """
+    Writes batches of readings for one user.
+
+    A batch is validated reading by reading (invalid ones are reported,
+    not fatal), deduplicated on (data_type, timestamp, source) within
+    the batch and against stored readings with one range query, then
+    encrypted and written with multi-row ``INSERT ... RETURNING`` in
+    chunks and committed once. Rollups, the score invalidation queue and
+    metrics are each updated once per batch rather than once per reading.
+    """
+
+    def __init__(self, db_session: Session, rollup_store: Optional[HealthRollupStore] = None,
+                 score_store: Optional[HealthScoreStore] = None, chunk_size: Optional[int] = None):
+        self.db = db_session
+        self.rollup_store = rollup_store or HealthRollupStore(db_session)
+        self.score_store = score_store or HealthScoreStore(db_session)
+        self.chunk_size = chunk_size or settings.bulk_ingest_chunk_size
+
+    def ingest(self, user_id: int, readings: Sequence[Dict[str, Any]],
+               default_source: str = DEFAULT_SOURCE) -> BulkIngestResult:
+        """
+        Validate, deduplicate and store a batch of readings.
+
+        Args:
+            user_id: Owner of the readings
+            readings: Raw reading dicts (HealthReadingIn fields)
+            default_source: Source for readings that do not name one
+
+        Returns:
+            BulkIngestResult with inserted ids, duplicate count and rejected readings
+
+        Raises:
+            BatchTooLargeError: If the batch exceeds ``bulk_ingest_max_readings``
+        """
+        started = time.perf_counter()
+        if len(readings) > settings.bulk_ingest_max_readings:
+            raise BatchTooLargeError(f"At most {settings.bulk_ingest_max_readings} readings may be sent per request")
+
+        result = BulkIngestResult(received=len(readings))
+        valid = self._validate(readings, default_source, result)
+        fresh = self._deduplicate(user_id, valid)
+        result.duplicates = len(valid) - len(fresh)
+
+        if fresh:
+            result.inserted_ids = self._insert(user_id, fresh)
+            self.score_store.mark_dirty(user_id, reason="readings", commit=False)
+            self.db.commit()
+            threshold_monitor.submit_readings(user_id, [(r.data_type, r.value, r.timestamp) for r in fresh])
+            self._update_rollups(user_id, fresh, result.inserted_ids)
+            result.data_types = sorted({reading.data_type for reading in fresh})
+
+        metrics_registry.observe_health_data_ingest(result.inserted, result.duplicates, len(result.rejected))
+        result.elapsed_ms = (time.perf_counter() - started) * 1000
+        logger.info(f"Ingested {result.inserted} of {result.received} readings for user {user_id} "
+                    f"({result.duplicates} duplicates, {len(result.rejected)} rejected) "
+                    f"in {result.elapsed_ms:.0f}ms")
+        return result
+
+    def _validate(self, readings: Iterable[Dict[str, Any]], default_source: str,
+                  result: BulkIngestResult) -> List[HealthReadingIn]:
+        valid = []
+        for index, raw in enumerate(readings):
+            try:
+                reading = HealthReadingIn.model_validate(raw)
+            except ValidationError as e:
+                result.rejected.append(RejectedReading(index, "; ".join(error['msg'] for error in e.errors())))
+                continue
+            if reading.source is None:
+                reading.source = default_source
+            valid.append(reading)
+        return valid
+
+    def _deduplicate(self, user_id: int, readings: List[HealthReadingIn]) -> List[HealthReadingIn]:
+        """Drop readings repeated within the batch or already stored."""
+        unique: Dict[ReadingKey, HealthReadingIn] = {}
+        for reading in readings:
+            unique.setdefault((reading.data_type, reading.timestamp, reading.source), reading)
+        if not unique:
+            return []
+
+        timestamps = [key[1] for key in unique]
+        stored = set(self.db.query(HealthData.data_type, HealthData.timestamp, HealthData.source).filter(and_(
+            HealthData.user_id == user_id,
+            HealthData.data_type.in_({key[0] for key in unique}),
+            HealthData.timestamp >= min(timestamps),
+            HealthData.timestamp <= max(timestamps)
+        )).all())
+        return [reading for key, reading in unique.items() if key not in stored]
+
+    def _insert(self, user_id: int, readings: List[HealthReadingIn]) -> List[int]:
+        """Encrypt and insert readings in multi-row chunks, returning their ids in order."""
+        now = datetime.utcnow()
+        encrypt = encryption_manager.encrypt_field
+        rows = [
+            {
+                'user_id': user_id,
+                'data_type': reading.data_type,
+                'value': encrypt(reading.value),
+                'unit': reading.unit,
+                'timestamp': reading.timestamp,
+                'notes': encrypt(reading.notes) if reading.notes else None,
+                'source': reading.source,
+                'confidence': reading.confidence,
+                'reading_key': reading_key(reading.source, reading.data_type, reading.timestamp),
+                'content_hash': content_hash(reading.value, reading.unit, reading.confidence),
+                'created_at': now,
+                'updated_at': now
+            }
+            for reading in readings
+        ]
+
+        ids: List[int] = []
+        statement = insert(HealthData).returning(HealthData.id, sort_by_parameter_order=True)
+        for offset in range(0, len(rows), self.chunk_size):
+            ids.extend(self.db.scalars(statement, rows[offset:offset + self.chunk_size]).all())
+        return ids
+
+    def _update_rollups(self, user_id: int, readings: List[HealthReadingIn], ids: List[int]) -> None:
+        """Merge the batch into the rollups (keyed by its id range, so retries are no-ops)."""
+        try:
+            self.rollup_store.ingest_records(
+                user_id,
+                [(reading.data_type, reading.timestamp, reading.value, reading.unit) for reading in readings],
+                batch_key=f"health_data:{min(ids)}-{max(ids)}"
+            )
+        except Exception as e:
+            self.db.rollback()
+            logger.warning(f"Failed to update health rollups for {len(ids)} readings of user {user_id}: {e}")
+
+
+def reading_key(source: str, data_type: str, timestamp: datetime, source_id: Optional[str] = None) -> str:
+    """
+    Natural key of a reading: the provider's own id when it has one,
+    otherwise its source, type and timestamp.
+    
+    The value is left to ``content_hash``, so a provider revising a
+    reading updates it in place. A source reporting two readings of one
+    type at the same timestamp without ids keeps only the latest.
+    """
+    if source_id:
+        identity = f"{source}|{data_type}|id:{source_id}"
+    else:
+        identity = f"{source}|{data_type}|{timestamp.isoformat()}"
+    return hashlib.sha256(identity.encode()).hexdigest()
+
+
+def content_hash(value: Any, unit: Optional[str] = None, confidence: Optional[float] = None) -> str:
+    """Hash of the mutable part of a reading, to tell a revised reading from a repeated one."""
+    return hashlib.sha1(f"{_canonical(value)}|{unit or ''}|{confidence}".encode()).hexdigest()
+
+
+def _canonical(value: Any) -> str:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return repr(float(value))
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+def parse_readings(body: bytes, content_type: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Parse a bulk request body.
+
+    Accepts NDJSON (one reading per line, for ``application/x-ndjson``),
+    a JSON array of readings, or an object with a ``readings`` array.
+
+    Raises:
+        ValueError: If the body is not one of these shapes
+    """
+    text = body.decode("utf-8")
+    if content_type and "ndjson" in content_type:
+        try:
+            readings = [json.loads(line) for line in text.splitlines() if line.strip()]
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid NDJSON: {e}")
+    else:
+        try:
+            payload = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON: {e}")
+        readings = payload.get("readings") if isinstance(payload, dict) else payload
+
+    if not isinstance(readings, list) or not all(isinstance(reading, dict) for reading in readings):
+        raise ValueError("Expected a list of reading objects")
+    return readings
+
+
+def get_health_data_ingestor(db_session: Session) -> HealthDataIngestor:
+    """Create a bulk health data ingestor bound to a database session"""
+    return HealthDataIngestor(db_session)
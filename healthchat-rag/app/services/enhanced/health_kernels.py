@@ -0,0 +1,295 @@
+"""
+Health Time-Series Kernels
+Vectorized NumPy kernels for trend, pattern and anomaly detection over columnar health series
+"""
+
+import logging
+from typing import NamedTuple, Tuple, Union, Sequence
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ArrayLike = Union[np.ndarray, Sequence[float]]
+
+# Scale factor making the MAD a consistent estimator of the standard deviation
+MAD_SCALE = 0.6745
+
+
+class LinearFit(NamedTuple):
+    """Ordinary least squares fit of y on x."""
+    slope: float
+    intercept: float
+    r_value: float
+
+    @property
+    def r_squared(self) -> float:
+        return self.r_value ** 2
+
+
+def linear_trend(x: ArrayLike, y: ArrayLike) -> LinearFit:
+    """
+    Fit y = slope * x + intercept by ordinary least squares.
+
+    Equivalent to scipy.stats.linregress without the p-value and standard
+    error, which no caller uses.
+
+    Args:
+        x: Independent variable (e.g. elapsed days)
+        y: Dependent variable
+
+    Returns:
+        LinearFit; r_value is NaN when x or y is constant
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    dx = x - x.mean()
+    dy = y - y.mean()
+    sxx = np.dot(dx, dx)
+    syy = np.dot(dy, dy)
+    sxy = np.dot(dx, dy)
+
+    slope = sxy / sxx if sxx > 0 else 0.0
+    intercept = y.mean() - slope * x.mean()
+    denom = np.sqrt(sxx * syy)
+    r_value = float(np.clip(sxy / denom, -1.0, 1.0)) if denom > 0 else float("nan")
+    return LinearFit(float(slope), float(intercept), r_value)
+
+
+def centered_moving_mean(values: ArrayLike, half_window: int) -> np.ndarray:
+    """
+    Mean of values[i - half_window : i + half_window + 1] for every i.
+
+    Windows are truncated at the edges. Runs in O(n) using a cumulative sum.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n == 0:
+        return values.copy()
+    cumsum = np.concatenate(([0.0], np.cumsum(values)))
+    index = np.arange(n)
+    lo = np.maximum(index - half_window, 0)
+    hi = np.minimum(index + half_window + 1, n)
+    return (cumsum[hi] - cumsum[lo]) / (hi - lo)
+
+
+def zscores(values: ArrayLike) -> np.ndarray:
+    """
+    Absolute z-score of every value against the whole sample.
+
+    Uses the sample standard deviation (ddof=1); returns zeros when the
+    values are constant.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) < 2:
+        return np.zeros_like(values)
+    std = values.std(ddof=1)
+    if std == 0:
+        return np.zeros_like(values)
+    return np.abs(values - values.mean()) / std
+
+
+def rolling_zscores(values: ArrayLike, half_window: int) -> np.ndarray:
+    """
+    Absolute deviation from the centered moving mean, in sample standard deviations.
+
+    Measures how far each reading departs from its local level, so slow
+    drifts are not reported as spikes. Returns zeros when the values are
+    constant.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) < 2:
+        return np.zeros_like(values)
+    std = values.std(ddof=1)
+    if std == 0:
+        return np.zeros_like(values)
+    return np.abs(values - centered_moving_mean(values, half_window)) / std
+
+
+def mad_scores(values: ArrayLike) -> np.ndarray:
+    """
+    Absolute modified z-scores based on the median absolute deviation.
+
+    Robust to the outliers being detected: a handful of extreme readings
+    barely move the median or the MAD. Returns zeros when more than half of
+    the values are identical.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if not len(values):
+        return values.copy()
+    median = np.median(values)
+    deviations = np.abs(values - median)
+    mad = np.median(deviations)
+    if mad == 0:
+        return np.zeros_like(values)
+    return MAD_SCALE * deviations / mad
+
+
+def mad_outliers(values: ArrayLike, threshold: float = 3.5) -> np.ndarray:
+    """Indices of values whose modified z-score exceeds threshold."""
+    return np.flatnonzero(mad_scores(values) > threshold)
+
+
+def percentile_rank(value: Union[float, ArrayLike], data: ArrayLike, assume_sorted: bool = False) -> Union[float, np.ndarray]:
+    """
+    Percentage of data strictly below value.
+
+    Args:
+        value: Value or array of values to rank
+        data: Reference sample
+        assume_sorted: Skip sorting when data is already ascending
+
+    Returns:
+        Percentile in [0, 100] (50.0 when data is empty)
+    """
+    data = np.asarray(data, dtype=np.float64)
+    if not len(data):
+        return 50.0 if np.isscalar(value) else np.full(np.shape(value), 50.0)
+    if not assume_sorted:
+        data = np.sort(data)
+    ranks = np.searchsorted(data, value, side="left") / len(data) * 100
+    return float(ranks) if np.isscalar(value) else ranks
+
+
+def autocorrelation(values: ArrayLike, demean: bool = False) -> np.ndarray:
+    """
+    Autocorrelation at lags 0..n-1 via FFT, in O(n log n).
+
+    Matches ``np.correlate(values, values, mode='full')[n - 1:]``, which is
+    O(n^2). Zero-padding to at least 2n avoids circular wrap-around.
+
+    Args:
+        values: Evenly spaced samples
+        demean: Subtract the mean first (autocovariance)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n == 0:
+        return values.copy()
+    if demean:
+        values = values - values.mean()
+    size = 1 << int(2 * n - 1).bit_length()
+    spectrum = np.fft.rfft(values, size)
+    return np.fft.irfft(spectrum * np.conj(spectrum), size)[:n]
+
+
+def local_maxima(values: ArrayLike) -> np.ndarray:
+    """Indices of interior points strictly greater than both neighbours."""
+    values = np.asarray(values)
+    if len(values) < 3:
+        return np.empty(0, dtype=np.intp)
+    middle = values[1:-1]
+    return np.flatnonzero((middle > values[:-2]) & (middle > values[2:])) + 1
+
+
+def weekday_means(weekdays: ArrayLike, values: ArrayLike) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Mean value per day of week via bincount.
+
+    Args:
+        weekdays: Day of week per reading (Monday=0)
+        values: Readings
+
+    Returns:
+        (means, counts) arrays of length 7; means are NaN for days without readings
+    """
+    weekdays = np.asarray(weekdays, dtype=np.intp)
+    values = np.asarray(values, dtype=np.float64)
+    counts = np.bincount(weekdays, minlength=7)
+    sums = np.bincount(weekdays, weights=values, minlength=7)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / counts
+    return means, counts
+
+
+def weekly_seasonality(weekdays: ArrayLike, values: ArrayLike) -> float:
+    """
+    Sample variance of the seven weekday means.
+
+    Returns NaN unless every day of the week has at least one reading.
+    """
+    means, counts = weekday_means(weekdays, values)
+    if np.any(counts == 0):
+        return float("nan")
+    return float(means.var(ddof=1))
+
+
+def lttb(x: ArrayLike, y: ArrayLike, threshold: int) -> np.ndarray:
+    """
+    Indices kept by Largest-Triangle-Three-Buckets downsampling.
+
+    The first and last points are always kept; the interior is split into
+    threshold - 2 buckets and from each the point forming the largest
+    triangle with the previously kept point and the next bucket's mean is
+    kept. Peaks and troughs survive, unlike striding or bucket averaging.
+
+    Args:
+        x: Sorted positions (e.g. epoch seconds)
+        y: Values
+        threshold: Points to keep
+
+    Returns:
+        Sorted indices into x and y (all indices if len(x) <= threshold)
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # threshold - 2 interior buckets; edges strictly increase because threshold < n
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.intp)
+    keep = np.empty(threshold, dtype=np.intp)
+    keep[0], keep[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_lo, next_hi = hi, edges[bucket + 2]
+            cx, cy = x[next_lo:next_hi].mean(), y[next_lo:next_hi].mean()
+        else:
+            cx, cy = x[-1], y[-1]
+        ax, ay = x[previous], y[previous]
+        area = np.abs((ax - cx) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (cy - ay))
+        previous = lo + int(np.argmax(area))
+        keep[bucket + 1] = previous
+    return keep
+
+
+def pairwise_correlation(matrix: ArrayLike, min_periods: int = 2) -> np.ndarray:
+    """
+    Pearson correlation between columns over the rows where both are present.
+
+    Missing values are NaN. A complete matrix goes straight to
+    ``np.corrcoef``; otherwise the pairwise-complete sums for every pair
+    come from three matrix products, so no Python loop over pairs.
+
+    Args:
+        matrix: (observations, variables) array
+        min_periods: Fewest shared observations for a defined correlation
+
+    Returns:
+        (variables, variables) array; NaN where undefined (too few shared
+        observations or a constant column)
+    """
+    values = np.asarray(matrix, dtype=np.float64)
+    k = values.shape[1] if values.ndim == 2 else 0
+    present = ~np.isnan(values)
+
+    if present.all() and len(values) >= min_periods:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result = np.atleast_2d(np.corrcoef(values, rowvar=False))
+        return np.clip(result, -1.0, 1.0)
+
+    weights = present.astype(np.float64)
+    filled = np.where(present, values, 0.0)
+    count = weights.T @ weights
+    sums = filled.T @ weights  # sums[i, j]: sum of column i where j is present
+    squares = (filled * filled).T @ weights
+    products = filled.T @ filled
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        covariance = count * products - sums * sums.T
+        variance = count * squares - sums * sums
+        result = covariance / np.sqrt(variance * variance.T)
+    result[(count < min_periods) | (variance <= 0) | (variance.T <= 0)] = np.nan
+    return np.clip(result, -1.0, 1.0).reshape(k, k)
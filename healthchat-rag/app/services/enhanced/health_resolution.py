@@ -0,0 +1,270 @@
+"""
+Resolution-Aware Series Queries
+Time-series reads bounded by a point budget, from raw readings or precomputed rollup tiers
+"""
+
+import logging
+from typing import Any, Dict, List, Optional, Union
+from datetime import datetime, timedelta
+from enum import Enum
+import numpy as np
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, func
+
+from app.config import settings
+from app.models.health_data import HealthData
+from app.services.enhanced import health_kernels as kernels
+from app.services.enhanced.data_integration import DataType
+from app.services.enhanced.health_rollups import (
+    HealthRollupStore, RollupGranularity, bucket_end, bucket_start, rollups_backfilled
+)
+from app.services.enhanced.health_timeseries import HealthSeriesSet, HealthTimeSeries, components_for
+
+logger = logging.getLogger(__name__)
+
+# Rollup tiers, finest first, with their nominal bucket width
+TIER_WIDTHS = {
+    RollupGranularity.HOURLY: timedelta(hours=1),
+    RollupGranularity.DAILY: timedelta(days=1),
+    RollupGranularity.WEEKLY: timedelta(weeks=1),
+    RollupGranularity.MONTHLY: timedelta(days=31),
+}
+
+
+class ResolutionMode(str, Enum):
+    """How a series is reduced to the point budget"""
+    BUCKETS = "buckets"  # count, mean, min and max per time bucket
+    LTTB = "lttb"  # representative points chosen by LTTB
+
+
+class SeriesResolutionService:
+    """
+    Serves a metric's time series at a bounded resolution.
+
+    A request gives a point budget or an explicit bucket size. Windows
+    with no more raw readings than the budget come back raw. Otherwise,
+    if the window holds at most ``series_raw_scan_limit`` readings, they
+    are reduced in NumPy (even buckets or LTTB); beyond that, the finest
+    rollup tier whose bucket count fits is read instead, so neither the
+    scan nor the response grows with the number of raw readings. Until
+    the rollup backfill has completed, rollups may miss older readings,
+    so every request is served from readings.
+    """
+
+    def __init__(self, db_session: Session, rollup_store: Optional[HealthRollupStore] = None,
+                 raw_scan_limit: Optional[int] = None):
+        self.db = db_session
+        self.rollup_store = rollup_store or HealthRollupStore(db_session)
+        self.raw_scan_limit = raw_scan_limit if raw_scan_limit is not None else settings.series_raw_scan_limit
+        self._rollups_ready: Optional[bool] = None
+    
+    @property
+    def rollups_ready(self) -> bool:
+        """Whether rollups cover every stored reading."""
+        if self._rollups_ready is None:
+            self._rollups_ready = rollups_backfilled(self.db)
+            if not self._rollups_ready:
+                logger.warning("Rollups have not been backfilled from stored readings; serving series from readings")
+        return self._rollups_ready
+
+    def get_series(self, user_id: int, data_type: Union[str, DataType], start: datetime, end: datetime,
+                   max_points: Optional[int] = None, bucket: Optional[Union[str, int]] = None,
+                   mode: Union[str, ResolutionMode] = ResolutionMode.BUCKETS,
+                   component: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Read one metric over [start, end) at a bounded resolution.
+
+        Args:
+            user_id: User ID
+            data_type: Metric to read
+            start: Window start (inclusive)
+            end: Window end (exclusive)
+            max_points: Point budget (default ``series_default_points``, capped at ``series_max_points``)
+            bucket: Explicit bucket size: a rollup granularity (hourly, daily, weekly,
+                monthly) or a width in seconds; overrides max_points
+            mode: buckets (count/mean/min/max per bucket) or lttb (representative points)
+            component: Component of multi-valued readings (default: the primary one)
+
+        Returns:
+            Dict with the resolution and source used, total raw readings and the points
+
+        Raises:
+            ValueError: If the bucket size is invalid or yields too many buckets
+        """
+        data_type = data_type.value if isinstance(data_type, DataType) else str(data_type)
+        mode = ResolutionMode(mode)
+        component = component or components_for(data_type)[0]
+        max_points = min(max_points or settings.series_default_points, settings.series_max_points)
+        total = self._count(user_id, data_type, start, end)
+
+        result = {
+            'data_type': data_type,
+            'component': component,
+            'mode': mode.value,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'total_points': total
+        }
+
+        if bucket is not None:
+            granularity = _granularity(bucket)
+            if granularity is not None and self.rollups_ready:
+                result.update(self._from_rollups(user_id, data_type, component, start, end, granularity))
+            elif granularity is not None:
+                # Nominal tier width from the start of the bucket the window starts in
+                result.update(self._from_readings(self._load(user_id, data_type, component, start, end),
+                                                  bucket_start(start, granularity), TIER_WIDTHS[granularity],
+                                                  ResolutionMode.BUCKETS))
+                result['resolution'] = granularity.value
+            else:
+                width = timedelta(seconds=int(bucket))
+                if width.total_seconds() <= 0 or (end - start) / width > settings.series_max_points:
+                    raise ValueError(f"Bucket size {bucket} must yield between 1 and {settings.series_max_points} buckets")
+                if total > self.raw_scan_limit and self.rollups_ready:
+                    # Too many readings to scan: serve the finest tier at least this coarse
+                    tiers = [g for g, w in TIER_WIDTHS.items() if w >= width and self._tier_available(g, start)]
+                    granularity = tiers[0] if tiers else RollupGranularity.MONTHLY
+                    result.update(self._from_rollups(user_id, data_type, component, start, end, granularity))
+                else:
+                    result.update(self._from_readings(self._load(user_id, data_type, component, start, end),
+                                                      start, width, ResolutionMode.BUCKETS))
+            return result
+
+        if total <= max_points:
+            series = self._load(user_id, data_type, component, start, end)
+            result.update({'resolution': 'raw', 'source': 'readings', 'points': _raw_points(*series)})
+        elif total <= self.raw_scan_limit or not self.rollups_ready:
+            width = _even_width(start, end, max_points)
+            result.update(self._from_readings(self._load(user_id, data_type, component, start, end),
+                                              start, width, mode, max_points))
+        else:
+            granularity = self._tier_for(start, end, max_points)
+            result.update(self._from_rollups(user_id, data_type, component, start, end, granularity, mode, max_points))
+        return result
+
+    def _count(self, user_id: int, data_type: str, start: datetime, end: datetime) -> int:
+        return self.db.query(func.count(HealthData.id)).filter(and_(
+            HealthData.user_id == user_id,
+            HealthData.data_type == data_type,
+            HealthData.timestamp >= start,
+            HealthData.timestamp < end
+        )).scalar() or 0
+
+    def _load(self, user_id: int, data_type: str, component: str, start: datetime, end: datetime):
+        """(timestamps, values) of one component's raw readings."""
+        series = HealthSeriesSet.load(self.db, user_id, start, end, data_types=[data_type]).get(data_type)
+        if series is None:
+            series = HealthTimeSeries.empty(user_id, data_type)
+            return series.timestamps, series.primary
+        return series.timestamps, series.component(component)
+
+    def _tier_for(self, start: datetime, end: datetime, max_points: int) -> RollupGranularity:
+        """Finest available rollup tier with at most max_points buckets in the window."""
+        for granularity, width in TIER_WIDTHS.items():
+            if self._tier_available(granularity, start) and (end - start) / width <= max_points:
+                return granularity
+        return RollupGranularity.MONTHLY
+
+    def _tier_available(self, granularity: RollupGranularity, start: datetime) -> bool:
+        """Whether the store keeps this tier as far back as start."""
+        if granularity not in self.rollup_store.granularities:
+            return False
+        return granularity != RollupGranularity.HOURLY or \
+            start >= datetime.utcnow() - self.rollup_store.hourly_retention
+
+    def _from_readings(self, series, start: datetime, width: timedelta, mode: ResolutionMode,
+                       max_points: Optional[int] = None) -> Dict[str, Any]:
+        timestamps, values = series
+        if mode == ResolutionMode.LTTB:
+            keep = kernels.lttb(timestamps.astype(np.int64), values, max_points)
+            return {'resolution': f'lttb:{len(keep)}', 'source': 'readings',
+                    'points': _raw_points(timestamps[keep], values[keep])}
+        return {'resolution': f'{int(width.total_seconds())}s', 'source': 'readings',
+                'points': bucket_points(timestamps, values, start, width)}
+
+    def _from_rollups(self, user_id: int, data_type: str, component: str, start: datetime, end: datetime,
+                      granularity: RollupGranularity, mode: ResolutionMode = ResolutionMode.BUCKETS,
+                      max_points: Optional[int] = None) -> Dict[str, Any]:
+        # Buckets are calendar-aligned; include the one the window starts in
+        rows = [
+            row for row in self.rollup_store.get_rollups(user_id, granularity, bucket_start(start, granularity),
+                                                         end, [data_type])
+            if row.component == component and row.count
+        ]
+        if mode == ResolutionMode.LTTB:
+            timestamps = np.array([row.bucket_start for row in rows], dtype="datetime64[s]")
+            means = np.array([row.total / row.count for row in rows], dtype=np.float64)
+            keep = kernels.lttb(timestamps.astype(np.int64), means, max_points)
+            return {'resolution': f'{granularity.value}+lttb:{len(keep)}', 'source': 'rollups',
+                    'points': _raw_points(timestamps[keep], means[keep])}
+
+        return {'resolution': granularity.value, 'source': 'rollups', 'points': [
+            {
+                'start': row.bucket_start.isoformat(),
+                'end': bucket_end(row.bucket_start, granularity).isoformat(),
+                'count': row.count,
+                'mean': row.total / row.count,
+                'min': row.minimum,
+                'max': row.maximum
+            }
+            for row in rows
+        ]}
+
+
+def bucket_points(timestamps: np.ndarray, values: np.ndarray, start: datetime,
+                  width: timedelta) -> List[Dict[str, Any]]:
+    """
+    Count, mean, min and max of sorted readings per fixed-width bucket.
+
+    Empty buckets are omitted.
+    """
+    if not len(timestamps):
+        return []
+    width_seconds = int(width.total_seconds())
+    origin = np.datetime64(start, "s")
+    index = (timestamps - origin).astype(np.int64) // width_seconds
+    starts = np.flatnonzero(np.r_[True, np.diff(index) != 0])
+    counts = np.diff(np.r_[starts, len(index)])
+    means = np.add.reduceat(values, starts) / counts
+    minimums = np.minimum.reduceat(values, starts)
+    maximums = np.maximum.reduceat(values, starts)
+    bucket_starts = origin + (index[starts] * width_seconds).astype("timedelta64[s]")
+
+    return [
+        {
+            'start': begin.isoformat(),
+            'end': (begin + width).isoformat(),
+            'count': count,
+            'mean': mean,
+            'min': minimum,
+            'max': maximum
+        }
+        for begin, count, mean, minimum, maximum in zip(
+            bucket_starts.astype(datetime).tolist(), counts.tolist(), means.tolist(),
+            minimums.tolist(), maximums.tolist()
+        )
+    ]
+
+
+def _raw_points(timestamps: np.ndarray, values: np.ndarray) -> List[Dict[str, Any]]:
+    return [
+        {'timestamp': ts.isoformat(), 'value': value}
+        for ts, value in zip(timestamps.astype(datetime).tolist(), values.tolist())
+    ]
+
+
+def _even_width(start: datetime, end: datetime, max_points: int) -> timedelta:
+    """Smallest whole-second bucket width giving at most max_points buckets."""
+    seconds = (end - start).total_seconds()
+    return timedelta(seconds=max(1, int(np.ceil(seconds / max_points))))
+
+
+def _granularity(bucket: Union[str, int]) -> Optional[RollupGranularity]:
+    if isinstance(bucket, str) and not bucket.isdigit():
+        return RollupGranularity(bucket)
+    return None
+
+
+def get_series_resolution_service(db_session: Session) -> SeriesResolutionService:
+    """Create a series resolution service bound to a database session"""
+    return SeriesResolutionService(db_session)
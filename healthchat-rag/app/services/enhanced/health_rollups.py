@@ -0,0 +1,631 @@
+"""
+Streaming Health Metric Rollups
+Mergeable hourly, daily, weekly and monthly aggregates maintained in place on every ingest
+"""
+
+import hashlib
+import logging
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
+from datetime import datetime, timedelta
+from dataclasses import dataclass, field
+from enum import Enum
+from collections import defaultdict
+import numpy as np
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import and_, distinct, func
+
+from app.config import settings
+from app.models.health_data import HealthData
+from app.models.enhanced_health_models import EtlWatermark, HealthMetricRollup, HealthRollupBatch
+from app.services.enhanced.data_integration import DataType
+from app.services.enhanced.health_timeseries import HealthSeriesSet, HealthTimeSeries
+from app.utils.sketches import TDigest
+
+logger = logging.getLogger(__name__)
+
+# EtlWatermark job tracking the backfill of rollups from readings stored before ingest maintained them
+BACKFILL_JOB_ID = "health_rollups_backfill"
+
+
+class RollupGranularity(str, Enum):
+    """Rollup bucket sizes"""
+    HOURLY = "hourly"
+    DAILY = "daily"
+    WEEKLY = "weekly"
+    MONTHLY = "monthly"
+
+
+class RollupKey(NamedTuple):
+    """Identity of one rollup bucket for one user"""
+    data_type: str
+    component: str
+    granularity: str
+    bucket_start: datetime
+
+
+def bucket_starts(timestamps: np.ndarray, granularity: Union[str, RollupGranularity]) -> np.ndarray:
+    """
+    Start of the enclosing bucket for every timestamp.
+
+    Weeks start on Monday, months on the 1st.
+
+    Args:
+        timestamps: datetime64 array
+        granularity: Bucket size
+
+    Returns:
+        datetime64[s] array
+    """
+    granularity = RollupGranularity(granularity)
+    if granularity == RollupGranularity.HOURLY:
+        starts = timestamps.astype("datetime64[h]")
+    elif granularity == RollupGranularity.DAILY:
+        starts = timestamps.astype("datetime64[D]")
+    elif granularity == RollupGranularity.WEEKLY:
+        days = timestamps.astype("datetime64[D]")
+        # 1970-01-01 was a Thursday
+        weekday = (days.astype(np.int64) + 3) % 7
+        starts = days - weekday.astype("timedelta64[D]")
+    else:
+        starts = timestamps.astype("datetime64[M]")
+    return starts.astype("datetime64[s]")
+
+
+def bucket_start(timestamp: datetime, granularity: Union[str, RollupGranularity]) -> datetime:
+    """Start of the bucket containing a timestamp."""
+    return bucket_starts(np.array([timestamp], dtype="datetime64[s]"), granularity)[0].astype(datetime)
+
+
+def bucket_end(start: datetime, granularity: Union[str, RollupGranularity]) -> datetime:
+    """End (exclusive) of the bucket starting at start."""
+    granularity = RollupGranularity(granularity)
+    if granularity == RollupGranularity.HOURLY:
+        return start + timedelta(hours=1)
+    if granularity == RollupGranularity.DAILY:
+        return start + timedelta(days=1)
+    if granularity == RollupGranularity.WEEKLY:
+        return start + timedelta(days=7)
+    return (start.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+@dataclass
+class RunningAggregate:
+    """
+    Mergeable summary of a set of readings.
+
+    Count, sum, sum of squares, min and max merge exactly; the t-digest
+    merges approximately. First/last readings keep changes over a bucket
+    (e.g. weight change) computable without raw data.
+    """
+    count: int = 0
+    total: float = 0.0
+    total_sq: float = 0.0
+    minimum: Optional[float] = None
+    maximum: Optional[float] = None
+    first_timestamp: Optional[datetime] = None
+    first_value: Optional[float] = None
+    last_timestamp: Optional[datetime] = None
+    last_value: Optional[float] = None
+    digest: TDigest = field(default_factory=TDigest)
+
+    @classmethod
+    def from_values(cls, timestamps: np.ndarray, values: np.ndarray) -> "RunningAggregate":
+        """Summarize time-sorted readings."""
+        if not len(values):
+            return cls()
+        return cls(
+            count=int(len(values)),
+            total=float(values.sum()),
+            total_sq=float(np.dot(values, values)),
+            minimum=float(values.min()),
+            maximum=float(values.max()),
+            first_timestamp=timestamps[0].astype(datetime),
+            first_value=float(values[0]),
+            last_timestamp=timestamps[-1].astype(datetime),
+            last_value=float(values[-1]),
+            digest=TDigest().update(values),
+        )
+
+    @classmethod
+    def from_row(cls, row: HealthMetricRollup) -> "RunningAggregate":
+        """Load the aggregate stored on a rollup row."""
+        return cls(
+            count=row.count or 0,
+            total=row.total or 0.0,
+            total_sq=row.total_sq or 0.0,
+            minimum=row.minimum,
+            maximum=row.maximum,
+            first_timestamp=row.first_timestamp,
+            first_value=row.first_value,
+            last_timestamp=row.last_timestamp,
+            last_value=row.last_value,
+            digest=TDigest.from_dict(row.digest),
+        )
+
+    def apply_to_row(self, row: HealthMetricRollup) -> HealthMetricRollup:
+        """Write this aggregate onto a rollup row."""
+        row.count = self.count
+        row.total = self.total
+        row.total_sq = self.total_sq
+        row.minimum = self.minimum
+        row.maximum = self.maximum
+        row.first_timestamp = self.first_timestamp
+        row.first_value = self.first_value
+        row.last_timestamp = self.last_timestamp
+        row.last_value = self.last_value
+        row.digest = self.digest.to_dict()
+        return row
+
+    def merge(self, other: "RunningAggregate") -> "RunningAggregate":
+        """Merge another aggregate into this one (order independent)."""
+        if not other.count:
+            return self
+        if not self.count:
+            self.minimum, self.maximum = other.minimum, other.maximum
+            self.first_timestamp, self.first_value = other.first_timestamp, other.first_value
+            self.last_timestamp, self.last_value = other.last_timestamp, other.last_value
+        else:
+            self.minimum = min(self.minimum, other.minimum)
+            self.maximum = max(self.maximum, other.maximum)
+            if other.first_timestamp < self.first_timestamp:
+                self.first_timestamp, self.first_value = other.first_timestamp, other.first_value
+            if other.last_timestamp >= self.last_timestamp:
+                self.last_timestamp, self.last_value = other.last_timestamp, other.last_value
+        self.count += other.count
+        self.total += other.total
+        self.total_sq += other.total_sq
+        self.digest.merge(other.digest)
+        return self
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    @property
+    def variance(self) -> Optional[float]:
+        """Sample variance (None for fewer than two readings)."""
+        if self.count < 2:
+            return None
+        return max(self.total_sq - self.total * self.total / self.count, 0.0) / (self.count - 1)
+
+    @property
+    def std(self) -> Optional[float]:
+        variance = self.variance
+        return variance ** 0.5 if variance is not None else None
+
+    @property
+    def change(self) -> Optional[float]:
+        """Last reading minus first reading."""
+        return self.last_value - self.first_value if self.count else None
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Approximate quantile from the t-digest."""
+        return self.digest.quantile(q) if self.count else None
+
+    def to_dict(self) -> Dict[str, Optional[float]]:
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'mean': self.mean,
+            'std': self.std,
+            'min': self.minimum,
+            'max': self.maximum,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+        }
+
+
+class HealthRollupStore:
+    """
+    Maintains health metric rollups in the database.
+
+    Ingest merges each batch into existing buckets with one read and one
+    write per touched bucket. Readings arriving after their bucket closed
+    merge the same way (the aggregates are order independent) and are
+    counted in ``late_count``. Each batch is recorded under a content key,
+    so replaying a batch is a no-op.
+    """
+
+    def __init__(self, db_session: Session,
+                 granularities: Sequence[RollupGranularity] = tuple(RollupGranularity),
+                 hourly_retention_days: Optional[int] = None):
+        self.db = db_session
+        self.granularities = [RollupGranularity(g) for g in granularities]
+        self.hourly_retention = timedelta(
+            days=hourly_retention_days if hourly_retention_days is not None else settings.rollup_hourly_retention_days
+        )
+
+    # Ingest
+
+    def ingest(self, user_id: int, series_set: HealthSeriesSet, batch_key: Optional[str] = None,
+               now: Optional[datetime] = None, commit: bool = True) -> Dict[str, object]:
+        """
+        Merge a batch of readings into the rollups.
+
+        Args:
+            user_id: User ID
+            series_set: Readings to merge
+            batch_key: Idempotency key (defaults to a hash of the readings)
+            now: Ingest time, for late-data accounting
+            commit: Commit the transaction (otherwise only flush)
+
+        Returns:
+            Dict with batch_key, duplicate flag, points, late_points,
+            buckets_created, buckets_updated and touched bucket starts per granularity
+        """
+        now = now or datetime.utcnow()
+        batch_key = batch_key or self.batch_key_for(series_set)
+        result = {
+            'batch_key': batch_key,
+            'duplicate': False,
+            'points': series_set.total_points,
+            'late_points': 0,
+            'buckets_created': 0,
+            'buckets_updated': 0,
+            'touched': {},
+        }
+        if not series_set.total_points:
+            return result
+
+        for attempt in range(2):
+            if self._batch_seen(user_id, batch_key):
+                result['duplicate'] = True
+                return result
+
+            partials = self.build_partials(series_set, now)
+            try:
+                # A savepoint, so a conflict never discards the caller's pending work when commit=False
+                with self.db.begin_nested():
+                    created, updated = self._merge_partials(user_id, partials)
+                    self.db.add(HealthRollupBatch(
+                        user_id=user_id, batch_key=batch_key, point_count=series_set.total_points
+                    ))
+                break
+            except IntegrityError:
+                # A concurrent ingest created one of our buckets (or the same batch) first
+                if attempt:
+                    raise
+                logger.info(f"Retrying rollup ingest for user {user_id} after concurrent insert")
+        
+        if commit:
+            self.db.commit()
+
+        touched = defaultdict(set)
+        for key in partials:
+            touched[key.granularity].add(key.bucket_start)
+        result.update({
+            'late_points': self._count_late(series_set, now),
+            'buckets_created': created,
+            'buckets_updated': updated,
+            'touched': {g: sorted(starts) for g, starts in touched.items()},
+        })
+        return result
+
+    def ingest_records(self, user_id: int, records: Iterable[Tuple[Union[str, DataType], datetime, object, Optional[str]]],
+                       batch_key: Optional[str] = None, commit: bool = True) -> Dict[str, object]:
+        """Merge (data_type, timestamp, value, unit) records into the rollups."""
+        return self.ingest(user_id, HealthSeriesSet.from_records(user_id, records), batch_key=batch_key, commit=commit)
+
+    def build_partials(self, series_set: HealthSeriesSet, now: datetime,
+                       windows: Optional[Dict[RollupGranularity, Tuple[datetime, datetime]]] = None
+                       ) -> Dict[RollupKey, Tuple[RunningAggregate, int]]:
+        """
+        Aggregate readings per bucket without touching the database.
+
+        Args:
+            series_set: Readings
+            now: Reference time for late-data accounting and hourly retention
+            windows: Restrict each granularity to [start, end)
+
+        Returns:
+            Mapping of bucket key to (aggregate, number of late readings)
+        """
+        partials = {}
+        for data_type, series in series_set.items():
+            for granularity in self.granularities:
+                window = windows.get(granularity) if windows else None
+                scoped = series.window(*window) if window else series
+                if granularity == RollupGranularity.HOURLY:
+                    scoped = scoped.window(start=now - self.hourly_retention)
+                partials.update(self._bucket_series(scoped, granularity, now))
+        return partials
+
+    def _bucket_series(self, series: HealthTimeSeries, granularity: RollupGranularity,
+                       now: datetime) -> Dict[RollupKey, Tuple[RunningAggregate, int]]:
+        if not len(series):
+            return {}
+
+        # Series are time-sorted, so each bucket is a contiguous slice
+        starts = bucket_starts(series.timestamps, granularity)
+        boundaries = np.flatnonzero(np.concatenate(([True], starts[1:] != starts[:-1])))
+        ends = np.append(boundaries[1:], len(series))
+
+        partials = {}
+        for lo, hi in zip(boundaries.tolist(), ends.tolist()):
+            start = starts[lo].astype(datetime)
+            late = (hi - lo) if bucket_end(start, granularity) <= now else 0
+            for index, component in enumerate(series.components):
+                key = RollupKey(series.data_type, component, granularity.value, start)
+                aggregate = RunningAggregate.from_values(series.timestamps[lo:hi], series.values[lo:hi, index])
+                partials[key] = (aggregate, late)
+        return partials
+
+    @staticmethod
+    def _count_late(series_set: HealthSeriesSet, now: datetime) -> int:
+        """Readings whose day had already ended at ingest time."""
+        day_limit = np.datetime64(now, "s") - np.timedelta64(1, "D")
+        return sum(
+            int(np.count_nonzero(bucket_starts(series.timestamps, RollupGranularity.DAILY) <= day_limit))
+            for _, series in series_set.items()
+        )
+    
+    def _merge_partials(self, user_id: int, partials: Dict[RollupKey, Tuple[RunningAggregate, int]]) -> Tuple[int, int]:
+        existing = self._load_rows(user_id, partials.keys(), for_update=True)
+        created = updated = 0
+        for key, (aggregate, late) in partials.items():
+            row = existing.get(key)
+            if row is None:
+                row = HealthMetricRollup(
+                    user_id=user_id, data_type=key.data_type, component=key.component,
+                    granularity=key.granularity, bucket_start=key.bucket_start,
+                    bucket_end=bucket_end(key.bucket_start, key.granularity),
+                    late_count=late, revision=1
+                )
+                aggregate.apply_to_row(row)
+                self.db.add(row)
+                created += 1
+            else:
+                RunningAggregate.from_row(row).merge(aggregate).apply_to_row(row)
+                row.late_count = (row.late_count or 0) + late
+                row.revision = (row.revision or 0) + 1
+                updated += 1
+        return created, updated
+
+    def _load_rows(self, user_id: int, keys: Iterable[RollupKey], for_update: bool = False) -> Dict[RollupKey, HealthMetricRollup]:
+        """Load existing rows for bucket keys, one query per granularity."""
+        by_granularity = defaultdict(list)
+        for key in keys:
+            by_granularity[key.granularity].append(key)
+
+        rows = {}
+        for granularity, grouped in by_granularity.items():
+            query = self.db.query(HealthMetricRollup).filter(and_(
+                HealthMetricRollup.user_id == user_id,
+                HealthMetricRollup.granularity == granularity,
+                HealthMetricRollup.data_type.in_(sorted({key.data_type for key in grouped})),
+                HealthMetricRollup.bucket_start.in_(sorted({key.bucket_start for key in grouped}))
+            ))
+            if for_update:
+                query = query.with_for_update()
+            for row in query.all():
+                rows[RollupKey(row.data_type, row.component, row.granularity, row.bucket_start)] = row
+        return rows
+
+    def _batch_seen(self, user_id: int, batch_key: str) -> bool:
+        return self.db.query(HealthRollupBatch.id).filter(and_(
+            HealthRollupBatch.user_id == user_id,
+            HealthRollupBatch.batch_key == batch_key
+        )).first() is not None
+
+    @staticmethod
+    def batch_key_for(series_set: HealthSeriesSet) -> str:
+        """Content hash of a batch of readings."""
+        digest = hashlib.sha256()
+        for data_type in sorted(series_set.data_types):
+            series = series_set.get(data_type)
+            digest.update(data_type.encode())
+            digest.update(np.ascontiguousarray(series.timestamps).tobytes())
+            digest.update(np.ascontiguousarray(series.values).tobytes())
+        return digest.hexdigest()
+
+    # Corrections
+
+    def rebuild(self, user_id: int, start: datetime, end: datetime,
+                data_types: Optional[Sequence[Union[str, DataType]]] = None,
+                now: Optional[datetime] = None, commit: bool = True) -> Dict[str, int]:
+        """
+        Recompute every bucket overlapping [start, end) from raw readings.
+
+        Used after readings are edited or deleted, since min, max and the
+        digest cannot be retracted. Rows are rewritten in place (bumping
+        their revision); buckets left without readings are deleted.
+        """
+        now = now or datetime.utcnow()
+        windows = {
+            granularity: (bucket_start(start, granularity),
+                          bucket_end(bucket_start(end - timedelta(seconds=1), granularity), granularity))
+            for granularity in self.granularities
+        }
+        load_start = min(window[0] for window in windows.values())
+        load_end = max(window[1] for window in windows.values())
+        series_set = HealthSeriesSet.load(self.db, user_id, load_start, load_end, data_types=data_types)
+        partials = self.build_partials(series_set, now, windows)
+
+        rewritten = deleted = 0
+        for granularity, (window_start, window_end) in windows.items():
+            filters = [
+                HealthMetricRollup.user_id == user_id,
+                HealthMetricRollup.granularity == granularity.value,
+                HealthMetricRollup.bucket_start >= window_start,
+                HealthMetricRollup.bucket_start < window_end,
+            ]
+            if data_types:
+                filters.append(HealthMetricRollup.data_type.in_([_type_value(t) for t in data_types]))
+            for row in self.db.query(HealthMetricRollup).filter(and_(*filters)).with_for_update().all():
+                key = RollupKey(row.data_type, row.component, row.granularity, row.bucket_start)
+                fresh = partials.pop(key, None)
+                if fresh is None:
+                    self.db.delete(row)
+                    deleted += 1
+                else:
+                    fresh[0].apply_to_row(row)
+                    row.revision = (row.revision or 0) + 1
+                    rewritten += 1
+
+        created, _ = self._merge_partials(user_id, partials)
+        if commit:
+            self.db.commit()
+        else:
+            self.db.flush()
+        return {'created': created, 'rewritten': rewritten, 'deleted': deleted}
+
+    def backfill(self, user_id: int, now: Optional[datetime] = None, commit: bool = True) -> Dict[str, int]:
+        """
+        Rebuild every bucket of a user's stored readings, a month of readings at a time.
+        
+        Returns:
+            Totals of the rebuild counts over all months
+        """
+        first, last = self.db.query(func.min(HealthData.timestamp), func.max(HealthData.timestamp)).filter(
+            HealthData.user_id == user_id
+        ).one()
+        totals = {'created': 0, 'rewritten': 0, 'deleted': 0}
+        if first is None:
+            return totals
+        
+        start = bucket_start(first, RollupGranularity.MONTHLY)
+        while start <= last:
+            end = bucket_end(start, RollupGranularity.MONTHLY)
+            for key, count in self.rebuild(user_id, start, end, now=now, commit=commit).items():
+                totals[key] += count
+            start = end
+        return totals
+    
+    def refresh_readings(self, user_id: int, data_type: Union[str, DataType],
+                         timestamps: Iterable[datetime], commit: bool = True) -> None:
+        """Rebuild the buckets containing edited or deleted readings."""
+        for timestamp in sorted(set(timestamps)):
+            self.rebuild(user_id, timestamp, timestamp + timedelta(seconds=1),
+                         data_types=[data_type], commit=commit)
+
+    # Queries
+
+    def get_rollups(self, user_id: int, granularity: Union[str, RollupGranularity], start: datetime, end: datetime,
+                    data_types: Optional[Sequence[Union[str, DataType]]] = None) -> List[HealthMetricRollup]:
+        """Rollup rows whose bucket starts in [start, end), oldest first."""
+        filters = [
+            HealthMetricRollup.user_id == user_id,
+            HealthMetricRollup.granularity == RollupGranularity(granularity).value,
+            HealthMetricRollup.bucket_start >= start,
+            HealthMetricRollup.bucket_start < end,
+        ]
+        if data_types:
+            filters.append(HealthMetricRollup.data_type.in_([_type_value(t) for t in data_types]))
+        rows = self.db.query(HealthMetricRollup).filter(and_(*filters)).all()
+        return sorted(rows, key=lambda row: row.bucket_start)
+
+    def granularity_for_window(self, start: datetime, end: datetime) -> RollupGranularity:
+        """Coarsest granularity whose buckets tile [start, end) exactly."""
+        candidates = [RollupGranularity.MONTHLY, RollupGranularity.WEEKLY, RollupGranularity.DAILY]
+        for granularity in candidates:
+            if granularity in self.granularities and \
+                    bucket_start(start, granularity) == start and bucket_start(end, granularity) == end:
+                return granularity
+        if RollupGranularity.HOURLY in self.granularities and start >= datetime.utcnow() - self.hourly_retention:
+            return RollupGranularity.HOURLY
+        return RollupGranularity.DAILY
+
+    def summarize(self, user_id: int, start: datetime, end: datetime,
+                  data_types: Optional[Sequence[Union[str, DataType]]] = None,
+                  granularity: Optional[RollupGranularity] = None) -> Dict[Tuple[str, str], RunningAggregate]:
+        """
+        Merge the rollups covering [start, end) into one aggregate per metric.
+
+        Returns:
+            Mapping of (data_type, component) to RunningAggregate
+        """
+        granularity = granularity or self.granularity_for_window(start, end)
+        merged: Dict[Tuple[str, str], RunningAggregate] = {}
+        for row in self.get_rollups(user_id, granularity, start, end, data_types):
+            key = (row.data_type, row.component)
+            merged.setdefault(key, RunningAggregate()).merge(RunningAggregate.from_row(row))
+        return merged
+
+    def series(self, user_id: int, data_type: Union[str, DataType], granularity: Union[str, RollupGranularity],
+               start: datetime, end: datetime, component: str = "value",
+               statistic: str = "mean") -> Tuple[List[datetime], np.ndarray]:
+        """
+        One statistic per bucket, for charts and rolling features.
+
+        Args:
+            statistic: mean, sum, count, min, max or last
+
+        Returns:
+            (bucket starts, values)
+        """
+        rows = [
+            row for row in self.get_rollups(user_id, granularity, start, end, [data_type])
+            if row.component == component and row.count
+        ]
+        extract = {
+            'mean': lambda row: row.total / row.count,
+            'sum': lambda row: row.total,
+            'count': lambda row: row.count,
+            'min': lambda row: row.minimum,
+            'max': lambda row: row.maximum,
+            'last': lambda row: row.last_value,
+        }[statistic]
+        return [row.bucket_start for row in rows], np.array([extract(row) for row in rows], dtype=np.float64)
+
+
+def _type_value(data_type: Union[str, DataType]) -> str:
+    return data_type.value if isinstance(data_type, DataType) else str(data_type)
+
+
+def _backfill_watermark(db_session: Session) -> Optional[EtlWatermark]:
+    return db_session.query(EtlWatermark).filter(
+        EtlWatermark.job_id == BACKFILL_JOB_ID,
+        EtlWatermark.source_table == HealthData.__tablename__
+    ).first()
+
+
+def rollups_backfilled(db_session: Session) -> bool:
+    """Whether rollups cover readings stored before ingest maintained them (the backfill has completed)."""
+    watermark = _backfill_watermark(db_session)
+    return watermark is not None and watermark.last_run_at is not None
+
+
+def backfill_rollups(db_session: Session, max_users: int = 100) -> Dict[str, object]:
+    """
+    Rebuild the rollups of the next users with readings, resuming after the last user done.
+    
+    Progress is kept in an EtlWatermark row (last_id is the last user
+    rebuilt); last_run_at is set once every user has been rebuilt, which
+    is what ``rollups_backfilled`` checks.
+    
+    Args:
+        db_session: Database session
+        max_users: Users rebuilt in this call
+    
+    Returns:
+        Dict with the users rebuilt, the last user ID and whether the backfill is complete
+    """
+    watermark = _backfill_watermark(db_session)
+    if watermark is None:
+        watermark = EtlWatermark(job_id=BACKFILL_JOB_ID, source_table=HealthData.__tablename__,
+                                 last_id=0, rows_extracted=0)
+        db_session.add(watermark)
+        db_session.commit()
+    
+    user_ids = [user_id for (user_id,) in db_session.query(distinct(HealthData.user_id)).filter(
+        HealthData.user_id > (watermark.last_id or 0)
+    ).order_by(HealthData.user_id).limit(max_users)]
+    
+    store = HealthRollupStore(db_session)
+    for user_id in user_ids:
+        store.backfill(user_id)
+        watermark.last_id = user_id
+        watermark.rows_extracted = (watermark.rows_extracted or 0) + 1  # Users rebuilt
+        db_session.commit()
+    
+    complete = len(user_ids) < max_users
+    if complete:
+        watermark.last_run_at = datetime.utcnow()
+        db_session.commit()
+    return {'users': len(user_ids), 'last_user_id': watermark.last_id, 'complete': complete}
+
+
+def get_health_rollup_store(db_session: Session) -> HealthRollupStore:
+    """Create a rollup store bound to a database session"""
+    return HealthRollupStore(db_session)
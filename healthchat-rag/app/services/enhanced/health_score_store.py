@@ -0,0 +1,371 @@
+"""
+Materialized Health Scores
+Per-user health scores and risk assessments recomputed from a dirty-set queue and served by key lookup
+"""
+
+import logging
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+from datetime import datetime
+from dataclasses import asdict, dataclass, is_dataclass
+from enum import Enum
+from sqlalchemy.orm import Session
+from sqlalchemy import event, exists, func, and_
+
+from app.models.enhanced_health_models import HealthScoreInvalidation, HealthScoreSnapshot, UserHealthProfile
+from app.services.health_analytics import HealthAnalyticsService
+from app.services.enhanced.health_analytics import HealthAnalyticsEngine
+from app.services.enhanced.health_rollups import get_health_rollup_store
+from app.services.enhanced.predictive_analytics import PredictiveAnalyticsBackend, get_predictive_analytics_backend
+from app.services.threshold_alerts import threshold_monitor
+
+logger = logging.getLogger(__name__)
+
+# Users recomputed per refresh pass
+REFRESH_BATCH_SIZE = 200
+
+
+class ScoreKind(str, Enum):
+    """Materialized results kept per user"""
+    HEALTH_SCORE = "health_score"  # HealthAnalyticsService.get_health_score
+    ANALYTICS_SCORE = "analytics_score"  # HealthAnalyticsEngine health score
+    CARDIOVASCULAR_RISK = "cardiovascular_risk"
+    DIABETES_RISK = "diabetes_risk"
+    MENTAL_HEALTH_RISK = "mental_health_risk"
+
+
+RISK_KINDS = (ScoreKind.CARDIOVASCULAR_RISK, ScoreKind.DIABETES_RISK, ScoreKind.MENTAL_HEALTH_RISK)
+
+
+@dataclass
+class ScoreSnapshot:
+    """A materialized result as served to the API"""
+    user_id: int
+    kind: ScoreKind
+    payload: Dict[str, Any]
+    version: int
+    computed_at: datetime
+    stale: bool  # Inputs changed since computation; a refresh is queued
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'kind': self.kind.value,
+            'payload': self.payload,
+            'version': self.version,
+            'computed_at': self.computed_at.isoformat(),
+            'stale': self.stale
+        }
+
+
+class HealthScoreStore:
+    """
+    Materialized per-user scores and risk assessments.
+
+    Writes that change a user's inputs (readings, profile) append a row to
+    the invalidation queue instead of recomputing. A background refresh
+    drains the queue in batches: every queued user is recomputed once,
+    however many invalidations it has, and only the invalidations the
+    refresh read are removed, so a write landing mid-refresh queues the
+    user again. A user with any kind that failed to compute stays queued
+    and is retried on a later pass. Reads are a single lookup on (user_id, kind) that also
+    reports whether a refresh is pending.
+    """
+
+    def __init__(self, db_session: Session, predictive_backend: Optional[PredictiveAnalyticsBackend] = None,
+                 analytics_days: int = 90):
+        self.db = db_session
+        self._predictive_backend = predictive_backend
+        self.analytics_days = analytics_days
+
+    @property
+    def predictive_backend(self) -> PredictiveAnalyticsBackend:
+        if self._predictive_backend is None:
+            self._predictive_backend = get_predictive_analytics_backend()
+        return self._predictive_backend
+
+    def mark_dirty(self, user_ids: Union[int, Iterable[int]], reason: str = "readings", commit: bool = True) -> None:
+        """
+        Queue users for recomputation.
+
+        Args:
+            user_ids: User or users whose inputs changed
+            reason: Short label for the change (readings, profile)
+            commit: Commit the session (False to join the caller's transaction)
+        """
+        user_ids = [user_ids] if isinstance(user_ids, int) else list(dict.fromkeys(user_ids))
+        if not user_ids:
+            return
+        now = datetime.utcnow()
+        self.db.bulk_insert_mappings(HealthScoreInvalidation, [
+            {'user_id': user_id, 'reason': reason, 'created_at': now} for user_id in user_ids
+        ])
+        if commit:
+            self.db.commit()
+
+    def get(self, user_id: int, kind: Union[str, ScoreKind]) -> Optional[ScoreSnapshot]:
+        """
+        Read a materialized result.
+
+        Returns:
+            The snapshot, or None if it has never been computed
+        """
+        kind = ScoreKind(kind)
+        pending = exists().where(and_(
+            HealthScoreInvalidation.user_id == HealthScoreSnapshot.user_id,
+            HealthScoreInvalidation.id > func.coalesce(HealthScoreSnapshot.input_mark, 0)
+        ))
+        row = self.db.query(HealthScoreSnapshot, pending.label('stale')).filter(
+            HealthScoreSnapshot.user_id == user_id,
+            HealthScoreSnapshot.kind == kind.value
+        ).first()
+        if row is None:
+            return None
+
+        snapshot, stale = row
+        return ScoreSnapshot(user_id=user_id, kind=kind, payload=snapshot.payload, version=snapshot.version,
+                             computed_at=snapshot.computed_at, stale=bool(stale))
+
+    async def get_or_compute(self, user_id: int, kind: Union[str, ScoreKind]) -> ScoreSnapshot:
+        """
+        Read a materialized result, computing it synchronously on first use.
+
+        Raises:
+            LookupError: If the result cannot be computed for the user
+        """
+        snapshot = self.get(user_id, kind)
+        if snapshot is None:
+            await self.refresh_users([user_id], kinds=[ScoreKind(kind)])
+            snapshot = self.get(user_id, kind)
+            if snapshot is None:
+                raise LookupError(f"No {ScoreKind(kind).value} available for user {user_id}")
+        return snapshot
+
+    def pending_count(self) -> int:
+        """Number of users with queued invalidations."""
+        return self.db.query(func.count(func.distinct(HealthScoreInvalidation.user_id))).scalar() or 0
+
+    async def refresh_dirty(self, limit: int = REFRESH_BATCH_SIZE) -> Dict[str, int]:
+        """
+        Recompute the users longest in the queue.
+
+        Args:
+            limit: Maximum users to recompute in this pass
+
+        Returns:
+            Dict with users refreshed, users whose refresh failed and is
+            retried later, invalidations cleared and users still pending
+        """
+        queued = self.db.query(
+            HealthScoreInvalidation.user_id, func.max(HealthScoreInvalidation.id)
+        ).group_by(HealthScoreInvalidation.user_id).order_by(
+            func.min(HealthScoreInvalidation.id)
+        ).limit(limit).all()
+        if not queued:
+            return {'refreshed': 0, 'failed': 0, 'cleared': 0, 'pending': 0}
+        
+        marks = {user_id: mark for user_id, mark in queued}
+        refreshed = await self.refresh_users(list(marks), input_marks=marks)
+        kinds = list(ScoreKind)
+        done = [
+            user_id for user_id in marks
+            if all((user_id, kind) in refreshed for kind in kinds)
+        ]
+        
+        cleared = 0
+        for user_id in done:
+            mark = marks[user_id]
+            cleared += self.db.query(HealthScoreInvalidation).filter(
+                HealthScoreInvalidation.user_id == user_id,
+                HealthScoreInvalidation.id <= mark
+            ).delete(synchronize_session=False)
+        self.db.commit()
+
+        return {
+            'refreshed': len(done),
+            'failed': len(marks) - len(done),
+            'cleared': cleared,
+            'pending': self.pending_count()
+        }
+
+    async def refresh_users(self, user_ids: Sequence[int], kinds: Optional[Sequence[ScoreKind]] = None,
+                            input_marks: Optional[Dict[int, int]] = None) -> Set[Tuple[int, ScoreKind]]:
+        """
+        Recompute and store results for users.
+        
+        Engine health scores are computed for all users in one cohort pass;
+        the remaining kinds per user. A kind that fails for a user keeps
+        its previous snapshot.
+        
+        Args:
+            user_ids: Users to recompute
+            kinds: Kinds to recompute (default: all)
+            input_marks: Highest invalidation id each user's inputs reflect
+        
+        Returns:
+            (user_id, kind) pairs that were refreshed: a snapshot was
+            written, or the computation succeeded with nothing to store
+        """
+        kinds = list(kinds or ScoreKind)
+        results: Dict[int, Dict[ScoreKind, Any]] = {user_id: {} for user_id in user_ids}
+        refreshed: Set[Tuple[int, ScoreKind]] = set()
+
+        if ScoreKind.ANALYTICS_SCORE in kinds:
+            try:
+                engine = HealthAnalyticsEngine(self.db)
+                cohort = await engine.run_cohort_analytics(user_ids, days=self.analytics_days, persist=False)
+                for user_id, result in cohort.items():
+                    if 'health_score' in result:
+                        results[user_id][ScoreKind.ANALYTICS_SCORE] = result['health_score']
+                refreshed.update((user_id, ScoreKind.ANALYTICS_SCORE) for user_id in user_ids)
+            except Exception as e:
+                logger.error(f"Cohort health scores failed for {len(user_ids)} users: {e}")
+
+        calculators = self._calculators(kinds)
+        for user_id in user_ids:
+            for kind, calculate in calculators.items():
+                try:
+                    result = await calculate(user_id)
+                except Exception as e:
+                    logger.warning(f"Failed to compute {kind.value} for user {user_id}: {e}")
+                    continue
+                refreshed.add((user_id, kind))
+                if result is not None:
+                    results[user_id][kind] = result
+        
+        self._store(results, input_marks or {})
+        return refreshed
+
+    def _calculators(self, kinds: Sequence[ScoreKind]) -> Dict[ScoreKind, Callable[[int], Awaitable[Any]]]:
+        analytics_service = HealthAnalyticsService(self.db)
+
+        async def health_score(user_id: int):
+            return analytics_service.get_health_score(user_id)
+
+        calculators = {
+            ScoreKind.HEALTH_SCORE: health_score,
+            ScoreKind.CARDIOVASCULAR_RISK: lambda user_id: self.predictive_backend.assess_cardiovascular_risk(user_id),
+            ScoreKind.DIABETES_RISK: lambda user_id: self.predictive_backend.assess_diabetes_risk(user_id),
+            ScoreKind.MENTAL_HEALTH_RISK: lambda user_id: self.predictive_backend.assess_mental_health_risk(user_id)
+        }
+        return {kind: calculators[kind] for kind in kinds if kind in calculators}
+
+    def _store(self, results: Dict[int, Dict[ScoreKind, Any]], input_marks: Dict[int, int]) -> int:
+        """Upsert snapshots, bumping each one's version."""
+        user_ids = [user_id for user_id, by_kind in results.items() if by_kind]
+        if not user_ids:
+            return 0
+
+        existing = {
+            (row.user_id, row.kind): row
+            for row in self.db.query(HealthScoreSnapshot).filter(HealthScoreSnapshot.user_id.in_(user_ids))
+        }
+        now = datetime.utcnow()
+        written = 0
+        for user_id in user_ids:
+            for kind, result in results[user_id].items():
+                row = existing.get((user_id, kind.value))
+                if row is None:
+                    row = HealthScoreSnapshot(user_id=user_id, kind=kind.value, version=0)
+                    self.db.add(row)
+                row.payload = to_payload(result)
+                row.version = (row.version or 0) + 1
+                row.computed_at = now
+                if user_id in input_marks:
+                    row.input_mark = input_marks[user_id]
+                elif row.input_mark is None:
+                    # Synchronous first computation: reflects everything queued so far
+                    row.input_mark = self.db.query(func.max(HealthScoreInvalidation.id)).filter(
+                        HealthScoreInvalidation.user_id == user_id
+                    ).scalar() or 0
+                written += 1
+        self.db.commit()
+        return written
+
+
+def to_payload(value: Any) -> Any:
+    """Convert a result (dataclasses, enums, datetimes) to JSON-friendly values."""
+    if is_dataclass(value):
+        return to_payload(asdict(value))
+    if isinstance(value, dict):
+        return {str(key): to_payload(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_payload(item) for item in value]
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+@event.listens_for(UserHealthProfile, "after_insert")
+@event.listens_for(UserHealthProfile, "after_update")
+def _invalidate_on_profile_change(mapper, connection, target):
+    """Queue a recompute whenever a health profile is written, in the same transaction."""
+    connection.execute(HealthScoreInvalidation.__table__.insert().values(
+        user_id=target.user_id, reason="profile", created_at=datetime.utcnow()
+    ))
+
+
+def readings_stored(db_session: Session, user_id: int, records: Sequence[Tuple[str, datetime, Any, Optional[str]]],
+                    batch_key: Optional[str] = None) -> None:
+    """
+    Run the write hooks for newly committed readings.
+    
+    Queues the readings for threshold evaluation, merges them into the
+    running rollups and queues the user's scores for recomputation. A
+    failing hook is logged and rolled back; it never fails the write that
+    called it.
+    
+    Args:
+        db_session: Database session the readings were committed on
+        user_id: Owner of the readings
+        records: (data_type, timestamp, value, unit) of each reading, value unencrypted
+        batch_key: Rollup batch key making retries no-ops (e.g. "health_data:<id>")
+    """
+    threshold_monitor.submit_readings(user_id, [(data_type, value, timestamp) for data_type, timestamp, value, _ in records])
+    try:
+        get_health_rollup_store(db_session).ingest_records(user_id, records, batch_key=batch_key)
+    except Exception as e:
+        db_session.rollback()
+        logger.warning(f"Failed to update health rollups for user {user_id}: {e}")
+    _queue_score_refresh(db_session, user_id)
+
+
+def readings_changed(db_session: Session, user_id: int, readings: Iterable[Tuple[str, datetime]],
+                     updated: Sequence[Tuple[str, datetime, Any, Optional[str]]] = ()) -> None:
+    """
+    Run the write hooks for committed edits or deletions of readings.
+    
+    Queues the edited readings for threshold evaluation, rebuilds the
+    rollup buckets the readings were (and now are) in and queues the
+    user's scores for recomputation; failures are handled as in
+    ``readings_stored``.
+    
+    Args:
+        db_session: Database session the change was committed on
+        user_id: Owner of the readings
+        readings: (data_type, timestamp) of each reading before and after the change
+        updated: (data_type, timestamp, value, unit) of each edited reading as now
+            stored, value unencrypted; empty for deletions
+    """
+    threshold_monitor.submit_readings(user_id, [(data_type, value, timestamp) for data_type, timestamp, value, _ in updated])
+    try:
+        store = get_health_rollup_store(db_session)
+        for data_type, timestamp in dict.fromkeys(readings):
+            store.refresh_readings(user_id, data_type, [timestamp])
+    except Exception as e:
+        db_session.rollback()
+        logger.warning(f"Failed to refresh health rollups for user {user_id}: {e}")
+    _queue_score_refresh(db_session, user_id)
+
+
+def _queue_score_refresh(db_session: Session, user_id: int) -> None:
+    try:
+        HealthScoreStore(db_session).mark_dirty(user_id, reason="readings")
+    except Exception as e:
+        db_session.rollback()
+        logger.warning(f"Failed to queue health score refresh for user {user_id}: {e}")
+
+
+def get_health_score_store(db_session: Session) -> HealthScoreStore:
+    """Create a health score store bound to a database session"""
+    return HealthScoreStore(db_session)
@@ -0,0 +1,339 @@
+"""
+Wearable Health Data Sync
+Incremental, idempotent sync of external provider readings using per-stream high-water marks and keyed upserts
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+from datetime import datetime, timedelta
+from collections import defaultdict
+from dataclasses import dataclass, field
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.config import settings
+from app.models.health_data import HealthData
+from app.models.enhanced_health_models import HealthSyncState
+from app.services.enhanced.data_integration import (
+    DataIntegrationService, DataSourceType, DataType, HealthDataPoint
+)
+from app.services.enhanced.health_ingestion import content_hash, reading_key
+from app.services.enhanced.health_rollups import HealthRollupStore, RollupGranularity, bucket_start
+from app.services.enhanced.health_score_store import HealthScoreStore
+from app.services.threshold_alerts import threshold_monitor
+from app.utils.encryption_utils import encryption_manager
+
+logger = logging.getLogger(__name__)
+
+StreamKey = Tuple[str, str]  # (source, data_type)
+
+
+@dataclass
+class StreamSync:
+    """Outcome of one sync for one source and data type"""
+    source: str
+    data_type: str
+    start: datetime  # Start of the fetched window
+    fetched: int = 0
+    inserted: int = 0
+    updated: int = 0  # Existing readings whose value the provider revised
+    high_water_mark: Optional[datetime] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'source': self.source,
+            'data_type': self.data_type,
+            'start': self.start.isoformat(),
+            'fetched': self.fetched,
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'high_water_mark': self.high_water_mark.isoformat() if self.high_water_mark else None
+        }
+
+
+@dataclass
+class SyncResult:
+    """Outcome of syncing one user"""
+    user_id: int
+    streams: List[StreamSync] = field(default_factory=list)
+    elapsed_ms: float = 0.0
+
+    @property
+    def fetched(self) -> int:
+        return sum(stream.fetched for stream in self.streams)
+
+    @property
+    def inserted(self) -> int:
+        return sum(stream.inserted for stream in self.streams)
+
+    @property
+    def updated(self) -> int:
+        return sum(stream.updated for stream in self.streams)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'user_id': self.user_id,
+            'fetched': self.fetched,
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'unchanged': self.fetched - self.inserted - self.updated,
+            'streams': [stream.to_dict() for stream in self.streams if stream.fetched],
+            'processing_time_ms': round(self.elapsed_ms, 2)
+        }
+
+
+@dataclass
+class UpsertedReading:
+    """A row written by an upsert"""
+    id: int
+    source: str
+    data_type: str
+    timestamp: datetime
+    created: bool  # False when an existing reading was revised
+    point: HealthDataPoint
+
+
+class HealthSyncEngine:
+    """
+    Syncs a user's readings from registered providers.
+
+    Each (user, source, data_type) stream keeps a high-water mark: the
+    latest reading timestamp received. A sync fetches only from that mark,
+    less ``health_sync_overlap_hours`` for late or revised readings, and
+    writes through ``INSERT ... ON CONFLICT`` on the reading's natural
+    key (the provider's id, else a hash of its content). Re-fetched
+    readings are no-ops unless their value changed, so both sync time and
+    table growth follow the amount of genuinely new data.
+    """
+
+    def __init__(self, db_session: Session, integration_service: Optional[DataIntegrationService] = None,
+                 rollup_store: Optional[HealthRollupStore] = None, score_store: Optional[HealthScoreStore] = None,
+                 overlap: Optional[timedelta] = None, initial_days: Optional[int] = None):
+        self.db = db_session
+        self.integration = integration_service or DataIntegrationService()
+        self.rollup_store = rollup_store or HealthRollupStore(db_session)
+        self.score_store = score_store or HealthScoreStore(db_session)
+        self.overlap = overlap if overlap is not None else timedelta(hours=settings.health_sync_overlap_hours)
+        self.initial_days = initial_days or settings.health_sync_initial_days
+
+    async def sync_user(self, user_id: int, sources: Optional[Sequence[Union[str, DataSourceType]]] = None,
+                        data_types: Optional[Sequence[Union[str, DataType]]] = None,
+                        now: Optional[datetime] = None) -> SyncResult:
+        """
+        Fetch and store a user's new readings.
+
+        Args:
+            user_id: User to sync
+            sources: Sources to sync (default: every registered provider)
+            data_types: Data types to sync (default: all)
+            now: End of the fetched window (default: current time)
+
+        Returns:
+            SyncResult with per-stream counts and high-water marks
+        """
+        started = time.perf_counter()
+        now = now or datetime.utcnow()
+        sources = [DataSourceType(s) for s in sources] if sources else list(self.integration.providers)
+        data_types = [DataType(t) for t in data_types] if data_types else list(DataType)
+
+        states = {
+            (state.source, state.data_type): state
+            for state in self.db.query(HealthSyncState).filter(HealthSyncState.user_id == user_id)
+        }
+
+        # One fetch per source and window start, covering every data type sharing that start
+        streams: Dict[StreamKey, StreamSync] = {}
+        windows: Dict[Tuple[DataSourceType, datetime], List[DataType]] = defaultdict(list)
+        for source in sources:
+            for data_type in data_types:
+                state = states.get((source.value, data_type.value))
+                mark = state.high_water_mark if state else None
+                start = mark - self.overlap if mark else now - timedelta(days=self.initial_days)
+                streams[(source.value, data_type.value)] = StreamSync(source.value, data_type.value, start,
+                                                                      high_water_mark=mark)
+                windows[(source, start)].append(data_type)
+
+        fetched = await asyncio.gather(*(
+            self.integration.fetch_user_health_data(user_id, types, [source], start, now)
+            for (source, start), types in windows.items()
+        ))
+        points = [
+            point for point in await self.integration.process_and_validate_data(
+                [point for batch in fetched for point in batch]
+            )
+            if _stream_key(point) in streams
+        ]
+
+        for point in points:
+            stream = streams[_stream_key(point)]
+            stream.fetched += 1
+            if stream.high_water_mark is None or point.timestamp > stream.high_water_mark:
+                stream.high_water_mark = point.timestamp
+
+        written = self.upsert(user_id, points)
+        for reading in written:
+            stream = streams[(reading.source, reading.data_type)]
+            if reading.created:
+                stream.inserted += 1
+            else:
+                stream.updated += 1
+
+        self._save_states(user_id, states, streams, now)
+        if written:
+            self.score_store.mark_dirty(user_id, reason="readings", commit=False)
+        self.db.commit()
+        threshold_monitor.submit_readings(user_id, [(r.data_type, r.point.value, r.timestamp) for r in written])
+        self._update_rollups(user_id, written)
+
+        result = SyncResult(user_id, list(streams.values()), (time.perf_counter() - started) * 1000)
+        logger.info(f"Synced user {user_id}: {result.fetched} fetched, {result.inserted} new, "
+                    f"{result.updated} revised in {result.elapsed_ms:.0f}ms")
+        return result
+
+    def upsert(self, user_id: int, points: Sequence[HealthDataPoint]) -> List[UpsertedReading]:
+        """Write readings keyed on their natural key, without committing (see upsert_readings)."""
+        return upsert_readings(self.db, user_id, points)
+
+    def _save_states(self, user_id: int, states: Dict[StreamKey, HealthSyncState],
+                     streams: Dict[StreamKey, StreamSync], now: datetime) -> None:
+        for key, stream in streams.items():
+            state = states.get(key)
+            if state is None:
+                if not stream.fetched:
+                    continue
+                state = HealthSyncState(user_id=user_id, source=stream.source, data_type=stream.data_type)
+                self.db.add(state)
+            state.high_water_mark = stream.high_water_mark
+            state.last_synced_at = now
+            state.last_fetched = stream.fetched
+            state.last_inserted = stream.inserted
+            state.last_updated = stream.updated
+
+    def _update_rollups(self, user_id: int, written: List[UpsertedReading]) -> None:
+        """Merge new readings into the rollups and rebuild the buckets of revised ones."""
+        try:
+            merge_written_readings(self.rollup_store, user_id, written)
+        except Exception as e:
+            self.db.rollback()
+            logger.warning(f"Failed to update health rollups after sync for user {user_id}: {e}")
+
+
+def _stream_key(point: HealthDataPoint) -> StreamKey:
+    return (
+        getattr(point.source, "value", point.source),
+        getattr(point.data_type, "value", point.data_type)
+    )
+
+
+def upsert_readings(db_session: Session, user_id: int, points: Sequence[HealthDataPoint]) -> List[UpsertedReading]:
+    """
+    Write readings keyed on their natural key, without committing.
+
+    New readings are inserted, readings whose value, unit or confidence
+    changed are updated in place, and unchanged ones are skipped by the
+    database.
+
+    Returns:
+        The inserted and updated readings
+    """
+    now = datetime.utcnow()
+    rows: Dict[str, Dict[str, Any]] = {}
+    by_key: Dict[str, HealthDataPoint] = {}
+    for point in points:
+        source, data_type = _stream_key(point)
+        key = reading_key(source, data_type, point.timestamp, point.source_id)
+        by_key[key] = point  # A key repeated within the batch keeps its latest version
+        rows[key] = {
+            'user_id': user_id,
+            'data_type': data_type,
+            'value': encryption_manager.encrypt_field(point.value),
+            'unit': point.unit,
+            'timestamp': point.timestamp,
+            'source': source,
+            'confidence': point.confidence,
+            'reading_key': key,
+            'content_hash': content_hash(point.value, point.unit, point.confidence),
+            'created_at': now,
+            'updated_at': now
+        }
+    if not rows:
+        return []
+
+    insert = dialect_insert(db_session)
+    values = list(rows.values())
+    written = []
+    for offset in range(0, len(values), settings.bulk_ingest_chunk_size):
+        statement = insert(HealthData).values(values[offset:offset + settings.bulk_ingest_chunk_size])
+        statement = statement.on_conflict_do_update(
+            index_elements=[HealthData.user_id, HealthData.reading_key],
+            set_={
+                'value': statement.excluded.value,
+                'unit': statement.excluded.unit,
+                'confidence': statement.excluded.confidence,
+                'content_hash': statement.excluded.content_hash,
+                'updated_at': statement.excluded.updated_at
+            },
+            where=HealthData.content_hash.is_distinct_from(statement.excluded.content_hash)
+        ).returning(
+            HealthData.id, HealthData.source, HealthData.data_type, HealthData.timestamp,
+            HealthData.reading_key, HealthData.created_at
+        )
+        for row_id, source, data_type, timestamp, key, created_at in db_session.execute(statement):
+            written.append(UpsertedReading(row_id, source, data_type, timestamp, created_at == now, by_key[key]))
+    return written
+
+
+def merge_written_readings(rollup_store: HealthRollupStore, user_id: int, written: Sequence[UpsertedReading],
+                           commit: bool = True) -> Dict[str, Any]:
+    """
+    Merge upserted readings into the rollups.
+    
+    Inserted readings are merged under a key of their row IDs, so merging
+    the same rows again is a no-op; the buckets of revised readings are
+    rebuilt from health_data.
+    
+    Returns:
+        Dict with the rollup ingest result of the inserted readings (None
+        if there were none) and the daily buckets touched
+    """
+    created = [reading for reading in written if reading.created]
+    ingest = None
+    touched_days = set()
+    if created:
+        ids = [reading.id for reading in created]
+        ingest = rollup_store.ingest_records(
+            user_id,
+            [(r.data_type, r.timestamp, r.point.value, r.point.unit) for r in created],
+            batch_key=f"health_data:{min(ids)}-{max(ids)}:{len(ids)}",
+            commit=commit
+        )
+        touched_days.update(ingest['touched'].get(RollupGranularity.DAILY, []))
+    
+    revised_by_type: Dict[str, List[datetime]] = defaultdict(list)
+    for reading in written:
+        if not reading.created:
+            revised_by_type[reading.data_type].append(reading.timestamp)
+            touched_days.add(bucket_start(reading.timestamp, RollupGranularity.DAILY))
+    for data_type, timestamps in revised_by_type.items():
+        rollup_store.refresh_readings(user_id, data_type, timestamps, commit=commit)
+    
+    return {'ingest': ingest, 'touched_days': sorted(touched_days)}
+
+
+def dialect_insert(bind: Union[Session, Connection, Engine]):
+    """INSERT construct with ON CONFLICT support for a session's, connection's or engine's database."""
+    dialect = (bind.get_bind() if isinstance(bind, Session) else bind).dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert
+    if dialect == "sqlite":
+        return sqlite.insert
+    raise NotImplementedError(f"Keyed upserts are not supported on {dialect}")
+
+
+def get_health_sync_engine(db_session: Session,
+                           integration_service: Optional[DataIntegrationService] = None) -> HealthSyncEngine:
+    """Create a health sync engine bound to a database session"""
+    return HealthSyncEngine(db_session, integration_service)
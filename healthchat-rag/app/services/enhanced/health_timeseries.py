@@ -0,0 +1,301 @@
+"""
+Columnar Health Time Series
+Compact NumPy containers for a user's readings, built once per request and shared by every analytics stage
+"""
+
+import json
+import logging
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+from datetime import datetime
+from dataclasses import dataclass
+from collections import defaultdict
+import numpy as np
+from sqlalchemy.orm import Session
+from sqlalchemy import and_
+
+from app.models.health_data import HealthData
+from app.utils.encryption_utils import encryption_manager
+from app.services.enhanced.data_integration import HealthDataPoint, DataType, DataSourceType
+
+logger = logging.getLogger(__name__)
+
+# Multi-component readings, in column order
+COMPONENT_FIELDS: Dict[str, Tuple[str, ...]] = {
+    DataType.BLOOD_PRESSURE.value: ("systolic", "diastolic"),
+}
+
+# Keys probed, in order, when a single-valued reading is stored as a dict
+SCALAR_FIELDS: Tuple[str, ...] = ("value", "systolic", "diastolic", "reading", "level")
+
+_SECONDS_PER_DAY = 86400.0
+
+
+def components_for(data_type: str) -> Tuple[str, ...]:
+    """Return the value columns stored for a data type."""
+    return COMPONENT_FIELDS.get(data_type, ("value",))
+
+
+def parse_reading(value: Union[float, int, str, Dict, None], components: Tuple[str, ...]) -> Optional[Tuple[float, ...]]:
+    """
+    Parse a raw reading into one float per component.
+
+    Args:
+        value: Number, numeric or JSON string, or dict
+        components: Expected components (see components_for)
+
+    Returns:
+        Tuple of floats, or None if the reading is not numeric
+    """
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return (float(value),) if len(components) == 1 else None
+    if isinstance(value, str):
+        text = value.strip()
+        if text.startswith("{"):
+            try:
+                value = json.loads(text)
+            except json.JSONDecodeError:
+                return None
+        else:
+            try:
+                return (float(text),) if len(components) == 1 else None
+            except ValueError:
+                return None
+    if not isinstance(value, dict):
+        return None
+
+    if len(components) > 1:
+        try:
+            return tuple(float(value[name]) for name in components)
+        except (KeyError, TypeError, ValueError):
+            return None
+    for key in SCALAR_FIELDS:
+        field_value = value.get(key)
+        if isinstance(field_value, (int, float)) and not isinstance(field_value, bool):
+            return (float(field_value),)
+    return None
+
+
+def decrypt_value(value: Union[str, None]) -> Union[str, Dict, list, None]:
+    """Decrypt a stored HealthData value if it is encrypted."""
+    if value and encryption_manager.is_encrypted(str(value)):
+        try:
+            return encryption_manager.decrypt_field(value)
+        except Exception as e:
+            logger.error(f"Failed to decrypt health data value: {e}")
+            return None
+    return value
+
+
+def _type_key(data_type: Union[str, DataType]) -> str:
+    return data_type.value if isinstance(data_type, DataType) else str(data_type)
+
+
+@dataclass
+class HealthTimeSeries:
+    """
+    Readings of one data type for one user.
+
+    Timestamps are ``datetime64[s]`` sorted ascending; values are a
+    ``float64`` array of shape (n, components). A point costs 8 bytes of
+    timestamp plus 8 bytes per component.
+    """
+    user_id: int
+    data_type: str
+    timestamps: np.ndarray
+    values: np.ndarray
+    components: Tuple[str, ...] = ("value",)
+    unit: Optional[str] = None
+
+    @classmethod
+    def from_arrays(cls, user_id: int, data_type: Union[str, DataType], timestamps: Sequence,
+                    values: Sequence, components: Optional[Tuple[str, ...]] = None,
+                    unit: Optional[str] = None, assume_sorted: bool = False) -> "HealthTimeSeries":
+        """Build a series from timestamp and value sequences, sorting by time."""
+        data_type = _type_key(data_type)
+        components = components or components_for(data_type)
+        ts = np.asarray(timestamps, dtype="datetime64[s]")
+        vals = np.asarray(values, dtype=np.float64).reshape(len(ts), len(components))
+        if not assume_sorted and len(ts) > 1:
+            order = np.argsort(ts, kind="stable")
+            ts, vals = ts[order], vals[order]
+        return cls(user_id, data_type, ts, vals, components, unit)
+
+    @classmethod
+    def empty(cls, user_id: int, data_type: Union[str, DataType]) -> "HealthTimeSeries":
+        """Build a series with no readings."""
+        return cls.from_arrays(user_id, data_type, [], [], assume_sorted=True)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @property
+    def is_multi_component(self) -> bool:
+        return len(self.components) > 1
+
+    @property
+    def primary(self) -> np.ndarray:
+        """First component (the value, or systolic for blood pressure)."""
+        return self.values[:, 0]
+
+    def component(self, name: str) -> np.ndarray:
+        """Return one component's values."""
+        return self.values[:, self.components.index(name)]
+
+    @property
+    def nbytes(self) -> int:
+        return self.timestamps.nbytes + self.values.nbytes
+
+    @property
+    def start(self) -> Optional[datetime]:
+        return self.timestamps[0].astype(datetime) if len(self) else None
+
+    @property
+    def end(self) -> Optional[datetime]:
+        return self.timestamps[-1].astype(datetime) if len(self) else None
+
+    def epoch_seconds(self) -> np.ndarray:
+        """Timestamps as int64 seconds since the Unix epoch."""
+        return self.timestamps.astype(np.int64)
+
+    def elapsed_days(self) -> np.ndarray:
+        """Fractional days since the first reading."""
+        seconds = self.epoch_seconds()
+        if not len(seconds):
+            return seconds.astype(np.float64)
+        return (seconds - seconds[0]) / _SECONDS_PER_DAY
+
+    def weekdays(self) -> np.ndarray:
+        """Day of week per reading (Monday=0), as datetime.weekday()."""
+        days = self.timestamps.astype("datetime64[D]").astype(np.int64)
+        # 1970-01-01 was a Thursday
+        return (days + 3) % 7
+
+    def window(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> "HealthTimeSeries":
+        """Return the readings in [start, end) as views of this series."""
+        lo = np.searchsorted(self.timestamps, np.datetime64(start, "s"), "left") if start else 0
+        hi = np.searchsorted(self.timestamps, np.datetime64(end, "s"), "left") if end else len(self)
+        return HealthTimeSeries(
+            self.user_id, self.data_type, self.timestamps[lo:hi], self.values[lo:hi], self.components, self.unit
+        )
+
+    def to_datetimes(self) -> List[datetime]:
+        """Timestamps as a list of naive datetimes."""
+        return self.timestamps.astype(datetime).tolist()
+
+    def to_points(self, source: DataSourceType = DataSourceType.MANUAL_ENTRY) -> List[HealthDataPoint]:
+        """Expand back into HealthDataPoint objects (for stages not yet columnar)."""
+        points = []
+        data_type = DataType(self.data_type)
+        for ts, row in zip(self.to_datetimes(), self.values.tolist()):
+            value = dict(zip(self.components, row)) if self.is_multi_component else row[0]
+            points.append(HealthDataPoint(
+                user_id=self.user_id, data_type=data_type, value=value,
+                timestamp=ts, source=source, unit=self.unit
+            ))
+        return points
+
+
+class HealthSeriesSet:
+    """All of one user's series, keyed by data type value."""
+
+    def __init__(self, user_id: int, series: Optional[Dict[str, HealthTimeSeries]] = None):
+        self.user_id = user_id
+        self.series: Dict[str, HealthTimeSeries] = series or {}
+
+    @classmethod
+    def from_records(cls, user_id: int,
+                     records: Iterable[Tuple[Union[str, DataType], datetime, object, Optional[str]]]) -> "HealthSeriesSet":
+        """
+        Build series from (data_type, timestamp, raw value, unit) records.
+
+        Non-numeric readings are skipped.
+        """
+        timestamps: Dict[str, list] = defaultdict(list)
+        values: Dict[str, list] = defaultdict(list)
+        units: Dict[str, Optional[str]] = {}
+        for data_type, timestamp, raw_value, unit in records:
+            key = _type_key(data_type)
+            parsed = parse_reading(raw_value, components_for(key))
+            if parsed is None:
+                continue
+            timestamps[key].append(timestamp)
+            values[key].append(parsed)
+            if unit and key not in units:
+                units[key] = unit
+
+        return cls(user_id, {
+            key: HealthTimeSeries.from_arrays(user_id, key, timestamps[key], values[key], unit=units.get(key))
+            for key in timestamps
+        })
+
+    @classmethod
+    def from_points(cls, user_id: int, points: Iterable[HealthDataPoint]) -> "HealthSeriesSet":
+        """Build series from HealthDataPoint objects."""
+        return cls.from_records(user_id, ((p.data_type, p.timestamp, p.value, p.unit) for p in points))
+
+    @classmethod
+    def from_health_data_rows(cls, user_id: int, rows: Iterable[HealthData], decrypt: bool = True) -> "HealthSeriesSet":
+        """Build series from HealthData rows, decrypting each value once."""
+        def records():
+            for row in rows:
+                if decrypt:
+                    row.decrypt_sensitive_fields()
+                yield row.data_type, row.timestamp, row.value, row.unit
+        return cls.from_records(user_id, records())
+
+    @classmethod
+    def load(cls, db: Session, user_id: int, start: datetime, end: Optional[datetime] = None,
+             data_types: Optional[Sequence[Union[str, DataType]]] = None) -> "HealthSeriesSet":
+        """
+        Load a user's readings with a single query.
+
+        Args:
+            db: Database session
+            user_id: User ID
+            start: Window start (inclusive)
+            end: Window end (exclusive, defaults to now)
+            data_types: Restrict to these data types
+        """
+        filters = [HealthData.user_id == user_id, HealthData.timestamp >= start]
+        if end is not None:
+            filters.append(HealthData.timestamp < end)
+        if data_types:
+            filters.append(HealthData.data_type.in_([_type_key(t) for t in data_types]))
+
+        # Select columns rather than entities so decryption never dirties the session
+        rows = db.query(
+            HealthData.data_type, HealthData.timestamp, HealthData.value, HealthData.unit
+        ).filter(and_(*filters)).order_by(HealthData.timestamp.asc()).all()
+        return cls.from_records(
+            user_id, ((data_type, timestamp, decrypt_value(value), unit) for data_type, timestamp, value, unit in rows)
+        )
+
+    def get(self, data_type: Union[str, DataType]) -> Optional[HealthTimeSeries]:
+        """Return the series for a data type, if any."""
+        return self.series.get(_type_key(data_type))
+
+    def __contains__(self, data_type: Union[str, DataType]) -> bool:
+        return _type_key(data_type) in self.series
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.series)
+
+    def __len__(self) -> int:
+        return len(self.series)
+
+    def items(self):
+        return self.series.items()
+
+    @property
+    def data_types(self) -> List[str]:
+        return list(self.series)
+
+    @property
+    def total_points(self) -> int:
+        return sum(len(s) for s in self.series.values())
+
+    @property
+    def nbytes(self) -> int:
+        return sum(s.nbytes for s in self.series.values())
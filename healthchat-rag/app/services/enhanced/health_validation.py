@@ -0,0 +1,343 @@
+"""
+Batch Health Data Validation
+Columnar, vectorized type, range and consistency checks over batches of readings with per-row reason codes
+"""
+
+import logging
+import warnings
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+from datetime import datetime, timedelta
+from dataclasses import dataclass
+from enum import IntFlag
+from numbers import Integral, Real
+import numpy as np
+
+from app.services.enhanced.data_integration import HealthDataPoint
+
+logger = logging.getLogger(__name__)
+
+
+class ReasonCode(IntFlag):
+    """Why a reading was rejected or flagged; a row carries any combination"""
+    MISSING_VALUE = 1
+    NON_NUMERIC = 2
+    NOT_INTEGER = 4
+    BELOW_MIN = 8
+    ABOVE_MAX = 16
+    MISSING_TIMESTAMP = 32
+    FUTURE_TIMESTAMP = 64
+    INCOMPLETE_BLOOD_PRESSURE = 128
+    INVERTED_BLOOD_PRESSURE = 256  # Diastolic at or above systolic
+    # Warnings
+    UNUSUAL_VALUE = 512
+    UNUSUAL_RATIO = 1024
+    LOW_CONFIDENCE = 2048
+    UNKNOWN_TYPE = 4096
+
+
+# Codes that make a reading invalid; the rest are warnings
+ERROR_CODES = (
+    ReasonCode.MISSING_VALUE | ReasonCode.NON_NUMERIC | ReasonCode.NOT_INTEGER
+    | ReasonCode.BELOW_MIN | ReasonCode.ABOVE_MAX | ReasonCode.MISSING_TIMESTAMP
+    | ReasonCode.FUTURE_TIMESTAMP | ReasonCode.INCOMPLETE_BLOOD_PRESSURE | ReasonCode.INVERTED_BLOOD_PRESSURE
+)
+
+# Python value kinds, for one pass of type inspection
+_KIND_OTHER, _KIND_NONE, _KIND_INT, _KIND_FLOAT, _KIND_DICT = range(5)
+_KINDS = {type(None): _KIND_NONE, int: _KIND_INT, float: _KIND_FLOAT, dict: _KIND_DICT}
+
+
+class RangeRule(NamedTuple):
+    """Valid and usual range of a numeric value"""
+    minimum: float
+    maximum: float
+    usual_low: Optional[float] = None  # Below this is valid but flagged
+    usual_high: Optional[float] = None
+    integer: bool = False
+
+
+DEFAULT_RULES: Dict[str, RangeRule] = {
+    'heart_rate': RangeRule(30, 200, usual_low=50, usual_high=120),
+    'steps': RangeRule(0, 50000, integer=True),
+    'sleep': RangeRule(0, 24, usual_low=4, usual_high=12),  # hours
+    'weight': RangeRule(10, 500),
+}
+
+BLOOD_PRESSURE_RULES = {
+    'systolic': RangeRule(70, 200),
+    'diastolic': RangeRule(40, 130),
+}
+
+# Sleep values above this many hours are taken to be minutes
+SLEEP_MINUTES_THRESHOLD = 24
+
+
+@dataclass
+class ReadingColumns:
+    """A batch of readings as parallel arrays"""
+    data_types: List[str]  # Distinct data types; type_codes index into this
+    type_codes: np.ndarray  # int16
+    values: np.ndarray  # float64; NaN where missing or not a number
+    kinds: np.ndarray  # int8 Python value kind
+    systolic: np.ndarray  # float64; NaN outside blood pressure readings
+    diastolic: np.ndarray
+    timestamps: np.ndarray  # datetime64[s]; NaT where missing
+    confidence: np.ndarray  # float64; NaN where missing
+
+    def __len__(self) -> int:
+        return len(self.type_codes)
+
+    @classmethod
+    def from_points(cls, points: Sequence[HealthDataPoint]) -> "ReadingColumns":
+        return cls.build(
+            [p.data_type for p in points], [p.value for p in points],
+            [p.timestamp for p in points], [p.confidence for p in points]
+        )
+
+    @classmethod
+    def from_records(cls, records: Sequence[Dict[str, Any]]) -> "ReadingColumns":
+        """Readings as dicts with data_type, value, timestamp and optional confidence."""
+        return cls.build(
+            [r.get('data_type') for r in records], [r.get('value') for r in records],
+            [r.get('timestamp') for r in records], [r.get('confidence') for r in records]
+        )
+
+    @classmethod
+    def build(cls, data_types: Sequence[Any], values: Sequence[Any], timestamps: Sequence[Any],
+              confidence: Sequence[Optional[float]]) -> "ReadingColumns":
+        """Convert per-reading fields to columns in one pass each."""
+        n = len(values)
+        names = [getattr(t, 'value', t) for t in data_types]
+        distinct = sorted(set(names), key=str)
+        index = {name: code for code, name in enumerate(distinct)}
+
+        kinds, floats = value_kinds(values)
+        systolic = np.full(n, np.nan)
+        diastolic = np.full(n, np.nan)
+        for row in np.flatnonzero(kinds == _KIND_DICT):
+            systolic[row] = _number(values[row].get('systolic'))
+            diastolic[row] = _number(values[row].get('diastolic'))
+
+        return cls(
+            data_types=distinct,
+            type_codes=np.fromiter((index[name] for name in names), np.int16, n),
+            values=floats,
+            kinds=kinds,
+            systolic=systolic,
+            diastolic=diastolic,
+            timestamps=to_datetime64(timestamps),
+            confidence=np.fromiter((np.nan if c is None else c for c in confidence), np.float64, n)
+        )
+
+
+@dataclass
+class BatchValidationResult:
+    """Reason codes for every reading in a batch"""
+    data_types: List[str]
+    type_codes: np.ndarray
+    codes: np.ndarray  # uint16 ReasonCode flags per row
+    confidence: np.ndarray
+
+    @property
+    def valid(self) -> np.ndarray:
+        return (self.codes & ERROR_CODES) == 0
+
+    def valid_indices(self) -> np.ndarray:
+        return np.flatnonzero(self.valid)
+
+    def reasons(self, row: int) -> List[str]:
+        """Reason code names of one row"""
+        return [flag.name.lower() for flag in ReasonCode if self.codes[row] & flag]
+
+    def reason_counts(self) -> Dict[str, Dict[str, int]]:
+        """Rows carrying each reason code, by data type"""
+        counts: Dict[str, Dict[str, int]] = {}
+        for flag in ReasonCode:
+            flagged = (self.codes & flag) != 0
+            if not flagged.any():
+                continue
+            per_type = np.bincount(self.type_codes[flagged], minlength=len(self.data_types))
+            for code in np.flatnonzero(per_type):
+                counts.setdefault(str(self.data_types[code]), {})[flag.name.lower()] = int(per_type[code])
+        return counts
+
+    def messages(self) -> Tuple[List[str], List[str]]:
+        """One error or warning message per data type and reason"""
+        errors, warnings = [], []
+        for data_type, reasons in self.reason_counts().items():
+            for reason, count in reasons.items():
+                message = f"{data_type}: {count} reading{'s' if count != 1 else ''} with {reason}"
+                (errors if ReasonCode[reason.upper()] & ERROR_CODES else warnings).append(message)
+        return errors, warnings
+
+    def quality(self) -> Dict[str, float]:
+        """Aggregate quality metrics of the batch"""
+        n = len(self.codes)
+        if not n:
+            return {'completeness': 0.0, 'validity': 0.0, 'accuracy': 0.0, 'warning_rate': 0.0}
+        missing = (self.codes & (ReasonCode.MISSING_VALUE | ReasonCode.MISSING_TIMESTAMP)) != 0
+        warned = (self.codes & ~ERROR_CODES & 0xFFFF) != 0
+        known = ~np.isnan(self.confidence)
+        return {
+            'completeness': float(1 - missing.mean()),
+            'validity': float(self.valid.mean()),
+            'accuracy': float(self.confidence[known].mean()) if known.any() else 0.8,
+            'warning_rate': float(warned.mean())
+        }
+
+
+class BatchValidator:
+    """
+    Validates batches of readings column by column.
+
+    Rules are applied once per data type as boolean masks over the whole
+    batch, so the cost is a few array passes per rule rather than Python
+    work per reading. Each row gets a bitmask of ReasonCode flags;
+    error codes make it invalid, the rest are warnings.
+    """
+
+    def __init__(self, rules: Optional[Dict[str, RangeRule]] = None,
+                 blood_pressure: Optional[Dict[str, RangeRule]] = None, max_pressure_ratio: float = 3.0,
+                 min_confidence: float = 0.5, future_tolerance: timedelta = timedelta(minutes=5)):
+        self.rules = rules or DEFAULT_RULES
+        self.blood_pressure = blood_pressure or BLOOD_PRESSURE_RULES
+        self.max_pressure_ratio = max_pressure_ratio
+        self.min_confidence = min_confidence
+        self.future_tolerance = future_tolerance
+
+    @classmethod
+    def from_processing_rules(cls, rules: Dict[str, Dict[str, Any]], **kwargs) -> "BatchValidator":
+        """Build a validator from HealthDataProcessor processing rules, keeping default usual ranges."""
+        ranges = {}
+        for data_type, default in DEFAULT_RULES.items():
+            rule = rules.get(data_type, {})
+            ranges[data_type] = default._replace(
+                minimum=rule.get('min_value', rule.get('min_hours', default.minimum)),
+                maximum=rule.get('max_value', rule.get('max_hours', default.maximum))
+            )
+        pressure = rules.get('blood_pressure', {})
+        blood_pressure = {
+            part: RangeRule(pressure[part]['min'], pressure[part]['max']) if part in pressure else default
+            for part, default in BLOOD_PRESSURE_RULES.items()
+        }
+        return cls(ranges, blood_pressure, pressure.get('ratio_threshold', 3.0), **kwargs)
+    
+    def validate_points(self, points: Sequence[HealthDataPoint], now: Optional[datetime] = None) -> BatchValidationResult:
+        return self.validate(ReadingColumns.from_points(points), now)
+
+    def validate(self, columns: ReadingColumns, now: Optional[datetime] = None) -> BatchValidationResult:
+        """
+        Check every reading in a batch.
+
+        Args:
+            columns: The batch as columns
+            now: Reference time for future timestamps (default: current time)
+
+        Returns:
+            BatchValidationResult with per-row reason codes
+        """
+        now = np.datetime64(now or datetime.utcnow(), 's') + np.timedelta64(self.future_tolerance)
+        codes = _flags(columns.kinds == _KIND_NONE, ReasonCode.MISSING_VALUE)
+        codes |= _flags(np.isnat(columns.timestamps), ReasonCode.MISSING_TIMESTAMP)
+        codes |= _flags(columns.timestamps > now, ReasonCode.FUTURE_TIMESTAMP)
+        codes |= _flags(columns.confidence < self.min_confidence, ReasonCode.LOW_CONFIDENCE)
+
+        for code, data_type in enumerate(columns.data_types):
+            rows = np.flatnonzero(columns.type_codes == code)
+            if data_type == 'blood_pressure':
+                codes[rows] |= self._check_blood_pressure(columns, rows)
+            elif data_type in self.rules:
+                values = columns.values[rows]
+                if data_type == 'sleep':
+                    values = np.where(values > SLEEP_MINUTES_THRESHOLD, values / 60, values)
+                codes[rows] |= check_range(values, columns.kinds[rows], self.rules[data_type])
+            else:
+                codes[rows] |= ReasonCode.UNKNOWN_TYPE
+
+        return BatchValidationResult(columns.data_types, columns.type_codes, codes, columns.confidence)
+
+    def _check_blood_pressure(self, columns: ReadingColumns, rows: np.ndarray) -> np.ndarray:
+        systolic, diastolic = columns.systolic[rows], columns.diastolic[rows]
+        present = columns.kinds[rows] != _KIND_NONE
+        codes = _flags(present & (np.isnan(systolic) | np.isnan(diastolic)), ReasonCode.INCOMPLETE_BLOOD_PRESSURE)
+        for values, rule in ((systolic, self.blood_pressure['systolic']), (diastolic, self.blood_pressure['diastolic'])):
+            codes |= _flags(values < rule.minimum, ReasonCode.BELOW_MIN)
+            codes |= _flags(values > rule.maximum, ReasonCode.ABOVE_MAX)
+        codes |= _flags(diastolic >= systolic, ReasonCode.INVERTED_BLOOD_PRESSURE)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            codes |= _flags((diastolic > 0) & (systolic / diastolic > self.max_pressure_ratio), ReasonCode.UNUSUAL_RATIO)
+        return codes
+
+
+def check_range(values: np.ndarray, kinds: np.ndarray, rule: RangeRule) -> np.ndarray:
+    """
+    Reason codes for numeric values against a range rule.
+
+    Args:
+        values: Values as float64, NaN where not a number
+        kinds: Python value kinds of the original values
+        rule: The range rule
+
+    Returns:
+        uint16 ReasonCode flags per value
+    """
+    numeric = (kinds == _KIND_INT) | (kinds == _KIND_FLOAT)
+    codes = _flags((kinds != _KIND_NONE) & ~numeric, ReasonCode.NON_NUMERIC)
+    if rule.integer:
+        codes |= _flags(kinds == _KIND_FLOAT, ReasonCode.NOT_INTEGER)
+    codes |= _flags(values < rule.minimum, ReasonCode.BELOW_MIN)
+    codes |= _flags(values > rule.maximum, ReasonCode.ABOVE_MAX)
+    if rule.usual_low is not None:
+        codes |= _flags((values < rule.usual_low) & (values >= rule.minimum), ReasonCode.UNUSUAL_VALUE)
+    if rule.usual_high is not None:
+        codes |= _flags((values > rule.usual_high) & (values <= rule.maximum), ReasonCode.UNUSUAL_VALUE)
+    return codes
+
+
+def value_kinds(values: Sequence[Any]) -> Tuple[np.ndarray, np.ndarray]:
+    """Python value kinds and float64 values (NaN where not a number) of a column."""
+    kinds = np.fromiter((_KINDS.get(type(v)) or _kind(v) for v in values), np.int8, len(values))
+    numeric = (kinds == _KIND_INT) | (kinds == _KIND_FLOAT)
+    return kinds, np.fromiter((v if ok else np.nan for v, ok in zip(values, numeric)), np.float64, len(values))
+
+
+def to_datetime64(timestamps: Sequence[Any]) -> np.ndarray:
+    """Timestamps (datetimes, ISO strings or None) as datetime64[s], NaT where missing or unparseable."""
+    try:
+        with warnings.catch_warnings():
+            # NumPy only warns on timezone-aware input; parse those one by one instead
+            warnings.simplefilter('error', DeprecationWarning)
+            return np.array(timestamps, dtype='datetime64[s]')
+    except (ValueError, TypeError, DeprecationWarning):
+        return np.array([_parse_timestamp(t) for t in timestamps], dtype='datetime64[s]')
+
+
+def _parse_timestamp(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None) if value.tzinfo is None else \
+            (value - value.utcoffset()).replace(tzinfo=None)
+    if isinstance(value, str):
+        try:
+            return _parse_timestamp(datetime.fromisoformat(value.replace('Z', '+00:00')))
+        except ValueError:
+            return None
+    return None
+
+
+def _kind(value: Any) -> int:
+    """Kind of a value whose exact type is not in _KINDS, such as a NumPy scalar"""
+    if isinstance(value, bool):
+        return _KIND_OTHER
+    if isinstance(value, Integral):
+        return _KIND_INT
+    if isinstance(value, Real):
+        return _KIND_FLOAT
+    return _KIND_DICT if isinstance(value, dict) else _KIND_OTHER
+
+
+def _number(value: Any) -> float:
+    return float(value) if _kind(value) in (_KIND_INT, _KIND_FLOAT) else np.nan
+
+
+def _flags(mask: np.ndarray, flag: ReasonCode) -> np.ndarray:
+    return mask.astype(np.uint16) * np.uint16(flag)
@@ -35,6 +35,7 @@ from app.services.enhanced.business_intelligence import (
 from app.exceptions.health_exceptions import MLDataPreparationError
 from app.utils.encryption_utils import field_encryption
 from app.utils.performance_monitoring import monitor_custom_performance
+from app.services.enhanced.health_rollups import HealthRollupStore, RollupGranularity
 
 logger = logging.getLogger(__name__)
 
@@ -148,6 +149,7 @@ class FeatureEngineeringPipeline:
     def __init__(self, db_session: Session):
         self.db = db_session
         self.bi_service = get_business_intelligence_service(db_session)
+        self.rollup_store = HealthRollupStore(db_session)
         self.config = self._load_feature_engineering_config()
     
     def _load_feature_engineering_config(self) -> Dict[str, Any]:
@@ -360,45 +362,43 @@ class FeatureEngineeringPipeline:
     
     async def _extract_rolling_features(self, user_id: int, start_date: datetime, 
                                       end_date: datetime) -> Dict[str, float]:
-        """Extract rolling window features from health data"""
+        """Extract rolling window features from precomputed daily rollups"""
         try:
-            # Get health metrics aggregations for rolling analysis
-            aggregations = self.db.query(HealthMetricsAggregation).filter(
-                and_(
-                    HealthMetricsAggregation.health_profile_id == user_id,
-                    HealthMetricsAggregation.period_start >= start_date,
-                    HealthMetricsAggregation.period_end <= end_date
-                )
-            ).order_by(HealthMetricsAggregation.period_start).all()
+            # Metric -> (data type, component, daily statistic)
+            metrics_to_analyze = {
+                'avg_blood_pressure_systolic': ('blood_pressure', 'systolic', 'mean'),
+                'avg_heart_rate': ('heart_rate', 'value', 'mean'),
+                'avg_weight': ('weight', 'value', 'mean'),
+                'total_steps': ('steps', 'value', 'sum'),
+                'avg_sleep_hours': ('sleep', 'value', 'mean')
+            }
             
-            if len(aggregations) < 7:  # Need at least 7 days for rolling features
-                return {}
+            rollups = self.rollup_store.get_rollups(
+                user_id, RollupGranularity.DAILY, start_date, end_date,
+                data_types=sorted({data_type for data_type, _, _ in metrics_to_analyze.values()})
+            )
+            daily = defaultdict(list)
+            for row in rollups:
+                if row.count:
+                    daily[(row.data_type, row.component)].append(row)
             
             features = {}
             
             # Calculate rolling features for each metric
-            metrics_to_analyze = [
-                'avg_blood_pressure_systolic', 'avg_heart_rate', 'avg_weight',
-                'total_steps', 'avg_sleep_hours'
-            ]
-            
-            for metric in metrics_to_analyze:
-                values = [getattr(agg, metric) for agg in aggregations if getattr(agg, metric) is not None]
+            for metric, (data_type, component, statistic) in metrics_to_analyze.items():
+                rows = daily.get((data_type, component), [])
+                if statistic == 'sum':
+                    values = np.array([row.total for row in rows])
+                else:
+                    values = np.array([row.total / row.count for row in rows])
+                if metric == 'avg_sleep_hours':
+                    values = values / 60  # Sleep is recorded in minutes
                 
-                if len(values) >= 7:
-                    # 7-day rolling average
-                    rolling_7 = pd.Series(values).rolling(window=7, min_periods=1).mean()
-                    features[f"{metric}_rolling_7_mean"] = rolling_7.iloc[-1] if not rolling_7.empty else 0
-                    
-                    # 14-day rolling average
-                    if len(values) >= 14:
-                        rolling_14 = pd.Series(values).rolling(window=14, min_periods=1).mean()
-                        features[f"{metric}_rolling_14_mean"] = rolling_14.iloc[-1] if not rolling_14.empty else 0
-                    
-                    # 30-day rolling average
-                    if len(values) >= 30:
-                        rolling_30 = pd.Series(values).rolling(window=30, min_periods=1).mean()
-                        features[f"{metric}_rolling_30_mean"] = rolling_30.iloc[-1] if not rolling_30.empty else 0
+                if len(values) >= 7:  # Need at least 7 days for rolling features
+                    # Mean of the trailing 7/14/30 days
+                    for window in (7, 14, 30):
+                        if len(values) >= window:
+                            features[f"{metric}_rolling_{window}_mean"] = float(values[-window:].mean())
             
             return features
             
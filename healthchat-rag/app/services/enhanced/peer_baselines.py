@@ -0,0 +1,227 @@
+"""
+Peer Group Baselines
+Per-metric population distributions by age band, gender and activity level, built nightly and shared per process
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from datetime import datetime, timedelta
+from collections import defaultdict
+from dataclasses import dataclass
+import numpy as np
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, func
+
+from app.config import settings
+from app.models.user import User
+from app.models.enhanced_health_models import HealthMetricRollup, PeerBaseline, UserHealthProfile
+from app.services.enhanced.health_rollups import RollupGranularity
+from app.utils.sketches import TDigest
+
+logger = logging.getLogger(__name__)
+
+# Matches any value of a peer group dimension
+ANY = "all"
+
+# Lower edges of the age bands; the last band is open-ended
+AGE_BAND_EDGES = (18, 30, 40, 50, 60, 70)
+
+
+class PeerGroup(NamedTuple):
+    """Peer group key; any dimension may be ANY"""
+    age_band: str
+    gender: str
+    activity_level: str
+
+    @classmethod
+    def for_user(cls, age: Optional[int], gender: Any = None, activity_level: Any = None) -> "PeerGroup":
+        return cls(age_band(age), _label(gender), _label(activity_level))
+
+    def fallbacks(self) -> List["PeerGroup"]:
+        """This group, then progressively broader ones, ending with everyone."""
+        return [
+            self,
+            PeerGroup(self.age_band, self.gender, ANY),
+            PeerGroup(self.age_band, ANY, ANY),
+            PeerGroup(ANY, ANY, ANY)
+        ]
+
+
+@dataclass
+class Baseline:
+    """One peer group's distribution of a metric, ready for percentile lookups"""
+    group: PeerGroup
+    data_type: str
+    component: str
+    user_count: int
+    mean: float
+    positions: np.ndarray  # Percentile at each of values, ascending
+    values: np.ndarray  # Digest min, centroid means, max
+
+    @classmethod
+    def from_row(cls, row: PeerBaseline) -> "Baseline":
+        digest = TDigest.from_dict(row.digest)
+        cumulative = np.cumsum(digest.weights)
+        total = cumulative[-1]
+        positions = np.concatenate(([0.0], cumulative - digest.weights / 2, [total])) / total * 100
+        values = np.concatenate(([digest.min], digest.means, [digest.max]))
+        return cls(
+            group=PeerGroup(row.age_band, row.gender, row.activity_level),
+            data_type=row.data_type, component=row.component,
+            user_count=row.user_count, mean=row.mean, positions=positions, values=values
+        )
+
+    def percentile(self, value: float) -> float:
+        """Approximate percentage of peers at or below value (binary search, O(log n))."""
+        return float(np.interp(value, self.values, self.positions))
+
+    def quantile(self, q: float) -> float:
+        """Approximate value at percentile q in [0, 100]."""
+        return float(np.interp(q, self.positions, self.values))
+
+
+class PeerBaselineStore:
+    """
+    Peer group baselines held in memory.
+
+    ``build`` (run nightly) reduces the daily rollups to one mean per user
+    and metric with a single GROUP BY, groups users by age band, gender
+    and activity level, plus the broader groups used as fallbacks, and
+    stores each group's distribution as a t-digest. ``load`` reads those
+    few hundred rows once; a process then serves percentile lookups from
+    memory, falling back to broader groups when a group has too few users.
+    """
+
+    def __init__(self, baselines: Optional[Iterable[Baseline]] = None, built_at: Optional[datetime] = None,
+                 min_users: Optional[int] = None):
+        self.baselines: Dict[Tuple[PeerGroup, str, str], Baseline] = {
+            (b.group, b.data_type, b.component): b for b in baselines or []
+        }
+        self.built_at = built_at
+        self.min_users = min_users if min_users is not None else settings.peer_baseline_min_users
+
+    @classmethod
+    def load(cls, db_session: Session, min_users: Optional[int] = None) -> "PeerBaselineStore":
+        """Load every stored baseline."""
+        rows = db_session.query(PeerBaseline).all()
+        built_at = max((row.built_at for row in rows), default=None)
+        return cls((Baseline.from_row(row) for row in rows if row.user_count), built_at, min_users)
+
+    def __len__(self) -> int:
+        return len(self.baselines)
+
+    def lookup(self, group: PeerGroup, data_type: str, component: str = "value") -> Optional[Baseline]:
+        """
+        Baseline for the narrowest group containing the user with at least min_users peers.
+
+        Returns:
+            The baseline, or None if no group has enough users for the metric
+        """
+        for candidate in group.fallbacks():
+            baseline = self.baselines.get((candidate, data_type, component))
+            if baseline is not None and baseline.user_count >= self.min_users:
+                return baseline
+        return None
+
+    @staticmethod
+    def build(db_session: Session, days: Optional[int] = None) -> int:
+        """
+        Rebuild all baselines from the last days of daily rollups.
+
+        Args:
+            db_session: Database session
+            days: Window of readings per user (default ``peer_baseline_days``)
+
+        Returns:
+            Number of baselines written
+        """
+        days = days or settings.peer_baseline_days
+        since = datetime.utcnow() - timedelta(days=days)
+        user_means = db_session.query(
+            HealthMetricRollup.user_id,
+            HealthMetricRollup.data_type,
+            HealthMetricRollup.component,
+            func.sum(HealthMetricRollup.total) / func.sum(HealthMetricRollup.count)
+        ).filter(and_(
+            HealthMetricRollup.granularity == RollupGranularity.DAILY.value,
+            HealthMetricRollup.bucket_start >= since,
+            HealthMetricRollup.count > 0
+        )).group_by(
+            HealthMetricRollup.user_id, HealthMetricRollup.data_type, HealthMetricRollup.component
+        ).all()
+
+        demographics = {
+            user_id: PeerGroup.for_user(age, gender, activity_level)
+            for user_id, age, gender, activity_level in db_session.query(
+                User.id, User.age, UserHealthProfile.gender, UserHealthProfile.activity_level
+            ).outerjoin(UserHealthProfile, UserHealthProfile.user_id == User.id)
+        }
+
+        grouped: Dict[Tuple[PeerGroup, str, str], List[float]] = defaultdict(list)
+        for user_id, data_type, component, mean in user_means:
+            group = demographics.get(user_id, PeerGroup(ANY, ANY, ANY))
+            for candidate in dict.fromkeys(group.fallbacks()):
+                grouped[(candidate, data_type, component)].append(float(mean))
+
+        now = datetime.utcnow()
+        db_session.query(PeerBaseline).delete(synchronize_session=False)
+        db_session.bulk_insert_mappings(PeerBaseline, [
+            {
+                'age_band': group.age_band, 'gender': group.gender, 'activity_level': group.activity_level,
+                'data_type': data_type, 'component': component,
+                'user_count': len(means), 'mean': float(np.mean(means)),
+                'digest': TDigest().update(means).to_dict(), 'built_at': now
+            }
+            for (group, data_type, component), means in grouped.items()
+        ])
+        db_session.commit()
+        logger.info(f"Built {len(grouped)} peer baselines from {len(demographics)} users")
+        return len(grouped)
+
+
+def age_band(age: Optional[int]) -> str:
+    """Age band label (e.g. 30-39), or ANY when the age is unknown."""
+    if age is None:
+        return ANY
+    index = int(np.searchsorted(AGE_BAND_EDGES, age, side="right"))
+    if index == 0:
+        return f"<{AGE_BAND_EDGES[0]}"
+    if index == len(AGE_BAND_EDGES):
+        return f"{AGE_BAND_EDGES[-1]}+"
+    return f"{AGE_BAND_EDGES[index - 1]}-{AGE_BAND_EDGES[index] - 1}"
+
+
+def _label(value: Any) -> str:
+    if value is None:
+        return ANY
+    return str(getattr(value, "value", value))
+
+
+# Baselines shared by every request in the process
+_shared_store: Optional[PeerBaselineStore] = None
+_shared_loaded_at = 0.0
+_shared_lock = threading.Lock()
+
+
+def get_peer_baseline_store(db_session: Session) -> PeerBaselineStore:
+    """
+    Get the process-wide baseline store, loading it on first use.
+
+    The store is reloaded at most every ``peer_baseline_reload_seconds``,
+    so a nightly rebuild reaches every worker without a query per request.
+    """
+    global _shared_store, _shared_loaded_at
+    with _shared_lock:
+        if _shared_store is None or time.monotonic() - _shared_loaded_at > settings.peer_baseline_reload_seconds:
+            _shared_store = PeerBaselineStore.load(db_session)
+            _shared_loaded_at = time.monotonic()
+        return _shared_store
+
+
+def reset_peer_baseline_store() -> None:
+    """Drop the shared store so the next lookup reloads it."""
+    global _shared_store
+    with _shared_lock:
+        _shared_store = None
@@ -0,0 +1,189 @@
+"""
+Population Health Statistics
+Per-metric population distributions computed with SQL aggregates and mergeable sketches in bounded memory
+"""
+
+import logging
+from typing import Any, Dict, Iterable, List, Tuple
+from enum import Enum
+import numpy as np
+from sqlalchemy.orm import Session
+from sqlalchemy import distinct, func
+
+from app.models.health_data import HealthData
+from app.models.enhanced_health_models import HealthMetricRollup
+from app.services.enhanced.health_rollups import RollupGranularity, RunningAggregate, rollups_backfilled
+from app.services.enhanced.health_timeseries import COMPONENT_FIELDS, HealthSeriesSet, decrypt_value
+from app.utils.sketches import TDigest
+
+logger = logging.getLogger(__name__)
+
+# Percentiles reported for every metric
+POPULATION_PERCENTILES = (25, 50, 75, 90, 95)
+
+# Rows fetched per round trip when streaming
+STREAM_CHUNK_SIZE = 5000
+
+
+class PopulationSource(str, Enum):
+    """Where population statistics are computed from"""
+    ROLLUPS = "rollups"
+    READINGS = "readings"
+
+
+class PopulationStatisticsEngine:
+    """
+    Computes population statistics per health metric without loading the table.
+
+    From rollups, counts, sums, sums of squares and extremes are summed by
+    the database in one GROUP BY over monthly buckets, and percentiles come
+    from merging the buckets' t-digests streamed with ``yield_per``. From
+    readings, rows are streamed in chunks, decrypted and folded into one
+    mergeable aggregate per metric. Either way memory is bounded by the
+    number of metrics, not readings. Counts, mean, std, min and max are
+    exact; median and percentiles are t-digest estimates.
+    """
+
+    def __init__(self, db_session: Session, chunk_size: int = STREAM_CHUNK_SIZE):
+        self.db = db_session
+        self.chunk_size = chunk_size
+
+    def compute(self, source: PopulationSource = PopulationSource.ROLLUPS) -> Dict[str, Any]:
+        """
+        Compute per-metric population statistics.
+
+        Args:
+            source: "rollups" (falls back to readings until the rollup backfill
+                has completed, or when no rollups exist) or "readings"
+
+        Returns:
+            Dict with population_stats keyed by metric, total_users,
+            total_data_points and the source used
+        """
+        source = PopulationSource(source)
+        if source == PopulationSource.ROLLUPS and not rollups_backfilled(self.db):
+            logger.warning("Rollups have not been backfilled from stored readings; "
+                           "computing population statistics from readings")
+            source = PopulationSource.READINGS
+        if source == PopulationSource.ROLLUPS:
+            aggregates = self._aggregate_rollups()
+            if not aggregates:
+                logger.info("No monthly rollups found; computing population statistics from readings")
+                source = PopulationSource.READINGS
+        if source == PopulationSource.READINGS:
+            aggregates = self._aggregate_readings()
+
+        total_users, total_data_points = self._table_totals(source)
+        return {
+            'population_stats': {
+                metric_key(data_type, component): describe(aggregate)
+                for (data_type, component), aggregate in sorted(aggregates.items()) if aggregate.count
+            },
+            'total_users': total_users,
+            'total_data_points': total_data_points,
+            'source': source.value
+        }
+
+    def _aggregate_rollups(self) -> Dict[Tuple[str, str], RunningAggregate]:
+        """Sum monthly rollups in SQL and merge their digests in a streaming pass."""
+        monthly = HealthMetricRollup.granularity == RollupGranularity.MONTHLY.value
+        rows = self.db.query(
+            HealthMetricRollup.data_type,
+            HealthMetricRollup.component,
+            func.sum(HealthMetricRollup.count),
+            func.sum(HealthMetricRollup.total),
+            func.sum(HealthMetricRollup.total_sq),
+            func.min(HealthMetricRollup.minimum),
+            func.max(HealthMetricRollup.maximum)
+        ).filter(monthly).group_by(HealthMetricRollup.data_type, HealthMetricRollup.component).all()
+
+        aggregates = {
+            (data_type, component): RunningAggregate(
+                count=int(count or 0), total=float(total or 0.0), total_sq=float(total_sq or 0.0),
+                minimum=minimum, maximum=maximum
+            )
+            for data_type, component, count, total, total_sq, minimum, maximum in rows
+        }
+
+        digests = self.db.query(
+            HealthMetricRollup.data_type, HealthMetricRollup.component, HealthMetricRollup.digest
+        ).filter(monthly).yield_per(self.chunk_size)
+        for data_type, component, digest in digests:
+            aggregate = aggregates.get((data_type, component))
+            if aggregate is not None and digest:
+                aggregate.digest.merge(TDigest.from_dict(digest))
+        return aggregates
+
+    def _aggregate_readings(self) -> Dict[Tuple[str, str], RunningAggregate]:
+        """Stream raw readings in chunks into one aggregate per metric."""
+        aggregates: Dict[Tuple[str, str], RunningAggregate] = {}
+        rows = self.db.query(
+            HealthData.data_type, HealthData.timestamp, HealthData.value
+        ).yield_per(self.chunk_size)
+
+        for chunk in _chunks(rows, self.chunk_size):
+            series_set = HealthSeriesSet.from_records(
+                0, ((data_type, timestamp, decrypt_value(value), None) for data_type, timestamp, value in chunk)
+            )
+            for data_type, series in series_set.items():
+                for index, component in enumerate(series.components):
+                    partial = RunningAggregate.from_values(series.timestamps, series.values[:, index])
+                    aggregates.setdefault((data_type, component), RunningAggregate()).merge(partial)
+        return aggregates
+
+    def _table_totals(self, source: PopulationSource) -> Tuple[int, int]:
+        """Distinct users and readings, counted by the database."""
+        if source == PopulationSource.ROLLUPS:
+            # Count each multi-component reading once, under its first component
+            secondary = [component for components in COMPONENT_FIELDS.values() for component in components[1:]]
+            total_users, total_points = self.db.query(
+                func.count(distinct(HealthMetricRollup.user_id)), func.sum(HealthMetricRollup.count)
+            ).filter(
+                HealthMetricRollup.granularity == RollupGranularity.MONTHLY.value,
+                HealthMetricRollup.component.notin_(secondary)
+            ).one()
+        else:
+            total_users, total_points = self.db.query(
+                func.count(distinct(HealthData.user_id)), func.count(HealthData.id)
+            ).one()
+        return int(total_users or 0), int(total_points or 0)
+
+
+def metric_key(data_type: str, component: str) -> str:
+    """Report key for a metric (e.g. heart_rate, blood_pressure_systolic)."""
+    return data_type if component == "value" else f"{data_type}_{component}"
+
+
+def describe(aggregate: RunningAggregate, percentiles: Iterable[int] = POPULATION_PERCENTILES) -> Dict[str, Any]:
+    """
+    Population statistics for one metric.
+
+    std is the population standard deviation (ddof=0), as np.std.
+    """
+    mean = aggregate.mean
+    variance = max(aggregate.total_sq / aggregate.count - mean * mean, 0.0)
+    return {
+        'count': aggregate.count,
+        'mean': mean,
+        'median': aggregate.quantile(0.5),
+        'std': float(np.sqrt(variance)),
+        'min': aggregate.minimum,
+        'max': aggregate.maximum,
+        'percentiles': {str(p): aggregate.quantile(p / 100) for p in percentiles}
+    }
+
+
+def _chunks(rows: Iterable, size: int) -> Iterable[List]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def get_population_statistics_engine(db_session: Session) -> PopulationStatisticsEngine:
+    """Create a population statistics engine bound to a database session"""
+    return PopulationStatisticsEngine(db_session)
@@ -0,0 +1,214 @@
+"""
+Streaming Stage Pipeline
+Bounded, chunked async stage graph with backpressure, per-stage concurrency and throughput/latency counters
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Union
+from dataclasses import dataclass, field
+
+from app.utils.metrics_registry import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+# A stage takes a chunk and returns {'data': [...], 'errors': [...], 'warnings': [...]};
+# stages that only consume their input may leave 'data' out to pass the chunk through
+StageFunction = Callable[[List[Any]], Awaitable[Dict[str, Any]]]
+Source = Union[Iterable[Any], AsyncIterator[Any]]
+
+_END = object()  # Marks the end of a stage's input
+
+
+@dataclass
+class Stage:
+    """One step of a streaming pipeline"""
+    name: str
+    function: StageFunction
+    concurrency: int = 1  # Chunks processed at once; keep 1 for stages sharing a database session
+
+
+@dataclass
+class StageStats:
+    """Throughput and latency counters of one stage"""
+    name: str
+    chunks: int = 0
+    items_in: int = 0
+    items_out: int = 0
+    busy_seconds: float = 0.0  # Summed time spent inside the stage function
+    max_latency: float = 0.0  # Slowest single chunk
+    failures: int = 0  # Chunks whose stage function raised
+
+    def record(self, items_in: int, items_out: int, seconds: float) -> None:
+        self.chunks += 1
+        self.items_in += items_in
+        self.items_out += items_out
+        self.busy_seconds += seconds
+        self.max_latency = max(self.max_latency, seconds)
+
+    @property
+    def throughput(self) -> float:
+        """Items per busy second"""
+        return self.items_in / self.busy_seconds if self.busy_seconds else 0.0
+
+    @property
+    def mean_latency(self) -> float:
+        return self.busy_seconds / self.chunks if self.chunks else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'stage': self.name,
+            'chunks': self.chunks,
+            'items_in': self.items_in,
+            'items_out': self.items_out,
+            'failures': self.failures,
+            'throughput_per_second': round(self.throughput, 1),
+            'mean_latency_ms': round(self.mean_latency * 1000, 2),
+            'max_latency_ms': round(self.max_latency * 1000, 2)
+        }
+
+
+@dataclass
+class PipelineRun:
+    """Outcome of streaming a source through a pipeline"""
+    stages: List[StageStats]
+    items_read: int = 0  # Items taken from the source
+    elapsed: float = 0.0
+    errors: List[str] = field(default_factory=list)
+    warnings: List[str] = field(default_factory=list)
+    dropped_messages: int = 0  # Errors and warnings beyond the retained limit
+
+    @property
+    def items_out(self) -> int:
+        return self.stages[-1].items_out if self.stages else self.items_read
+
+    def stage(self, name: str) -> Optional[StageStats]:
+        return next((stats for stats in self.stages if stats.name == name), None)
+
+
+class StreamingPipeline:
+    """
+    Runs chunks of a source through a chain of stages.
+
+    Each stage is a set of worker tasks reading from a bounded queue and
+    writing to the next one, so stages overlap: while storage writes one
+    chunk, validation is already checking the next. A full queue blocks
+    its producer, which bounds memory to roughly
+    ``chunk_size * (queue_size + concurrency)`` items per stage no matter
+    how large the source is. Chunks are not kept after the last stage
+    unless a sink does so.
+    """
+
+    def __init__(self, stages: List[Stage], chunk_size: int = 500, queue_size: int = 2,
+                 max_messages: int = 100):
+        self.stages = stages
+        self.chunk_size = chunk_size
+        self.queue_size = queue_size
+        self.max_messages = max_messages
+
+    async def run(self, source: Source,
+                  sink: Optional[Callable[[List[Any]], Awaitable[None]]] = None) -> PipelineRun:
+        """
+        Stream a source through every stage.
+
+        Args:
+            source: Items, as an iterable or async iterator
+            sink: Called with each chunk leaving the last stage
+
+        Returns:
+            PipelineRun with per-stage counters and collected messages
+        """
+        started = time.perf_counter()
+        run = PipelineRun([StageStats(stage.name) for stage in self.stages])
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+
+        tasks = [asyncio.create_task(self._feed(source, queues[0], run))]
+        for index, stage in enumerate(self.stages):
+            tasks.append(asyncio.create_task(
+                self._run_stage(stage, run.stages[index], queues[index], queues[index + 1], run)
+            ))
+        tasks.append(asyncio.create_task(self._drain(queues[-1], sink)))
+
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        run.elapsed = time.perf_counter() - started
+        for stats in run.stages:
+            metrics_registry.observe_pipeline_stage(stats.name, stats.items_in, stats.items_out,
+                                                    stats.busy_seconds, stats.failures)
+        return run
+
+    async def _feed(self, source: Source, output: asyncio.Queue, run: PipelineRun) -> None:
+        async for chunk in chunked(source, self.chunk_size):
+            run.items_read += len(chunk)
+            await output.put(chunk)
+        await output.put(_END)
+
+    async def _run_stage(self, stage: Stage, stats: StageStats, input_queue: asyncio.Queue,
+                         output: asyncio.Queue, run: PipelineRun) -> None:
+        async def worker() -> None:
+            while True:
+                chunk = await input_queue.get()
+                if chunk is _END:
+                    await input_queue.put(_END)  # Let sibling workers see it too
+                    return
+
+                chunk_started = time.perf_counter()
+                try:
+                    result = await stage.function(chunk)
+                except Exception as e:
+                    stats.failures += 1
+                    self._collect(run, [f"{stage.name} failed for a chunk of {len(chunk)} items: {e}"], [])
+                    logger.error(f"Pipeline stage {stage.name} failed: {e}")
+                    continue
+                data = result.get('data', chunk)
+                stats.record(len(chunk), len(data), time.perf_counter() - chunk_started)
+                self._collect(run, result.get('errors', []), result.get('warnings', []))
+
+                if data:
+                    await output.put(data)
+
+        await asyncio.gather(*(worker() for _ in range(max(stage.concurrency, 1))))
+        await output.put(_END)
+
+    @staticmethod
+    async def _drain(input_queue: asyncio.Queue, sink: Optional[Callable[[List[Any]], Awaitable[None]]]) -> None:
+        while True:
+            chunk = await input_queue.get()
+            if chunk is _END:
+                return
+            if sink is not None:
+                await sink(chunk)
+
+    def _collect(self, run: PipelineRun, errors: List[str], warnings: List[str]) -> None:
+        room = self.max_messages - len(run.errors) - len(run.warnings)
+        kept_errors = errors[:max(room, 0)]
+        kept_warnings = warnings[:max(room - len(kept_errors), 0)]
+        run.errors.extend(kept_errors)
+        run.warnings.extend(kept_warnings)
+        run.dropped_messages += len(errors) + len(warnings) - len(kept_errors) - len(kept_warnings)
+
+
+async def chunked(source: Source, size: int) -> AsyncIterator[List[Any]]:
+    """Group an iterable or async iterator into lists of at most ``size`` items."""
+    chunk: List[Any] = []
+    if hasattr(source, '__aiter__'):
+        async for item in source:
+            chunk.append(item)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+    else:
+        for item in source:
+            chunk.append(item)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+                await asyncio.sleep(0)  # Let downstream stages run between chunks
+    if chunk:
+        yield chunk
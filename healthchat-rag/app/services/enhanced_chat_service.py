@@ -12,6 +12,7 @@ from app.models.health_data import HealthData, SymptomLog, MedicationLog
 from app.services.openai_agent import HealthAgent
 from app.services.health_analytics import HealthAnalyticsService
 from app.utils.encryption_utils import encryption_manager
+from app.utils.tracing import tracer
 import json
 
 logger = logging.getLogger(__name__)
@@ -202,10 +203,12 @@ Remember: Your role is to support and educate, not to diagnose or treat medical
         """Enhanced chat with comprehensive health context"""
         try:
             # Get user health context
-            health_context = self.get_user_health_context(user.id)
+            with tracer.span("health_context"):
+                health_context = self.get_user_health_context(user.id)
             
             # Get conversation history
-            conversation_history = self.get_conversation_history(user.id)
+            with tracer.span("conversation_history"):
+                conversation_history = self.get_conversation_history(user.id)
             
             # Create enhanced system prompt
             system_prompt = self.create_enhanced_system_prompt(user, health_context, conversation_history)
@@ -227,7 +230,8 @@ Remember: Your role is to support and educate, not to diagnose or treat medical
                 }
             
             # Add health insights if relevant
-            enhanced_response = self._add_health_insights(response, health_context, user.id)
+            with tracer.span("health_insights"):
+                enhanced_response = self._add_health_insights(response, health_context, user.id)
             
             return {
                 "response": enhanced_response,
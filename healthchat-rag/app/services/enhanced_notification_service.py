@@ -235,24 +235,7 @@ class EnhancedNotificationService:
             sent_alerts = []
             for alert in alerts:
                 try:
-                    result = await self.send_smart_notification(
-                        user_id=user_id,
-                        notification_type=alert["notification_type"],
-                        title=f"Health Alert: {alert['description']}",
-                        message=f"Your {alert['description'].lower()} is {alert['value']} {alert['unit']}. "
-                               f"This is outside the normal range of {alert.get('threshold', 'N/A')} {alert['unit']}. "
-                               f"Please consult with your healthcare provider if this persists.",
-                        context_data={
-                            "alert_type": alert["type"],
-                            "metric": alert["metric"],
-                            "value": alert["value"],
-                            "threshold": alert.get("threshold"),
-                            "unit": alert["unit"],
-                            "urgency": alert["urgency"].value,
-                            "trigger_type": "health_metric_threshold"
-                        },
-                        db=db
-                    )
+                    result = await self.send_threshold_alert(user_id, alert, db)
                     
                     sent_alerts.append({
                         "alert": alert,
@@ -268,6 +251,42 @@ class EnhancedNotificationService:
             logger.error(f"Failed to monitor health metrics for user {user_id}: {e}")
             return alerts
     
+    async def send_threshold_alert(
+        self,
+        user_id: int,
+        alert: Dict[str, Any],
+        db: Session
+    ) -> Dict[str, Any]:
+        """
+        Send a health metric threshold alert.
+        
+        Args:
+            user_id: Target user ID
+            alert: Alert from SmartNotificationLogic.check_health_metric_thresholds
+            db: Database session
+            
+        Returns:
+            Dictionary with delivery results
+        """
+        return await self.send_smart_notification(
+            user_id=user_id,
+            notification_type=alert["notification_type"],
+            title=f"Health Alert: {alert['description']}",
+            message=f"Your {alert['description'].lower()} is {alert['value']} {alert['unit']}. "
+                   f"This is outside the normal range of {alert.get('threshold', 'N/A')} {alert['unit']}. "
+                   f"Please consult with your healthcare provider if this persists.",
+            context_data={
+                "alert_type": alert["type"],
+                "metric": alert["metric"],
+                "value": alert["value"],
+                "threshold": alert.get("threshold"),
+                "unit": alert["unit"],
+                "urgency": alert["urgency"].value,
+                "trigger_type": "health_metric_threshold"
+            },
+            db=db
+        )
+    
     async def process_medication_reminders(
         self,
         user_id: int,
@@ -10,6 +10,9 @@ from sqlalchemy import func, and_, desc
 from app.models.health_data import HealthData, SymptomLog, MedicationLog, HealthGoal, HealthAlert
 from app.models.user import User
 from app.utils.encryption_utils import encryption_manager
+from app.config import settings
+from app.services.enhanced import health_kernels as kernels
+from app.services.enhanced.health_timeseries import HealthSeriesSet
 import json
 import statistics
 
@@ -21,8 +24,14 @@ class HealthAnalyticsService:
     def __init__(self, db: Session):
         self.db = db
     
-    def get_health_trends(self, user_id: int, data_type: str, days: int = 30) -> Dict[str, Any]:
-        """Analyze health data trends over time"""
+    def get_health_trends(self, user_id: int, data_type: str, days: int = 30,
+                          max_points: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Analyze health data trends over time.
+        
+        Statistics use every reading; trend_data is LTTB-downsampled to
+        max_points (default ``series_default_points``) for charting.
+        """
         try:
             start_date = datetime.utcnow() - timedelta(days=days)
             
@@ -43,36 +52,10 @@ class HealthAnalyticsService:
                     "data_points": 0
                 }
             
-            # Decrypt sensitive fields
-            for data in health_data:
-                data.decrypt_sensitive_fields()
+            # Decrypt once and parse numeric readings into a columnar series
+            series = HealthSeriesSet.from_health_data_rows(user_id, health_data).get(data_type)
             
-            # Extract numeric values for analysis
-            values = []
-            timestamps = []
-            
-            for data in health_data:
-                try:
-                    # Try to parse as JSON first, then as float
-                    if data.value.startswith('{'):
-                        parsed_value = json.loads(data.value)
-                        if isinstance(parsed_value, dict):
-                            # Look for common numeric fields
-                            for key in ['value', 'systolic', 'diastolic', 'reading', 'level']:
-                                if key in parsed_value and isinstance(parsed_value[key], (int, float)):
-                                    values.append(float(parsed_value[key]))
-                                    timestamps.append(data.timestamp)
-                                    break
-                        else:
-                            values.append(float(parsed_value))
-                            timestamps.append(data.timestamp)
-                    else:
-                        values.append(float(data.value))
-                        timestamps.append(data.timestamp)
-                except (ValueError, json.JSONDecodeError, KeyError):
-                    continue
-            
-            if not values:
+            if series is None or not len(series):
                 return {
                     "data_type": data_type,
                     "trend": "no_numeric_data",
@@ -81,8 +64,14 @@ class HealthAnalyticsService:
                 }
             
             # Calculate trend statistics
+            values = series.primary.tolist()
+            timestamps = series.to_datetimes()
             trend_analysis = self._calculate_trend_statistics(values, timestamps)
             
+            keep = kernels.lttb(series.epoch_seconds(), series.primary,
+                                min(max_points or settings.series_default_points, settings.series_max_points))
+            trend_analysis["trend_data"] = [trend_analysis["trend_data"][i] for i in keep.tolist()]
+            
             return {
                 "data_type": data_type,
                 "trend": trend_analysis["trend"],
@@ -90,6 +79,7 @@ class HealthAnalyticsService:
                 "total_records": len(health_data),
                 "statistics": trend_analysis["statistics"],
                 "trend_data": trend_analysis["trend_data"],
+                "trend_points": len(trend_analysis["trend_data"]),
                 "insights": trend_analysis["insights"]
             }
             
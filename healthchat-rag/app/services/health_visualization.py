@@ -3,437 +3,312 @@ Health Visualization Service
 Provides chart and graph data for health analytics
 """
 import logging
-from typing import List, Dict, Any, Optional, Tuple
+import hashlib
+from typing import List, Dict, Any, Optional, Tuple, Iterable
 from datetime import datetime, timedelta
+from dataclasses import dataclass
+from collections import Counter
+import numpy as np
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, desc, func
+from sqlalchemy import and_, func
+from app.config import settings
 from app.models.health_data import HealthData, SymptomLog, MedicationLog
-from app.models.user import User
-from app.utils.encryption_utils import encryption_manager
-import json
-import statistics
+from app.services.enhanced import health_kernels as kernels
+from app.services.enhanced.health_correlation import resample
+from app.services.enhanced.health_timeseries import HealthSeriesSet, decrypt_value
+from app.utils.cache import CacheManager, get_cache_manager
 
 logger = logging.getLogger(__name__)
 
+# Chart builders and the tables each one reads
+CHART_SOURCES = {
+    "health_trends": ("readings",),
+    "symptom_distribution": ("symptoms",),
+    "medication_adherence": ("medications",),
+    "data_completeness": ("readings",),
+    "health_score_timeline": ("readings",),
+    "correlation_matrix": ("readings",),
+}
+
+SEVERITY_LEVELS = ("mild", "moderate", "severe")
+
+
+@dataclass
+class DashboardWindow:
+    """One user's readings, symptoms and medications for a window, loaded and decrypted once"""
+    series: HealthSeriesSet  # Numeric readings, columnar per data type
+    reading_types: np.ndarray  # Data type of every reading, numeric or not
+    reading_times: np.ndarray  # datetime64[s]
+    symptoms: List[Tuple[str, str]]  # (symptom, severity)
+    medication_names: np.ndarray
+    medication_times: np.ndarray  # datetime64[s]
+    
+    @classmethod
+    def load(cls, db: Session, user_id: int, start_date: datetime,
+             sources: Iterable[str] = ("readings", "symptoms", "medications")) -> "DashboardWindow":
+        """Load the window with one column query per table it needs"""
+        sources = set(sources)
+        readings, symptoms, medications = [], [], []
+        
+        if "readings" in sources:
+            readings = db.query(
+                HealthData.data_type, HealthData.timestamp, HealthData.value, HealthData.unit
+            ).filter(
+                and_(HealthData.user_id == user_id, HealthData.timestamp >= start_date)
+            ).order_by(HealthData.timestamp.asc()).all()
+        if "symptoms" in sources:
+            symptoms = db.query(SymptomLog.symptom, SymptomLog.severity).filter(
+                and_(SymptomLog.user_id == user_id, SymptomLog.timestamp >= start_date)
+            ).all()
+        if "medications" in sources:
+            medications = db.query(MedicationLog.medication_name, MedicationLog.taken_at).filter(
+                and_(MedicationLog.user_id == user_id, MedicationLog.taken_at >= start_date)
+            ).all()
+        
+        return cls(
+            series=HealthSeriesSet.from_records(
+                user_id, ((data_type, timestamp, decrypt_value(value), unit) for data_type, timestamp, value, unit in readings)
+            ),
+            reading_types=np.array([row[0] for row in readings], dtype=object),
+            reading_times=np.array([row[1] for row in readings], dtype="datetime64[s]"),
+            symptoms=[(symptom, severity) for symptom, severity in symptoms],
+            medication_names=np.array([row[0] for row in medications], dtype=object),
+            medication_times=np.array([row[1] for row in medications], dtype="datetime64[s]")
+        )
+
+
 class HealthVisualizationService:
     """Service for generating visualization data for health analytics"""
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, cache: Optional[CacheManager] = None,
+                 max_points: Optional[int] = None):
         self.db = db
+        self._cache = cache
+        self.max_points = max_points or settings.dashboard_max_points
+    
+    @property
+    def cache(self) -> CacheManager:
+        if self._cache is None:
+            self._cache = get_cache_manager()
+        return self._cache
     
     def generate_health_dashboard_charts(self, user_id: int, days: int = 30) -> Dict[str, Any]:
-        """Generate comprehensive chart data for health dashboard"""
+        """
+        Generate comprehensive chart data for health dashboard.
+        
+        The window is loaded once (one query per table) and every chart is
+        built from the same arrays. Results are cached per user, window and
+        data version, so any write to the user's readings, symptoms or
+        medications produces a new key.
+        """
         try:
+            data_version = self._data_version(user_id)
+            cache_key = f"dashboard_charts:{user_id}:{days}:{self.max_points}:{data_version}"
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+            
             start_date = datetime.utcnow() - timedelta(days=days)
+            window = DashboardWindow.load(self.db, user_id, start_date)
             
             charts_data = {
                 "timestamp": datetime.utcnow().isoformat(),
                 "user_id": user_id,
+                "data_version": data_version,
                 "charts": {
-                    "health_trends": self._generate_health_trends_chart(user_id, start_date),
-                    "symptom_distribution": self._generate_symptom_distribution_chart(user_id, start_date),
-                    "medication_adherence": self._generate_medication_adherence_chart(user_id, start_date),
-                    "data_completeness": self._generate_data_completeness_chart(user_id, start_date),
-                    "health_score_timeline": self._generate_health_score_timeline(user_id, start_date),
-                    "correlation_matrix": self._generate_correlation_matrix(user_id, start_date)
+                    chart_type: self._build_chart(chart_type, window) for chart_type in CHART_SOURCES
                 }
             }
             
+            self.cache.set(cache_key, charts_data, ttl=settings.dashboard_cache_ttl)
             return charts_data
             
         except Exception as e:
             logger.error(f"Error generating dashboard charts: {e}")
             return {"error": str(e), "timestamp": datetime.utcnow().isoformat()}
     
-    def _generate_health_trends_chart(self, user_id: int, start_date: datetime) -> Dict[str, Any]:
-        """Generate health trends chart data"""
+    def generate_export_data(self, user_id: int, chart_type: str, days: int = 30) -> Dict[str, Any]:
+        """Generate export data for specific chart types"""
         try:
-            # Get health data by type
-            health_data = self.db.query(HealthData).filter(
-                and_(
-                    HealthData.user_id == user_id,
-                    HealthData.timestamp >= start_date
-                )
-            ).order_by(HealthData.timestamp.asc()).all()
-            
-            # Decrypt sensitive fields
-            for data in health_data:
-                data.decrypt_sensitive_fields()
-            
-            # Group by data type and date
-            data_by_type = {}
-            for data in health_data:
-                if data.data_type not in data_by_type:
-                    data_by_type[data.data_type] = []
-                
-                try:
-                    # Extract numeric value
-                    if data.value.startswith('{'):
-                        parsed = json.loads(data.value)
-                        if isinstance(parsed, dict):
-                            for key in ['value', 'systolic', 'diastolic', 'reading']:
-                                if key in parsed and isinstance(parsed[key], (int, float)):
-                                    data_by_type[data.data_type].append({
-                                        'date': data.timestamp.date().isoformat(),
-                                        'value': float(parsed[key]),
-                                        'timestamp': data.timestamp.isoformat()
-                                    })
-                                    break
-                    else:
-                        data_by_type[data.data_type].append({
-                            'date': data.timestamp.date().isoformat(),
-                            'value': float(data.value),
-                            'timestamp': data.timestamp.isoformat()
-                        })
-                except (ValueError, json.JSONDecodeError, KeyError):
-                    continue
-            
-            # Generate chart data
-            chart_data = {
-                "type": "line",
-                "title": "Health Trends Over Time",
-                "x_axis": "Date",
-                "y_axis": "Value",
-                "datasets": []
-            }
+            if chart_type not in CHART_SOURCES:
+                return {"error": f"Unknown chart type: {chart_type}"}
             
-            for data_type, data_points in data_by_type.items():
-                if len(data_points) < 2:
-                    continue
-                
-                # Sort by date
-                data_points.sort(key=lambda x: x['timestamp'])
-                
-                dataset = {
-                    "label": data_type.replace('_', ' ').title(),
-                    "data": [
-                        {
-                            "x": point['date'],
-                            "y": point['value']
-                        }
-                        for point in data_points
-                    ],
-                    "borderColor": self._get_color_for_data_type(data_type),
-                    "backgroundColor": self._get_color_for_data_type(data_type, alpha=0.1),
-                    "fill": False
-                }
+            start_date = datetime.utcnow() - timedelta(days=days)
+            window = DashboardWindow.load(self.db, user_id, start_date, CHART_SOURCES[chart_type])
+            return self._build_chart(chart_type, window)
                 
-                chart_data["datasets"].append(dataset)
-            
-            return chart_data
-            
         except Exception as e:
-            logger.error(f"Error generating health trends chart: {e}")
+            logger.error(f"Error generating export data: {e}")
             return {"error": str(e)}
     
-    def _generate_symptom_distribution_chart(self, user_id: int, start_date: datetime) -> Dict[str, Any]:
-        """Generate symptom distribution chart data"""
-        try:
-            symptoms = self.db.query(SymptomLog).filter(
-                and_(
-                    SymptomLog.user_id == user_id,
-                    SymptomLog.timestamp >= start_date
-                )
-            ).all()
-            
-            # Decrypt sensitive fields
-            for symptom in symptoms:
-                symptom.decrypt_sensitive_fields()
-            
-            # Count symptoms by type and severity
-            symptom_counts = {}
-            severity_counts = {"mild": 0, "moderate": 0, "severe": 0}
-            
-            for symptom in symptoms:
-                # Count by symptom type
-                if symptom.symptom not in symptom_counts:
-                    symptom_counts[symptom.symptom] = 0
-                symptom_counts[symptom.symptom] += 1
-                
-                # Count by severity
-                severity_counts[symptom.severity] += 1
-            
-            # Generate pie chart for symptom types
-            symptom_pie_data = {
-                "type": "pie",
-                "title": "Symptom Distribution",
-                "datasets": [{
-                    "data": list(symptom_counts.values()),
-                    "backgroundColor": self._generate_colors(len(symptom_counts)),
-                    "labels": list(symptom_counts.keys())
-                }]
-            }
-            
-            # Generate bar chart for severity
-            severity_bar_data = {
-                "type": "bar",
-                "title": "Symptom Severity Distribution",
-                "x_axis": "Severity",
-                "y_axis": "Count",
-                "datasets": [{
-                    "label": "Symptom Count",
-                    "data": list(severity_counts.values()),
-                    "backgroundColor": ["#4CAF50", "#FF9800", "#F44336"],
-                    "labels": list(severity_counts.keys())
-                }]
-            }
-            
-            return {
-                "symptom_types": symptom_pie_data,
-                "severity_distribution": severity_bar_data,
-                "total_symptoms": len(symptoms)
-            }
-            
-        except Exception as e:
-            logger.error(f"Error generating symptom distribution chart: {e}")
-            return {"error": str(e)}
+    def _data_version(self, user_id: int) -> str:
+        """Fingerprint of the user's readings, symptoms and medications, in one round trip"""
+        def summary(model, *columns):
+            return [
+                self.db.query(column).filter(model.user_id == user_id).scalar_subquery()
+                for column in columns
+            ]
+        
+        row = self.db.query(
+            *summary(HealthData, func.count(HealthData.id), func.max(HealthData.id), func.max(HealthData.updated_at)),
+            *summary(SymptomLog, func.count(SymptomLog.id), func.max(SymptomLog.id)),
+            *summary(MedicationLog, func.count(MedicationLog.id), func.max(MedicationLog.id))
+        ).one()
+        return hashlib.sha1(repr(tuple(row)).encode()).hexdigest()[:16]
     
-    def _generate_medication_adherence_chart(self, user_id: int, start_date: datetime) -> Dict[str, Any]:
-        """Generate medication adherence chart data"""
+    def _build_chart(self, chart_type: str, window: DashboardWindow) -> Dict[str, Any]:
+        builders = {
+            "health_trends": self._health_trends_chart,
+            "symptom_distribution": self._symptom_distribution_chart,
+            "medication_adherence": self._medication_adherence_chart,
+            "data_completeness": self._data_completeness_chart,
+            "health_score_timeline": self._health_score_timeline,
+            "correlation_matrix": self._correlation_matrix,
+        }
         try:
-            medications = self.db.query(MedicationLog).filter(
-                and_(
-                    MedicationLog.user_id == user_id,
-                    MedicationLog.taken_at >= start_date
-                )
-            ).all()
-            
-            # Decrypt sensitive fields
-            for med in medications:
-                med.decrypt_sensitive_fields()
-            
-            # Group by medication and date
-            med_by_date = {}
-            for med in medications:
-                date_key = med.taken_at.date().isoformat()
-                if date_key not in med_by_date:
-                    med_by_date[date_key] = {}
-                
-                if med.medication_name not in med_by_date[date_key]:
-                    med_by_date[date_key][med.medication_name] = 0
-                med_by_date[date_key][med.medication_name] += 1
-            
-            # Calculate adherence rate by date
-            adherence_data = []
-            unique_meds = len(set(med.medication_name for med in medications))
-            
-            for date, med_counts in sorted(med_by_date.items()):
-                total_doses = sum(med_counts.values())
-                adherence_rate = (total_doses / unique_meds * 100) if unique_meds > 0 else 0
-                adherence_data.append({
-                    "x": date,
-                    "y": round(adherence_rate, 1)
-                })
-            
-            # Generate chart data
-            chart_data = {
-                "type": "line",
-                "title": "Medication Adherence Over Time",
-                "x_axis": "Date",
-                "y_axis": "Adherence Rate (%)",
-                "datasets": [{
-                    "label": "Adherence Rate",
-                    "data": adherence_data,
-                    "borderColor": "#2196F3",
-                    "backgroundColor": "rgba(33, 150, 243, 0.1)",
-                    "fill": True
-                }]
-            }
-            
-            return chart_data
-            
+            return builders[chart_type](window)
         except Exception as e:
-            logger.error(f"Error generating medication adherence chart: {e}")
+            logger.error(f"Error generating {chart_type} chart: {e}")
             return {"error": str(e)}
     
-    def _generate_data_completeness_chart(self, user_id: int, start_date: datetime) -> Dict[str, Any]:
+    def _health_trends_chart(self, window: DashboardWindow) -> Dict[str, Any]:
+        """Generate health trends chart data, downsampled to the point budget"""
+        chart_data = {
+            "type": "line",
+            "title": "Health Trends Over Time",
+            "x_axis": "Date",
+            "y_axis": "Value",
+            "datasets": []
+        }
+        
+        for data_type, series in window.series.items():
+            if len(series) < 2:
+                continue
+            
+            keep = kernels.lttb(series.epoch_seconds(), series.primary, self.max_points)
+            dates = series.timestamps[keep].astype("datetime64[D]").astype(str)
+            
+            chart_data["datasets"].append({
+                "label": data_type.replace('_', ' ').title(),
+                "data": [{"x": x, "y": y} for x, y in zip(dates.tolist(), series.primary[keep].tolist())],
+                "borderColor": self._get_color_for_data_type(data_type),
+                "backgroundColor": self._get_color_for_data_type(data_type, alpha=0.1),
+                "fill": False,
+                "total_points": len(series)
+            })
+        
+        return chart_data
+    
+    def _symptom_distribution_chart(self, window: DashboardWindow) -> Dict[str, Any]:
+        """Generate symptom distribution chart data"""
+        symptom_counts = Counter(symptom for symptom, _ in window.symptoms)
+        severities = Counter(severity for _, severity in window.symptoms)
+        severity_counts = {level: severities.get(level, 0) for level in SEVERITY_LEVELS}
+        
+        # Generate pie chart for symptom types
+        symptom_pie_data = {
+            "type": "pie",
+            "title": "Symptom Distribution",
+            "datasets": [{
+                "data": list(symptom_counts.values()),
+                "backgroundColor": self._generate_colors(len(symptom_counts)),
+                "labels": list(symptom_counts.keys())
+            }]
+        }
+        
+        # Generate bar chart for severity
+        severity_bar_data = {
+            "type": "bar",
+            "title": "Symptom Severity Distribution",
+            "x_axis": "Severity",
+            "y_axis": "Count",
+            "datasets": [{
+                "label": "Symptom Count",
+                "data": list(severity_counts.values()),
+                "backgroundColor": ["#4CAF50", "#FF9800", "#F44336"],
+                "labels": list(severity_counts.keys())
+            }]
+        }
+        
+        return {
+            "symptom_types": symptom_pie_data,
+            "severity_distribution": severity_bar_data,
+            "total_symptoms": len(window.symptoms)
+        }
+    
+    def _medication_adherence_chart(self, window: DashboardWindow) -> Dict[str, Any]:
+        """Generate medication adherence chart data (doses per day over distinct medications)"""
+        unique_meds = len(set(window.medication_names.tolist()))
+        days, doses = np.unique(window.medication_times.astype("datetime64[D]"), return_counts=True)
+        rates = doses / unique_meds * 100 if unique_meds else np.zeros(len(days))
+        
+        return {
+            "type": "line",
+            "title": "Medication Adherence Over Time",
+            "x_axis": "Date",
+            "y_axis": "Adherence Rate (%)",
+            "datasets": [{
+                "label": "Adherence Rate",
+                "data": [{"x": x, "y": round(y, 1)} for x, y in zip(days.astype(str).tolist(), rates.tolist())],
+                "borderColor": "#2196F3",
+                "backgroundColor": "rgba(33, 150, 243, 0.1)",
+                "fill": True
+            }]
+        }
+    
+    def _data_completeness_chart(self, window: DashboardWindow) -> Dict[str, Any]:
         """Generate data completeness chart"""
-        try:
-            # Get all health data
-            health_data = self.db.query(HealthData).filter(
-                and_(
-                    HealthData.user_id == user_id,
-                    HealthData.timestamp >= start_date
-                )
-            ).all()
-            
-            # Count data by type
-            data_counts = {}
-            for data in health_data:
-                if data.data_type not in data_counts:
-                    data_counts[data.data_type] = 0
-                data_counts[data.data_type] += 1
-            
-            # Generate chart data
-            chart_data = {
-                "type": "doughnut",
-                "title": "Data Completeness by Type",
-                "datasets": [{
-                    "data": list(data_counts.values()),
-                    "backgroundColor": self._generate_colors(len(data_counts)),
-                    "labels": list(data_counts.keys())
-                }]
-            }
-            
-            return chart_data
-            
-        except Exception as e:
-            logger.error(f"Error generating data completeness chart: {e}")
-            return {"error": str(e)}
+        data_counts = Counter(window.reading_types.tolist())
+        
+        return {
+            "type": "doughnut",
+            "title": "Data Completeness by Type",
+            "datasets": [{
+                "data": list(data_counts.values()),
+                "backgroundColor": self._generate_colors(len(data_counts)),
+                "labels": list(data_counts.keys())
+            }]
+        }
     
-    def _generate_health_score_timeline(self, user_id: int, start_date: datetime) -> Dict[str, Any]:
+    def _health_score_timeline(self, window: DashboardWindow) -> Dict[str, Any]:
         """Generate health score timeline chart"""
-        try:
-            # This would typically calculate health scores over time
-            # For now, we'll create a placeholder with sample data
-            # In a real implementation, you'd calculate health scores for different time periods
-            
-            # Get health data to estimate health scores
-            health_data = self.db.query(HealthData).filter(
-                and_(
-                    HealthData.user_id == user_id,
-                    HealthData.timestamp >= start_date
-                )
-            ).order_by(HealthData.timestamp.asc()).all()
-            
-            # Group by week and calculate estimated health scores
-            weekly_scores = {}
-            for data in health_data:
-                week_start = data.timestamp.date() - timedelta(days=data.timestamp.weekday())
-                week_key = week_start.isoformat()
-                
-                if week_key not in weekly_scores:
-                    weekly_scores[week_key] = {
-                        'data_points': 0,
-                        'total_score': 0
-                    }
-                
-                weekly_scores[week_key]['data_points'] += 1
-                weekly_scores[week_key]['total_score'] += 10  # Base score per data point
-            
-            # Calculate average scores
-            timeline_data = []
-            for week, score_data in sorted(weekly_scores.items()):
-                avg_score = min(100, score_data['total_score'] / max(1, score_data['data_points']))
-                timeline_data.append({
-                    "x": week,
-                    "y": round(avg_score, 1)
-                })
-            
-            chart_data = {
-                "type": "line",
-                "title": "Health Score Timeline",
-                "x_axis": "Week",
-                "y_axis": "Health Score",
-                "datasets": [{
-                    "label": "Health Score",
-                    "data": timeline_data,
-                    "borderColor": "#4CAF50",
-                    "backgroundColor": "rgba(76, 175, 80, 0.1)",
-                    "fill": True
-                }]
-            }
-            
-            return chart_data
-            
-        except Exception as e:
-            logger.error(f"Error generating health score timeline: {e}")
-            return {"error": str(e)}
-    
-    def _generate_correlation_matrix(self, user_id: int, start_date: datetime) -> Dict[str, Any]:
-        """Generate correlation matrix data"""
-        try:
-            # Get health data by type
-            health_data = self.db.query(HealthData).filter(
-                and_(
-                    HealthData.user_id == user_id,
-                    HealthData.timestamp >= start_date
-                )
-            ).all()
-            
-            # Decrypt sensitive fields
-            for data in health_data:
-                data.decrypt_sensitive_fields()
-            
-            # Group by data type
-            data_by_type = {}
-            for data in health_data:
-                if data.data_type not in data_by_type:
-                    data_by_type[data.data_type] = []
-                
-                try:
-                    if data.value.startswith('{'):
-                        parsed = json.loads(data.value)
-                        if isinstance(parsed, dict):
-                            for key in ['value', 'systolic', 'diastolic', 'reading']:
-                                if key in parsed and isinstance(parsed[key], (int, float)):
-                                    data_by_type[data.data_type].append(float(parsed[key]))
-                                    break
-                    else:
-                        data_by_type[data.data_type].append(float(data.value))
-                except (ValueError, json.JSONDecodeError, KeyError):
-                    continue
-            
-            # Calculate correlations
-            data_types = list(data_by_type.keys())
-            correlation_matrix = []
-            
-            for i, type1 in enumerate(data_types):
-                row = []
-                for j, type2 in enumerate(data_types):
-                    if i == j:
-                        row.append(1.0)  # Perfect correlation with self
-                    else:
-                        correlation = self._calculate_correlation(
-                            data_by_type[type1], data_by_type[type2]
-                        )
-                        row.append(round(correlation, 2))
-                correlation_matrix.append(row)
-            
-            chart_data = {
-                "type": "heatmap",
-                "title": "Health Data Correlations",
-                "x_axis": "Data Types",
-                "y_axis": "Data Types",
-                "labels": data_types,
-                "data": correlation_matrix,
-                "colorScale": "RdYlBu"
-            }
-            
-            return chart_data
-            
-        except Exception as e:
-            logger.error(f"Error generating correlation matrix: {e}")
-            return {"error": str(e)}
+        # Placeholder weekly score: 10 points per reading, averaged per week
+        days = window.reading_times.astype("datetime64[D]")
+        # 1970-01-01 was a Thursday; shift to the Monday starting each week
+        week_starts = days - ((days.astype(np.int64) + 3) % 7).astype("timedelta64[D]")
+        weeks, counts = np.unique(week_starts, return_counts=True)
+        scores = np.minimum(100, counts * 10 / np.maximum(1, counts))
+        
+        return {
+            "type": "line",
+            "title": "Health Score Timeline",
+            "x_axis": "Week",
+            "y_axis": "Health Score",
+            "datasets": [{
+                "label": "Health Score",
+                "data": [{"x": x, "y": round(y, 1)} for x, y in zip(weeks.astype(str).tolist(), scores.tolist())],
+                "borderColor": "#4CAF50",
+                "backgroundColor": "rgba(76, 175, 80, 0.1)",
+                "fill": True
+            }]
+        }
     
-    def _calculate_correlation(self, values1: List[float], values2: List[float]) -> float:
-        """Calculate correlation coefficient between two sets of values"""
-        try:
-            if len(values1) < 2 or len(values2) < 2:
-                return 0.0
-            
-            # Use the shorter list length
-            min_length = min(len(values1), len(values2))
-            v1 = values1[:min_length]
-            v2 = values2[:min_length]
-            
-            # Calculate correlation coefficient
-            mean1 = statistics.mean(v1)
-            mean2 = statistics.mean(v2)
-            
-            numerator = sum((x - mean1) * (y - mean2) for x, y in zip(v1, v2))
-            denominator1 = sum((x - mean1) ** 2 for x in v1)
-            denominator2 = sum((y - mean2) ** 2 for y in v2)
-            
-            if denominator1 == 0 or denominator2 == 0:
-                return 0.0
-            
-            correlation = numerator / (denominator1 * denominator2) ** 0.5
-            return correlation
-            
-        except Exception as e:
-            logger.error(f"Error calculating correlation: {e}")
-            return 0.0
+    def _correlation_matrix(self, window: DashboardWindow) -> Dict[str, Any]:
+        """Generate correlation matrix data from daily means aligned on a shared day grid"""
+        grid = resample(window.series, timedelta(days=1))
+        correlations = kernels.pairwise_correlation(grid.values, min_periods=3) if grid.metrics else np.empty((0, 0))
+        correlations = np.round(np.nan_to_num(correlations, nan=0.0), 2)
+        np.fill_diagonal(correlations, 1.0)
+        
+        return {
+            "type": "heatmap",
+            "title": "Health Data Correlations",
+            "x_axis": "Data Types",
+            "y_axis": "Data Types",
+            "labels": grid.metrics,
+            "data": correlations.tolist(),
+            "colorScale": "RdYlBu"
+        }
     
     def _get_color_for_data_type(self, data_type: str, alpha: float = 1.0) -> str:
         """Get color for specific data type"""
@@ -468,27 +343,3 @@ class HealthVisualizationService:
             colors.append(base_colors[i % len(base_colors)])
         
         return colors
-    
-    def generate_export_data(self, user_id: int, chart_type: str, days: int = 30) -> Dict[str, Any]:
-        """Generate export data for specific chart types"""
-        try:
-            start_date = datetime.utcnow() - timedelta(days=days)
-            
-            if chart_type == "health_trends":
-                return self._generate_health_trends_chart(user_id, start_date)
-            elif chart_type == "symptom_distribution":
-                return self._generate_symptom_distribution_chart(user_id, start_date)
-            elif chart_type == "medication_adherence":
-                return self._generate_medication_adherence_chart(user_id, start_date)
-            elif chart_type == "data_completeness":
-                return self._generate_data_completeness_chart(user_id, start_date)
-            elif chart_type == "health_score_timeline":
-                return self._generate_health_score_timeline(user_id, start_date)
-            elif chart_type == "correlation_matrix":
-                return self._generate_correlation_matrix(user_id, start_date)
-            else:
-                return {"error": f"Unknown chart type: {chart_type}"}
-                
-        except Exception as e:
-            logger.error(f"Error generating export data: {e}")
-            return {"error": str(e)} 
\ No newline at end of file
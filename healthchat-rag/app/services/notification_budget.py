@@ -0,0 +1,372 @@
+"""
+Notification Budget Service for HealthMate
+
+This module provides:
+- Per-user daily and per-trigger sliding-window counters of sent notifications
+- Redis and in-memory counter stores
+- Batched budget checks for many candidate notifications in one round trip
+- Periodic reconciliation of the counters against the notifications table
+"""
+
+import logging
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from itertools import groupby
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+from datetime import datetime, timedelta, timezone
+from dataclasses import dataclass
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.notification_models import Notification, NotificationStatus
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "notification_budget"
+ALL_SENDS = "*"  # Counter of every send, whatever its trigger
+COUNTED_STATUSES = (NotificationStatus.SENT, NotificationStatus.DELIVERED)
+
+Send = Tuple[str, Optional[str], float]  # (notification id, trigger type, sent at in epoch seconds)
+CountQuery = Tuple[int, str, float]  # (user id, counter, count sends at or after)
+
+
+def _epoch(moment: datetime) -> float:
+    """Epoch seconds of a datetime, naive ones being UTC like Notification.created_at."""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def _by_counter(sends: Sequence[Send]) -> Dict[str, Dict[str, float]]:
+    """Group sends into the counters they belong to, as member -> score mappings."""
+    counters: Dict[str, Dict[str, float]] = {}
+    for member, trigger_type, sent_at in sends:
+        counters.setdefault(ALL_SENDS, {})[member] = sent_at
+        if trigger_type:
+            counters.setdefault(trigger_type, {})[member] = sent_at
+    return counters
+
+
+class BudgetStore(ABC):
+    """
+    Sent notifications per user and counter, scored by send time.
+
+    Every send is kept in the user's ``ALL_SENDS`` counter and in the
+    counter of its trigger. Members are notification IDs, so recording the
+    same notification twice counts it once.
+    """
+
+    def __init__(self, retention: timedelta):
+        self.retention = retention
+
+    @abstractmethod
+    def add(self, user_id: int, sends: Sequence[Send], now: float) -> None:
+        """Record a user's sends and drop those older than the retention."""
+
+    @abstractmethod
+    def count(self, queries: Sequence[CountQuery]) -> List[int]:
+        """Count the sends of each (user, counter, since) query, in query order."""
+
+    @abstractmethod
+    def replace(self, sends_by_user: Dict[int, List[Send]], as_of: float) -> None:
+        """Replace each user's sends before ``as_of``, keeping those recorded since."""
+
+    @abstractmethod
+    def tracked_users(self) -> Set[int]:
+        """IDs of the users with counters."""
+
+
+class InMemoryBudgetStore(BudgetStore):
+    """Budget store for tests and single-process deployments."""
+
+    def __init__(self, retention: timedelta):
+        super().__init__(retention)
+        self.counters: Dict[Tuple[int, str], Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, user_id: int, sends: Sequence[Send], now: float) -> None:
+        cutoff = now - self.retention.total_seconds()
+        with self._lock:
+            for counter, members in _by_counter(sends).items():
+                scores = self.counters.setdefault((user_id, counter), {})
+                scores.update(members)
+                for member in [m for m, score in scores.items() if score < cutoff]:
+                    del scores[member]
+
+    def count(self, queries: Sequence[CountQuery]) -> List[int]:
+        with self._lock:
+            return [
+                sum(1 for score in self.counters.get((user_id, counter), {}).values() if score >= since)
+                for user_id, counter, since in queries
+            ]
+
+    def replace(self, sends_by_user: Dict[int, List[Send]], as_of: float) -> None:
+        with self._lock:
+            for user_id, sends in sends_by_user.items():
+                for (owner, _), scores in self.counters.items():
+                    if owner == user_id:
+                        for member in [m for m, score in scores.items() if score < as_of]:
+                            del scores[member]
+                for counter, members in _by_counter(sends).items():
+                    self.counters.setdefault((user_id, counter), {}).update(members)
+            self.counters = {key: scores for key, scores in self.counters.items() if scores}
+
+    def tracked_users(self) -> Set[int]:
+        with self._lock:
+            return {user_id for user_id, _ in self.counters}
+
+
+class RedisBudgetStore(BudgetStore):
+    """
+    Budget store shared by every API and worker process through Redis.
+
+    Each counter is a sorted set ``notification_budget:<user>:<counter>``
+    scored by send time, and ``notification_budget:<user>`` holds the names
+    of a user's counters. Keys expire after the retention, so users who
+    stop receiving notifications leave nothing behind.
+    """
+
+    def __init__(self, redis_url: str, retention: timedelta):
+        """
+        Initialize the Redis store.
+
+        The connection is opened on first use so that importing the module
+        never requires a running Redis server.
+
+        Args:
+            redis_url: Redis connection URL
+            retention: How long sends are kept
+        """
+        super().__init__(retention)
+        self.redis_url = redis_url
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            import redis
+
+            self._client = redis.from_url(self.redis_url, decode_responses=True)
+        return self._client
+
+    @staticmethod
+    def _key(user_id: int, counter: str) -> str:
+        return f"{KEY_PREFIX}:{user_id}:{counter}"
+
+    @staticmethod
+    def _index(user_id: int) -> str:
+        return f"{KEY_PREFIX}:{user_id}"
+
+    def _write(self, pipe, user_id: int, counters: Dict[str, Dict[str, float]]) -> None:
+        ttl = int(self.retention.total_seconds())
+        for counter, members in counters.items():
+            key = self._key(user_id, counter)
+            pipe.zadd(key, members)
+            pipe.expire(key, ttl)
+        if counters:
+            pipe.sadd(self._index(user_id), *counters)
+            pipe.expire(self._index(user_id), ttl)
+
+    def add(self, user_id: int, sends: Sequence[Send], now: float) -> None:
+        counters = _by_counter(sends)
+        pipe = self.client.pipeline(transaction=False)
+        for counter in counters:
+            pipe.zremrangebyscore(self._key(user_id, counter), "-inf", f"({now - self.retention.total_seconds()}")
+        self._write(pipe, user_id, counters)
+        pipe.execute()
+
+    def count(self, queries: Sequence[CountQuery]) -> List[int]:
+        pipe = self.client.pipeline(transaction=False)
+        for user_id, counter, since in queries:
+            pipe.zcount(self._key(user_id, counter), since, "+inf")
+        return [int(count) for count in pipe.execute()]
+
+    def replace(self, sends_by_user: Dict[int, List[Send]], as_of: float) -> None:
+        users = list(sends_by_user)
+        pipe = self.client.pipeline(transaction=False)
+        for user_id in users:
+            pipe.smembers(self._index(user_id))
+        existing = pipe.execute()
+
+        pipe = self.client.pipeline(transaction=True)  # Each page of users switches over at once
+        for user_id, counters in zip(users, existing):
+            replacement = _by_counter(sends_by_user[user_id])
+            for counter in set(counters) | set(replacement):
+                pipe.zremrangebyscore(self._key(user_id, counter), "-inf", f"({as_of}")
+            self._write(pipe, user_id, replacement)
+        pipe.execute()
+
+    def tracked_users(self) -> Set[int]:
+        users = set()
+        for key in self.client.scan_iter(match=f"{KEY_PREFIX}:*", count=1000):
+            parts = key.split(":")
+            if len(parts) == 2 and parts[1].isdigit():
+                users.add(int(parts[1]))
+        return users
+
+
+@dataclass
+class BudgetCheck:
+    """Budgets a candidate notification is checked against"""
+    user_id: int
+    daily_limit: Optional[int] = None  # Notifications allowed per UTC day
+    trigger_type: Optional[str] = None
+    trigger_limit: Optional[int] = None  # Notifications of this trigger allowed per window
+    trigger_window: Optional[timedelta] = None
+
+    @property
+    def limits_trigger(self) -> bool:
+        return bool(self.trigger_type and self.trigger_limit and self.trigger_window)
+
+
+@dataclass
+class BudgetStatus:
+    """Where a candidate notification stands against its budgets"""
+    daily_sent: int = 0
+    trigger_sent: int = 0
+    daily_exceeded: bool = False
+    trigger_exceeded: bool = False
+
+    @property
+    def allowed(self) -> bool:
+        return not (self.daily_exceeded or self.trigger_exceeded)
+
+
+class NotificationBudget:
+    """
+    Enforces daily and per-trigger notification limits from send counters.
+
+    Sends are recorded as they happen, so checking a notification reads
+    two counters from the store instead of counting rows of the
+    notifications table, and the checks of many candidates share one round
+    trip. ``reconcile`` periodically rebuilds the counters from the table
+    to pick up sends recorded elsewhere or lost while the store was down.
+    """
+
+    def __init__(self, store: BudgetStore):
+        self.store = store
+
+    def check(self, check: BudgetCheck, now: Optional[datetime] = None) -> BudgetStatus:
+        """Check one candidate notification against its budgets."""
+        return self.check_many([check], now)[0]
+
+    def check_many(self, checks: Sequence[BudgetCheck], now: Optional[datetime] = None) -> List[BudgetStatus]:
+        """
+        Check candidate notifications against their budgets in one store round trip.
+
+        Args:
+            checks: Budgets of each candidate
+            now: Time of the check (default: current UTC time)
+
+        Returns:
+            Status of each candidate, in order; all allowed if the store fails
+        """
+        now = now or datetime.utcnow()
+        day_start = _epoch(now.replace(hour=0, minute=0, second=0, microsecond=0))
+        queries: List[CountQuery] = []
+        for check in checks:
+            if check.daily_limit is not None:
+                queries.append((check.user_id, ALL_SENDS, day_start))
+            if check.limits_trigger:
+                queries.append((check.user_id, check.trigger_type, _epoch(now - check.trigger_window)))
+
+        try:
+            counts = iter(self.store.count(queries) if queries else [])
+        except Exception as e:
+            logger.error(f"Failed to read notification budgets, allowing {len(checks)} notifications: {e}")
+            return [BudgetStatus() for _ in checks]
+
+        statuses = []
+        for check in checks:
+            status = BudgetStatus()
+            if check.daily_limit is not None:
+                status.daily_sent = next(counts)
+                status.daily_exceeded = status.daily_sent >= check.daily_limit
+            if check.limits_trigger:
+                status.trigger_sent = next(counts)
+                status.trigger_exceeded = status.trigger_sent >= check.trigger_limit
+            statuses.append(status)
+        return statuses
+
+    def record_sent(self, user_id: int, notification_id: Optional[int], trigger_type: Optional[str] = None,
+                    sent_at: Optional[datetime] = None) -> None:
+        """
+        Count a sent notification against the user's budgets.
+
+        Args:
+            user_id: User the notification was sent to
+            notification_id: ID of the notification row
+            trigger_type: Trigger of the notification, if any
+            sent_at: Time of sending (default: current UTC time)
+        """
+        sent_at = _epoch(sent_at or datetime.utcnow())
+        member = str(notification_id) if notification_id is not None else uuid.uuid4().hex
+        try:
+            self.store.add(user_id, [(member, trigger_type, sent_at)], sent_at)
+        except Exception as e:
+            logger.error(f"Failed to record notification {notification_id} in budgets of user {user_id}: {e}")
+
+    def reconcile(self, db: Session, now: Optional[datetime] = None, page_size: Optional[int] = None) -> int:
+        """
+        Rebuild the counters from sent notifications in the database.
+
+        Sends recorded after the reconciliation started are kept, and users
+        whose counters no longer match any sent notification are cleared.
+
+        Args:
+            db: Database session
+            now: Time the rebuild is taken as of (default: current UTC time)
+            page_size: Users replaced per store round trip
+
+        Returns:
+            Number of users whose counters were rebuilt
+        """
+        now = now or datetime.utcnow()
+        page_size = page_size or settings.notification_budget_reconcile_page_size
+        query = db.query(
+            Notification.user_id, Notification.id, Notification.template_data, Notification.created_at
+        ).filter(
+            Notification.created_at >= now - self.store.retention,
+            Notification.created_at < now,
+            Notification.status.in_(COUNTED_STATUSES)
+        ).order_by(Notification.user_id).yield_per(page_size)
+
+        reconciled = 0
+        page: Dict[int, List[Send]] = {}
+        for user_id, sends in self._sends_by_user(query, self.store.tracked_users()):
+            page[user_id] = sends
+            if len(page) >= page_size:
+                self.store.replace(page, _epoch(now))
+                reconciled += len(page)
+                page = {}
+        if page:
+            self.store.replace(page, _epoch(now))
+            reconciled += len(page)
+
+        logger.info(f"Reconciled notification budgets of {reconciled} users")
+        return reconciled
+
+    @staticmethod
+    def _sends_by_user(rows, tracked: Set[int]) -> Iterator[Tuple[int, List[Send]]]:
+        for user_id, user_rows in groupby(rows, key=lambda row: row.user_id):
+            tracked.discard(user_id)
+            yield user_id, [
+                (str(row.id), (row.template_data or {}).get("trigger_type"), _epoch(row.created_at))
+                for row in user_rows
+            ]
+        for user_id in tracked:  # Counters left from sends no longer in the table
+            yield user_id, []
+
+
+def create_budget_store() -> BudgetStore:
+    """Create the budget store configured in settings."""
+    retention = timedelta(hours=settings.notification_budget_retention_hours)
+    if settings.notification_budget_backend.lower() == "redis":
+        return RedisBudgetStore(settings.redis_url, retention)
+    return InMemoryBudgetStore(retention)
+
+
+# Global notification budget instance
+notification_budget = NotificationBudget(create_budget_store())
@@ -25,6 +25,7 @@ from app.models.notification_models import (
 from app.models.user import User
 from app.exceptions.notification_exceptions import NotificationError
 from app.services.email_service import EmailService
+from app.services.notification_budget import notification_budget
 from app.services.sms_service import SMSService
 from app.services.push_service import PushService
 from app.utils.audit_logging import AuditLogger
@@ -150,6 +151,12 @@ class NotificationService:
                     else:
                         break
             
+            # Count the notification against the user's budgets
+            if any(r.get("success", False) for r in results.values()):
+                notification_budget.record_sent(
+                    user_id, notification.id, (template_data or {}).get("trigger_type")
+                )
+            
             # Log notification sent
             self.audit_logger.log_system_action(
                 action="notification_sent",
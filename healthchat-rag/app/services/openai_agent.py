@@ -1,6 +1,7 @@
 from openai import OpenAI
 from typing import Dict, List
 from app.services.health_functions import check_symptoms, calculate_bmi, check_drug_interactions
+from app.utils.tracing import tracer
 import json
 
 class HealthAgent:
@@ -69,15 +70,20 @@ class HealthAgent:
         User Profile: {json.dumps(user_profile)}
         Medical Context: {context}
         """
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": message}
-            ],
-            functions=self.functions,
-            function_call="auto"
-        )
+        with tracer.span("llm.chat_completion", **{"llm.model": self.model}) as span:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": message}
+                ],
+                functions=self.functions,
+                function_call="auto"
+            )
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                span.set_attribute("llm.prompt_tokens", usage.prompt_tokens)
+                span.set_attribute("llm.completion_tokens", usage.completion_tokens)
         msg = response.choices[0].message
         # Handle function call if present
         if hasattr(msg, "function_call") and msg.function_call:
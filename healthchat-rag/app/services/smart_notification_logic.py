@@ -32,6 +32,7 @@ from app.models.enhanced_health_models import (
     HealthMetricsAggregation, EnhancedSymptomLog
 )
 from app.exceptions.notification_exceptions import NotificationError
+from app.services.notification_budget import BudgetCheck, NotificationBudget, notification_budget
 from app.utils.audit_logging import AuditLogger
 
 logger = logging.getLogger(__name__)
@@ -84,10 +85,11 @@ class HealthThreshold:
 class SmartNotificationLogic:
     """Smart notification logic service for intelligent targeting and prioritization."""
     
-    def __init__(self, settings: Settings):
+    def __init__(self, settings: Settings, budget: Optional[NotificationBudget] = None):
         """Initialize the smart notification logic service."""
         self.settings = settings
         self.audit_logger = AuditLogger()
+        self.budget = budget or notification_budget
         
         # Health metric thresholds
         self.health_thresholds = self._initialize_health_thresholds()
@@ -332,15 +334,13 @@ class SmartNotificationLogic:
                 else:
                     return False, "Notification blocked by quiet hours"
             
-            # Check daily notification limit
-            if not self._check_daily_limit(user, prefs, db):
+            # Check daily and per-trigger frequency budgets
+            budget_check = self.budget_check(user, prefs, context_data)
+            status = self.budget.check(budget_check)
+            if status.daily_exceeded:
                 return False, "Daily notification limit exceeded"
-            
-            # Check frequency limits for specific triggers
-            if context_data and "trigger_type" in context_data:
-                trigger_type = context_data["trigger_type"]
-                if not self._check_frequency_limit(user, trigger_type, db):
-                    return False, f"Frequency limit exceeded for trigger {trigger_type}"
+            if status.trigger_exceeded:
+                return False, f"Frequency limit exceeded for trigger {budget_check.trigger_type}"
             
             return True, "Notification allowed"
             
@@ -384,52 +384,35 @@ class SmartNotificationLogic:
             logger.error(f"Error checking quiet hours: {e}")
             return False
     
-    def _check_daily_limit(self, user: User, prefs: UserNotificationPreference, db: Session) -> bool:
-        """Check if user has exceeded daily notification limit."""
-        try:
-            # Count notifications sent today
-            today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-            today_end = today_start + timedelta(days=1)
-            
-            notification_count = db.query(Notification).filter(
-                and_(
-                    Notification.user_id == user.id,
-                    Notification.created_at >= today_start,
-                    Notification.created_at < today_end,
-                    Notification.status.in_([NotificationStatus.SENT, NotificationStatus.DELIVERED])
-                )
-            ).count()
-            
-            return notification_count < prefs.max_daily_notifications
-            
-        except Exception as e:
-            logger.error(f"Error checking daily limit: {e}")
-            return True  # Default to allow if error
-    
-    def _check_frequency_limit(self, user: User, trigger_type: str, db: Session) -> bool:
-        """Check frequency limit for specific trigger types."""
-        try:
-            trigger = self.notification_triggers.get(trigger_type)
-            if not trigger or not trigger.frequency_limit:
-                return True
-            
-            # Count recent notifications for this trigger
-            time_window_start = datetime.now() - trigger.time_window
-            
-            notification_count = db.query(Notification).filter(
-                and_(
-                    Notification.user_id == user.id,
-                    Notification.created_at >= time_window_start,
-                    Notification.metadata.contains({"trigger_type": trigger_type}),
-                    Notification.status.in_([NotificationStatus.SENT, NotificationStatus.DELIVERED])
-                )
-            ).count()
-            
-            return notification_count < trigger.frequency_limit
+    def budget_check(
+        self,
+        user: User,
+        prefs: UserNotificationPreference,
+        context_data: Optional[Dict[str, Any]] = None
+    ) -> BudgetCheck:
+        """
+        Build the budgets a notification for a user is checked against.
+        
+        Checks for many notifications can be passed together to
+        ``self.budget.check_many``.
+        
+        Args:
+            user: Target user
+            prefs: User's notification preferences
+            context_data: Additional context data, with the trigger_type if any
             
-        except Exception as e:
-            logger.error(f"Error checking frequency limit: {e}")
-            return True  # Default to allow if error
+        Returns:
+            Daily limit and trigger frequency limit of the notification
+        """
+        trigger_type = (context_data or {}).get("trigger_type")
+        trigger = self.notification_triggers.get(trigger_type)
+        return BudgetCheck(
+            user_id=user.id,
+            daily_limit=prefs.max_daily_notifications,
+            trigger_type=trigger_type,
+            trigger_limit=trigger.frequency_limit if trigger else None,
+            trigger_window=trigger.time_window if trigger else None
+        )
     
     def get_optimal_send_time(
         self,
@@ -0,0 +1,413 @@
+"""
+Threshold Alert Monitor for HealthMate
+
+This module provides:
+- Evaluation of health metric thresholds on readings as they are ingested
+- Micro-batching of readings across users
+- Per-user rule state with hysteresis, so readings hovering at a limit do not flap
+- Deduplication against alerts already sent within a cooldown
+"""
+
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from datetime import datetime, timedelta
+from dataclasses import dataclass
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.notification_models import Notification, NotificationType
+from app.services.enhanced_notification_service import EnhancedNotificationService
+from app.services.smart_notification_logic import HealthThreshold, NotificationUrgency, SmartNotificationLogic
+
+logger = logging.getLogger(__name__)
+
+THRESHOLD_TRIGGER = "health_metric_threshold"  # trigger_type of threshold alert notifications
+SCALAR_METRICS = ("heart_rate", "blood_glucose", "temperature", "oxygen_saturation")
+
+EVICTION_INTERVAL = 60.0  # Seconds between sweeps of idle rule state
+
+# Severity of each level; within the cooldown only a more severe level is alerted again
+LEVEL_SEVERITY = {"normal": 0, "low": 1, "high": 1, "critical_low": 2, "critical_high": 2}
+
+AlertSender = Callable[[Dict[str, Any]], Awaitable[Any]]
+RecentAlerts = Dict[Tuple[int, str], Tuple[str, datetime]]  # (user, metric) -> (level, sent at)
+
+
+@dataclass
+class MetricReading:
+    """One thresholded metric of a stored reading"""
+    user_id: int
+    metric: str  # Threshold name, e.g. blood_pressure_systolic
+    value: float
+    timestamp: datetime
+
+
+@dataclass
+class RuleState:
+    """Where one user's metric stands against its thresholds"""
+    level: str = "normal"
+    last_seen: Optional[datetime] = None
+    last_alert_level: Optional[str] = None
+    last_alert_at: Optional[datetime] = None
+
+
+def metric_readings(user_id: int, data_type: str, value: Any, timestamp: datetime) -> List[MetricReading]:
+    """
+    Split a reading into the metrics that have thresholds.
+
+    Blood pressure yields a systolic and a diastolic metric; readings of
+    other types, or whose value is not numeric, yield none.
+    """
+    try:
+        if data_type == "blood_pressure":
+            if isinstance(value, str):
+                value = json.loads(value)  # Decrypted values are JSON text
+            if not isinstance(value, dict):
+                return []
+            return [
+                MetricReading(user_id, f"blood_pressure_{part}", float(value[part]), timestamp)
+                for part in ("systolic", "diastolic") if value.get(part) is not None
+            ]
+        if data_type in SCALAR_METRICS:
+            return [MetricReading(user_id, data_type, float(value), timestamp)]
+    except (TypeError, ValueError):
+        logger.debug(f"Skipping non-numeric {data_type} reading of user {user_id}")
+    return []
+
+
+class ThresholdEvaluator:
+    """
+    Tracks each user's metrics against SmartNotificationLogic.health_thresholds.
+
+    A metric's level only relaxes once its value is back inside the limit
+    by a hysteresis band (a fraction of the normal range). Entering an
+    abnormal level raises an alert unless one at the same or a higher
+    severity on the same side of the range went out within the cooldown;
+    alerts sent before this process started count once they are seeded.
+    Readings older than ``max_age`` update the state without alerting, so
+    backfills do not page anyone. ``evict_idle`` drops the state of metrics
+    that have been quiet for longer than ``max_age`` plus the cooldown.
+    """
+
+    def __init__(self, thresholds: Dict[str, HealthThreshold], hysteresis: float = 0.05,
+                 cooldown: timedelta = timedelta(hours=1), max_age: timedelta = timedelta(hours=24)):
+        self.thresholds = thresholds
+        self.hysteresis = hysteresis
+        self.cooldown = cooldown
+        self.max_age = max_age
+        self.states: Dict[Tuple[int, str], RuleState] = {}
+
+    def seed(self, recent_alerts: RecentAlerts) -> None:
+        """Record alerts already sent, so they are not repeated within the cooldown."""
+        for key, (level, sent_at) in recent_alerts.items():
+            state = self.states.setdefault(key, RuleState())
+            if state.last_alert_at is None or sent_at > state.last_alert_at:
+                state.last_alert_level, state.last_alert_at = level, sent_at
+
+    def evict_idle(self, now: Optional[datetime] = None) -> int:
+        """
+        Drop rule state with no reading or alert within max_age plus the cooldown.
+        
+        Such state can neither suppress an alert nor hold a level that a
+        fresh reading would not re-establish.
+        
+        Returns:
+            Number of states dropped
+        """
+        cutoff = (now or datetime.utcnow()) - self.max_age - self.cooldown
+        idle = [
+            key for key, state in self.states.items()
+            if max(state.last_seen or datetime.min, state.last_alert_at or datetime.min) < cutoff
+        ]
+        for key in idle:
+            del self.states[key]
+        return len(idle)
+    
+    def tracked_users(self) -> Set[int]:
+        """Users with any rule state."""
+        return {user_id for user_id, _ in self.states}
+    
+    def evaluate(self, readings: Iterable[MetricReading], now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """
+        Advance rule state through a batch of readings.
+
+        Args:
+            readings: Readings of any users, in any order
+            now: Current time (default: now)
+
+        Returns:
+            Alerts, in the shape of SmartNotificationLogic.check_health_metric_thresholds
+            plus user_id and timestamp
+        """
+        now = now or datetime.utcnow()
+        alerts = []
+        for reading in sorted(readings, key=lambda r: r.timestamp):
+            threshold = self.thresholds.get(reading.metric)
+            if threshold is None:
+                continue
+            state = self.states.setdefault((reading.user_id, reading.metric), RuleState())
+            if state.last_seen and reading.timestamp < state.last_seen:
+                continue  # Late reading; the state already reflects a newer one
+            state.last_seen = reading.timestamp
+
+            previous, state.level = state.level, self._level(threshold, reading.value, state.level)
+            if state.level == "normal" or reading.timestamp < now - self.max_age:
+                continue
+            last = state.last_alert_level
+            if state.level == previous and last == state.level:
+                continue  # Still at the level last alerted
+            recently_alerted = state.last_alert_at is not None and now - state.last_alert_at < self.cooldown
+            if recently_alerted and last in LEVEL_SEVERITY and _side(last) == _side(state.level) \
+                    and LEVEL_SEVERITY[state.level] <= LEVEL_SEVERITY[last]:
+                continue  # Already alerted on this side of the range, at this severity or above
+
+            state.last_alert_level, state.last_alert_at = state.level, now
+            alerts.append(self._alert(reading, threshold, state.level))
+        return alerts
+
+    def _level(self, threshold: HealthThreshold, value: float, current: str) -> str:
+        band = 0.0
+        if threshold.min_value is not None and threshold.max_value is not None:
+            band = self.hysteresis * (threshold.max_value - threshold.min_value)
+
+        def held(level: str) -> bool:
+            # A level is held by itself and by the more severe level on its side
+            return current == level or current == f"critical_{level}"
+
+        if threshold.critical_max is not None and (
+                value > threshold.critical_max or current == "critical_high" and value > threshold.critical_max - band):
+            return "critical_high"
+        if threshold.critical_min is not None and (
+                value < threshold.critical_min or current == "critical_low" and value < threshold.critical_min + band):
+            return "critical_low"
+        if threshold.max_value is not None and (
+                value > threshold.max_value or held("high") and value > threshold.max_value - band):
+            return "high"
+        if threshold.min_value is not None and (
+                value < threshold.min_value or held("low") and value < threshold.min_value + band):
+            return "low"
+        return "normal"
+
+    @staticmethod
+    def _alert(reading: MetricReading, threshold: HealthThreshold, level: str) -> Dict[str, Any]:
+        limits = {
+            "critical_high": threshold.critical_max,
+            "critical_low": threshold.critical_min,
+            "high": threshold.max_value,
+            "low": threshold.min_value
+        }
+        critical = level.startswith("critical")
+        label = level.split("_")[-1].capitalize()
+        return {
+            "type": level,
+            "metric": reading.metric,
+            "value": reading.value,
+            "threshold": limits[level],
+            "unit": threshold.unit,
+            "description": f"{'Critical ' + label.lower() if critical else label} {threshold.description}",
+            "urgency": NotificationUrgency.CRITICAL if critical else NotificationUrgency.HIGH,
+            "notification_type": NotificationType.HEALTH_ALERT,
+            "user_id": reading.user_id,
+            "timestamp": reading.timestamp
+        }
+
+
+def _side(level: str) -> str:
+    return level.rsplit("_", 1)[-1]
+
+
+def recent_threshold_alerts(db: Session, user_ids: List[int], since: datetime) -> RecentAlerts:
+    """Latest threshold alert per user and metric sent since a time"""
+    rows = db.query(Notification.user_id, Notification.template_data, Notification.created_at).filter(
+        Notification.user_id.in_(user_ids),
+        Notification.type == NotificationType.HEALTH_ALERT,
+        Notification.created_at >= since
+    ).all()
+
+    recent: RecentAlerts = {}
+    for user_id, data, created_at in rows:
+        if not data or data.get("trigger_type") != THRESHOLD_TRIGGER or not data.get("metric"):
+            continue
+        key = (user_id, data["metric"])
+        if key not in recent or created_at > recent[key][1]:
+            recent[key] = (data.get("alert_type"), created_at)
+    return recent
+
+
+class ThresholdAlertMonitor:
+    """
+    Micro-batches ingested readings across users and alerts on threshold changes.
+
+    Ingestion paths call ``submit_readings`` after committing; it only
+    queues the readings. A background task takes whatever has arrived
+    within ``max_wait`` (up to ``batch_size`` metrics), seeds dedup state
+    for users it has not seen with one query, evaluates the batch in
+    memory and sends the alerts concurrently. Idle rule state is evicted
+    every ``EVICTION_INTERVAL`` seconds, and users left without state are
+    seeded again when they next report. Readings submitted while the task
+    is not running (see ``start``) are not evaluated.
+    """
+
+    def __init__(self, evaluator: Optional[ThresholdEvaluator] = None, send_alert: Optional[AlertSender] = None,
+                 batch_size: Optional[int] = None, max_wait: Optional[float] = None):
+        self.evaluator = evaluator or ThresholdEvaluator(
+            SmartNotificationLogic(settings).health_thresholds,
+            hysteresis=settings.threshold_alert_hysteresis,
+            cooldown=timedelta(minutes=settings.threshold_alert_cooldown_minutes),
+            max_age=timedelta(hours=settings.threshold_alert_max_age_hours)
+        )
+        self.send_alert = send_alert or self._send_notification
+        self.batch_size = batch_size or settings.threshold_alert_batch_size
+        self.max_wait = max_wait if max_wait is not None else settings.threshold_alert_max_wait_ms / 1000
+        self._seeded: Set[int] = set()
+        self._next_eviction = time.monotonic() + EVICTION_INTERVAL
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._notification_service: Optional[EnhancedNotificationService] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done() and not self._loop.is_closed()
+
+    def start(self) -> None:
+        """Start the batching task on the running event loop; rule state carries over from earlier runs."""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._task = self._loop.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Evaluate what is queued, then stop the batching task."""
+        if not self.running:
+            return
+        await self.flush()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def flush(self) -> None:
+        """Wait until every queued reading has been evaluated and its alerts sent."""
+        if self.running:
+            await self._queue.join()
+
+    def submit_readings(self, user_id: int, readings: Iterable[Tuple[str, Any, datetime]]) -> int:
+        """
+        Queue a user's newly stored readings for evaluation.
+
+        Args:
+            user_id: Owner of the readings
+            readings: (data_type, value, timestamp) of each reading
+
+        Returns:
+            Number of thresholded metrics queued
+        """
+        metrics = [
+            metric for data_type, value, timestamp in readings
+            for metric in metric_readings(user_id, data_type, value, timestamp)
+        ]
+        if not metrics:
+            return 0
+
+        if not self.running:
+            logger.debug(f"Threshold monitor is not running; {len(metrics)} readings of user {user_id} not evaluated")
+            return 0
+        try:
+            on_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            on_loop = None
+        if on_loop is self._loop:
+            self._queue.put_nowait((metrics, time.perf_counter()))
+        else:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, (metrics, time.perf_counter()))
+        return len(metrics)
+
+    async def process(self, readings: List[MetricReading]) -> List[Dict[str, Any]]:
+        """Evaluate a batch of readings and send its alerts."""
+        if time.monotonic() >= self._next_eviction:
+            self.evict_idle()
+        unseen = sorted({reading.user_id for reading in readings} - self._seeded)
+        if unseen:
+            try:
+                self.evaluator.seed(await asyncio.to_thread(self._load_recent_alerts, unseen))
+                self._seeded.update(unseen)
+            except Exception as e:
+                logger.warning(f"Failed to load recent threshold alerts for {len(unseen)} users: {e}")
+
+        alerts = self.evaluator.evaluate(readings)
+        results = await asyncio.gather(*(self.send_alert(alert) for alert in alerts), return_exceptions=True)
+        for alert, result in zip(alerts, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to send {alert['type']} {alert['metric']} alert to user {alert['user_id']}: "
+                             f"{result}")
+        return alerts
+
+    def evict_idle(self, now: Optional[datetime] = None) -> int:
+        """Drop idle rule state and forget the seeding of users left without any."""
+        evicted = self.evaluator.evict_idle(now)
+        self._seeded &= self.evaluator.tracked_users()
+        self._next_eviction = time.monotonic() + EVICTION_INTERVAL
+        if evicted:
+            logger.debug(f"Evicted {evicted} idle threshold rule states")
+        return evicted
+    
+    async def _run(self) -> None:
+        while True:
+            items = await self._next_batch()
+            readings = [reading for metrics, _ in items for reading in metrics]
+            try:
+                alerts = await self.process(readings)
+                latency = time.perf_counter() - min(queued_at for _, queued_at in items)
+                if alerts:
+                    logger.info(f"Sent {len(alerts)} threshold alerts from {len(readings)} readings "
+                                f"{latency * 1000:.0f}ms after ingestion")
+            except Exception as e:
+                logger.error(f"Threshold evaluation failed for {len(readings)} readings: {e}")
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+
+    async def _next_batch(self) -> List[Tuple[List[MetricReading], float]]:
+        items = [await self._queue.get()]
+        count = len(items[0][0])
+        deadline = self._loop.time() + self.max_wait
+        while count < self.batch_size:
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            items.append(item)
+            count += len(item[0])
+        return items
+
+    def _load_recent_alerts(self, user_ids: List[int]) -> RecentAlerts:
+        db = SessionLocal()
+        try:
+            return recent_threshold_alerts(db, user_ids, datetime.utcnow() - self.evaluator.cooldown)
+        finally:
+            db.close()
+
+    async def _send_notification(self, alert: Dict[str, Any]) -> Dict[str, Any]:
+        if self._notification_service is None:
+            self._notification_service = EnhancedNotificationService(settings)
+        db = SessionLocal()
+        try:
+            return await self._notification_service.send_threshold_alert(alert["user_id"], alert, db)
+        finally:
+            db.close()
+
+
+# Process-wide monitor fed by the ingestion paths
+threshold_monitor = ThresholdAlertMonitor()
@@ -2,6 +2,7 @@ from pinecone import Pinecone
 from langchain_openai import OpenAIEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from typing import List, Dict
+from app.utils.tracing import tracer
 import spacy
 
 class VectorStore:
@@ -63,12 +64,15 @@ class VectorStore:
 
     def similarity_search(self, query: str, k: int = 5) -> List[Dict]:
         """Search for similar medical content"""
-        query_vector = self.embeddings.embed_query(query)
-        results = self.index.query(
-            vector=query_vector,
-            top_k=k,
-            include_metadata=True
-        )
+        with tracer.span("retrieval.embed"):
+            query_vector = self.embeddings.embed_query(query)
+        with tracer.span("retrieval.vector_query", top_k=k) as span:
+            results = self.index.query(
+                vector=query_vector,
+                top_k=k,
+                include_metadata=True
+            )
+            span.set_attribute("matches", len(results.matches))
         return [
             {
                 "text": match.metadata["text"],
@@ -10,12 +10,19 @@ This module provides background tasks for:
 
 import logging
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Sequence
 import numpy as np
 
 from app.celery_app import celery_app
+from app.config import settings
 from app.database import SessionLocal
-from app.models.enhanced_health_models import HealthData, UserHealthProfile
+from app.models.health_data import HealthData
+from app.models.enhanced_health_models import UserHealthProfile
+from app.models.user import User
+from app.services.enhanced.health_analytics import HealthAnalyticsEngine
+from app.services.enhanced.population_analytics import PopulationSource, PopulationStatisticsEngine
+from app.services.enhanced.health_score_store import HealthScoreStore, to_payload
+from app.services.enhanced.peer_baselines import PeerBaselineStore
 from app.services.enhanced.business_intelligence import (
     get_global_bi_service, ReportType, AggregationPeriod
 )
@@ -23,10 +30,18 @@ from app.services.enhanced.ml_data_preparation import (
     get_global_ml_data_preparation_service, FeatureType, ModelType, DataVersion,
     FeatureDefinition, FeatureSet, ModelPerformance
 )
+from app.utils.async_utils import run_async
 from app.utils.performance_monitoring import monitor_custom_performance
 
 logger = logging.getLogger(__name__)
 
+
+def run_cohort(db, user_ids: Sequence[int], days: int = 90, persist: bool = True) -> Dict[int, Dict[str, Any]]:
+    """Run batch analytics for a cohort on the given session."""
+    engine = HealthAnalyticsEngine(db)
+    return run_async(engine.run_cohort_analytics(user_ids, days=days, persist=persist))
+
+
 @celery_app.task
 @monitor_custom_performance("compute_analytics")
 def compute_analytics():
@@ -34,31 +49,32 @@ def compute_analytics():
     Compute health analytics for all users.
     
     This task runs every 2 hours to compute comprehensive
-    health analytics and insights.
+    health analytics and insights. Active users are processed in
+    cohorts of ``analytics_cohort_size`` through the batch engine, so
+    each cohort costs a few set-based queries rather than one round
+    trip per user.
     """
     try:
         db = SessionLocal()
         
         # Get all active users
-        users = db.query(UserHealthProfile).filter(
-            UserHealthProfile.is_active == True
-        ).all()
+        user_ids = [user_id for (user_id,) in db.query(User.id).filter(
+            User.is_active == True
+        ).order_by(User.id).all()]
         
         processed_count = 0
         error_count = 0
+        cohort_size = settings.analytics_cohort_size
         
-        for user_profile in users:
+        for offset in range(0, len(user_ids), cohort_size):
+            cohort = user_ids[offset:offset + cohort_size]
             try:
-                # Compute analytics for each user
-                result = compute_user_analytics(user_profile.user_id, db)
-                if result["success"]:
-                    processed_count += 1
-                else:
-                    error_count += 1
-                    
+                results = run_cohort(db, cohort)
+                processed_count += len(results)
+                
             except Exception as e:
-                logger.error(f"Failed to compute analytics for user {user_profile.user_id}: {e}")
-                error_count += 1
+                logger.error(f"Failed to compute analytics for cohort starting at user {cohort[0]}: {e}")
+                error_count += len(cohort)
         
         logger.info(f"Analytics computation completed: {processed_count} successful, {error_count} errors")
         
@@ -75,6 +91,107 @@ def compute_analytics():
     finally:
         db.close()
 
+@celery_app.task
+@monitor_custom_performance("compute_cohort_analytics")
+def compute_cohort_analytics(user_ids: List[int], days: int = 90):
+    """
+    Compute trends, health scores and risks for a cohort of users.
+    
+    Args:
+        user_ids: IDs of the users to analyze
+        days: Number of days to analyze (default: 90)
+    """
+    try:
+        db = SessionLocal()
+        
+        results = run_cohort(db, user_ids, days=days)
+        
+        logger.info(f"Cohort analytics completed: {len(results)} of {len(user_ids)} users with data")
+        
+        return {
+            "user_count": len(user_ids),
+            "analyzed_count": len(results),
+            "results": {str(user_id): to_payload(result) for user_id, result in results.items()},
+            "timestamp": datetime.now().isoformat()
+        }
+        
+    except Exception as e:
+        logger.error(f"Cohort analytics failed for {len(user_ids)} users: {e}")
+        raise
+    finally:
+        db.close()
+
+@celery_app.task
+@monitor_custom_performance("refresh_health_scores")
+def refresh_health_scores(max_batches: int = 10):
+    """
+    Recompute materialized health scores for users whose inputs changed.
+    
+    Drains the invalidation queue in batches of
+    ``health_score_refresh_batch_size`` users; anything left after
+    max_batches, or after a batch in which every user failed, is picked
+    up by the next scheduled run.
+    
+    Args:
+        max_batches: Maximum batches to process in this run
+    """
+    try:
+        db = SessionLocal()
+        store = HealthScoreStore(db)
+        
+        refreshed = failed = cleared = pending = 0
+        for _ in range(max_batches):
+            result = run_async(store.refresh_dirty(limit=settings.health_score_refresh_batch_size))
+            refreshed += result['refreshed']
+            failed += result['failed']
+            cleared += result['cleared']
+            pending = result['pending']
+            if not pending or not result['refreshed']:
+                break  # Failed users stay at the head of the queue; retry them next run
+        
+        logger.info(f"Health score refresh completed: {refreshed} users, {failed} failed, "
+                    f"{pending} still pending")
+        
+        return {
+            "refreshed_users": refreshed,
+            "failed_users": failed,
+            "cleared_invalidations": cleared,
+            "pending_users": pending,
+            "timestamp": datetime.now().isoformat()
+        }
+        
+    except Exception as e:
+        logger.error(f"Health score refresh failed: {e}")
+        raise
+    finally:
+        db.close()
+
+@celery_app.task
+@monitor_custom_performance("build_peer_baselines")
+def build_peer_baselines(days: Optional[int] = None):
+    """
+    Rebuild the peer group baselines used by comparative analytics.
+    
+    Args:
+        days: Window of readings behind each user's mean (default: peer_baseline_days)
+    """
+    try:
+        db = SessionLocal()
+        baselines = PeerBaselineStore.build(db, days=days)
+        
+        logger.info(f"Peer baseline build completed: {baselines} baselines")
+        
+        return {
+            "baselines": baselines,
+            "timestamp": datetime.now().isoformat()
+        }
+        
+    except Exception as e:
+        logger.error(f"Peer baseline build failed: {e}")
+        raise
+    finally:
+        db.close()
+
 @celery_app.task
 @monitor_custom_performance("analyze_health_trends")
 def analyze_health_trends(user_id: int, days: int = 30):
@@ -88,29 +205,9 @@ def analyze_health_trends(user_id: int, days: int = 30):
     try:
         db = SessionLocal()
         
-        # Get health data for the specified period
-        start_date = datetime.now() - timedelta(days=days)
-        health_data = db.query(HealthData).filter(
-            HealthData.user_id == user_id,
-            HealthData.timestamp >= start_date
-        ).order_by(HealthData.timestamp).all()
-        
-        # Group data by metric type
-        metrics_data = {}
-        for data_point in health_data:
-            if data_point.metric_type not in metrics_data:
-                metrics_data[data_point.metric_type] = []
-            metrics_data[data_point.metric_type].append({
-                "value": data_point.value,
-                "timestamp": data_point.timestamp
-            })
-        
-        # Analyze trends for each metric
-        trends = {}
-        for metric_type, data_points in metrics_data.items():
-            if len(data_points) >= 3:  # Need at least 3 points for trend analysis
-                trend_analysis = analyze_metric_trend(data_points)
-                trends[metric_type] = trend_analysis
+        # A cohort of one shares the batch engine's loading and trend code
+        result = run_cohort(db, [user_id], days=days, persist=False).get(user_id, {})
+        trends = {trend.data_type: to_payload(trend) for trend in result.get('trends', [])}
         
         logger.info(f"Health trends analyzed for user {user_id}: {len(trends)} metrics")
         
@@ -118,7 +215,7 @@ def analyze_health_trends(user_id: int, days: int = 30):
             "user_id": user_id,
             "analysis_period_days": days,
             "trends": trends,
-            "total_data_points": len(health_data),
+            "total_data_points": sum(trend["data_points"] for trend in trends.values()),
             "timestamp": datetime.now().isoformat()
         }
         
@@ -193,34 +290,17 @@ def predict_health_risks(user_id: int):
     try:
         db = SessionLocal()
         
-        # Get user's health data
-        health_data = db.query(HealthData).filter(
-            HealthData.user_id == user_id
-        ).order_by(HealthData.timestamp.desc()).limit(100).all()
-        
-        # Analyze risk factors
-        risk_factors = analyze_risk_factors(health_data)
-        
-        # Generate risk predictions
-        risk_predictions = generate_risk_predictions(risk_factors)
-        
-        # Update user profile with risk assessment
-        user_profile = db.query(UserHealthProfile).filter(
-            UserHealthProfile.user_id == user_id
-        ).first()
-        
-        if user_profile:
-            user_profile.last_risk_assessment = datetime.now()
-            user_profile.risk_factors = risk_factors
-            user_profile.risk_predictions = risk_predictions
-            db.commit()
+        # Score and assess risks through the batch engine (persists the health score)
+        result = run_cohort(db, [user_id]).get(user_id, {})
+        risk_assessments = to_payload(result.get('risk_assessment', []))
+        health_score = to_payload(result['health_score']) if 'health_score' in result else None
         
         logger.info(f"Health risk prediction completed for user {user_id}")
         
         return {
             "user_id": user_id,
-            "risk_factors": risk_factors,
-            "risk_predictions": risk_predictions,
+            "risk_assessments": risk_assessments,
+            "health_score": health_score,
             "timestamp": datetime.now().isoformat()
         }
         
@@ -232,45 +312,24 @@ def predict_health_risks(user_id: int):
 
 @celery_app.task
 @monitor_custom_performance("compute_population_analytics")
-def compute_population_analytics():
+def compute_population_analytics(source: str = PopulationSource.ROLLUPS.value):
     """
     Compute population-level health analytics.
     
     This task analyzes health patterns across all users
-    to identify population trends and insights.
+    to identify population trends and insights. Statistics are
+    aggregated in the database and in streamed sketches, so memory
+    stays bounded however many readings the table holds.
+    
+    Args:
+        source: "rollups" (monthly rollups, default) or "readings" (stream raw readings)
     """
     try:
         db = SessionLocal()
         
-        # Get all health data
-        health_data = db.query(HealthData).all()
-        
-        # Group by metric type
-        population_metrics = {}
-        for data_point in health_data:
-            if data_point.metric_type not in population_metrics:
-                population_metrics[data_point.metric_type] = []
-            population_metrics[data_point.metric_type].append(data_point.value)
-        
         # Compute population statistics
-        population_stats = {}
-        for metric_type, values in population_metrics.items():
-            if values:
-                population_stats[metric_type] = {
-                    "count": len(values),
-                    "mean": np.mean(values),
-                    "median": np.median(values),
-                    "std": np.std(values),
-                    "min": np.min(values),
-                    "max": np.max(values),
-                    "percentiles": {
-                        "25": np.percentile(values, 25),
-                        "50": np.percentile(values, 50),
-                        "75": np.percentile(values, 75),
-                        "90": np.percentile(values, 90),
-                        "95": np.percentile(values, 95)
-                    }
-                }
+        result = PopulationStatisticsEngine(db).compute(source)
+        population_stats = result["population_stats"]
         
         # Identify outliers and anomalies
         anomalies = detect_population_anomalies(population_stats)
@@ -278,14 +337,14 @@ def compute_population_analytics():
         # Generate insights
         insights = generate_population_insights(population_stats, anomalies)
         
-        logger.info(f"Population analytics computed: {len(population_stats)} metrics analyzed")
+        logger.info(f"Population analytics computed from {result['source']}: {len(population_stats)} metrics analyzed")
         
         return {
             "population_stats": population_stats,
             "anomalies": anomalies,
             "insights": insights,
-            "total_users": len(set(dp.user_id for dp in health_data)),
-            "total_data_points": len(health_data),
+            "total_users": result["total_users"],
+            "total_data_points": result["total_data_points"],
             "timestamp": datetime.now().isoformat()
         }
         
@@ -877,73 +936,6 @@ def version_ml_data():
 
 # Helper functions
 
-def compute_user_analytics(user_id: int, db) -> Dict[str, Any]:
-    """Compute comprehensive analytics for a specific user."""
-    # Get user's health data
-    health_data = db.query(HealthData).filter(
-        HealthData.user_id == user_id
-    ).all()
-    
-    if not health_data:
-        return {"success": False, "reason": "No health data available"}
-    
-    # Compute various analytics
-    analytics = {
-        "data_summary": compute_data_summary(health_data),
-        "trends": compute_trends(health_data),
-        "correlations": compute_correlations(health_data),
-        "anomalies": detect_anomalies(health_data),
-        "recommendations": generate_recommendations(health_data)
-    }
-    
-    # Update user profile
-    user_profile = db.query(UserHealthProfile).filter(
-        UserHealthProfile.user_id == user_id
-    ).first()
-    
-    if user_profile:
-        user_profile.last_analytics_computation = datetime.now()
-        user_profile.analytics_data = analytics
-        db.commit()
-    
-    return {"success": True, "analytics": analytics}
-
-def analyze_metric_trend(data_points: List[Dict[str, Any]]) -> Dict[str, Any]:
-    """Analyze trend for a specific metric."""
-    if len(data_points) < 3:
-        return {"trend": "insufficient_data", "confidence": 0.0}
-    
-    # Extract values and timestamps
-    values = [dp["value"] for dp in data_points]
-    timestamps = [dp["timestamp"] for dp in data_points]
-    
-    # Convert timestamps to numeric values for regression
-    time_numeric = [(ts - timestamps[0]).days for ts in timestamps]
-    
-    # Simple linear regression
-    slope, intercept = np.polyfit(time_numeric, values, 1)
-    
-    # Determine trend direction
-    if slope > 0.01:
-        trend = "increasing"
-    elif slope < -0.01:
-        trend = "decreasing"
-    else:
-        trend = "stable"
-    
-    # Calculate confidence (R-squared)
-    y_pred = slope * np.array(time_numeric) + intercept
-    ss_res = np.sum((values - y_pred) ** 2)
-    ss_tot = np.sum((values - np.mean(values)) ** 2)
-    r_squared = 1 - (ss_res / ss_tot) if ss_tot != 0 else 0
-    
-    return {
-        "trend": trend,
-        "slope": slope,
-        "confidence": r_squared,
-        "data_points": len(data_points)
-    }
-
 def generate_comprehensive_report(user_id: int, user_profile, db) -> Dict[str, Any]:
     """Generate comprehensive health report."""
     # Get recent health data
@@ -1011,53 +1003,6 @@ def generate_trends_report(user_id: int, user_profile, db) -> Dict[str, Any]:
     
     return report
 
-def analyze_risk_factors(health_data: List[HealthData]) -> Dict[str, Any]:
-    """Analyze health risk factors from data."""
-    risk_factors = {
-        "high_blood_pressure": False,
-        "high_heart_rate": False,
-        "low_activity": False,
-        "poor_sleep": False,
-        "weight_issues": False
-    }
-    
-    # Analyze each metric for risk factors
-    for data_point in health_data:
-        if data_point.metric_type == "blood_pressure_systolic" and data_point.value > 140:
-            risk_factors["high_blood_pressure"] = True
-        elif data_point.metric_type == "heart_rate" and data_point.value > 100:
-            risk_factors["high_heart_rate"] = True
-        elif data_point.metric_type == "steps" and data_point.value < 5000:
-            risk_factors["low_activity"] = True
-        elif data_point.metric_type == "sleep_hours" and data_point.value < 6:
-            risk_factors["poor_sleep"] = True
-        elif data_point.metric_type == "bmi" and (data_point.value < 18.5 or data_point.value > 25):
-            risk_factors["weight_issues"] = True
-    
-    return risk_factors
-
-def generate_risk_predictions(risk_factors: Dict[str, Any]) -> Dict[str, Any]:
-    """Generate health risk predictions based on risk factors."""
-    predictions = {
-        "cardiovascular_risk": "low",
-        "diabetes_risk": "low",
-        "obesity_risk": "low",
-        "sleep_disorder_risk": "low"
-    }
-    
-    # Simple risk assessment logic
-    if risk_factors["high_blood_pressure"] or risk_factors["high_heart_rate"]:
-        predictions["cardiovascular_risk"] = "moderate"
-    
-    if risk_factors["weight_issues"] and risk_factors["low_activity"]:
-        predictions["diabetes_risk"] = "moderate"
-        predictions["obesity_risk"] = "moderate"
-    
-    if risk_factors["poor_sleep"]:
-        predictions["sleep_disorder_risk"] = "moderate"
-    
-    return predictions
-
 def detect_population_anomalies(population_stats: Dict[str, Any]) -> List[Dict[str, Any]]:
     """Detect anomalies in population health data."""
     anomalies = []
@@ -1106,32 +1051,11 @@ def generate_population_insights(population_stats: Dict[str, Any], anomalies: Li
 
 # Additional helper functions (simplified implementations)
 
-def compute_data_summary(health_data: List[HealthData]) -> Dict[str, Any]:
-    """Compute summary statistics for health data."""
-    return {
-        "total_points": len(health_data),
-        "date_range": {
-            "start": min(dp.timestamp for dp in health_data).isoformat(),
-            "end": max(dp.timestamp for dp in health_data).isoformat()
-        },
-        "metrics_count": len(set(dp.metric_type for dp in health_data))
-    }
-
 def compute_trends(health_data: List[HealthData]) -> Dict[str, Any]:
     """Compute trends in health data."""
     # Simplified trend computation
     return {"trends": "computed"}
 
-def compute_correlations(health_data: List[HealthData]) -> Dict[str, Any]:
-    """Compute correlations between different health metrics."""
-    # Simplified correlation computation
-    return {"correlations": "computed"}
-
-def detect_anomalies(health_data: List[HealthData]) -> List[Dict[str, Any]]:
-    """Detect anomalies in health data."""
-    # Simplified anomaly detection
-    return []
-
 def generate_recommendations(health_data: List[HealthData]) -> List[str]:
     """Generate health recommendations based on data."""
     # Simplified recommendation generation
@@ -2,7 +2,7 @@
 Enhanced Notification Tasks for HealthMate
 
 This module provides Celery tasks for:
-- Automated health metric monitoring and alerting
+- Health metric alerts for individual data points (alerts on ingest run in app.services.threshold_alerts)
 - Smart medication reminder processing
 - Emergency health condition monitoring
 - Contextual notification generation
@@ -11,9 +11,10 @@ This module provides Celery tasks for:
 
 import logging
 import asyncio
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 from datetime import datetime, timedelta
-from celery import current_task
+from celery import chord, current_task
+from sqlalchemy import and_
 
 from app.celery_app import celery_app
 from app.database import SessionLocal
@@ -25,6 +26,8 @@ from app.models.enhanced_health_models import (
     HealthMetricsAggregation, EnhancedSymptomLog
 )
 from app.services.enhanced_notification_service import EnhancedNotificationService
+from app.services.threshold_alerts import metric_readings, threshold_monitor
+from app.utils.async_utils import run_async
 from app.utils.performance_monitoring import monitor_custom_performance
 from app.utils.audit_logging import AuditLogger
 
@@ -32,78 +35,125 @@ logger = logging.getLogger(__name__)
 audit_logger = AuditLogger()
 
 
-def run_async(coro):
-    """Helper function to run async coroutines in sync context."""
-    try:
-        loop = asyncio.get_event_loop()
-    except RuntimeError:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-    return loop.run_until_complete(coro)
+def users_with_active_medications(db):
+    """Query the IDs of active users with active medications."""
+    return db.query(User.id).join(
+        EnhancedMedication, User.id == EnhancedMedication.user_id
+    ).filter(
+        and_(
+            User.is_active == True,
+            EnhancedMedication.status == "active"
+        )
+    ).distinct()
 
 
-@celery_app.task
-@monitor_custom_performance("monitor_health_metrics_for_all_users")
-def monitor_health_metrics_for_all_users():
+def active_users(db):
+    """Query the IDs of active users."""
+    return db.query(User.id).filter(User.is_active == True)
+
+
+# Per-user sweeps fanned out in chunks:
+# name -> (EnhancedNotificationService method, result count key, query of the users to sweep)
+USER_SWEEPS = {
+    "medication_reminders": ("process_medication_reminders", "total_reminders", users_with_active_medications),
+    "emergency_conditions": ("check_emergency_conditions", "total_emergencies", active_users),
+}
+
+
+def user_id_ranges(query, chunk_size: int) -> Iterator[Tuple[int, int, int]]:
     """
-    Monitor health metrics for all active users and send alerts for threshold violations.
+    Split a query of user IDs into keyset ranges of at most chunk_size users.
     
-    This task runs periodically to check all users' health data and generate
-    appropriate notifications based on smart notification logic.
+    Only each range's last ID is read, except for the final, partial range.
+    
+    Yields:
+        (after_id, through_id, users) selecting User.id > after_id and <= through_id
     """
-    try:
-        db = SessionLocal()
-        settings = Settings()
-        enhanced_service = EnhancedNotificationService(settings)
-        
-        # Get all active users
-        active_users = db.query(User).filter(User.is_active == True).all()
-        
-        total_alerts = 0
-        successful_users = 0
-        failed_users = 0
+    last_id = 0
+    while True:
+        remaining = query.filter(User.id > last_id).order_by(User.id)
+        boundary = remaining.offset(chunk_size - 1).limit(1).scalar()
+        if boundary is None:
+            tail = [user_id for (user_id,) in remaining]
+            if tail:
+                yield last_id, tail[-1], len(tail)
+            return
+        yield last_id, boundary, chunk_size
+        last_id = boundary
+
+
+def fan_out_user_sweep(sweep: str, db) -> Dict[str, Any]:
+    """
+    Dispatch a per-user sweep as a chord of chunk subtasks.
+    
+    Each subtask receives an ID range rather than the IDs themselves, so
+    the dispatcher never holds the full user list.
+    
+    Args:
+        sweep: Name of the sweep in USER_SWEEPS
+        db: Database session used to find the chunk boundaries
         
-        for user in active_users:
+    Returns:
+        Dictionary with the number of users and chunks dispatched
+    """
+    settings = Settings()
+    _, _, query = USER_SWEEPS[sweep]
+    header = []
+    total_users = 0
+    for after_id, through_id, users in user_id_ranges(query(db), settings.notification_sweep_chunk_size):
+        header.append(sweep_user_chunk.s(sweep, after_id, through_id))
+        total_users += users
+    
+    summary_task_id = None
+    if header:
+        result = chord(header)(summarize_user_sweep.s(sweep))
+        summary_task_id = result.id
+    
+    logger.info(f"Dispatched {sweep} sweep: {total_users} users in {len(header)} chunks")
+    
+    return {
+        "status": "dispatched" if header else "completed",
+        "sweep": sweep,
+        "total_users": total_users,
+        "chunks": len(header),
+        "summary_task_id": summary_task_id,
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+async def sweep_users(sweep: str, user_ids: List[int], concurrency: int) -> Dict[str, Any]:
+    """Run a sweep for users concurrently, each on its own session, at most ``concurrency`` at a time."""
+    method_name, _, _ = USER_SWEEPS[sweep]
+    handler = getattr(EnhancedNotificationService(Settings()), method_name)
+    limit = asyncio.Semaphore(concurrency)
+    
+    async def sweep_user(user_id: int) -> int:
+        async with limit:
+            db = SessionLocal()
             try:
-                # Monitor health metrics for this user
-                alerts = run_async(enhanced_service.monitor_health_metrics_and_alert(user.id, db))
-                total_alerts += len(alerts)
-                successful_users += 1
-                
-                logger.info(f"Health metrics monitored for user {user.id}: {len(alerts)} alerts generated")
-                
-            except Exception as e:
-                logger.error(f"Failed to monitor health metrics for user {user.id}: {e}")
-                failed_users += 1
-        
-        # Log task completion
-        audit_logger.log_system_action(
-            action="health_metrics_monitoring_completed",
-            details={
-                "total_users": len(active_users),
-                "successful_users": successful_users,
-                "failed_users": failed_users,
-                "total_alerts": total_alerts,
-                "timestamp": datetime.now().isoformat()
-            }
-        )
-        
-        logger.info(f"Health metrics monitoring completed: {successful_users} users processed, {total_alerts} alerts generated")
-        
-        return {
-            "status": "completed",
-            "total_users": len(active_users),
-            "successful_users": successful_users,
-            "failed_users": failed_users,
-            "total_alerts": total_alerts,
-            "timestamp": datetime.now().isoformat()
-        }
-        
-    except Exception as e:
-        logger.error(f"Health metrics monitoring task failed: {e}")
-        raise
-    finally:
-        db.close()
+                return len(await handler(user_id, db))
+            finally:
+                db.close()
+    
+    outcomes = await asyncio.gather(*(sweep_user(user_id) for user_id in user_ids), return_exceptions=True)
+    
+    failed_users = 0
+    items = 0
+    for user_id, outcome in zip(user_ids, outcomes):
+        if isinstance(outcome, Exception):
+            logger.error(f"Failed to run {sweep} for user {user_id}: {outcome}")
+            failed_users += 1
+        else:
+            items += outcome
+            if outcome and sweep == "emergency_conditions":
+                logger.warning(f"Emergency conditions detected for user {user_id}: {outcome} emergencies")
+    
+    return {
+        "users": len(user_ids),
+        "successful_users": len(user_ids) - failed_users,
+        "failed_users": failed_users,
+        "items": items
+    }
 
 
 @celery_app.task
@@ -113,62 +163,14 @@ def process_medication_reminders_for_all_users():
     Process medication reminders for all active users.
     
     This task runs periodically to check for missed doses and upcoming
-    medication schedules, sending appropriate reminders.
+    medication schedules, sending appropriate reminders. Users with
+    active medications are paged by ID and fanned out to sweep_user_chunk
+    subtasks, so the sweep spreads across workers.
     """
     try:
         db = SessionLocal()
-        settings = Settings()
-        enhanced_service = EnhancedNotificationService(settings)
-        
-        # Get all active users with medications
-        users_with_medications = db.query(User).join(
-            EnhancedMedication, User.id == EnhancedMedication.user_id
-        ).filter(
-            and_(
-                User.is_active == True,
-                EnhancedMedication.status == "active"
-            )
-        ).distinct().all()
         
-        total_reminders = 0
-        successful_users = 0
-        failed_users = 0
-        
-        for user in users_with_medications:
-            try:
-                # Process medication reminders for this user
-                reminders = run_async(enhanced_service.process_medication_reminders(user.id, db))
-                total_reminders += len(reminders)
-                successful_users += 1
-                
-                logger.info(f"Medication reminders processed for user {user.id}: {len(reminders)} reminders sent")
-                
-            except Exception as e:
-                logger.error(f"Failed to process medication reminders for user {user.id}: {e}")
-                failed_users += 1
-        
-        # Log task completion
-        audit_logger.log_system_action(
-            action="medication_reminders_processing_completed",
-            details={
-                "total_users": len(users_with_medications),
-                "successful_users": successful_users,
-                "failed_users": failed_users,
-                "total_reminders": total_reminders,
-                "timestamp": datetime.now().isoformat()
-            }
-        )
-        
-        logger.info(f"Medication reminders processing completed: {successful_users} users processed, {total_reminders} reminders sent")
-        
-        return {
-            "status": "completed",
-            "total_users": len(users_with_medications),
-            "successful_users": successful_users,
-            "failed_users": failed_users,
-            "total_reminders": total_reminders,
-            "timestamp": datetime.now().isoformat()
-        }
+        return fan_out_user_sweep("medication_reminders", db)
         
     except Exception as e:
         logger.error(f"Medication reminders processing task failed: {e}")
@@ -185,57 +187,13 @@ def check_emergency_conditions_for_all_users():
     
     This task runs frequently to monitor for critical health values
     that require immediate attention and emergency notifications.
+    Active users are paged by ID and fanned out to sweep_user_chunk
+    subtasks, so the sweep spreads across workers.
     """
     try:
         db = SessionLocal()
-        settings = Settings()
-        enhanced_service = EnhancedNotificationService(settings)
         
-        # Get all active users
-        active_users = db.query(User).filter(User.is_active == True).all()
-        
-        total_emergencies = 0
-        successful_users = 0
-        failed_users = 0
-        
-        for user in active_users:
-            try:
-                # Check emergency conditions for this user
-                emergencies = run_async(enhanced_service.check_emergency_conditions(user.id, db))
-                total_emergencies += len(emergencies)
-                successful_users += 1
-                
-                if emergencies:
-                    logger.warning(f"Emergency conditions detected for user {user.id}: {len(emergencies)} emergencies")
-                else:
-                    logger.info(f"Emergency conditions checked for user {user.id}: no emergencies detected")
-                
-            except Exception as e:
-                logger.error(f"Failed to check emergency conditions for user {user.id}: {e}")
-                failed_users += 1
-        
-        # Log task completion
-        audit_logger.log_system_action(
-            action="emergency_conditions_check_completed",
-            details={
-                "total_users": len(active_users),
-                "successful_users": successful_users,
-                "failed_users": failed_users,
-                "total_emergencies": total_emergencies,
-                "timestamp": datetime.now().isoformat()
-            }
-        )
-        
-        logger.info(f"Emergency conditions check completed: {successful_users} users processed, {total_emergencies} emergencies detected")
-        
-        return {
-            "status": "completed",
-            "total_users": len(active_users),
-            "successful_users": successful_users,
-            "failed_users": failed_users,
-            "total_emergencies": total_emergencies,
-            "timestamp": datetime.now().isoformat()
-        }
+        return fan_out_user_sweep("emergency_conditions", db)
         
     except Exception as e:
         logger.error(f"Emergency conditions check task failed: {e}")
@@ -244,6 +202,66 @@ def check_emergency_conditions_for_all_users():
         db.close()
 
 
+@celery_app.task
+@monitor_custom_performance("sweep_user_chunk")
+def sweep_user_chunk(sweep: str, after_id: int, through_id: int):
+    """
+    Run a per-user sweep for one chunk of users.
+    
+    The chunk's users are those the sweep's query selects within the ID
+    range. The whole chunk shares one event loop, with users processed
+    concurrently up to ``notification_sweep_concurrency``.
+    
+    Args:
+        sweep: Name of the sweep in USER_SWEEPS
+        after_id: Users with IDs above this are in the chunk
+        through_id: Last user ID in the chunk
+    """
+    settings = Settings()
+    _, _, query = USER_SWEEPS[sweep]
+    db = SessionLocal()
+    try:
+        user_ids = [
+            user_id for (user_id,) in
+            query(db).filter(User.id > after_id, User.id <= through_id).order_by(User.id)
+        ]
+    finally:
+        db.close()
+    result = run_async(sweep_users(sweep, user_ids, settings.notification_sweep_concurrency))
+    
+    logger.info(f"{sweep} sweep chunk completed: {result['successful_users']} of {len(user_ids)} users, "
+                f"{result['items']} notifications")
+    return result
+
+
+@celery_app.task
+@monitor_custom_performance("summarize_user_sweep")
+def summarize_user_sweep(results: List[Dict[str, Any]], sweep: str):
+    """
+    Aggregate the chunk results of a per-user sweep.
+    
+    Args:
+        results: Results of the sweep's sweep_user_chunk subtasks
+        sweep: Name of the sweep in USER_SWEEPS
+    """
+    _, count_key, _ = USER_SWEEPS[sweep]
+    summary = {
+        "status": "completed",
+        "sweep": sweep,
+        "chunks": len(results),
+        "total_users": sum(result["users"] for result in results),
+        "successful_users": sum(result["successful_users"] for result in results),
+        "failed_users": sum(result["failed_users"] for result in results),
+        count_key: sum(result["items"] for result in results),
+        "timestamp": datetime.now().isoformat()
+    }
+    
+    logger.info(f"{sweep} sweep completed: {summary['successful_users']} users processed, "
+                f"{summary[count_key]} notifications, {summary['failed_users']} failures")
+    
+    return summary
+
+
 @celery_app.task
 @monitor_custom_performance("send_contextual_notifications")
 def send_contextual_notifications(
@@ -348,14 +366,15 @@ def process_health_data_alerts(user_id: int, health_data_id: int):
     """
     Process health data alerts for a specific user and health data point.
     
+    Only this reading is evaluated, against the same rule state and dedup
+    as readings checked on ingest.
+    
     Args:
         user_id: Target user ID
         health_data_id: Health data record ID
     """
     try:
         db = SessionLocal()
-        settings = Settings()
-        enhanced_service = EnhancedNotificationService(settings)
         
         # Get health data
         health_data = db.query(HealthData).filter(
@@ -374,15 +393,18 @@ def process_health_data_alerts(user_id: int, health_data_id: int):
                 "timestamp": datetime.now().isoformat()
             }
         
-        # Monitor health metrics for this specific data point
-        alerts = run_async(enhanced_service.monitor_health_metrics_and_alert(user_id, db))
+        # Evaluate this data point and send its alerts
+        health_data.decrypt_sensitive_fields()
+        alerts = run_async(threshold_monitor.process(
+            metric_readings(user_id, health_data.data_type, health_data.value, health_data.timestamp)
+        ))
         
         logger.info(f"Health data alerts processed for user {user_id}, data {health_data_id}: {len(alerts)} alerts generated")
         
         return {
             "user_id": user_id,
             "health_data_id": health_data_id,
-            "alerts": alerts,
+            "alerts": [{"type": alert["type"], "metric": alert["metric"], "value": alert["value"]} for alert in alerts],
             "timestamp": datetime.now().isoformat()
         }
         
@@ -8,6 +8,7 @@ This module provides background tasks for:
 - Data export and backup
 """
 
+import asyncio
 import logging
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
@@ -15,7 +16,12 @@ from celery import current_task
 
 from app.celery_app import celery_app
 from app.database import SessionLocal
-from app.models.enhanced_health_models import HealthData, UserHealthProfile
+from app.models.health_data import HealthData
+from app.models.enhanced_health_models import UserHealthProfile
+from app.services.enhanced.data_integration import DataIntegrationService, close_client_sessions
+from app.services.enhanced.health_rollups import backfill_rollups
+from app.services.enhanced.health_sync import get_health_sync_engine
+from app.services.threshold_alerts import threshold_monitor
 from app.utils.performance_monitoring import monitor_custom_performance
 
 logger = logging.getLogger(__name__)
@@ -38,21 +44,12 @@ def sync_health_data():
             UserHealthProfile.has_external_connections == True
         ).all()
         
-        synced_count = 0
-        error_count = 0
-        
-        for user_profile in users_with_connections:
-            try:
-                # Sync data for each user
-                result = sync_user_health_data(user_profile.user_id, db)
-                if result["success"]:
-                    synced_count += 1
-                else:
-                    error_count += 1
-                    
-            except Exception as e:
-                logger.error(f"Failed to sync health data for user {user_profile.user_id}: {e}")
-                error_count += 1
+        # One event loop for every user, so provider connections are reused
+        results = asyncio.run(sync_users_health_data(
+            [user_profile.user_id for user_profile in users_with_connections], db
+        ))
+        synced_count = sum(1 for result in results.values() if result["success"])
+        error_count = len(results) - synced_count
         
         logger.info(f"Health data sync completed: {synced_count} successful, {error_count} errors")
         
@@ -269,17 +266,73 @@ def backup_health_data():
     finally:
         db.close()
 
+@celery_app.task
+@monitor_custom_performance("backfill_health_rollups")
+def backfill_health_rollups(batch_size: int = 100):
+    """
+    Build rollups from readings stored before ingest maintained them.
+    
+    Run once after deploying rollups (or after restoring readings). Each
+    run rebuilds the next batch_size users and queues itself until every
+    user is done; progress is kept in the database, so an interrupted
+    backfill resumes where it stopped. Population statistics and series
+    reads use rollups only once it has completed.
+    
+    Args:
+        batch_size: Users rebuilt per run
+    """
+    try:
+        db = SessionLocal()
+        
+        result = backfill_rollups(db, max_users=batch_size)
+        
+        if result["complete"]:
+            logger.info(f"Rollup backfill completed through user {result['last_user_id']}")
+        else:
+            logger.info(f"Rollup backfill rebuilt {result['users']} users through user {result['last_user_id']}")
+            backfill_health_rollups.delay(batch_size)
+        
+        return {
+            **result,
+            "timestamp": datetime.now().isoformat()
+        }
+        
+    except Exception as e:
+        logger.error(f"Rollup backfill failed: {e}")
+        raise
+    finally:
+        db.close()
+
 # Helper functions
 
-def sync_user_health_data(user_id: int, db) -> Dict[str, Any]:
-    """Sync health data for a specific user."""
-    # This would integrate with actual health APIs
-    # For now, return a mock result
-    return {
-        "success": True,
-        "synced_data_points": 10,
-        "user_id": user_id
-    }
+def sync_user_health_data(user_id: int, db,
+                          integration_service: Optional[DataIntegrationService] = None) -> Dict[str, Any]:
+    """Sync a user's new readings from their connected sources."""
+    return asyncio.run(sync_users_health_data([user_id], db, integration_service))[user_id]
+
+async def sync_users_health_data(user_ids: List[int], db,
+                                 integration_service: Optional[DataIntegrationService] = None) -> Dict[int, Dict[str, Any]]:
+    """Sync users one after another over the same pooled provider sessions."""
+    engine = get_health_sync_engine(db, integration_service)
+    results = {}
+    threshold_monitor.start()
+    try:
+        for user_id in user_ids:
+            try:
+                result = await engine.sync_user(user_id)
+                results[user_id] = {
+                    "success": True,
+                    "synced_data_points": result.inserted + result.updated,
+                    **result.to_dict()
+                }
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Failed to sync health data for user {user_id}: {e}")
+                results[user_id] = {"success": False, "user_id": user_id, "error": str(e)}
+    finally:
+        await threshold_monitor.stop()  # Send the alerts of synced readings before the loop closes
+        await close_client_sessions()
+    return results
 
 def validate_data_point(data_point: HealthData) -> bool:
     """Validate a single health data point."""
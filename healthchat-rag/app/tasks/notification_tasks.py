@@ -18,7 +18,9 @@ from email.mime.multipart import MIMEMultipart
 from app.celery_app import celery_app
 from app.database import SessionLocal
 from app.models.user import User
+from app.services.notification_budget import notification_budget
 from app.utils.performance_monitoring import monitor_custom_performance
+from app.websocket.pubsub import publish_to_user_sync
 
 logger = logging.getLogger(__name__)
 
@@ -113,6 +115,16 @@ def send_health_alert(user_id: int, alert_type: str, alert_data: Dict[str, Any])
         # Log the alert
         log_health_alert(user_id, alert_type, alert_data, result, db)
         
+        # Push the alert to any WebSocket the user has open on an API worker
+        try:
+            publish_to_user_sync(user_id, {
+                "type": "health_alert",
+                "alert": {"alert_type": alert_type, **alert_data},
+                "timestamp": datetime.now().isoformat()
+            })
+        except Exception as e:
+            logger.warning(f"Failed to push health alert to user {user_id} sockets: {e}")
+        
         logger.info(f"Health alert sent to user {user_id}: {alert_type}")
         
         return {
@@ -291,6 +303,31 @@ def cleanup_old_notifications(days: int = 30):
     finally:
         db.close()
 
+@celery_app.task
+@monitor_custom_performance("reconcile_notification_budgets")
+def reconcile_notification_budgets():
+    """
+    Rebuild notification budget counters from the notifications table.
+    
+    This task runs every 15 minutes so the counters catch up with sends
+    recorded outside NotificationService or lost while the store was down.
+    """
+    try:
+        db = SessionLocal()
+        
+        reconciled_users = notification_budget.reconcile(db)
+        
+        return {
+            "reconciled_users": reconciled_users,
+            "timestamp": datetime.now().isoformat()
+        }
+        
+    except Exception as e:
+        logger.error(f"Notification budget reconciliation failed: {e}")
+        raise
+    finally:
+        db.close()
+
 # Helper functions
 
 def get_pending_notifications(db) -> List[Dict[str, Any]]:
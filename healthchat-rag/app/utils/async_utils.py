@@ -0,0 +1,18 @@
+"""
+Async helpers for HealthMate backend.
+
+This module provides:
+- Running coroutines from synchronous code such as Celery tasks
+"""
+
+import asyncio
+
+
+def run_async(coro):
+    """Helper function to run async coroutines in sync context."""
+    try:
+        loop = asyncio.get_event_loop()
+    except RuntimeError:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+    return loop.run_until_complete(coro)
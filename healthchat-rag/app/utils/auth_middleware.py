@@ -9,6 +9,7 @@ from typing import Optional, Dict, Any
 from app.database import get_db
 from app.models.user import User
 from app.utils.jwt_utils import jwt_manager
+from app.utils.tracing import tracer
 import logging
 import time
 import hashlib
@@ -54,7 +55,8 @@ class AuthMiddleware:
                 await AuthMiddleware._check_rate_limit(request)
             
             # Verify token
-            payload = jwt_manager.verify_token(token, "access")
+            with tracer.span("auth.verify_token"):
+                payload = jwt_manager.verify_token(token, "access")
             
             # Extract user ID
             user_id = payload.get("user_id")
@@ -65,7 +67,8 @@ class AuthMiddleware:
                 )
             
             # Get user from database
-            user = db.query(User).filter(User.id == user_id).first()
+            with tracer.span("auth.user_lookup"):
+                user = db.query(User).filter(User.id == user_id).first()
             if not user:
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
@@ -0,0 +1,280 @@
+"""
+Histogram-based metrics core for HealthMate backend.
+
+This module provides:
+- Log-linear latency histograms with bounded relative error
+- Time-sliced rotation so summaries cover a configurable window
+- Per-thread shards so recording never takes a shared lock
+- Percentile summaries computed in O(buckets)
+"""
+
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+# Bucket layout: values below MIN_TRACKED_VALUE share bucket 0, above that each
+# bucket is BUCKET_GROWTH times wider than the previous one (~2% relative error).
+MIN_TRACKED_VALUE = 0.01
+BUCKET_GROWTH = 1.04
+MAX_BUCKET_INDEX = 512
+_LOG_GROWTH = math.log(BUCKET_GROWTH)
+
+
+def bucket_index(value: float) -> int:
+    """Return the histogram bucket for a value."""
+    if value <= MIN_TRACKED_VALUE:
+        return 0
+    index = int(math.log(value / MIN_TRACKED_VALUE) / _LOG_GROWTH) + 1
+    return min(index, MAX_BUCKET_INDEX)
+
+
+def bucket_upper_bound(index: int) -> float:
+    """Return the upper bound of a histogram bucket."""
+    return MIN_TRACKED_VALUE * BUCKET_GROWTH ** index
+
+
+class LatencyHistogram:
+    """Sparse log-linear histogram of latency values."""
+
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        """Initialize an empty histogram."""
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def record(self, value: float):
+        """Record a single value."""
+        index = bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "LatencyHistogram"):
+        """Add another histogram's counts into this one."""
+        # Copy first: the owning thread may add buckets concurrently
+        for index, count in list(other.counts.items()):
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def mean(self) -> float:
+        """Mean of recorded values."""
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percentile: float) -> float:
+        """
+        Estimate a percentile.
+
+        Args:
+            percentile: Percentile in [0, 100]
+
+        Returns:
+            Upper bound of the bucket holding the percentile, clamped to
+            the observed min/max
+        """
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * percentile / 100.0))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(max(bucket_upper_bound(index), self.min), self.max)
+        return self.max
+
+    def count_above(self, threshold: float) -> int:
+        """Count values recorded in buckets entirely above a threshold."""
+        first = bucket_index(threshold) + 1
+        return sum(count for index, count in self.counts.items() if index >= first)
+
+    def summary(self) -> Dict[str, Any]:
+        """Return count, mean, min, max and p50/p95/p99."""
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "average": self.mean,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99)
+        }
+
+
+class _Shard:
+    """Time-sliced histograms owned by a single thread."""
+    
+    __slots__ = ("epochs", "slices", "owner")
+    
+    def __init__(self, num_slices: int, owner: Optional[threading.Thread] = None):
+        self.epochs: List[int] = [-1] * num_slices
+        self.slices: List[Dict[Hashable, LatencyHistogram]] = [{} for _ in range(num_slices)]
+        self.owner = owner
+    
+    def absorb(self, other: "_Shard", oldest_epoch: int):
+        """Merge another shard's slices from oldest_epoch on into this one."""
+        for slot, epoch in enumerate(other.epochs):
+            if epoch < oldest_epoch or epoch < self.epochs[slot]:
+                continue
+            if epoch > self.epochs[slot]:
+                self.slices[slot] = {}
+                self.epochs[slot] = epoch
+            histograms = self.slices[slot]
+            for key, histogram in other.slices[slot].items():
+                target = histograms.get(key)
+                if target is None:
+                    target = histograms[key] = LatencyHistogram()
+                target.merge(histogram)
+
+
+class WindowedHistogramStore:
+    """
+    Keyed latency histograms over a sliding window of time slices.
+
+    Each thread writes to its own shard, so recording needs no lock and
+    async code on the event loop thread records without contention. A
+    shard holds a ring of slices; a slice is reset the first time it is
+    written in a new epoch. Shards of threads that have exited are folded
+    into a single retired shard on the next snapshot, which keeps memory
+    bounded by live threads x slices x keys x non-empty buckets.
+    """
+
+    def __init__(
+        self,
+        slice_seconds: int = 60,
+        num_slices: int = 1440,
+        clock: Callable[[], float] = time.time
+    ):
+        """
+        Initialize the store.
+
+        Args:
+            slice_seconds: Width of one time slice
+            num_slices: Number of slices retained (retention = width x count)
+            clock: Clock returning seconds
+        """
+        self.slice_seconds = slice_seconds
+        self.num_slices = num_slices
+        self.clock = clock
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._retired = _Shard(num_slices)
+        self._lock = threading.Lock()
+
+    @property
+    def retention_seconds(self) -> int:
+        """Longest window a summary can cover."""
+        return self.slice_seconds * self.num_slices
+
+    def _shard(self) -> _Shard:
+        """Return the calling thread's shard."""
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = _Shard(self.num_slices, threading.current_thread())
+            self._local.shard = shard
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+    
+    def _reclaim_shards(self, current_epoch: int):
+        """Fold the shards of exited threads into the retired shard. Caller holds the lock."""
+        live = [shard for shard in self._shards if shard.owner.is_alive()]
+        if len(live) == len(self._shards):
+            return
+        oldest_epoch = current_epoch - self.num_slices + 1
+        for shard in self._shards:
+            if not shard.owner.is_alive():
+                self._retired.absorb(shard, oldest_epoch)
+        self._shards = live
+
+    def record(self, key: Hashable, value: float):
+        """
+        Record a value for a key in the current time slice.
+
+        Args:
+            key: Series key, e.g. (endpoint, method, status class)
+            value: Observed value
+        """
+        epoch = int(self.clock() // self.slice_seconds)
+        slot = epoch % self.num_slices
+        shard = self._shard()
+        if shard.epochs[slot] != epoch:
+            shard.slices[slot] = {}
+            shard.epochs[slot] = epoch
+        histograms = shard.slices[slot]
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = LatencyHistogram()
+        histogram.record(value)
+
+    def snapshot(self, window_seconds: Optional[int] = None) -> Dict[Hashable, LatencyHistogram]:
+        """
+        Merge every shard's slices inside a window.
+
+        Args:
+            window_seconds: Window length (defaults to full retention)
+
+        Returns:
+            Merged histogram per key
+        """
+        window = min(window_seconds or self.retention_seconds, self.retention_seconds)
+        current_epoch = int(self.clock() // self.slice_seconds)
+        oldest_epoch = current_epoch - max(1, math.ceil(window / self.slice_seconds)) + 1
+
+        merged: Dict[Hashable, LatencyHistogram] = {}
+        with self._lock:
+            self._reclaim_shards(current_epoch)
+            for shard in [self._retired, *self._shards]:
+                for slot, epoch in enumerate(list(shard.epochs)):
+                    if epoch < oldest_epoch or epoch > current_epoch:
+                        continue
+                    for key, histogram in list(shard.slices[slot].items()):
+                        target = merged.get(key)
+                        if target is None:
+                            target = merged[key] = LatencyHistogram()
+                        target.merge(histogram)
+        return merged
+
+    def clear(self):
+        """Drop all recorded values."""
+        with self._lock:
+            shards = [self._retired, *self._shards]
+        for shard in shards:
+            shard.epochs[:] = [-1] * self.num_slices
+            shard.slices[:] = [{} for _ in range(self.num_slices)]
+
+
+def merge_histograms(histograms: Iterable[LatencyHistogram]) -> LatencyHistogram:
+    """Merge several histograms into a new one."""
+    merged = LatencyHistogram()
+    for histogram in histograms:
+        merged.merge(histogram)
+    return merged
+
+
+def group_histograms(
+    histograms: Dict[Tuple, LatencyHistogram],
+    key_func: Callable[[Tuple], Hashable]
+) -> Dict[Hashable, LatencyHistogram]:
+    """Re-group keyed histograms, merging those that map to the same group."""
+    grouped: Dict[Hashable, LatencyHistogram] = {}
+    for key, histogram in histograms.items():
+        group = key_func(key)
+        target = grouped.get(group)
+        if target is None:
+            target = grouped[group] = LatencyHistogram()
+        target.merge(histogram)
+    return grouped
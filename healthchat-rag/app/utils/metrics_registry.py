@@ -0,0 +1,340 @@
+"""
+Prometheus/OpenMetrics registry for HealthMate backend.
+
+This module provides:
+- Counters and histograms for HTTP requests, database queries, custom
+  timings and Celery tasks, fed by PerformanceMonitor and Celery signals
+- Counters of health readings ingested, by outcome
+- Scrape-time gauges for load balancer, database optimizer, WebSocket
+  and system resource state
+- OpenMetrics / Prometheus text exposition for the /metrics endpoint
+- Multi-process aggregation for Uvicorn/Gunicorn and Celery prefork
+  workers when PROMETHEUS_MULTIPROC_DIR is set
+"""
+
+import logging
+import os
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    from prometheus_client import CollectorRegistry, Counter, Histogram, REGISTRY, multiprocess
+    from prometheus_client import generate_latest as prometheus_generate_latest
+    from prometheus_client import CONTENT_TYPE_LATEST as PROMETHEUS_CONTENT_TYPE
+    from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily
+    from prometheus_client.openmetrics.exposition import (
+        generate_latest as openmetrics_generate_latest,
+        CONTENT_TYPE_LATEST as OPENMETRICS_CONTENT_TYPE,
+    )
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from 5ms to 30s
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Celery tasks run longer than requests
+TASK_BUCKETS = (0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+MetricSource = Callable[[], Iterable[Any]]
+
+
+def is_multiprocess_mode() -> bool:
+    """Check whether metrics are aggregated across worker processes."""
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR") or os.environ.get("prometheus_multiproc_dir"))
+
+
+class _SourceCollector:
+    """Collector that builds gauge families from registered sources at scrape time."""
+
+    def __init__(self, sources: Dict[str, MetricSource]):
+        self.sources = sources
+
+    def describe(self):
+        # Skip the registry's eager collect() used for duplicate-name checks
+        return []
+
+    def collect(self):
+        for name, source in list(self.sources.items()):
+            try:
+                yield from source()
+            except Exception as e:
+                logger.warning(f"Metric source {name} failed: {e}")
+
+
+class MetricsRegistry:
+    """Unified registry of HealthMate metrics."""
+
+    def __init__(self, registry: Optional[Any] = None):
+        """
+        Initialize metrics.
+
+        Args:
+            registry: Prometheus collector registry (defaults to the global one)
+        """
+        self.enabled = PROMETHEUS_AVAILABLE
+        self.sources: Dict[str, MetricSource] = {}
+        if not self.enabled:
+            logger.warning("prometheus_client not installed; /metrics is disabled")
+            return
+
+        self.registry = registry if registry is not None else REGISTRY
+
+        self.http_requests = Counter(
+            "http_requests_total", "HTTP requests handled",
+            ["method", "endpoint", "status"], registry=self.registry
+        )
+        self.http_duration = Histogram(
+            "http_request_duration_seconds", "HTTP request latency",
+            ["method", "endpoint"], buckets=LATENCY_BUCKETS, registry=self.registry
+        )
+        self.db_duration = Histogram(
+            "healthmate_db_query_duration_seconds", "Database query latency",
+            ["table"], buckets=LATENCY_BUCKETS, registry=self.registry
+        )
+        self.custom_duration = Histogram(
+            "healthmate_operation_duration_seconds", "Duration of instrumented operations",
+            ["operation"], buckets=LATENCY_BUCKETS, registry=self.registry
+        )
+        self.custom_errors = Counter(
+            "healthmate_operation_errors_total", "Failed instrumented operations",
+            ["operation"], registry=self.registry
+        )
+        self.celery_tasks = Counter(
+            "healthmate_celery_tasks_total", "Celery tasks finished",
+            ["task", "state"], registry=self.registry
+        )
+        self.celery_duration = Histogram(
+            "healthmate_celery_task_duration_seconds", "Celery task runtime",
+            ["task"], buckets=TASK_BUCKETS, registry=self.registry
+        )
+        self.health_data_points = Counter(
+            "healthmate_health_data_points", "Health readings received for ingestion",
+            ["outcome"], registry=self.registry
+        )
+        self.pipeline_items = Counter(
+            "healthmate_pipeline_stage_items", "Items passing through streaming pipeline stages",
+            ["stage", "direction"], registry=self.registry
+        )
+        self.pipeline_busy = Counter(
+            "healthmate_pipeline_stage_busy_seconds", "Time spent inside streaming pipeline stages",
+            ["stage"], registry=self.registry
+        )
+        self.pipeline_failures = Counter(
+            "healthmate_pipeline_stage_failures", "Pipeline chunks whose stage raised",
+            ["stage"], registry=self.registry
+        )
+
+        # Scrape-time gauges describe the process answering the scrape
+        self._source_collector = _SourceCollector(self.sources)
+        self.registry.register(self._source_collector)
+
+    def observe_http_request(self, method: str, endpoint: str, status_code: int, duration_ms: float):
+        """Record one HTTP request."""
+        if not self.enabled:
+            return
+        self.http_requests.labels(method, endpoint, str(status_code)).inc()
+        self.http_duration.labels(method, endpoint).observe(duration_ms / 1000.0)
+
+    def observe_db_query(self, table: Optional[str], duration_ms: float):
+        """Record one database query."""
+        if not self.enabled:
+            return
+        self.db_duration.labels(table or "unknown").observe(duration_ms / 1000.0)
+
+    def observe_operation(self, name: str, value: float, unit: str = "ms", error: bool = False):
+        """Record one instrumented operation (custom metric)."""
+        if not self.enabled:
+            return
+        if error:
+            self.custom_errors.labels(name).inc()
+        if unit == "ms":
+            self.custom_duration.labels(name).observe(value / 1000.0)
+        elif unit == "s":
+            self.custom_duration.labels(name).observe(value)
+
+    def observe_celery_task(self, task: str, state: str, duration_seconds: Optional[float] = None):
+        """Record one finished Celery task."""
+        if not self.enabled:
+            return
+        self.celery_tasks.labels(task, state).inc()
+        if duration_seconds is not None:
+            self.celery_duration.labels(task).observe(duration_seconds)
+
+    def observe_health_data_ingest(self, inserted: int, duplicates: int = 0, rejected: int = 0):
+        """Record the outcome of one ingestion batch."""
+        if not self.enabled:
+            return
+        for outcome, count in (("inserted", inserted), ("duplicate", duplicates), ("rejected", rejected)):
+            if count:
+                self.health_data_points.labels(outcome).inc(count)
+    
+    def observe_pipeline_stage(self, stage: str, items_in: int, items_out: int, busy_seconds: float,
+                               failures: int = 0):
+        """Record the counters of one stage after a pipeline run."""
+        if not self.enabled:
+            return
+        self.pipeline_items.labels(stage, "in").inc(items_in)
+        self.pipeline_items.labels(stage, "out").inc(items_out)
+        self.pipeline_busy.labels(stage).inc(busy_seconds)
+        if failures:
+            self.pipeline_failures.labels(stage).inc(failures)
+    
+    def register_source(self, name: str, source: MetricSource):
+        """
+        Register a callable producing metric families at scrape time.
+
+        Args:
+            name: Unique source name
+            source: Callable returning GaugeMetricFamily/CounterMetricFamily objects
+        """
+        self.sources[name] = source
+
+    def generate_latest(self, accept_header: str = "") -> Tuple[bytes, str]:
+        """
+        Render all metrics.
+
+        Args:
+            accept_header: Scraper Accept header, used to pick OpenMetrics
+
+        Returns:
+            Tuple of (payload, content type)
+        """
+        if not self.enabled:
+            return b"", "text/plain; charset=utf-8"
+
+        registry = self.registry
+        if is_multiprocess_mode():
+            # Counters/histograms are read from every worker's files; the
+            # scrape-time gauges come from the worker answering the request
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+            registry.register(self._source_collector)
+
+        if "application/openmetrics-text" in (accept_header or ""):
+            return openmetrics_generate_latest(registry), OPENMETRICS_CONTENT_TYPE
+        return prometheus_generate_latest(registry), PROMETHEUS_CONTENT_TYPE
+
+
+def start_metrics_server(port: int):
+    """
+    Serve /metrics on a separate port, for processes without an HTTP app
+    such as Celery workers.
+
+    Args:
+        port: Port to listen on
+    """
+    if not PROMETHEUS_AVAILABLE:
+        return
+    from prometheus_client import start_http_server
+
+    registry = metrics_registry.registry
+    if is_multiprocess_mode():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    start_http_server(port, registry=registry)
+    logger.info(f"Metrics server listening on port {port}")
+
+
+def mark_process_dead(pid: int):
+    """
+    Release a dead worker's live gauges in multi-process mode.
+
+    Call from Gunicorn's ``child_exit`` hook or Celery's
+    ``worker_process_shutdown`` signal.
+    """
+    if PROMETHEUS_AVAILABLE and is_multiprocess_mode():
+        multiprocess.mark_process_dead(pid)
+
+
+def _performance_monitor_source() -> List[Any]:
+    """Latest system resource samples from the performance monitor."""
+    from app.utils.performance_monitoring import performance_monitor
+
+    summary = performance_monitor.get_system_performance_summary(hours=1)
+    family = GaugeMetricFamily(
+        "healthmate_system_resource", "Latest system resource sample", labels=["resource", "unit"]
+    )
+    for name, values in summary.get("metrics", {}).items():
+        family.add_metric([name, values.get("unit", "")], values.get("current", 0))
+    return [family]
+
+
+def _load_balancer_source() -> List[Any]:
+    """Database node health from the load balancer, if one was created."""
+    from app.utils import load_balancer as load_balancer_module
+
+    balancer = load_balancer_module._load_balancer
+    if balancer is None:
+        return []
+
+    status = balancer.get_health_status()
+    node_up = GaugeMetricFamily("healthmate_db_node_up", "Database node is active", labels=["node", "role"])
+    node_latency = GaugeMetricFamily(
+        "healthmate_db_node_response_seconds", "Last health check latency", labels=["node", "role"]
+    )
+    node_connections = GaugeMetricFamily(
+        "healthmate_db_node_connections", "Connections held to a database node", labels=["node", "role"]
+    )
+    for node_name, node in status["nodes"].items():
+        labels = [node_name, node["role"]]
+        node_up.add_metric(labels, 1 if node["is_active"] else 0)
+        node_connections.add_metric(labels, node["connection_count"])
+        if node["response_time_ms"] is not None:
+            node_latency.add_metric(labels, node["response_time_ms"] / 1000.0)
+
+    queries = CounterMetricFamily(
+        "healthmate_load_balancer_queries", "Queries routed by the load balancer", labels=["kind"]
+    )
+    for kind, value in status["statistics"].items():
+        queries.add_metric([kind], value)
+    return [node_up, node_latency, node_connections, queries]
+
+
+def _db_optimizer_source() -> List[Any]:
+    """Query statistics from the database optimizer, if one was created."""
+    from app.models import database_optimization
+
+    optimizer = database_optimization.db_optimizer
+    if optimizer is None:
+        return []
+
+    summary = optimizer.get_performance_summary()
+    if "total_queries" not in summary:
+        return []
+
+    family = GaugeMetricFamily(
+        "healthmate_db_optimizer_queries", "Queries tracked by the database optimizer", labels=["stat"]
+    )
+    family.add_metric(["logged"], summary["total_queries"])
+    family.add_metric(["slow"], summary["slow_queries_count"])
+    average = GaugeMetricFamily(
+        "healthmate_db_optimizer_average_seconds", "Average tracked query time"
+    )
+    average.add_metric([], summary["average_execution_time"])
+    return [family, average]
+
+
+def _websocket_source() -> List[Any]:
+    """WebSocket connection counts for this worker."""
+    from app.websocket.connection_manager import connection_manager
+
+    stats = connection_manager.get_connection_stats()
+    connections = GaugeMetricFamily(
+        "healthmate_websocket_connections", "Open WebSocket connections on this worker", labels=["state"]
+    )
+    connections.add_metric(["total"], stats["total_connections"])
+    connections.add_metric(["authenticated"], stats["authenticated_connections"])
+    users = GaugeMetricFamily("healthmate_active_users_total", "Users with an open WebSocket on this worker")
+    users.add_metric([], stats["total_users"])
+    return [connections, users]
+
+
+# Global metrics registry instance
+metrics_registry = MetricsRegistry()
+
+if PROMETHEUS_AVAILABLE:
+    metrics_registry.register_source("system", _performance_monitor_source)
+    metrics_registry.register_source("load_balancer", _load_balancer_source)
+    metrics_registry.register_source("db_optimizer", _db_optimizer_source)
+    metrics_registry.register_source("websocket", _websocket_source)
@@ -6,6 +6,13 @@ This module provides:
 - Database query performance tracking
 - System resource monitoring
 - Performance metrics collection
+- Request timing middleware
+- Per-stage request trace breakdowns
+
+API, database and custom timings are aggregated into time-sliced latency
+histograms (see metrics_core), so summaries cost O(buckets) and cover any
+window up to the configured retention. A short buffer of raw samples is
+kept for inspection only.
 """
 
 import time
@@ -19,6 +26,11 @@ from collections import defaultdict, deque
 from contextlib import contextmanager
 from functools import wraps
 import json
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+
+from app.utils.metrics_core import WindowedHistogramStore, group_histograms, merge_histograms
+from app.utils.metrics_registry import metrics_registry
 
 logger = logging.getLogger(__name__)
 
@@ -56,19 +68,36 @@ class DatabaseMetric:
 class PerformanceMonitor:
     """Performance monitoring and metrics collection utility."""
     
-    def __init__(self, max_metrics: int = 10000):
+    def __init__(
+        self,
+        max_metrics: int = 1000,
+        slice_seconds: int = 60,
+        retention_slices: int = 1440
+    ):
         """
         Initialize performance monitor.
         
         Args:
-            max_metrics: Maximum number of metrics to store in memory
+            max_metrics: Maximum number of raw samples kept per metric type
+            slice_seconds: Width of one histogram time slice
+            retention_slices: Number of slices retained for summaries
         """
         self.max_metrics = max_metrics
+        # Raw sample buffers; deque.append is atomic so no lock is needed
         self.api_metrics: deque = deque(maxlen=max_metrics)
         self.db_metrics: deque = deque(maxlen=max_metrics)
         self.system_metrics: deque = deque(maxlen=max_metrics)
         self.custom_metrics: deque = deque(maxlen=max_metrics)
-        self.lock = threading.Lock()
+        
+        # Histograms keyed by (endpoint, method, status class), (table,) and (name,)
+        self.api_histograms = WindowedHistogramStore(slice_seconds, retention_slices)
+        self.db_histograms = WindowedHistogramStore(slice_seconds, retention_slices)
+        self.custom_histograms = WindowedHistogramStore(slice_seconds, retention_slices)
+        
+        # Per-stage trace durations keyed by (trace name, stage); every trace is
+        # aggregated, only sampled traces keep their full breakdown
+        self.trace_histograms = WindowedHistogramStore(slice_seconds, retention_slices)
+        self.trace_samples: deque = deque(maxlen=max_metrics)
         
         # Performance thresholds
         self.slow_api_threshold = 1000  # ms
@@ -113,8 +142,9 @@ class PerformanceMonitor:
             response_size=response_size
         )
         
-        with self.lock:
-            self.api_metrics.append(metric)
+        self.api_metrics.append(metric)
+        self.api_histograms.record((endpoint, method, f"{status_code // 100}xx"), response_time)
+        metrics_registry.observe_http_request(method, endpoint, status_code, response_time)
         
         # Log slow API calls
         if response_time > self.slow_api_threshold:
@@ -144,8 +174,9 @@ class PerformanceMonitor:
             connection_pool_size=connection_pool_size
         )
         
-        with self.lock:
-            self.db_metrics.append(metric)
+        self.db_metrics.append(metric)
+        self.db_histograms.record((table_name or "unknown",), execution_time)
+        metrics_registry.observe_db_query(table_name, execution_time)
         
         # Log slow database queries
         if execution_time > self.slow_db_threshold:
@@ -181,9 +212,7 @@ class PerformanceMonitor:
                 PerformanceMetric("network_bytes_recv", network.bytes_recv / (1024**2), datetime.now(), "MB")
             ]
             
-            with self.lock:
-                for metric in metrics:
-                    self.system_metrics.append(metric)
+            self.system_metrics.extend(metrics)
                     
         except Exception as e:
             logger.error(f"Failed to record system metrics: {e}")
@@ -198,93 +227,140 @@ class PerformanceMonitor:
             metadata=metadata or {}
         )
         
-        with self.lock:
-            self.custom_metrics.append(metric)
+        self.custom_metrics.append(metric)
+        self.custom_histograms.record((name,), value)
+        metrics_registry.observe_operation(name, value, unit, error="error" in metric.metadata)
     
-    def get_api_performance_summary(self, hours: int = 1) -> Dict[str, Any]:
+    def get_api_performance_summary(self, hours: float = 1) -> Dict[str, Any]:
         """Get API performance summary for the last N hours."""
-        cutoff_time = datetime.now() - timedelta(hours=hours)
-        
-        with self.lock:
-            recent_metrics = [
-                m for m in self.api_metrics
-                if m.timestamp >= cutoff_time
-            ]
+        histograms = self.api_histograms.snapshot(int(hours * 3600))
+        overall = merge_histograms(histograms.values())
         
-        if not recent_metrics:
+        if not overall.count:
             return {"message": "No API metrics available"}
         
-        response_times = [m.response_time for m in recent_metrics]
-        status_codes = [m.status_code for m in recent_metrics]
-        
-        # Group by endpoint
-        endpoint_stats = defaultdict(list)
-        for metric in recent_metrics:
-            endpoint_stats[metric.endpoint].append(metric.response_time)
+        errors = sum(h.count for (_, _, status_class), h in histograms.items() if status_class in ("4xx", "5xx"))
+        by_endpoint = group_histograms(histograms, lambda key: key[0])
+        by_status = group_histograms(histograms, lambda key: key[2])
         
         return {
-            "total_requests": len(recent_metrics),
-            "average_response_time": sum(response_times) / len(response_times),
-            "min_response_time": min(response_times),
-            "max_response_time": max(response_times),
-            "slow_requests": len([rt for rt in response_times if rt > self.slow_api_threshold]),
-            "error_rate": len([sc for sc in status_codes if sc >= 400]) / len(status_codes),
+            "total_requests": overall.count,
+            "average_response_time": overall.mean,
+            "min_response_time": overall.min,
+            "max_response_time": overall.max,
+            "p50_response_time": overall.percentile(50),
+            "p95_response_time": overall.percentile(95),
+            "p99_response_time": overall.percentile(99),
+            "slow_requests": overall.count_above(self.slow_api_threshold),
+            "error_rate": errors / overall.count,
             "endpoint_performance": {
-                endpoint: {
-                    "count": len(times),
-                    "average": sum(times) / len(times),
-                    "max": max(times)
-                }
-                for endpoint, times in endpoint_stats.items()
-            }
+                endpoint: histogram.summary()
+                for endpoint, histogram in by_endpoint.items()
+            },
+            "status_class_counts": {
+                status_class: histogram.count
+                for status_class, histogram in by_status.items()
+            },
+            "series": [
+                {"endpoint": endpoint, "method": method, "status_class": status_class, **histogram.summary()}
+                for (endpoint, method, status_class), histogram in histograms.items()
+            ]
         }
     
-    def get_db_performance_summary(self, hours: int = 1) -> Dict[str, Any]:
+    def get_db_performance_summary(self, hours: float = 1) -> Dict[str, Any]:
         """Get database performance summary for the last N hours."""
-        cutoff_time = datetime.now() - timedelta(hours=hours)
+        histograms = self.db_histograms.snapshot(int(hours * 3600))
+        overall = merge_histograms(histograms.values())
         
-        with self.lock:
-            recent_metrics = [
-                m for m in self.db_metrics
-                if m.timestamp >= cutoff_time
-            ]
-        
-        if not recent_metrics:
+        if not overall.count:
             return {"message": "No database metrics available"}
         
-        execution_times = [m.execution_time for m in recent_metrics]
-        
-        # Group by table
-        table_stats = defaultdict(list)
-        for metric in recent_metrics:
-            if metric.table_name:
-                table_stats[metric.table_name].append(metric.execution_time)
-        
         return {
-            "total_queries": len(recent_metrics),
-            "average_execution_time": sum(execution_times) / len(execution_times),
-            "min_execution_time": min(execution_times),
-            "max_execution_time": max(execution_times),
-            "slow_queries": len([et for et in execution_times if et > self.slow_db_threshold]),
+            "total_queries": overall.count,
+            "average_execution_time": overall.mean,
+            "min_execution_time": overall.min,
+            "max_execution_time": overall.max,
+            "p50_execution_time": overall.percentile(50),
+            "p95_execution_time": overall.percentile(95),
+            "p99_execution_time": overall.percentile(99),
+            "slow_queries": overall.count_above(self.slow_db_threshold),
             "table_performance": {
-                table: {
-                    "count": len(times),
-                    "average": sum(times) / len(times),
-                    "max": max(times)
-                }
-                for table, times in table_stats.items()
+                table: histogram.summary()
+                for (table,), histogram in histograms.items()
+                if table != "unknown"
             }
         }
     
+    def get_custom_performance_summary(self, hours: float = 1) -> Dict[str, Any]:
+        """Get custom metric summaries for the last N hours."""
+        histograms = self.custom_histograms.snapshot(int(hours * 3600))
+        
+        return {
+            "metrics": {
+                name: histogram.summary()
+                for (name,), histogram in histograms.items()
+            }
+        }
+    
+    def record_trace(
+        self,
+        name: str,
+        duration_ms: float,
+        stages: Dict[str, float],
+        breakdown: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Record the stage timings of one traced request.
+        
+        Args:
+            name: Trace (pipeline) name, e.g. "chat.message"
+            duration_ms: End-to-end duration
+            stages: Total duration per stage name
+            breakdown: Full span breakdown, kept only for sampled traces
+        """
+        self.trace_histograms.record((name, "total"), duration_ms)
+        for stage, value in stages.items():
+            self.trace_histograms.record((name, stage), value)
+        if breakdown is not None:
+            self.trace_samples.append(breakdown)
+    
+    def get_trace_summary(self, hours: float = 1, name: Optional[str] = None) -> Dict[str, Any]:
+        """Get per-stage latency summaries of traced requests for the last N hours."""
+        histograms = self.trace_histograms.snapshot(int(hours * 3600))
+        
+        traces: Dict[str, Dict[str, Any]] = {}
+        for (trace_name, stage), histogram in histograms.items():
+            if name and trace_name != name:
+                continue
+            entry = traces.setdefault(trace_name, {"total": {"count": 0}, "stages": {}})
+            if stage == "total":
+                entry["total"] = histogram.summary()
+            else:
+                entry["stages"][stage] = histogram.summary()
+        
+        return {"traces": traces}
+    
+    def get_trace_samples(
+        self,
+        name: Optional[str] = None,
+        min_duration_ms: float = 0,
+        limit: int = 20
+    ) -> List[Dict[str, Any]]:
+        """Get the most recent sampled trace breakdowns, newest first."""
+        samples = [
+            sample for sample in reversed(list(self.trace_samples))
+            if (not name or sample["name"] == name) and sample["duration_ms"] >= min_duration_ms
+        ]
+        return samples[:limit]
+    
     def get_system_performance_summary(self, hours: int = 1) -> Dict[str, Any]:
         """Get system performance summary for the last N hours."""
         cutoff_time = datetime.now() - timedelta(hours=hours)
         
-        with self.lock:
-            recent_metrics = [
-                m for m in self.system_metrics
-                if m.timestamp >= cutoff_time
-            ]
+        recent_metrics = [
+            m for m in list(self.system_metrics)
+            if m.timestamp >= cutoff_time
+        ]
         
         if not recent_metrics:
             return {"message": "No system metrics available"}
@@ -355,33 +431,37 @@ class PerformanceMonitor:
         return alerts
     
     def clear_old_metrics(self, hours: int = 24):
-        """Clear metrics older than specified hours."""
+        """
+        Clear raw samples older than specified hours.
+        
+        Histogram slices rotate out on their own once they fall outside
+        the retention window.
+        """
         cutoff_time = datetime.now() - timedelta(hours=hours)
         
-        with self.lock:
-            # Clear old API metrics
-            self.api_metrics = deque(
-                [m for m in self.api_metrics if m.timestamp >= cutoff_time],
-                maxlen=self.max_metrics
-            )
-            
-            # Clear old DB metrics
-            self.db_metrics = deque(
-                [m for m in self.db_metrics if m.timestamp >= cutoff_time],
-                maxlen=self.max_metrics
-            )
-            
-            # Clear old system metrics
-            self.system_metrics = deque(
-                [m for m in self.system_metrics if m.timestamp >= cutoff_time],
-                maxlen=self.max_metrics
-            )
-            
-            # Clear old custom metrics
-            self.custom_metrics = deque(
-                [m for m in self.custom_metrics if m.timestamp >= cutoff_time],
-                maxlen=self.max_metrics
-            )
+        # Clear old API metrics
+        self.api_metrics = deque(
+            [m for m in list(self.api_metrics) if m.timestamp >= cutoff_time],
+            maxlen=self.max_metrics
+        )
+        
+        # Clear old DB metrics
+        self.db_metrics = deque(
+            [m for m in list(self.db_metrics) if m.timestamp >= cutoff_time],
+            maxlen=self.max_metrics
+        )
+        
+        # Clear old system metrics
+        self.system_metrics = deque(
+            [m for m in list(self.system_metrics) if m.timestamp >= cutoff_time],
+            maxlen=self.max_metrics
+        )
+        
+        # Clear old custom metrics
+        self.custom_metrics = deque(
+            [m for m in list(self.custom_metrics) if m.timestamp >= cutoff_time],
+            maxlen=self.max_metrics
+        )
         
         logger.info(f"Cleared metrics older than {hours} hours")
 
@@ -485,4 +565,26 @@ def monitor_custom_performance(name: str, unit: str = "ms"):
                 raise
         
         return wrapper
-    return decorator 
\ No newline at end of file
+    return decorator
+
+class PerformanceMetricsMiddleware(BaseHTTPMiddleware):
+    """Record the latency and status of every HTTP request."""
+    
+    async def dispatch(self, request: Request, call_next):
+        start_time = time.perf_counter()
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            return response
+        finally:
+            response_time = (time.perf_counter() - start_time) * 1000
+            # Use the route template so path parameters don't explode label cardinality
+            route = request.scope.get("route")
+            endpoint = getattr(route, "path", None) or "unmatched"
+            performance_monitor.record_api_metric(
+                endpoint=endpoint,
+                method=request.method,
+                response_time=response_time,
+                status_code=status_code
+            )
@@ -0,0 +1,158 @@
+"""
+Mergeable streaming sketches for HealthMate analytics.
+
+This module provides:
+- A merging t-digest for approximate quantiles with bounded memory
+- Vectorized NumPy compression, so large batches are absorbed in one pass
+- Lossless merging of digests built on different shards or time buckets
+- Compact dict serialization for storing digests alongside rollups
+"""
+
+import math
+from typing import Any, Dict, Iterable, Optional, Union
+
+import numpy as np
+
+DEFAULT_COMPRESSION = 100.0
+
+
+class TDigest:
+    """
+    Merging t-digest (Dunning & Ertl) using the arcsine scale function.
+
+    Centroids are kept sorted by mean. Each compression pass assigns every
+    centroid to the integer k-bucket of its quantile midpoint and collapses
+    each bucket into one centroid, so no centroid spans more than one unit
+    of k and the tails keep near-singleton resolution. Roughly
+    ``compression`` centroids survive, independent of how many values were
+    added.
+    """
+
+    __slots__ = ("compression", "means", "weights", "min", "max", "_buffer")
+
+    def __init__(self, compression: float = DEFAULT_COMPRESSION):
+        self.compression = float(compression)
+        self.means = np.empty(0, dtype=np.float64)
+        self.weights = np.empty(0, dtype=np.float64)
+        self.min = math.inf
+        self.max = -math.inf
+        self._buffer: list = []
+
+    @property
+    def count(self) -> float:
+        self._flush()
+        return float(self.weights.sum())
+
+    @property
+    def centroid_count(self) -> int:
+        self._flush()
+        return len(self.means)
+
+    def add(self, value: float, weight: float = 1.0) -> None:
+        """Add one value (buffered until the next read or bulk update)."""
+        self._buffer.append((float(value), float(weight)))
+        if len(self._buffer) >= 10 * self.compression:
+            self._flush()
+
+    def update(self, values: Union[np.ndarray, Iterable[float]], weights: Optional[np.ndarray] = None) -> "TDigest":
+        """Add many values at once."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[np.isfinite(values)] if weights is None else values
+        if not len(values):
+            return self
+        weights = np.ones_like(values) if weights is None else np.asarray(weights, dtype=np.float64).ravel()
+        self._flush()
+        self._absorb(values, weights)
+        return self
+
+    def merge(self, other: "TDigest") -> "TDigest":
+        """Merge another digest into this one."""
+        other._flush()
+        self._flush()
+        if len(other.means):
+            self._absorb(other.means, other.weights, other.min, other.max)
+        return self
+
+    def quantile(self, q: float) -> float:
+        """Approximate value at quantile q in [0, 1] (NaN when empty)."""
+        self._flush()
+        if not len(self.means):
+            return math.nan
+        q = min(max(float(q), 0.0), 1.0)
+        if len(self.means) == 1:
+            return float(self.means[0]) if 0 < q < 1 else (self.min if q == 0 else self.max)
+
+        # Interpolate between centroid midpoints, anchored at the exact extremes
+        cumulative = np.cumsum(self.weights)
+        total = cumulative[-1]
+        centers = cumulative - self.weights / 2
+        positions = np.concatenate(([0.0], centers, [total]))
+        values = np.concatenate(([self.min], self.means, [self.max]))
+        return float(np.interp(q * total, positions, values))
+
+    def cdf(self, value: float) -> float:
+        """Approximate fraction of values at or below value."""
+        self._flush()
+        if not len(self.means):
+            return math.nan
+        if value < self.min:
+            return 0.0
+        if value >= self.max:
+            return 1.0
+        cumulative = np.cumsum(self.weights)
+        total = cumulative[-1]
+        centers = cumulative - self.weights / 2
+        positions = np.concatenate(([0.0], centers, [total]))
+        values = np.concatenate(([self.min], self.means, [self.max]))
+        return float(np.interp(value, values, positions) / total)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize to a JSON-compatible dict."""
+        self._flush()
+        return {
+            "compression": self.compression,
+            "means": self.means.tolist(),
+            "weights": self.weights.tolist(),
+            "min": self.min if len(self.means) else None,
+            "max": self.max if len(self.means) else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "TDigest":
+        """Rebuild a digest serialized with to_dict."""
+        digest = cls(data.get("compression", DEFAULT_COMPRESSION) if data else DEFAULT_COMPRESSION)
+        if data and data.get("means"):
+            digest.means = np.asarray(data["means"], dtype=np.float64)
+            digest.weights = np.asarray(data["weights"], dtype=np.float64)
+            digest.min = float(data["min"])
+            digest.max = float(data["max"])
+        return digest
+
+    def _flush(self) -> None:
+        if self._buffer:
+            buffered = np.asarray(self._buffer, dtype=np.float64)
+            self._buffer = []
+            self._absorb(buffered[:, 0], buffered[:, 1])
+
+    def _absorb(self, means: np.ndarray, weights: np.ndarray,
+                minimum: Optional[float] = None, maximum: Optional[float] = None) -> None:
+        self.min = min(self.min, float(means.min() if minimum is None else minimum))
+        self.max = max(self.max, float(means.max() if maximum is None else maximum))
+
+        means = np.concatenate((self.means, means))
+        weights = np.concatenate((self.weights, weights))
+        order = np.argsort(means, kind="stable")
+        self.means, self.weights = self._compress(means[order], weights[order])
+
+    def _compress(self, means: np.ndarray, weights: np.ndarray):
+        cumulative = np.cumsum(weights)
+        total = cumulative[-1]
+        midpoints = (cumulative - weights / 2) / total
+        # k1 scale k(q) = delta / pi * (asin(2q - 1) + pi / 2), spanning [0, delta]
+        k = self.compression / math.pi * (np.arcsin(2 * midpoints - 1) + math.pi / 2)
+        buckets = np.floor(k).astype(np.int64)
+
+        starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+        merged_weights = np.add.reduceat(weights, starts)
+        merged_means = np.add.reduceat(means * weights, starts) / merged_weights
+        return merged_means, merged_weights
@@ -0,0 +1,471 @@
+"""
+Request tracing utilities for HealthMate backend.
+
+This module provides:
+- Lightweight spans following the OpenTelemetry data model (128-bit trace
+  ids, 64-bit span ids, attributes, status, epoch-nanosecond timestamps)
+- Trace ids derived from the request correlation id, so logs and spans
+  of one request share an identifier
+- Per-stage durations for every trace and tail-sampled full breakdowns
+  stored in PerformanceMonitor
+- Pluggable span exporters (in-memory for tests, logging) and optional
+  mirroring to the OpenTelemetry SDK
+- Tracing middleware that opens the root span for selected routes
+"""
+
+import hashlib
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+import contextvars
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.types import ASGIApp
+
+from app.config import settings
+from app.utils.correlation_id_middleware import correlation_id_ctx_var
+
+try:
+    from opentelemetry import trace as otel_trace
+    OPENTELEMETRY_AVAILABLE = True
+except ImportError:
+    OPENTELEMETRY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Span currently active in this task/thread
+current_span_ctx_var = contextvars.ContextVar("current_span", default=None)
+
+
+def trace_id_from_correlation_id(correlation_id: Optional[str]) -> str:
+    """
+    Derive a 128-bit hex trace id from a correlation id.
+
+    UUID correlation ids (the middleware default) map one-to-one; any
+    other value is hashed.
+    """
+    if not correlation_id:
+        return uuid.uuid4().hex
+    try:
+        return uuid.UUID(correlation_id).hex
+    except ValueError:
+        return hashlib.sha256(correlation_id.encode()).hexdigest()[:32]
+
+
+def _new_span_id() -> str:
+    """Generate a 64-bit hex span id."""
+    return os.urandom(8).hex()
+
+
+class Span:
+    """A timed operation within a trace."""
+
+    def __init__(self, trace: "Trace", name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = _new_span_id()
+        self.parent = parent
+        self.attributes = dict(attributes)
+        self.status = "UNSET"
+        self.status_message: Optional[str] = None
+        self.events: List[Dict[str, Any]] = []
+        self.start_time_ns = time.time_ns()
+        self.end_time_ns: Optional[int] = None
+        self._start_perf_ns = time.perf_counter_ns()
+        self._duration_ns: Optional[int] = None
+        self._otel_span = None
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    @property
+    def parent_span_id(self) -> Optional[str]:
+        return self.parent.span_id if self.parent else None
+
+    @property
+    def is_recording(self) -> bool:
+        return True
+
+    @property
+    def duration_ms(self) -> float:
+        """Span duration (elapsed so far if still open)."""
+        duration_ns = self._duration_ns
+        if duration_ns is None:
+            duration_ns = time.perf_counter_ns() - self._start_perf_ns
+        return duration_ns / 1_000_000
+
+    def set_attribute(self, key: str, value: Any):
+        """Set a span attribute."""
+        self.attributes[key] = value
+
+    def set_status(self, status: str, message: Optional[str] = None):
+        """Set the span status ("OK" or "ERROR")."""
+        self.status = status
+        self.status_message = message
+
+    def record_exception(self, exc: BaseException):
+        """Record an exception event and mark the span as failed."""
+        self.events.append({
+            "name": "exception",
+            "time_ns": time.time_ns(),
+            "attributes": {
+                "exception.type": type(exc).__name__,
+                "exception.message": str(exc)
+            }
+        })
+        self.set_status("ERROR", str(exc))
+
+    def end(self):
+        """Close the span."""
+        if self._duration_ns is not None:
+            return
+        self._duration_ns = time.perf_counter_ns() - self._start_perf_ns
+        self.end_time_ns = self.start_time_ns + self._duration_ns
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize in the shape of an OpenTelemetry span."""
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "start_time_unix_nano": self.start_time_ns,
+            "end_time_unix_nano": self.end_time_ns,
+            "offset_ms": (self._start_perf_ns - self.trace.root._start_perf_ns) / 1_000_000,
+            "duration_ms": self.duration_ms,
+            "attributes": self.attributes,
+            "status": {"code": self.status, "message": self.status_message},
+            "events": self.events
+        }
+
+
+class _NonRecordingSpan:
+    """Span stand-in used when no trace is active."""
+
+    is_recording = False
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def set_status(self, status: str, message: Optional[str] = None):
+        pass
+
+    def record_exception(self, exc: BaseException):
+        pass
+
+
+NON_RECORDING_SPAN = _NonRecordingSpan()
+
+
+class Trace:
+    """All spans of one traced request."""
+
+    def __init__(self, name: str, trace_id: str, correlation_id: Optional[str]):
+        self.name = name
+        self.trace_id = trace_id
+        self.correlation_id = correlation_id
+        self.timestamp = datetime.utcnow()
+        self.root: Optional[Span] = None
+        # list.append is atomic, so spans may finish on worker threads
+        self.spans: List[Span] = []
+
+    def stage_durations(self) -> Dict[str, float]:
+        """
+        Total duration per stage name.
+
+        Time in the root span not covered by any direct child is reported
+        as "unattributed".
+        """
+        stages: Dict[str, float] = {}
+        children_ms = 0.0
+        for span in self.spans:
+            if span is self.root:
+                continue
+            stages[span.name] = stages.get(span.name, 0.0) + span.duration_ms
+            if span.parent is self.root:
+                children_ms += span.duration_ms
+        unattributed = self.root.duration_ms - children_ms
+        if unattributed > 0:
+            stages["unattributed"] = unattributed
+        return stages
+
+    def breakdown(self) -> Dict[str, Any]:
+        """Full per-span breakdown of the trace."""
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "correlation_id": self.correlation_id,
+            "timestamp": self.timestamp.isoformat(),
+            "duration_ms": self.root.duration_ms,
+            "status": self.root.status,
+            "spans": [span.to_dict() for span in sorted(self.spans, key=lambda s: s._start_perf_ns)]
+        }
+
+
+class SpanExporter(ABC):
+    """Receives the spans of sampled traces."""
+
+    @abstractmethod
+    def export(self, spans: List[Span]):
+        """Export the finished spans of one trace."""
+        pass
+
+    def shutdown(self):
+        """Release exporter resources."""
+        pass
+
+
+class InMemorySpanExporter(SpanExporter):
+    """Keeps exported spans in memory, for tests and debugging."""
+
+    def __init__(self):
+        self._spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Span]):
+        with self._lock:
+            self._spans.extend(spans)
+
+    def get_finished_spans(self) -> List[Span]:
+        """Return a copy of all exported spans."""
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self):
+        """Drop all exported spans."""
+        with self._lock:
+            self._spans.clear()
+
+
+class LoggingSpanExporter(SpanExporter):
+    """Writes each exported span to the log."""
+
+    def __init__(self, level: int = logging.DEBUG):
+        self.level = level
+
+    def export(self, spans: List[Span]):
+        for span in spans:
+            logger.log(
+                self.level,
+                f"span {span.name} trace={span.trace_id} span={span.span_id} "
+                f"parent={span.parent_span_id} duration={span.duration_ms:.2f}ms status={span.status}"
+            )
+
+
+class Tracer:
+    """
+    Creates spans and finishes traces.
+
+    Every finished trace feeds PerformanceMonitor's per-stage histograms.
+    The full breakdown is kept and exported for a random sample of traces
+    plus every failed or slow one (tail-based sampling), so p99 outliers
+    are always inspectable.
+    """
+
+    def __init__(
+        self,
+        sample_rate: float = 0.1,
+        enabled: bool = True,
+        monitor: Optional[Any] = None,
+        exporters: Optional[List[SpanExporter]] = None,
+        slow_threshold_ms: Optional[float] = None,
+        use_opentelemetry: bool = False
+    ):
+        """
+        Initialize tracer.
+
+        Args:
+            sample_rate: Share of traces whose breakdown is kept and exported
+            enabled: Disable to make every span a no-op
+            monitor: PerformanceMonitor receiving trace data (defaults to the global one)
+            exporters: Span exporters for sampled traces
+            slow_threshold_ms: Traces at least this slow are always sampled
+                (defaults to the monitor's slow API threshold)
+            use_opentelemetry: Mirror spans to the OpenTelemetry SDK if installed
+        """
+        self.sample_rate = sample_rate
+        self.enabled = enabled
+        self._monitor = monitor
+        self.exporters: List[SpanExporter] = list(exporters or [])
+        self._slow_threshold_ms = slow_threshold_ms
+        self._otel_tracer = None
+        if use_opentelemetry:
+            if OPENTELEMETRY_AVAILABLE:
+                self._otel_tracer = otel_trace.get_tracer("healthmate")
+            else:
+                logger.warning("opentelemetry not installed; spans are not mirrored")
+
+    @property
+    def monitor(self):
+        if self._monitor is None:
+            from app.utils.performance_monitoring import performance_monitor
+            self._monitor = performance_monitor
+        return self._monitor
+
+    @property
+    def slow_threshold_ms(self) -> float:
+        if self._slow_threshold_ms is not None:
+            return self._slow_threshold_ms
+        return self.monitor.slow_api_threshold
+
+    def add_exporter(self, exporter: SpanExporter):
+        """Register a span exporter."""
+        self.exporters.append(exporter)
+
+    def current_span(self):
+        """Return the active span, or a non-recording span."""
+        return current_span_ctx_var.get() or NON_RECORDING_SPAN
+
+    @contextmanager
+    def start_trace(self, name: str, correlation_id: Optional[str] = None, **attributes) -> Iterator[Any]:
+        """
+        Open the root span of a new trace.
+
+        Args:
+            name: Trace name, e.g. "chat.message"
+            correlation_id: Request correlation id (defaults to the current one)
+            **attributes: Root span attributes
+        """
+        if not self.enabled:
+            yield NON_RECORDING_SPAN
+            return
+
+        correlation_id = correlation_id or correlation_id_ctx_var.get()
+        trace = Trace(name, trace_id_from_correlation_id(correlation_id), correlation_id)
+        if correlation_id:
+            attributes.setdefault("correlation_id", correlation_id)
+        try:
+            with self._span(trace, name, None, attributes) as root:
+                trace.root = root
+                yield root
+        finally:
+            self._finish_trace(trace)
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Any]:
+        """
+        Open a child span of the active span.
+
+        Without an active trace this is a no-op, so library code can be
+        instrumented unconditionally.
+        """
+        parent = current_span_ctx_var.get()
+        if parent is None:
+            yield NON_RECORDING_SPAN
+            return
+        with self._span(parent.trace, name, parent, attributes) as span:
+            yield span
+
+    @contextmanager
+    def _span(self, trace: Trace, name: str, parent: Optional[Span], attributes: Dict[str, Any]) -> Iterator[Span]:
+        span = Span(trace, name, parent, attributes)
+        if self._otel_tracer is not None:
+            self._start_otel_span(span)
+        token = current_span_ctx_var.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            current_span_ctx_var.reset(token)
+            span.end()
+            trace.spans.append(span)
+            if span._otel_span is not None:
+                self._end_otel_span(span)
+
+    def _finish_trace(self, trace: Trace):
+        """Record stage timings and keep the breakdown of sampled traces."""
+        root = trace.root
+        sampled = (
+            root.status == "ERROR"
+            or root.duration_ms >= self.slow_threshold_ms
+            or random.random() < self.sample_rate
+        )
+        try:
+            self.monitor.record_trace(
+                trace.name,
+                root.duration_ms,
+                trace.stage_durations(),
+                breakdown=trace.breakdown() if sampled else None
+            )
+        except Exception as e:
+            logger.error(f"Failed to record trace {trace.name}: {e}")
+
+        if not sampled:
+            return
+        for exporter in self.exporters:
+            try:
+                exporter.export(list(trace.spans))
+            except Exception as e:
+                logger.error(f"Span exporter {type(exporter).__name__} failed: {e}")
+
+    def _start_otel_span(self, span: Span):
+        context = None
+        if span.parent is not None and span.parent._otel_span is not None:
+            context = otel_trace.set_span_in_context(span.parent._otel_span)
+        span._otel_span = self._otel_tracer.start_span(
+            span.name, context=context, attributes=span.attributes, start_time=span.start_time_ns
+        )
+
+    def _end_otel_span(self, span: Span):
+        otel_span = span._otel_span
+        for key, value in span.attributes.items():
+            otel_span.set_attribute(key, value)
+        if span.status == "ERROR":
+            otel_span.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR, span.status_message))
+        otel_span.end(end_time=span.end_time_ns)
+
+
+class TracingMiddleware(BaseHTTPMiddleware):
+    """
+    Open a root span for selected routes.
+
+    Must run inside CorrelationIdMiddleware so the trace id is derived from
+    the request's correlation id.
+    """
+
+    def __init__(self, app: ASGIApp, routes: Dict[str, str], tracer: Optional[Tracer] = None):
+        """
+        Initialize middleware.
+
+        Args:
+            app: ASGI application
+            routes: Mapping of request path to trace name
+            tracer: Tracer to use (defaults to the global one)
+        """
+        super().__init__(app)
+        self.routes = routes
+        self.tracer = tracer
+
+    async def dispatch(self, request: Request, call_next):
+        trace_name = self.routes.get(request.url.path)
+        if trace_name is None:
+            return await call_next(request)
+
+        active_tracer = self.tracer or tracer
+        with active_tracer.start_trace(trace_name, **{"http.method": request.method, "http.route": request.url.path}) as root:
+            response = await call_next(request)
+            root.set_attribute("http.status_code", response.status_code)
+            if response.status_code >= 500:
+                root.set_status("ERROR", f"HTTP {response.status_code}")
+            if root.is_recording:
+                response.headers["X-Trace-ID"] = root.trace_id
+            return response
+
+
+# Global tracer instance
+tracer = Tracer(
+    sample_rate=settings.tracing_sample_rate,
+    enabled=settings.tracing_enabled,
+    use_opentelemetry=settings.tracing_opentelemetry
+)
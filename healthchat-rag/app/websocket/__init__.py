@@ -6,6 +6,7 @@ including health data updates, chat messaging, and notifications.
 """
 
 from .connection_manager import ConnectionManager
+from .pubsub import PubSubBackend, InMemoryPubSubBackend, RedisPubSubBackend
 from .auth import WebSocketAuth
 from .health_updates import HealthDataWebSocket
 from .chat_messaging import ChatWebSocket
@@ -13,6 +14,9 @@ from .notifications import NotificationWebSocket
 
 __all__ = [
     "ConnectionManager",
+    "PubSubBackend",
+    "InMemoryPubSubBackend",
+    "RedisPubSubBackend",
     "WebSocketAuth", 
     "HealthDataWebSocket",
     "ChatWebSocket",
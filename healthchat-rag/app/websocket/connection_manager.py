@@ -2,7 +2,10 @@
 WebSocket Connection Manager.
 
 This module provides connection management, pooling, and scaling for WebSocket connections.
-It handles connection lifecycle, authentication, and message routing.
+It handles connection lifecycle, authentication, and message routing. When a pub/sub
+backplane is configured, user and topic messages are routed to whichever worker
+holds the target sockets. Heartbeats, idle timeouts and recovery attempts are
+scheduled per connection on a timing wheel driven by a single background task.
 """
 
 import asyncio
@@ -18,10 +21,21 @@ import uuid
 from fastapi import WebSocket, WebSocketDisconnect
 from sqlalchemy.orm import Session
 
+from app.config import settings
 from app.database import get_db
 from app.models.user import User
 from app.services.auth import AuthService
 from app.utils.audit_logging import AuditLogger
+from app.websocket.timer_wheel import TimerWheel
+from app.websocket.pubsub import (
+    PubSubBackend,
+    BROADCAST_CHANNEL,
+    USER_CHANNEL_PREFIX,
+    TOPIC_CHANNEL_PREFIX,
+    create_backplane,
+    topic_channel,
+    user_channel,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -43,6 +57,7 @@ class ConnectionInfo:
     state: ConnectionState = ConnectionState.CONNECTING
     connected_at: datetime = field(default_factory=datetime.utcnow)
     last_activity: datetime = field(default_factory=datetime.utcnow)
+    last_sent: float = field(default_factory=time.monotonic)
     subscriptions: Set[str] = field(default_factory=set)
     metadata: Dict[str, Any] = field(default_factory=dict)
     retry_count: int = 0
@@ -53,23 +68,78 @@ class ConnectionInfo:
 class ConnectionManager:
     """Manages WebSocket connections with pooling and scaling capabilities."""
     
-    def __init__(self):
-        """Initialize the connection manager."""
+    def __init__(
+        self,
+        backplane: Optional[PubSubBackend] = None,
+        node_id: Optional[str] = None,
+        max_connections: int = 1000
+    ):
+        """
+        Initialize the connection manager.
+        
+        Args:
+            backplane: Optional pub/sub backplane shared with other workers
+            node_id: Identifier of this worker on the backplane
+            max_connections: Maximum connections held by this worker
+        """
         self.active_connections: Dict[str, ConnectionInfo] = {}
         self.user_connections: Dict[int, Set[str]] = {}
         self.subscription_connections: Dict[str, Set[str]] = {}
         self.connection_pool: List[ConnectionInfo] = []
-        self.max_connections: int = 1000
+        self.max_connections: int = max_connections
         self.max_connections_per_user: int = 5
         self.connection_timeout: int = 3600  # 1 hour
         self.heartbeat_interval: int = 30  # 30 seconds
         self.cleanup_interval: int = 300  # 5 minutes
         self.recovery_interval: int = 60  # 1 minute
         self.max_recovery_attempts: int = 5
+        self.presence_refresh_interval: int = 30  # 30 seconds
+        
+        # Per-connection deadlines, keyed by (timer kind, connection or user ID)
+        self.timer_wheel = TimerWheel(tick_interval=1.0)
+        self.lifecycle_stats: Dict[str, Any] = {
+            "connections_opened": 0,
+            "connections_closed": 0,
+            "connections_rejected": 0,
+            "authentications": 0,
+            "heartbeats_sent": 0,
+            "heartbeats_coalesced": 0,
+            "idle_timeouts": 0,
+            "recovery_attempts": 0,
+            "recoveries_succeeded": 0,
+            "total_connection_seconds": 0.0,
+            "disconnect_reasons": {}
+        }
+        
+        # Cross-worker routing
+        self.node_id: str = node_id or uuid.uuid4().hex
+        self.backplane: Optional[PubSubBackend] = backplane
+        self.backplane_stats = {
+            "published": 0,
+            "received": 0,
+            "delivered_remote": 0
+        }
         
         # Background tasks will be started when first connection is made
         self._background_tasks_started = False
     
+    async def start_backplane(self):
+        """Start the pub/sub backplane and route its messages to local sockets."""
+        if not self.backplane or self.backplane.started:
+            return
+        self.backplane.set_handler(self._handle_backplane_message)
+        await self.backplane.start()
+        await self.backplane.subscribe(BROADCAST_CHANNEL)
+        logger.info(f"WebSocket backplane started for node {self.node_id}")
+    
+    async def stop_backplane(self):
+        """Stop the pub/sub backplane and clear this node's presence entries."""
+        if not self.backplane or not self.backplane.started:
+            return
+        for user_id in list(self.user_connections):
+            await self.backplane.set_presence(user_id, self.node_id, 0)
+        await self.backplane.stop()
+    
     async def connect(self, websocket: WebSocket) -> str:
         """
         Accept a new WebSocket connection.
@@ -82,15 +152,14 @@ class ConnectionManager:
         """
         # Start background tasks if not already started
         if not self._background_tasks_started:
-            asyncio.create_task(self._heartbeat_task())
-            asyncio.create_task(self._cleanup_task())
-            asyncio.create_task(self._recovery_task())
+            asyncio.create_task(self._timer_task())
             self._background_tasks_started = True
         
         await websocket.accept()
         
         # Check connection limits
         if len(self.active_connections) >= self.max_connections:
+            self.lifecycle_stats["connections_rejected"] += 1
             await websocket.close(code=1013, reason="Server overloaded")
             raise WebSocketDisconnect()
         
@@ -104,6 +173,11 @@ class ConnectionManager:
         
         # Store connection
         self.active_connections[connection_id] = connection_info
+        self.lifecycle_stats["connections_opened"] += 1
+        
+        # Schedule this connection's keepalive and idle deadlines
+        self.timer_wheel.schedule(("heartbeat", connection_id), self.heartbeat_interval)
+        self.timer_wheel.schedule(("idle", connection_id), self.connection_timeout)
         
         logger.info(f"WebSocket connected: {connection_id}")
         
@@ -178,7 +252,12 @@ class ConnectionManager:
             # Add to user connections
             if user_id not in self.user_connections:
                 self.user_connections[user_id] = set()
+                await self._backplane_subscribe(user_channel(user_id))
+                if self.backplane:
+                    self.timer_wheel.schedule(("presence", user_id), self.presence_refresh_interval)
             self.user_connections[user_id].add(connection_id)
+            await self._update_presence(user_id)
+            self.lifecycle_stats["authentications"] += 1
             
             # Send authentication success
             await self._send_to_connection(connection_id, {
@@ -222,23 +301,34 @@ class ConnectionManager:
             if not connection_info:
                 return
             
+            # Cancel pending deadlines
+            for kind in ("heartbeat", "idle", "recovery"):
+                self.timer_wheel.cancel((kind, connection_id))
+            
             # Remove from subscriptions
             for subscription in connection_info.subscriptions:
                 if subscription in self.subscription_connections:
                     self.subscription_connections[subscription].discard(connection_id)
+                    if not self.subscription_connections[subscription]:
+                        del self.subscription_connections[subscription]
+                        await self._backplane_unsubscribe(topic_channel(subscription))
             
             # Remove from user connections
             if connection_info.user_id:
                 user_connections = self.user_connections.get(connection_info.user_id, set())
                 user_connections.discard(connection_id)
                 if not user_connections:
-                    del self.user_connections[connection_info.user_id]
+                    self.user_connections.pop(connection_info.user_id, None)
+                    self.timer_wheel.cancel(("presence", connection_info.user_id))
+                    await self._backplane_unsubscribe(user_channel(connection_info.user_id))
+                await self._update_presence(connection_info.user_id)
             
             # Close WebSocket
             await connection_info.websocket.close(code=1000, reason=reason)
             
             # Remove from active connections
             del self.active_connections[connection_id]
+            self._record_disconnect(connection_info, reason)
             
             # Audit log
             if connection_info.user_id:
@@ -277,6 +367,7 @@ class ConnectionManager:
             # Add to topic subscriptions
             if subscription not in self.subscription_connections:
                 self.subscription_connections[subscription] = set()
+                await self._backplane_subscribe(topic_channel(subscription))
             self.subscription_connections[subscription].add(connection_id)
             
             # Send subscription confirmation
@@ -317,6 +408,7 @@ class ConnectionManager:
                 self.subscription_connections[subscription].discard(connection_id)
                 if not self.subscription_connections[subscription]:
                     del self.subscription_connections[subscription]
+                    await self._backplane_unsubscribe(topic_channel(subscription))
             
             # Send unsubscription confirmation
             await self._send_to_connection(connection_id, {
@@ -336,56 +428,173 @@ class ConnectionManager:
         """
         Broadcast a message to all connections or a specific subscription.
         
+        With a backplane configured the message also reaches connections
+        held by other workers.
+        
         Args:
             message: Message to broadcast
             subscription: Optional subscription topic
         """
         try:
-            if subscription:
-                # Broadcast to subscription
-                connection_ids = self.subscription_connections.get(subscription, set())
-            else:
-                # Broadcast to all authenticated connections
-                connection_ids = {
-                    conn_id for conn_id, conn_info in self.active_connections.items()
-                    if conn_info.state == ConnectionState.AUTHENTICATED
-                }
+            delivered = await self._deliver_to_topic(message, subscription)
             
-            # Send message to all connections
-            tasks = []
-            for connection_id in connection_ids:
-                tasks.append(self._send_to_connection(connection_id, message))
+            channel = topic_channel(subscription) if subscription else BROADCAST_CHANNEL
+            await self._publish(channel, message)
             
-            if tasks:
-                await asyncio.gather(*tasks, return_exceptions=True)
-            
-            logger.info(f"Broadcast sent to {len(connection_ids)} connections")
+            logger.info(f"Broadcast sent to {delivered} local connections")
             
         except Exception as e:
             logger.error(f"Broadcast error: {e}")
     
-    async def send_to_user(self, user_id: int, message: Dict[str, Any]):
+    async def send_to_user(self, user_id: int, message: Dict[str, Any]) -> bool:
         """
         Send a message to all connections of a specific user.
         
+        With a backplane configured the message is also routed to the
+        workers holding the user's other connections.
+        
         Args:
             user_id: User ID
             message: Message to send
+            
+        Returns:
+            True if at least one worker holds a connection for the user
         """
         try:
-            connection_ids = self.user_connections.get(user_id, set())
-            
-            tasks = []
-            for connection_id in connection_ids:
-                tasks.append(self._send_to_connection(connection_id, message))
+            delivered = await self._deliver_to_user(user_id, message)
+            remote_workers = await self._publish(user_channel(user_id), message)
             
-            if tasks:
-                await asyncio.gather(*tasks, return_exceptions=True)
-            
-            logger.info(f"Message sent to user {user_id} on {len(connection_ids)} connections")
+            logger.info(f"Message sent to user {user_id} on {delivered} local connections")
+            return delivered > 0 or remote_workers > 0
             
         except Exception as e:
             logger.error(f"Send to user error: {e}")
+            return False
+    
+    async def _deliver_to_user(self, user_id: int, message: Dict[str, Any]) -> int:
+        """Deliver a message to the user's connections held by this worker."""
+        connection_ids = list(self.user_connections.get(user_id, set()))
+        if connection_ids:
+            await asyncio.gather(
+                *(self._send_to_connection(connection_id, message) for connection_id in connection_ids),
+                return_exceptions=True
+            )
+        return len(connection_ids)
+    
+    async def _deliver_to_topic(self, message: Dict[str, Any], subscription: Optional[str] = None) -> int:
+        """Deliver a message to matching connections held by this worker."""
+        if subscription:
+            connection_ids = list(self.subscription_connections.get(subscription, set()))
+        else:
+            connection_ids = [
+                conn_id for conn_id, conn_info in self.active_connections.items()
+                if conn_info.state == ConnectionState.AUTHENTICATED
+            ]
+        if connection_ids:
+            await asyncio.gather(
+                *(self._send_to_connection(connection_id, message) for connection_id in connection_ids),
+                return_exceptions=True
+            )
+        return len(connection_ids)
+    
+    async def _publish(self, channel: str, message: Dict[str, Any]) -> int:
+        """
+        Publish a message on the backplane.
+        
+        Returns:
+            Number of other workers subscribed to the channel
+        """
+        if not self.backplane or not self.backplane.started:
+            return 0
+        
+        receivers = await self.backplane.publish(channel, {"origin": self.node_id, "message": message})
+        self.backplane_stats["published"] += 1
+        
+        # This worker is subscribed to the channels it holds sockets for
+        if self._holds_channel(channel):
+            receivers -= 1
+        return max(receivers, 0)
+    
+    def _holds_channel(self, channel: str) -> bool:
+        """Check whether this worker has local sockets behind a channel."""
+        if channel == BROADCAST_CHANNEL:
+            return True
+        if channel.startswith(USER_CHANNEL_PREFIX):
+            return int(channel[len(USER_CHANNEL_PREFIX):]) in self.user_connections
+        if channel.startswith(TOPIC_CHANNEL_PREFIX):
+            return channel[len(TOPIC_CHANNEL_PREFIX):] in self.subscription_connections
+        return False
+    
+    async def _handle_backplane_message(self, channel: str, envelope: Dict[str, Any]):
+        """
+        Deliver a message published by another worker to local sockets.
+        
+        Args:
+            channel: Backplane channel the message was published on
+            envelope: Envelope with the origin node and the message
+        """
+        if envelope.get("origin") == self.node_id:
+            return
+        
+        self.backplane_stats["received"] += 1
+        message = envelope.get("message", {})
+        
+        if channel == BROADCAST_CHANNEL:
+            delivered = await self._deliver_to_topic(message)
+        elif channel.startswith(USER_CHANNEL_PREFIX):
+            delivered = await self._deliver_to_user(int(channel[len(USER_CHANNEL_PREFIX):]), message)
+        elif channel.startswith(TOPIC_CHANNEL_PREFIX):
+            delivered = await self._deliver_to_topic(message, channel[len(TOPIC_CHANNEL_PREFIX):])
+        else:
+            return
+        
+        self.backplane_stats["delivered_remote"] += delivered
+    
+    async def _backplane_subscribe(self, channel: str):
+        """Subscribe this worker to a backplane channel."""
+        if self.backplane and self.backplane.started:
+            await self.backplane.subscribe(channel)
+    
+    async def _backplane_unsubscribe(self, channel: str):
+        """Unsubscribe this worker from a backplane channel."""
+        if self.backplane and self.backplane.started:
+            await self.backplane.unsubscribe(channel)
+    
+    async def _update_presence(self, user_id: int):
+        """Publish how many connections this worker holds for a user."""
+        if not self.backplane or not self.backplane.started:
+            return
+        try:
+            await self.backplane.set_presence(
+                user_id, self.node_id, len(self.user_connections.get(user_id, ()))
+            )
+        except Exception as e:
+            logger.warning(f"Presence update failed for user {user_id}: {e}")
+    
+    async def refresh_presence(self):
+        """Refresh presence entries for every user connected to this worker."""
+        for user_id in list(self.user_connections):
+            await self._update_presence(user_id)
+    
+    async def get_user_presence(self, user_id: int) -> Dict[str, int]:
+        """
+        Get the workers holding connections for a user.
+        
+        Args:
+            user_id: User ID
+            
+        Returns:
+            Mapping of node ID to connection count
+        """
+        if self.backplane and self.backplane.started:
+            return await self.backplane.get_presence(user_id)
+        
+        count = len(self.user_connections.get(user_id, ()))
+        return {self.node_id: count} if count else {}
+    
+    async def is_user_online(self, user_id: int) -> bool:
+        """Check whether any worker holds a connection for a user."""
+        return bool(await self.get_user_presence(user_id))
     
     async def _send_to_connection(self, connection_id: str, message: Dict[str, Any]):
         """
@@ -402,6 +611,7 @@ class ConnectionManager:
             
             # Update last activity
             connection_info.last_activity = datetime.utcnow()
+            connection_info.last_sent = time.monotonic()
             
             # Send message
             await connection_info.websocket.send_text(json.dumps(message))
@@ -411,55 +621,137 @@ class ConnectionManager:
             # Mark connection for cleanup
             await self.disconnect(connection_id, "Send error")
     
-    async def _heartbeat_task(self):
-        """Send heartbeat messages to keep connections alive."""
+    async def _timer_task(self):
+        """Fire due per-connection deadlines once per timer wheel tick."""
         while True:
             try:
-                await asyncio.sleep(self.heartbeat_interval)
-                
-                heartbeat_message = {
-                    "type": "heartbeat",
-                    "timestamp": datetime.utcnow().isoformat()
-                }
-                
-                # Send heartbeat to all authenticated connections
-                authenticated_connections = [
-                    conn_id for conn_id, conn_info in self.active_connections.items()
-                    if conn_info.state == ConnectionState.AUTHENTICATED
-                ]
-                
-                for connection_id in authenticated_connections:
-                    await self._send_to_connection(connection_id, heartbeat_message)
-                
-                logger.debug(f"Heartbeat sent to {len(authenticated_connections)} connections")
-                
+                await asyncio.sleep(self.timer_wheel.tick_interval)
+                await self._process_timers(self.timer_wheel.advance())
             except Exception as e:
-                logger.error(f"Heartbeat error: {e}")
+                logger.error(f"Timer task error: {e}")
     
-    async def _cleanup_task(self):
-        """Clean up inactive connections."""
-        while True:
-            try:
-                await asyncio.sleep(self.cleanup_interval)
-                
-                current_time = datetime.utcnow()
-                inactive_connections = []
-                
-                for connection_id, connection_info in self.active_connections.items():
-                    time_since_activity = (current_time - connection_info.last_activity).total_seconds()
-                    
-                    if time_since_activity > self.connection_timeout:
-                        inactive_connections.append(connection_id)
-                
-                # Disconnect inactive connections
-                for connection_id in inactive_connections:
-                    await self.disconnect(connection_id, "Connection timeout")
-                
-                if inactive_connections:
-                    logger.info(f"Cleaned up {len(inactive_connections)} inactive connections")
-                
-            except Exception as e:
-                logger.error(f"Cleanup error: {e}")
+    async def _process_timers(self, expired: List[tuple]):
+        """
+        Handle expired timers.
+        
+        Args:
+            expired: Expired (timer kind, connection or user ID) keys
+        """
+        due_heartbeats = []
+        for kind, target in expired:
+            if kind == "heartbeat":
+                due_heartbeats.append(target)
+            elif kind == "idle":
+                await self._check_idle(target)
+            elif kind == "recovery":
+                await self._attempt_connection_recovery(target)
+            elif kind == "presence":
+                if target in self.user_connections:
+                    await self._update_presence(target)
+                    self.timer_wheel.schedule(("presence", target), self.presence_refresh_interval)
+        
+        if due_heartbeats:
+            await self._send_heartbeats(due_heartbeats)
+    
+    async def _send_heartbeats(self, connection_ids: List[str]):
+        """
+        Send one batch of heartbeats to connections whose deadline expired.
+        
+        Connections that sent any other frame within the heartbeat interval
+        are skipped, since that traffic already kept them alive.
+        
+        Args:
+            connection_ids: Connections with an expired heartbeat deadline
+        """
+        now = time.monotonic()
+        payload = json.dumps({
+            "type": "heartbeat",
+            "timestamp": datetime.utcnow().isoformat()
+        })
+        
+        targets = []
+        for connection_id in connection_ids:
+            connection_info = self.active_connections.get(connection_id)
+            if not connection_info:
+                continue
+            
+            if connection_info.state != ConnectionState.AUTHENTICATED:
+                self.timer_wheel.schedule(("heartbeat", connection_id), self.heartbeat_interval)
+                continue
+            
+            # Next keepalive is due one interval after the last frame sent
+            remaining = self.heartbeat_interval - (now - connection_info.last_sent)
+            if remaining > 0:
+                self.lifecycle_stats["heartbeats_coalesced"] += 1
+                self.timer_wheel.schedule(("heartbeat", connection_id), remaining)
+                continue
+            
+            targets.append(connection_info)
+        
+        if not targets:
+            return
+        
+        results = await asyncio.gather(
+            *(connection_info.websocket.send_text(payload) for connection_info in targets),
+            return_exceptions=True
+        )
+        
+        for connection_info, result in zip(targets, results):
+            if isinstance(result, Exception):
+                logger.error(f"Heartbeat error for {connection_info.connection_id}: {result}")
+                await self.disconnect(connection_info.connection_id, "Send error")
+                continue
+            # A delivered heartbeat counts as activity, as any other send does
+            connection_info.last_activity = datetime.utcnow()
+            connection_info.last_sent = now
+            self.lifecycle_stats["heartbeats_sent"] += 1
+            self.timer_wheel.schedule(("heartbeat", connection_info.connection_id), self.heartbeat_interval)
+        
+        logger.debug(f"Heartbeat sent to {len(targets)} connections")
+    
+    async def _check_idle(self, connection_id: str):
+        """
+        Disconnect a connection whose idle deadline expired without activity.
+        
+        Activity does not reschedule the idle timer; instead the deadline is
+        re-armed from the last activity when it fires.
+        
+        Args:
+            connection_id: Connection with an expired idle deadline
+        """
+        connection_info = self.active_connections.get(connection_id)
+        if not connection_info:
+            return
+        
+        idle_seconds = (datetime.utcnow() - connection_info.last_activity).total_seconds()
+        if idle_seconds >= self.connection_timeout:
+            self.lifecycle_stats["idle_timeouts"] += 1
+            await self.disconnect(connection_id, "Connection timeout")
+        else:
+            self.timer_wheel.schedule(("idle", connection_id), self.connection_timeout - idle_seconds)
+    
+    def _record_disconnect(self, connection_info: ConnectionInfo, reason: str):
+        """Update lifecycle statistics for a closed connection."""
+        stats = self.lifecycle_stats
+        stats["connections_closed"] += 1
+        stats["total_connection_seconds"] += (datetime.utcnow() - connection_info.connected_at).total_seconds()
+        stats["disconnect_reasons"][reason] = stats["disconnect_reasons"].get(reason, 0) + 1
+    
+    def get_lifecycle_stats(self) -> Dict[str, Any]:
+        """
+        Get connection lifecycle statistics.
+        
+        Returns:
+            Lifecycle counters, pending timers and average connection duration
+        """
+        stats = dict(self.lifecycle_stats)
+        stats["disconnect_reasons"] = dict(self.lifecycle_stats["disconnect_reasons"])
+        closed = stats["connections_closed"]
+        stats["average_connection_seconds"] = (
+            stats["total_connection_seconds"] / closed if closed else 0.0
+        )
+        stats["pending_timers"] = len(self.timer_wheel)
+        return stats
     
     def get_connection_stats(self) -> Dict[str, Any]:
         """
@@ -487,45 +779,31 @@ class ConnectionManager:
             "connection_timeout": self.connection_timeout,
             "heartbeat_interval": self.heartbeat_interval,
             "recovery_interval": self.recovery_interval,
-            "max_recovery_attempts": self.max_recovery_attempts
+            "max_recovery_attempts": self.max_recovery_attempts,
+            "node_id": self.node_id,
+            "backplane": type(self.backplane).__name__ if self.backplane else None,
+            "backplane_stats": dict(self.backplane_stats),
+            "lifecycle": self.get_lifecycle_stats()
         }
     
-    async def _recovery_task(self):
-        """Attempt to recover failed connections."""
-        while True:
-            try:
-                await asyncio.sleep(self.recovery_interval)
-                
-                # Find connections that need recovery
-                failed_connections = [
-                    conn_id for conn_id, conn_info in self.active_connections.items()
-                    if conn_info.state == ConnectionState.ERROR and 
-                    conn_info.recovery_attempts < self.max_recovery_attempts
-                ]
-                
-                for connection_id in failed_connections:
-                    await self._attempt_connection_recovery(connection_id)
-                
-                if failed_connections:
-                    logger.info(f"Recovery attempts for {len(failed_connections)} connections")
-                
-            except Exception as e:
-                logger.error(f"Recovery task error: {e}")
-    
     async def _attempt_connection_recovery(self, connection_id: str):
         """
         Attempt to recover a failed connection.
         
         Args:
             connection_id: Connection ID to recover
+            
+        Returns:
+            True if the connection recovered
         """
+        connection_info = self.active_connections.get(connection_id)
+        if not connection_info:
+            return False
+        
         try:
-            connection_info = self.active_connections.get(connection_id)
-            if not connection_info:
-                return
-            
             # Increment recovery attempts
             connection_info.recovery_attempts += 1
+            self.lifecycle_stats["recovery_attempts"] += 1
             
             # Try to send a test message
             test_message = {
@@ -540,16 +818,22 @@ class ConnectionManager:
             connection_info.state = ConnectionState.CONNECTED
             connection_info.last_error = None
             connection_info.recovery_attempts = 0
+            self.timer_wheel.cancel(("recovery", connection_id))
+            self.lifecycle_stats["recoveries_succeeded"] += 1
             
             logger.info(f"Connection {connection_id} recovered successfully")
+            return True
             
         except Exception as e:
             connection_info.last_error = str(e)
             logger.warning(f"Recovery attempt {connection_info.recovery_attempts} failed for {connection_id}: {e}")
             
-            # If max attempts reached, disconnect
+            # If max attempts reached, disconnect; otherwise try again later
             if connection_info.recovery_attempts >= self.max_recovery_attempts:
                 await self.disconnect(connection_id, f"Max recovery attempts reached: {e}")
+            else:
+                self.timer_wheel.schedule(("recovery", connection_id), self.recovery_interval)
+            return False
     
     async def retry_send_message(
         self,
@@ -589,6 +873,7 @@ class ConnectionManager:
                 else:
                     logger.error(f"All send attempts failed for {connection_id}: {e}")
                     connection_info.state = ConnectionState.ERROR
+                    self.timer_wheel.schedule(("recovery", connection_id), self.recovery_interval)
                     return False
         
         return False
@@ -650,4 +935,7 @@ class ConnectionManager:
         }
 
 # Global connection manager instance
-connection_manager = ConnectionManager() 
\ No newline at end of file
+connection_manager = ConnectionManager(
+    backplane=create_backplane(),
+    max_connections=settings.websocket_max_connections
+) 
\ No newline at end of file
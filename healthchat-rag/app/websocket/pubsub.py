@@ -0,0 +1,372 @@
+"""
+WebSocket Pub/Sub Backplane.
+
+This module provides a pluggable publish/subscribe backplane that lets
+several Uvicorn workers (or nodes) share WebSocket traffic:
+- Routing of user and topic messages to whichever worker holds the socket
+- Presence tracking of which workers hold connections for a user
+- A Redis implementation for production deployments
+- An in-memory implementation for tests and single-process deployments
+"""
+
+import asyncio
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Channel naming
+USER_CHANNEL_PREFIX = "ws:user:"
+TOPIC_CHANNEL_PREFIX = "ws:topic:"
+BROADCAST_CHANNEL = "ws:broadcast"
+PRESENCE_KEY_PREFIX = "ws:presence:"
+
+MessageHandler = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+
+def user_channel(user_id: int) -> str:
+    """Return the backplane channel for a user."""
+    return f"{USER_CHANNEL_PREFIX}{user_id}"
+
+
+def topic_channel(topic: str) -> str:
+    """Return the backplane channel for a subscription topic."""
+    return f"{TOPIC_CHANNEL_PREFIX}{topic}"
+
+
+def presence_keys(user_id: int) -> Tuple[str, str]:
+    """Return the Redis keys of a user's node expiries (sorted set) and connection counts (hash)."""
+    return f"{PRESENCE_KEY_PREFIX}{user_id}:nodes", f"{PRESENCE_KEY_PREFIX}{user_id}:counts"
+
+
+class PubSubBackend(ABC):
+    """Base class for WebSocket backplanes."""
+
+    def __init__(self, presence_ttl: int = 90):
+        """
+        Initialize the backplane.
+
+        Args:
+            presence_ttl: Seconds a presence entry stays valid without refresh
+        """
+        self.presence_ttl = presence_ttl
+        self._handler: Optional[MessageHandler] = None
+        self.started = False
+
+    def set_handler(self, handler: MessageHandler):
+        """
+        Register the coroutine called for every message received.
+
+        Args:
+            handler: Coroutine taking (channel, envelope)
+        """
+        self._handler = handler
+
+    async def _dispatch(self, channel: str, envelope: Dict[str, Any]):
+        """Hand a received envelope to the registered handler."""
+        if not self._handler:
+            return
+        try:
+            await self._handler(channel, envelope)
+        except Exception as e:
+            logger.error(f"Backplane handler error on {channel}: {e}")
+
+    @abstractmethod
+    async def start(self):
+        """Start receiving messages."""
+
+    @abstractmethod
+    async def stop(self):
+        """Stop receiving messages and release resources."""
+
+    @abstractmethod
+    async def subscribe(self, channel: str):
+        """Start receiving messages published on a channel."""
+
+    @abstractmethod
+    async def unsubscribe(self, channel: str):
+        """Stop receiving messages published on a channel."""
+
+    @abstractmethod
+    async def publish(self, channel: str, envelope: Dict[str, Any]) -> int:
+        """
+        Publish an envelope on a channel.
+
+        Returns:
+            Number of subscribers that received the envelope
+        """
+
+    @abstractmethod
+    async def set_presence(self, user_id: int, node_id: str, connection_count: int):
+        """Record how many connections a node holds for a user (0 removes it)."""
+
+    @abstractmethod
+    async def get_presence(self, user_id: int) -> Dict[str, int]:
+        """Return a mapping of node id to connection count for a user."""
+
+
+class InMemoryBroker:
+    """Process-local message broker shared by in-memory backplanes."""
+
+    def __init__(self):
+        """Initialize the broker."""
+        self.subscribers: Dict[str, Set["InMemoryPubSubBackend"]] = {}
+        self.presence: Dict[int, Dict[str, tuple]] = {}
+        self.published_count = 0
+
+    def reset(self):
+        """Forget all subscriptions and presence entries."""
+        self.subscribers.clear()
+        self.presence.clear()
+        self.published_count = 0
+
+
+class InMemoryPubSubBackend(PubSubBackend):
+    """Backplane that routes messages between managers in the same process."""
+
+    def __init__(self, broker: Optional[InMemoryBroker] = None, presence_ttl: int = 90):
+        """
+        Initialize the in-memory backplane.
+
+        Args:
+            broker: Broker shared with the other simulated workers
+            presence_ttl: Seconds a presence entry stays valid without refresh
+        """
+        super().__init__(presence_ttl=presence_ttl)
+        self.broker = broker or InMemoryBroker()
+        self.channels: Set[str] = set()
+
+    async def start(self):
+        """Start receiving messages."""
+        self.started = True
+
+    async def stop(self):
+        """Stop receiving messages."""
+        for channel in list(self.channels):
+            await self.unsubscribe(channel)
+        self.started = False
+
+    async def subscribe(self, channel: str):
+        """Start receiving messages published on a channel."""
+        self.channels.add(channel)
+        self.broker.subscribers.setdefault(channel, set()).add(self)
+
+    async def unsubscribe(self, channel: str):
+        """Stop receiving messages published on a channel."""
+        self.channels.discard(channel)
+        subscribers = self.broker.subscribers.get(channel)
+        if subscribers is not None:
+            subscribers.discard(self)
+            if not subscribers:
+                del self.broker.subscribers[channel]
+
+    async def publish(self, channel: str, envelope: Dict[str, Any]) -> int:
+        """Deliver an envelope to every backplane subscribed to the channel."""
+        self.broker.published_count += 1
+        # Round-trip through JSON so tests see the same payloads as Redis
+        payload = json.loads(json.dumps(envelope, default=str))
+        subscribers = list(self.broker.subscribers.get(channel, set()))
+        for subscriber in subscribers:
+            if subscriber.started:
+                await subscriber._dispatch(channel, payload)
+        return len(subscribers)
+
+    async def set_presence(self, user_id: int, node_id: str, connection_count: int):
+        """Record how many connections a node holds for a user."""
+        nodes = self.broker.presence.setdefault(user_id, {})
+        if connection_count > 0:
+            nodes[node_id] = (connection_count, time.time() + self.presence_ttl)
+        else:
+            nodes.pop(node_id, None)
+            if not nodes:
+                self.broker.presence.pop(user_id, None)
+
+    async def get_presence(self, user_id: int) -> Dict[str, int]:
+        """Return a mapping of node id to connection count for a user."""
+        now = time.time()
+        nodes = self.broker.presence.get(user_id, {})
+        return {
+            node_id: count for node_id, (count, expires_at) in nodes.items()
+            if expires_at > now
+        }
+
+
+class RedisPubSubBackend(PubSubBackend):
+    """
+    Backplane built on Redis pub/sub.
+    
+    Presence keeps, per user, a sorted set of node IDs scored by when
+    their entry expires next to a hash of their connection counts. Each
+    node's entry expires on its own, so a crashed node drops out even
+    while other nodes keep refreshing the user's keys.
+    """
+
+    def __init__(self, redis_url: str = "redis://localhost:6379/0", presence_ttl: int = 90):
+        """
+        Initialize the Redis backplane.
+
+        The connection is opened lazily in start() so that importing the
+        module never requires a running Redis server.
+
+        Args:
+            redis_url: Redis connection URL
+            presence_ttl: Seconds a presence entry stays valid without refresh
+        """
+        super().__init__(presence_ttl=presence_ttl)
+        self.redis_url = redis_url
+        self.redis_client = None
+        self._pubsub = None
+        self._listener_task: Optional[asyncio.Task] = None
+        self._sync_client = None
+
+    async def start(self):
+        """Connect to Redis and start the listener task."""
+        if self.started:
+            return
+        import redis.asyncio as aioredis
+
+        self.redis_client = aioredis.from_url(self.redis_url, decode_responses=True)
+        self._pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+        # A pubsub connection needs at least one channel before listening
+        await self._pubsub.subscribe(BROADCAST_CHANNEL)
+        self._listener_task = asyncio.create_task(self._listen())
+        self.started = True
+        logger.info("Redis WebSocket backplane started")
+
+    async def stop(self):
+        """Stop the listener and close Redis connections."""
+        if self._listener_task:
+            self._listener_task.cancel()
+            self._listener_task = None
+        if self._pubsub:
+            await self._pubsub.close()
+            self._pubsub = None
+        if self.redis_client:
+            await self.redis_client.close()
+            self.redis_client = None
+        self.started = False
+
+    async def _listen(self):
+        """Dispatch messages received from Redis."""
+        while True:
+            try:
+                message = await self._pubsub.get_message(timeout=1.0)
+                if message is None:
+                    continue
+                await self._dispatch(message["channel"], json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Redis backplane listener error: {e}")
+                await asyncio.sleep(1)
+
+    async def subscribe(self, channel: str):
+        """Start receiving messages published on a channel."""
+        if self._pubsub:
+            await self._pubsub.subscribe(channel)
+
+    async def unsubscribe(self, channel: str):
+        """Stop receiving messages published on a channel."""
+        if self._pubsub and channel != BROADCAST_CHANNEL:
+            await self._pubsub.unsubscribe(channel)
+
+    async def publish(self, channel: str, envelope: Dict[str, Any]) -> int:
+        """Publish an envelope on a Redis channel."""
+        if not self.redis_client:
+            return 0
+        return await self.redis_client.publish(channel, json.dumps(envelope, default=str))
+
+    def publish_sync(self, channel: str, envelope: Dict[str, Any]) -> int:
+        """
+        Publish an envelope from synchronous code such as Celery tasks.
+
+        Returns:
+            Number of subscribers that received the envelope
+        """
+        import redis
+
+        if self._sync_client is None:
+            self._sync_client = redis.from_url(self.redis_url, decode_responses=True)
+        return self._sync_client.publish(channel, json.dumps(envelope, default=str))
+
+    async def set_presence(self, user_id: int, node_id: str, connection_count: int):
+        """Record how many connections a node holds for a user."""
+        if not self.redis_client:
+            return
+        nodes_key, counts_key = presence_keys(user_id)
+        pipe = self.redis_client.pipeline()
+        if connection_count > 0:
+            pipe.zadd(nodes_key, {node_id: time.time() + self.presence_ttl})
+            pipe.hset(counts_key, node_id, connection_count)
+            pipe.expire(nodes_key, self.presence_ttl)
+            pipe.expire(counts_key, self.presence_ttl)
+        else:
+            pipe.zrem(nodes_key, node_id)
+            pipe.hdel(counts_key, node_id)
+        await pipe.execute()
+    
+    async def get_presence(self, user_id: int) -> Dict[str, int]:
+        """Return a mapping of node id to connection count for a user, pruning expired nodes."""
+        if not self.redis_client:
+            return {}
+        nodes_key, counts_key = presence_keys(user_id)
+        now = time.time()
+        pipe = self.redis_client.pipeline()
+        pipe.zrangebyscore(nodes_key, now, "+inf")
+        pipe.hgetall(counts_key)
+        live, counts = await pipe.execute()
+        
+        expired = [node_id for node_id in counts if node_id not in live]
+        if expired:
+            pipe = self.redis_client.pipeline()
+            pipe.zremrangebyscore(nodes_key, "-inf", now)
+            pipe.hdel(counts_key, *expired)
+            await pipe.execute()
+        return {node_id: int(counts[node_id]) for node_id in live if node_id in counts}
+
+
+def create_backplane() -> Optional[PubSubBackend]:
+    """
+    Create the backplane configured in settings.
+
+    Returns:
+        Configured backplane, or None when running single-process
+    """
+    from app.config import settings
+
+    backend = settings.websocket_backplane.lower()
+    if backend == "redis":
+        return RedisPubSubBackend(settings.redis_url, settings.websocket_presence_ttl)
+    if backend == "memory":
+        return InMemoryPubSubBackend(presence_ttl=settings.websocket_presence_ttl)
+    return None
+
+
+# Backend reused by every publish_to_user_sync call in a process, so its Redis connection pool is shared
+_sync_backend: Optional[RedisPubSubBackend] = None
+
+
+def publish_to_user_sync(user_id: int, message: Dict[str, Any], origin: str = "worker") -> int:
+    """
+    Publish a message to a user's sockets from synchronous code (e.g. Celery).
+
+    Args:
+        user_id: Target user ID
+        message: Message to deliver
+        origin: Identifier of the publishing process
+
+    Returns:
+        Number of WebSocket workers that received the message
+    """
+    global _sync_backend
+    from app.config import settings
+    
+    if settings.websocket_backplane.lower() != "redis":
+        logger.debug("WebSocket backplane is not Redis; message not published")
+        return 0
+    if _sync_backend is None:
+        _sync_backend = RedisPubSubBackend(settings.redis_url, settings.websocket_presence_ttl)
+    return _sync_backend.publish_sync(user_channel(user_id), {"origin": origin, "message": message})
@@ -0,0 +1,132 @@
+"""
+Hashed Timing Wheel.
+
+This module provides a timing wheel used to schedule per-connection
+deadlines (heartbeats, idle timeouts, recovery attempts) so that the
+work done on each tick is proportional to the timers that expire rather
+than to the number of open connections.
+"""
+
+import time
+from typing import Callable, Dict, Hashable, List, Optional
+
+
+class TimerWheel:
+    """
+    Hashed timing wheel with O(1) schedule and cancel.
+    
+    Timers due within the current revolution are stored in the slot of
+    their deadline tick modulo the wheel size, together with the absolute
+    deadline tick. Longer timers wait in an overflow level bucketed by
+    revolution and are moved into the slots once when their revolution
+    begins, so no tick scans a timer that is not due.
+    """
+
+    def __init__(
+        self,
+        tick_interval: float = 1.0,
+        wheel_size: int = 512,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Initialize the timing wheel.
+
+        Args:
+            tick_interval: Seconds per tick (timer resolution)
+            wheel_size: Number of slots in the wheel
+            clock: Monotonic clock returning seconds
+        """
+        self.tick_interval = tick_interval
+        self.wheel_size = wheel_size
+        self.clock = clock
+        self.slots: List[Dict[Hashable, int]] = [{} for _ in range(wheel_size)]
+        self.overflow: Dict[int, Dict[Hashable, int]] = {}
+        self.timers: Dict[Hashable, int] = {}
+        self.start_time = clock()
+        self.current_tick = 0
+
+    def __len__(self) -> int:
+        """Return the number of pending timers."""
+        return len(self.timers)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Check whether a timer is pending for a key."""
+        return key in self.timers
+
+    def _tick_for(self, when: float) -> int:
+        """Convert a clock reading to a tick number."""
+        return int((when - self.start_time) / self.tick_interval)
+
+    def schedule(self, key: Hashable, delay: float, now: Optional[float] = None):
+        """
+        Schedule (or reschedule) the timer for a key.
+
+        Args:
+            key: Timer key, unique among pending timers
+            delay: Seconds until the timer expires
+            now: Current clock reading (defaults to the wheel clock)
+        """
+        self.cancel(key)
+        now = self.clock() if now is None else now
+        deadline = max(self._tick_for(now + delay), self.current_tick + 1)
+        revolution = deadline // self.wheel_size
+        if revolution > self.current_tick // self.wheel_size:
+            self.overflow.setdefault(revolution, {})[key] = deadline
+        else:
+            self.slots[deadline % self.wheel_size][key] = deadline
+        self.timers[key] = deadline
+
+    def cancel(self, key: Hashable) -> bool:
+        """
+        Cancel the pending timer for a key.
+
+        Returns:
+            True if a timer was cancelled
+        """
+        deadline = self.timers.pop(key, None)
+        if deadline is None:
+            return False
+        if self.slots[deadline % self.wheel_size].pop(key, None) is None:
+            revolution = deadline // self.wheel_size
+            bucket = self.overflow[revolution]
+            del bucket[key]
+            if not bucket:
+                del self.overflow[revolution]
+        return True
+
+    def advance(self, now: Optional[float] = None) -> List[Hashable]:
+        """
+        Advance the wheel to the current time.
+
+        Args:
+            now: Current clock reading (defaults to the wheel clock)
+
+        Returns:
+            Keys of the timers that expired
+        """
+        now = self.clock() if now is None else now
+        target_tick = self._tick_for(now)
+        if target_tick <= self.current_tick:
+            return []
+        
+        # Move the timers of every revolution reached into the slots
+        target_revolution = target_tick // self.wheel_size
+        for revolution in [r for r in self.overflow if r <= target_revolution]:
+            for key, deadline in self.overflow.pop(revolution).items():
+                self.slots[deadline % self.wheel_size][key] = deadline
+
+        # After a long stall every slot is visited at most once
+        first_tick = max(self.current_tick + 1, target_tick - self.wheel_size + 1)
+        expired: List[Hashable] = []
+        for tick in range(first_tick, target_tick + 1):
+            slot = self.slots[tick % self.wheel_size]
+            if not slot:
+                continue
+            due = [key for key, deadline in slot.items() if deadline <= target_tick]
+            for key in due:
+                del slot[key]
+                del self.timers[key]
+            expired.extend(due)
+
+        self.current_tick = target_tick
+        return expired
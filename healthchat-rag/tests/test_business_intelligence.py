@@ -110,12 +110,13 @@ class TestBusinessIntelligenceService:
         start_date = datetime(2024, 1, 1)
         end_date = datetime(2024, 1, 2)
         
-        result = await bi_service.aggregate_health_metrics(
-            user_id=1,
-            period=AggregationPeriod.DAILY,
-            start_date=start_date,
-            end_date=end_date
-        )
+        with patch.object(bi_service.rollup_store, 'summarize', return_value={}):
+            result = await bi_service.aggregate_health_metrics(
+                user_id=1,
+                period=AggregationPeriod.DAILY,
+                start_date=start_date,
+                end_date=end_date
+            )
         
         assert result is not None
         assert result.user_id == 1
@@ -15,11 +15,16 @@ import asyncio
 import json
 from unittest.mock import Mock, patch, AsyncMock
 from datetime import datetime, timedelta
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
 
+from app.base import Base
+from app.models.enhanced_health_models import EtlWatermark, HealthMetricRollup
 from app.services.data_pipeline import (
     DataPipelineManager, ETLJobConfig, PipelineType, DataQualityLevel,
     DataQualityMetrics, DataLineageInfo, BatchDataProcessor,
-    StreamingDataProcessor, DataWarehouseManager, DataValidator, DataTransformer
+    StreamingDataProcessor, DataWarehouseManager, DataValidator, DataTransformer,
+    KAFKA_AVAILABLE
 )
 from app.exceptions.health_exceptions import DataProcessingError
 
@@ -69,6 +74,32 @@ class TestDataValidator:
         assert len(metrics.issues) > 0
         assert len(metrics.recommendations) > 0
     
+    def test_validate_data_quality_counts_failed_rules(self):
+        """Test that each failed rule is reported once with its record count."""
+        now = datetime.utcnow().isoformat()
+        data = [{"user_id": 1, "heart_rate": value, "timestamp": now} for value in (70, 300, 310, "fast", 20, 80, None)]
+        
+        metrics = self.validator.validate_data_quality(data, "health_metrics")
+        
+        assert metrics.issues == [
+            "heart_rate: 2 non-numeric values",  # "fast" and None
+            "heart_rate: 1 values below minimum 30",
+            "heart_rate: 2 values above maximum 200"
+        ]
+        assert metrics.validity == pytest.approx(2 / 7)
+    
+    def test_combine_quality_metrics_weights_by_records(self):
+        """Test combining chunk metrics weighted by their record counts."""
+        now = datetime.utcnow().isoformat()
+        good = self.validator.validate_data_quality([{"heart_rate": 70, "timestamp": now}] * 3, "health_metrics")
+        bad = self.validator.validate_data_quality([{"heart_rate": 300, "timestamp": now}], "health_metrics")
+        
+        combined = self.validator.combine_quality_metrics([(3, good), (1, bad)])
+        
+        assert combined.validity == pytest.approx(0.75)
+        assert combined.issues == bad.issues
+        assert self.validator.combine_quality_metrics([]) is None
+    
     def test_validate_data_quality_empty(self):
         """Test data quality validation with empty data."""
         metrics = self.validator.validate_data_quality([], "health_metrics")
@@ -185,89 +216,165 @@ class TestDataTransformer:
         assert result == 75
 
 
+ANALYTICS_TABLE = """
+CREATE TABLE aggregated_health_metrics (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    metric_type VARCHAR(50) NOT NULL,
+    metric_value FLOAT,
+    metric_unit VARCHAR(20),
+    aggregation_period VARCHAR(20),
+    period_start TIMESTAMP,
+    period_end TIMESTAMP,
+    data_quality_score FLOAT,
+    source_count INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+
+def sqlite_engine(path):
+    """File-backed SQLite engine in WAL mode, so a streaming read and writes can overlap."""
+    engine = create_engine(f"sqlite:///{path}")
+    
+    @event.listens_for(engine, "connect")
+    def set_wal(connection, _):
+        connection.execute("PRAGMA journal_mode=WAL")
+    
+    return engine
+
+
 class TestBatchDataProcessor:
-    """Test batch data processing functionality."""
+    """Test incremental batch ETL."""
+    
+    @pytest.fixture(autouse=True)
+    def databases(self, tmp_path):
+        """Source database with rollups and watermarks, and a separate warehouse."""
+        self.source = sqlite_engine(tmp_path / "source.db")
+        Base.metadata.create_all(self.source, tables=[HealthMetricRollup.__table__, EtlWatermark.__table__])
+        with self.source.begin() as conn:
+            conn.execute(text(
+                "CREATE TABLE health_metrics (id INTEGER PRIMARY KEY, user_id INTEGER, heart_rate INTEGER, "
+                "timestamp VARCHAR(40), unit VARCHAR(10), updated_at TIMESTAMP)"
+            ))
+        
+        self.warehouse = sqlite_engine(tmp_path / "warehouse.db")
+        with self.warehouse.begin() as conn:
+            conn.execute(text(ANALYTICS_TABLE))
+            conn.execute(text(
+                "CREATE UNIQUE INDEX uq_aggregated_health_metrics_period ON aggregated_health_metrics "
+                "(user_id, metric_type, aggregation_period, period_start)"
+            ))
+            conn.execute(text(
+                "CREATE TABLE heart_rate_copy (id INTEGER PRIMARY KEY, user_id INTEGER, heart_rate INTEGER, unit VARCHAR(10))"
+            ))
+        
+        self.session = sessionmaker(bind=self.source)()
+        self.processor = BatchDataProcessor(self.session, self.warehouse)
+        self.processor.audit_logger = Mock()
+        yield
+        self.session.close()
+        self.source.dispose()
+        self.warehouse.dispose()
+    
+    def add_rollups(self, days, updated_at):
+        start = datetime(2024, 1, 1)
+        for day in range(days):
+            self.session.add(HealthMetricRollup(
+                user_id=1, data_type="steps", component="value", granularity="daily",
+                bucket_start=start + timedelta(days=day), bucket_end=start + timedelta(days=day + 1),
+                count=2, total=8000.0 + day, total_sq=0.0, updated_at=updated_at
+            ))
+        self.session.commit()
+    
+    def job(self, source_tables=("health_metric_rollups",), target_tables=("aggregated_health_metrics",), **kwargs):
+        return ETLJobConfig(
+            job_id="analytics", job_name="Analytics ETL", pipeline_type=PipelineType.BATCH,
+            source_tables=list(source_tables), target_tables=list(target_tables), schedule="0 * * * *",
+            batch_size=10, **kwargs
+        )
     
-    def setup_method(self):
-        """Setup test fixtures."""
-        self.mock_db = Mock()
-        self.processor = BatchDataProcessor(self.mock_db)
+    def warehouse_rows(self, table="aggregated_health_metrics"):
+        with self.warehouse.connect() as conn:
+            return conn.execute(text(f"SELECT * FROM {table} ORDER BY id")).mappings().all()
     
     @pytest.mark.asyncio
-    async def test_process_batch_data_success(self):
-        """Test successful batch data processing."""
-        job_config = ETLJobConfig(
-            job_id="test_job",
-            job_name="Test ETL Job",
-            pipeline_type=PipelineType.BATCH,
-            source_tables=["health_metrics"],
-            target_tables=["aggregated_metrics"],
-            schedule="0 0 * * *"
-        )
-        
-        with patch.object(self.processor, '_extract_data') as mock_extract:
-            with patch.object(self.processor, '_load_data') as mock_load:
-                mock_extract.return_value = [
-                    {"user_id": 1, "heart_rate": 75, "timestamp": datetime.utcnow().isoformat()}
-                ]
-                mock_load.return_value = {"aggregated_metrics": {"records_loaded": 1, "success": True}}
-                
-                result = await self.processor.process_batch_data(job_config)
-                
-                assert result["success"] is True
-                assert result["job_id"] == "test_job"
-                assert "quality_metrics" in result
-                assert "lineage_info" in result
+    async def test_runs_move_only_changed_rows(self):
+        """Test that each run loads rows changed since the previous one."""
+        self.add_rollups(25, updated_at=datetime.utcnow() - timedelta(hours=1))
+        
+        first = await self.processor.process_batch_data(self.job())
+        second = await self.processor.process_batch_data(self.job())
+        
+        changed = self.session.query(HealthMetricRollup).order_by(HealthMetricRollup.id).limit(2).all()
+        for rollup in changed:
+            rollup.total += 1000
+        self.session.commit()
+        third = await self.processor.process_batch_data(self.job())
+        
+        assert first["success"] is True
+        assert first["records_processed"] == 25
+        assert first["load_results"]["aggregated_health_metrics"]["records_loaded"] == 25
+        assert second["records_processed"] == 0
+        assert third["records_processed"] == 2
+        rows = self.warehouse_rows()
+        assert len(rows) == 25
+        assert rows[0]["metric_value"] == pytest.approx(4500.0)
+        assert rows[0]["source_count"] == 2
+        watermark = self.session.query(EtlWatermark).one()
+        assert watermark.rows_extracted == 27
     
     @pytest.mark.asyncio
-    async def test_process_batch_data_quality_threshold_failure(self):
-        """Test batch processing with quality threshold failure."""
-        job_config = ETLJobConfig(
-            job_id="test_job",
-            job_name="Test ETL Job",
-            pipeline_type=PipelineType.BATCH,
-            source_tables=["health_metrics"],
-            target_tables=["aggregated_metrics"],
-            schedule="0 0 * * *",
-            data_quality_threshold=0.9  # High threshold
-        )
+    async def test_streams_in_chunks(self):
+        """Test that extraction yields chunks of the configured size."""
+        self.add_rollups(25, updated_at=datetime.utcnow() - timedelta(hours=1))
         
-        with patch.object(self.processor, '_extract_data') as mock_extract:
-            # Return poor quality data
-            mock_extract.return_value = [
-                {"user_id": None, "heart_rate": 300, "timestamp": None}  # Poor quality
-            ]
-            
-            with pytest.raises(DataProcessingError) as exc_info:
-                await self.processor.process_batch_data(job_config)
-            
-            assert "Data quality score" in str(exc_info.value)
+        with self.source.connect() as conn:
+            chunks = list(self.processor._extract_data(conn, "health_metric_rollups", None, datetime.utcnow(), 10))
+        
+        assert [len(chunk) for chunk in chunks] == [10, 10, 5]
+        assert "bucket_start" in chunks[0][0]
     
     @pytest.mark.asyncio
-    async def test_extract_data(self):
-        """Test data extraction."""
-        source_tables = ["health_metrics"]
-        
-        with patch.object(self.mock_db, 'execute') as mock_execute:
-            mock_result = Mock()
-            mock_result.__iter__ = lambda self: iter([{"user_id": 1, "heart_rate": 75}])
-            mock_execute.return_value = mock_result
-            
-            result = await self.processor._extract_data(source_tables)
-            
-            assert len(result) > 0
-            assert "user_id" in result[0]
+    async def test_quality_threshold_failure(self):
+        """Test that a chunk below the quality threshold stops its table without advancing its watermark."""
+        with self.source.begin() as conn:
+            conn.execute(text(
+                "INSERT INTO health_metrics (user_id, heart_rate, timestamp, unit, updated_at) "
+                "VALUES (NULL, 300, NULL, 'bpm', :updated_at)"
+            ), {"updated_at": datetime.utcnow() - timedelta(hours=1)})
+        
+        with pytest.raises(DataProcessingError) as exc_info:
+            await self.processor.process_batch_data(
+                self.job(["health_metrics"], ["heart_rate_copy"], data_quality_threshold=0.9)
+            )
+        
+        assert "Data quality score" in str(exc_info.value)
+        assert self.session.query(EtlWatermark).count() == 0
+        assert self.warehouse_rows("heart_rate_copy") == []
     
     @pytest.mark.asyncio
-    async def test_load_data(self):
-        """Test data loading."""
-        data = [{"user_id": 1, "heart_rate": 75}]
-        target_tables = ["aggregated_metrics"]
-        
-        result = await self.processor._load_data(data, target_tables)
-        
-        assert "aggregated_metrics" in result
-        assert result["aggregated_metrics"]["success"] is True
+    async def test_tables_extracted_in_parallel(self):
+        """Test a job over several tables, with unmapped tables copied column by column."""
+        self.add_rollups(3, updated_at=datetime.utcnow() - timedelta(hours=1))
+        with self.source.begin() as conn:
+            for i in range(4):
+                conn.execute(text(
+                    "INSERT INTO health_metrics (user_id, heart_rate, timestamp, unit, updated_at) "
+                    "VALUES (1, :rate, :timestamp, 'bpm', :updated_at)"
+                ), {"rate": 70 + i, "timestamp": datetime.utcnow().isoformat(),
+                    "updated_at": datetime.utcnow() - timedelta(hours=1)})
+        
+        result = await self.processor.process_batch_data(self.job(
+            ["health_metric_rollups", "health_metrics"], ["aggregated_health_metrics", "heart_rate_copy"],
+            data_quality_threshold=0.5
+        ))
+        
+        assert result["records_processed"] == 7
+        assert len(self.warehouse_rows()) == 3
+        assert [row["heart_rate"] for row in self.warehouse_rows("heart_rate_copy")] == [70, 71, 72, 73]
+        assert result["quality_metrics"].validity == 1.0
     
     @pytest.mark.asyncio
     async def test_track_data_lineage(self):
@@ -281,18 +388,14 @@ class TestBatchDataProcessor:
             schedule="0 0 * * *"
         )
         
-        source_data = [{"id": 1, "value": 100}]
-        transformed_data = [{"id": 1, "value": 100, "processed": True}]
-        
-        lineage_info = await self.processor._track_data_lineage(
-            job_config, source_data, transformed_data
-        )
+        lineage_info = await self.processor._track_data_lineage(job_config, 1, 1)
         
         assert lineage_info.lineage_id is not None
         assert lineage_info.source_table == "source_table"
         assert lineage_info.target_table == "target_table"
         assert len(lineage_info.transformation_rules) > 0
         assert len(lineage_info.data_flow) > 0
+        assert lineage_info.metadata["source_records"] == 1
 
 
 class TestStreamingDataProcessor:
@@ -308,21 +411,18 @@ class TestStreamingDataProcessor:
         self.processor = StreamingDataProcessor(self.kafka_config)
     
     @pytest.mark.asyncio
-    async def test_stream_data_success(self):
-        """Test successful data streaming."""
-        topic = "test-topic"
-        data = {"user_id": 1, "heart_rate": 75, "timestamp": datetime.utcnow().isoformat()}
+    async def test_stream_data_success(self, tmp_path):
+        """Test streaming records through the embedded event log."""
+        processor = StreamingDataProcessor({"log_dir": str(tmp_path), "batch_size": 2})
+        data = [{"user_id": i % 3, "heart_rate": 70 + i} for i in range(5)]
         
-        with patch('app.services.data_pipeline.KAFKA_AVAILABLE', True):
-            with patch.object(self.processor, 'producer') as mock_producer:
-                mock_future = Mock()
-                mock_future.get.return_value = Mock(partition=0, offset=123)
-                mock_producer.send.return_value = mock_future
-                
-                result = await self.processor.stream_data(topic, data)
-                
-                assert result is True
-                mock_producer.send.assert_called_once()
+        assert await processor.stream_data("test-topic", {"user_id": 9, "heart_rate": 75}) is True
+        assert await processor.stream_batch("test-topic", data) == 5
+        
+        records = await processor.stream.consume("test-topic", "readers", timeout=0)
+        assert len(records) == 6
+        assert all("_stream_id" in record.value for record in records)
+        assert "_streamed_at" not in data[0]
     
     @pytest.mark.asyncio
     async def test_stream_data_kafka_unavailable(self):
@@ -331,28 +431,42 @@ class TestStreamingDataProcessor:
         data = {"user_id": 1, "heart_rate": 75}
         
         with patch('app.services.data_pipeline.KAFKA_AVAILABLE', False):
-            result = await self.processor.stream_data(topic, data)
+            processor = StreamingDataProcessor(self.kafka_config)
+            result = await processor.stream_data(topic, data)
             
             assert result is False
     
     @pytest.mark.asyncio
-    async def test_process_streaming_data(self):
-        """Test streaming data processing."""
-        topic = "test-topic"
+    async def test_process_streaming_data(self, tmp_path):
+        """Test batched consumption with committed offsets."""
+        processor = StreamingDataProcessor({"log_dir": str(tmp_path), "batch_size": 4, "poll_timeout": 0})
+        await processor.stream_batch("test-topic", [{"user_id": i, "heart_rate": 60 + i} for i in range(10)])
+        seen = []
         
         def processor_func(data):
-            return {"processed": True, "original_data": data}
+            if data["heart_rate"] == 63:
+                raise ValueError("bad reading")
+            seen.append(data["user_id"])
         
-        with patch('app.services.data_pipeline.KAFKA_AVAILABLE', True):
-            with patch.object(self.processor, 'consumer') as mock_consumer:
-                mock_consumer.__iter__ = lambda self: iter([
-                    Mock(value={"user_id": 1, "heart_rate": 75}, partition=0, offset=123)
-                ])
-                
-                # This would run indefinitely in real usage, so we'll just test the setup
-                # In a real test, you'd need to mock the consumer iteration properly
-                pass
+        counts = await processor.process_streaming_data("test-topic", processor_func, until_idle=True)
+        again = await StreamingDataProcessor({"log_dir": str(tmp_path), "poll_timeout": 0}).process_streaming_data(
+            "test-topic", processor_func, until_idle=True
+        )
+        
+        assert counts == {"batches": 3, "processed": 9, "failed": 1}
+        assert sorted(seen) == [0, 1, 2, 4, 5, 6, 7, 8, 9]
+        assert again["processed"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_create_topic_on_event_log(self, tmp_path):
+        """Test topic creation through the embedded event log."""
+        processor = StreamingDataProcessor({"log_dir": str(tmp_path)})
+        
+        assert await processor.create_topic("test-topic", partitions=2) is True
+        assert await processor.create_topic("test-topic") is True
+        assert json.loads((tmp_path / "test-topic" / "topic.json").read_text()) == {"partitions": 2}
     
+    @pytest.mark.skipif(not KAFKA_AVAILABLE, reason="kafka-python not installed")
     def test_create_kafka_topic_success(self):
         """Test successful Kafka topic creation."""
         topic_name = "test-topic"
@@ -367,6 +481,7 @@ class TestStreamingDataProcessor:
                 assert result is True
                 mock_admin_instance.create_topics.assert_called_once()
     
+    @pytest.mark.skipif(not KAFKA_AVAILABLE, reason="kafka-python not installed")
     def test_create_kafka_topic_already_exists(self):
         """Test Kafka topic creation when topic already exists."""
         topic_name = "test-topic"
@@ -466,9 +581,9 @@ class TestDataPipelineManager:
     @pytest.mark.asyncio
     async def test_setup_pipeline_infrastructure(self):
         """Test pipeline infrastructure setup."""
-        with patch.object(self.manager.streaming_processor, 'create_kafka_topic') as mock_kafka:
+        with patch.object(self.manager.streaming_processor, 'create_topic', new_callable=AsyncMock) as mock_topic:
             with patch.object(self.manager.warehouse_manager, 'create_analytics_tables') as mock_warehouse:
-                mock_kafka.return_value = True
+                mock_topic.return_value = True
                 mock_warehouse.return_value = {"success": True, "tables_created": 3}
                 
                 result = await self.manager.setup_pipeline_infrastructure()
@@ -0,0 +1,108 @@
+"""
+Test the embedded event log.
+
+This module checks keyed partitioning and ordering, batched consumption
+with committed offsets per consumer group, segment rollover, recovery of
+a log whose last write was interrupted, and that publishing and
+consuming run concurrently.
+"""
+
+import asyncio
+import os
+import pytest
+
+from app.services.enhanced.event_stream import LogEventStream, partition_for
+
+
+def events(count, users=5):
+    return [(str(i % users), {"user_id": i % users, "seq": i}) for i in range(count)]
+
+
+class TestLogEventStream:
+    """Test publishing and consuming through segment files."""
+
+    @pytest.mark.asyncio
+    async def test_keyed_partitions_keep_order(self, tmp_path):
+        stream = LogEventStream(str(tmp_path), partitions=3, fsync=False)
+
+        published = await stream.publish("readings", events(50))
+        consumed = await stream.consume("readings", "analytics", max_records=100, timeout=0)
+
+        assert len(published) == len(consumed) == 50
+        for record in consumed:
+            assert record.partition == partition_for(record.key, 3)
+        for user in map(str, range(5)):
+            sequence = [record.value["seq"] for record in consumed if record.key == user]
+            assert sequence == sorted(sequence)
+
+    @pytest.mark.asyncio
+    async def test_groups_commit_independently(self, tmp_path):
+        stream = LogEventStream(str(tmp_path), partitions=2, fsync=False)
+        await stream.publish("readings", events(10))
+
+        first = await stream.consume("readings", "alerts", max_records=4, timeout=0)
+        await stream.commit("alerts", first)
+        uncommitted = await stream.consume("readings", "alerts", max_records=4, timeout=0)
+
+        reopened = LogEventStream(str(tmp_path), fsync=False)
+        resumed = await reopened.consume("readings", "alerts", max_records=100, timeout=0)
+        other_group = await reopened.consume("readings", "analytics", max_records=100, timeout=0)
+
+        assert len(first) == len(uncommitted) == 4
+        assert len(resumed) == 6  # Uncommitted records are delivered again
+        assert {(r.partition, r.offset) for r in uncommitted} <= {(r.partition, r.offset) for r in resumed}
+        assert len(other_group) == 10
+
+    @pytest.mark.asyncio
+    async def test_segments_roll_and_read_across(self, tmp_path):
+        stream = LogEventStream(str(tmp_path), partitions=1, segment_bytes=200, fsync=False)
+        for start in range(0, 40, 4):
+            await stream.publish("readings", [(None, {"seq": i}) for i in range(start, start + 4)])
+
+        segments = os.listdir(tmp_path / "readings" / "0")
+        seqs = []
+        while True:
+            batch = await stream.consume("readings", "g", max_records=7, timeout=0)
+            if not batch:
+                break
+            seqs.extend(record.value["seq"] for record in batch)
+
+        assert len(segments) > 2
+        assert seqs == list(range(40))
+
+    @pytest.mark.asyncio
+    async def test_partial_write_truncated_on_recovery(self, tmp_path):
+        stream = LogEventStream(str(tmp_path), partitions=1, fsync=False)
+        await stream.publish("readings", events(3))
+        segment = tmp_path / "readings" / "0" / f"{0:020d}.log"
+        with open(segment, "ab") as log:
+            log.write(b'{"k":"1","v":{"seq"')
+
+        reopened = LogEventStream(str(tmp_path), fsync=False)
+        stored = await reopened.publish("readings", [("1", {"seq": 3})])
+        consumed = await reopened.consume("readings", "g", timeout=0)
+
+        assert stored[0].offset == 3
+        assert [record.value["seq"] for record in consumed] == [0, 1, 2, 3]
+
+    @pytest.mark.asyncio
+    async def test_consumer_waits_for_producer(self, tmp_path):
+        stream = LogEventStream(str(tmp_path), partitions=2, fsync=False, poll_interval=0.01)
+
+        async def produce():
+            for _ in range(10):
+                await stream.publish("readings", events(10))
+                await asyncio.sleep(0.005)
+
+        async def consume():
+            received = []
+            while len(received) < 100:
+                batch = await stream.consume("readings", "g", max_records=16, timeout=1.0)
+                assert batch, "consumer timed out"
+                received.extend(batch)
+                await stream.commit("g", batch)
+            return received
+
+        _, received = await asyncio.gather(produce(), consume())
+
+        assert len(received) == 100
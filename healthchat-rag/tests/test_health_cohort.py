@@ -0,0 +1,158 @@
+"""
+Test cohort batch analytics.
+
+This module checks that the set-based cohort path of the analytics
+engine agrees with the per-user path over the same readings.
+"""
+
+import pytest
+from datetime import datetime, timedelta
+import json
+import numpy as np
+from unittest.mock import patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.base import Base
+from app.exceptions.health_exceptions import AnalyticsError
+from app.models.health_data import HealthData
+from app.models.enhanced_health_models import HealthMetricsAggregation
+from app.services.enhanced.health_analytics import HealthAnalyticsEngine
+from app.services.enhanced.health_cohort import CohortFrame
+from app.services.enhanced.health_timeseries import HealthSeriesSet
+
+
+def make_records(seed: int = 3, users: int = 12, days: int = 40):
+    """Daily heart rate, steps and sleep for a cohort, with per-user trends."""
+    rng = np.random.default_rng(seed)
+    start = datetime.utcnow().replace(hour=8, minute=0, second=0, microsecond=0) - timedelta(days=days)
+    records = []
+    for user_id in range(1, users + 1):
+        drift = rng.normal(0, 0.5)
+        base = rng.uniform(55, 110)
+        for day in range(days):
+            timestamp = start + timedelta(days=day)
+            records.append((user_id, "heart_rate", timestamp, base + drift * day + rng.normal(0, 2)))
+            if user_id % 3:
+                records.append((user_id, "steps", timestamp, rng.uniform(2000, 12000)))
+            if user_id % 4 == 0:
+                records.append((user_id, "sleep", timestamp, rng.uniform(300, 540)))
+        if user_id % 5 == 0:
+            records.append((user_id, "blood_pressure", start, {"systolic": 130, "diastolic": 85}))
+    return records
+
+
+@pytest.fixture
+def db():
+    """In-memory database with the tables the cohort path touches."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine, tables=[HealthData.__table__, HealthMetricsAggregation.__table__])
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def engine(db):
+    return HealthAnalyticsEngine(db)
+
+
+class TestCohortFrame:
+    """Test grouping and segment reductions."""
+
+    def test_segment_stats_match_numpy(self):
+        records = make_records()
+        frame = CohortFrame.from_records(range(1, 13), records)
+        stats = frame.stats()
+
+        for segment in range(frame.segment_count):
+            user_id = int(frame.user_ids[frame.segment_user[segment]])
+            data_type = frame.data_types[frame.segment_type[segment]]
+            values = [r[3] if not isinstance(r[3], dict) else r[3]["systolic"]
+                      for r in records if r[0] == user_id and r[1] == data_type]
+            assert stats.count[segment] == len(values)
+            assert stats.mean[segment] == pytest.approx(np.mean(values))
+            assert stats.maximum[segment] == pytest.approx(np.max(values))
+
+    def test_users_outside_cohort_are_skipped(self):
+        frame = CohortFrame.from_records([2, 1], make_records(users=3))
+
+        assert frame.user_ids.tolist() == [2, 1]
+        assert frame.users_with_data == [2, 1]
+        assert 3 not in frame.user_ids
+
+    def test_empty_frame(self):
+        frame = CohortFrame.from_records([1, 2], [])
+
+        assert frame.segment_count == 0
+        assert frame.stats().mean.size == 0
+        assert np.isnan(frame.per_user(frame.stats().mean, "heart_rate")).all()
+
+
+class TestCohortAnalytics:
+    """Test the engine's batch mode against its per-user stages."""
+
+    @pytest.mark.asyncio
+    async def test_matches_per_user_analytics(self, engine):
+        records = make_records()
+        frame = CohortFrame.from_records(range(1, 13), records)
+
+        cohort_trends = engine._cohort_trends(frame)
+        overall, cohort_scores = engine._cohort_health_scores(frame)
+        cohort_risks = dict(engine._cohort_cardiovascular_risks(frame))
+
+        for user_id in range(1, 13):
+            series = HealthSeriesSet.from_records(
+                user_id, ((r[1], r[2], r[3], None) for r in records if r[0] == user_id)
+            )
+            trends = {t.data_type: t for t in await engine._analyze_trends(user_id, series)}
+            user_trends = {t.data_type: t for uid, t in cohort_trends if uid == user_id}
+            assert user_trends.keys() == trends.keys()
+            for data_type, trend in trends.items():
+                assert user_trends[data_type].slope == pytest.approx(trend.slope, abs=1e-9)
+                assert user_trends[data_type].confidence == pytest.approx(trend.confidence, abs=1e-9)
+                assert user_trends[data_type].direction == trend.direction
+                assert user_trends[data_type].seasonal_pattern == trend.seasonal_pattern
+
+            score = await engine._calculate_health_score(user_id, series)
+            assert cohort_scores[user_id].overall_score == pytest.approx(score.overall_score)
+            assert cohort_scores[user_id].component_scores == pytest.approx(score.component_scores)
+            assert cohort_scores[user_id].category == score.category
+
+            risk = await engine._assess_cardiovascular_risk(user_id, series)
+            if risk is None:
+                assert user_id not in cohort_risks
+            else:
+                assert cohort_risks[user_id].probability == pytest.approx(risk.probability)
+                assert cohort_risks[user_id].factors == risk.factors
+
+    @pytest.mark.asyncio
+    async def test_run_loads_and_persists_scores(self, engine, db):
+        records = make_records(users=4)
+        db.add_all([
+            HealthData(user_id=user_id, data_type=data_type, value=json.dumps(value), timestamp=timestamp)
+            for user_id, data_type, timestamp, value in records
+        ])
+        db.commit()
+
+        results = await engine.run_cohort_analytics([1, 2, 3, 4, 99])
+        assert sorted(results) == [1, 2, 3, 4]
+        assert all('health_score' in result for result in results.values())
+
+        rows = db.query(HealthMetricsAggregation).all()
+        assert len(rows) == 4
+        assert {row.health_profile_id for row in rows} == {1, 2, 3, 4}
+        expected = results[1]['health_score'].overall_score * 100
+        assert next(r for r in rows if r.health_profile_id == 1).overall_health_score == pytest.approx(expected)
+
+        # A second run updates the same rows in place
+        await engine.run_cohort_analytics([1, 2, 3, 4])
+        assert db.query(HealthMetricsAggregation).count() == 4
+
+    @pytest.mark.asyncio
+    async def test_failure_raises_analytics_error(self, engine):
+        with patch.object(CohortFrame, "load", side_effect=RuntimeError("database unavailable")):
+            with pytest.raises(AnalyticsError, match="Cohort analytics failed"):
+                await engine.run_cohort_analytics([1, 2])
@@ -0,0 +1,157 @@
+"""
+Test metric correlations on a resampled grid.
+
+This module checks grid alignment and gap filling, that the correlation
+matrices match their SciPy references, that lags are recovered, and that
+results are cached per data version.
+"""
+
+import pytest
+from datetime import datetime, timedelta
+import numpy as np
+from scipy import stats
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.base import Base
+from app.models.health_data import HealthData
+from app.services.enhanced.health_correlation import HealthCorrelationEngine, forward_fill, resample
+from app.services.enhanced.health_timeseries import HealthSeriesSet
+
+
+class DictCache:
+    """In-process stand-in for the Redis cache manager."""
+
+    def __init__(self):
+        self.store = {}
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.store[key] = value
+        return True
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine, tables=[HealthData.__table__])
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def daily_records(data_type, values, start, hour):
+    return [(data_type, start + timedelta(days=day, hours=hour), float(value), None) for day, value in enumerate(values)]
+
+
+@pytest.fixture
+def series_set():
+    """Heart rate each morning and steps each evening; steps follow heart rate two days later."""
+    rng = np.random.default_rng(3)
+    start = datetime(2024, 3, 1)
+    heart_rate = rng.normal(70, 6, 40)
+    steps = np.r_[rng.normal(8000, 300, 2), 14000 - 80 * heart_rate[:-2]]
+    weight = 80 + 0.1 * heart_rate + rng.normal(0, 0.2, 40)
+    records = (
+        daily_records("heart_rate", heart_rate, start, 8.2)
+        + daily_records("steps", steps, start, 20.7)
+        + daily_records("weight", weight, start, 7.0)
+    )
+    return HealthSeriesSet.from_records(1, records)
+
+
+class TestResample:
+    """Test grid construction."""
+
+    def test_unequal_timestamps_share_buckets(self, series_set):
+        grid = resample(series_set, timedelta(days=1))
+
+        assert grid.metrics == ["heart_rate", "steps", "weight"]
+        assert grid.values.shape == (40, 3)
+        assert not np.isnan(grid.values).any()
+        assert grid.timestamps[0] == np.datetime64("2024-03-01T00:00:00")
+
+    def test_bucket_means(self):
+        start = datetime(2024, 1, 1)
+        series_set = HealthSeriesSet.from_records(1, [
+            ("heart_rate", start + timedelta(hours=1), 60.0, None),
+            ("heart_rate", start + timedelta(hours=5), 70.0, None),
+            ("heart_rate", start + timedelta(days=2), 80.0, None),
+        ])
+
+        grid = resample(series_set, timedelta(days=1))
+
+        assert grid.values[:, 0].tolist()[0] == 65.0
+        assert np.isnan(grid.values[1, 0])
+        assert grid.values[2, 0] == 80.0
+
+    def test_forward_fill_limit(self):
+        values = np.array([[1.0, np.nan], [np.nan, 5.0], [np.nan, np.nan], [np.nan, np.nan], [4.0, np.nan]])
+
+        filled = forward_fill(values, 2)
+
+        np.testing.assert_array_equal(filled[:, 0], [1.0, 1.0, 1.0, np.nan, 4.0])
+        np.testing.assert_array_equal(filled[:, 1], [np.nan, 5.0, 5.0, 5.0, np.nan])
+
+
+class TestHealthCorrelationEngine:
+    """Test the correlation matrices and lags."""
+
+    def test_matrices_match_scipy(self, series_set):
+        result = HealthCorrelationEngine(None, max_lag=0).correlate(series_set)
+        grid = resample(series_set, timedelta(days=1)).values
+
+        for i in range(3):
+            for j in range(3):
+                if i == j:
+                    continue
+                assert result.pearson[i, j] == pytest.approx(stats.pearsonr(grid[:, i], grid[:, j])[0])
+                assert result.spearman[i, j] == pytest.approx(stats.spearmanr(grid[:, i], grid[:, j])[0])
+        assert result.observations[0, 1] == 40
+
+    def test_lagged_cross_correlation(self, series_set):
+        result = HealthCorrelationEngine(None, max_lag=5).correlate(series_set)
+        pairs = {(pair.metric_a, pair.metric_b): pair for pair in result.pairs()}
+
+        steps = pairs[("heart_rate", "steps")]
+        assert abs(steps.pearson) < 0.5
+        assert steps.best_lag == 2
+        assert steps.lag_correlation == pytest.approx(-1.0)
+        assert pairs[("heart_rate", "weight")].best_lag == 0
+        assert [(p.metric_a, p.metric_b) for p in result.pairs(min_abs=0.5)] == [("heart_rate", "weight")]
+
+    def test_short_series_are_undefined(self):
+        start = datetime(2024, 1, 1)
+        series_set = HealthSeriesSet.from_records(
+            1, daily_records("heart_rate", [60, 61], start, 8) + daily_records("steps", [5000, 5100], start, 9)
+        )
+
+        pair = HealthCorrelationEngine(None).correlate(series_set).pairs()[0]
+
+        assert pair.pearson is None
+        assert pair.observations == 2
+
+    def test_cached_per_data_version(self, db):
+        start = datetime.utcnow() - timedelta(days=10)
+        for day in range(8):
+            db.add(HealthData(user_id=1, data_type="heart_rate", value=str(60 + day), timestamp=start + timedelta(days=day)))
+            db.add(HealthData(user_id=1, data_type="steps", value=str(5000 + 100 * day),
+                              timestamp=start + timedelta(days=day, hours=10)))
+        db.commit()
+        cache = DictCache()
+        engine = HealthCorrelationEngine(db, cache=cache)
+
+        first = engine.get_correlations(1, days=30)
+        assert first["pairs"][0]["pearson"] == pytest.approx(1.0)
+        assert engine.get_correlations(1, days=30) is first
+        assert len(cache.store) == 1
+
+        db.add(HealthData(user_id=1, data_type="steps", value="1000", timestamp=start + timedelta(days=8)))
+        db.commit()
+        second = engine.get_correlations(1, days=30)
+        assert second["data_version"] != first["data_version"]
+        assert len(cache.store) == 2
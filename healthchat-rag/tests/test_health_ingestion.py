@@ -0,0 +1,121 @@
+"""
+Test bulk health data ingestion.
+
+This module checks request body parsing, per-reading rejection,
+deduplication within a batch and against stored readings, encryption,
+and that rollups and score invalidation are updated once per batch.
+"""
+
+import json
+import time
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.base import Base
+from app.models.health_data import HealthData
+from app.models.enhanced_health_models import HealthMetricRollup, HealthRollupBatch, HealthScoreInvalidation
+from app.services.enhanced.health_ingestion import BatchTooLargeError, HealthDataIngestor, parse_readings
+from app.utils.encryption_utils import encryption_manager
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    tables = [table.__table__ for table in (HealthData, HealthMetricRollup, HealthRollupBatch, HealthScoreInvalidation)]
+    Base.metadata.create_all(bind=engine, tables=tables)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def readings(count, start=datetime(2024, 5, 1), source=None):
+    return [
+        {"data_type": "heart_rate", "value": 60 + i % 30, "unit": "bpm",
+         "timestamp": (start + timedelta(minutes=i)).isoformat(), "source": source}
+        for i in range(count)
+    ]
+
+
+class TestParseReadings:
+    """Test request body shapes."""
+
+    def test_array_and_wrapper(self):
+        body = readings(2)
+
+        assert parse_readings(json.dumps(body).encode()) == json.loads(json.dumps(body))
+        assert len(parse_readings(json.dumps({"readings": body}).encode(), "application/json")) == 2
+
+    def test_ndjson(self):
+        body = "\n".join(json.dumps(reading) for reading in readings(3)) + "\n\n"
+
+        assert len(parse_readings(body.encode(), "application/x-ndjson")) == 3
+
+    def test_malformed(self):
+        with pytest.raises(ValueError):
+            parse_readings(b"{not json")
+        with pytest.raises(ValueError):
+            parse_readings(b'{"value": 1}')
+
+
+class TestHealthDataIngestor:
+    """Test batch writes."""
+
+    def test_rejects_are_reported_by_index(self, db):
+        batch = readings(3)
+        batch[1]["value"] = 500
+        batch[2]["data_type"] = "unknown"
+
+        result = HealthDataIngestor(db).ingest(1, batch)
+
+        assert result.inserted == 1
+        assert [r.index for r in result.rejected] == [1, 2]
+        assert db.query(HealthData).count() == 1
+
+    def test_duplicates_skipped(self, db):
+        ingestor = HealthDataIngestor(db)
+        batch = readings(5)
+
+        first = ingestor.ingest(1, batch + batch[:2])
+        second = ingestor.ingest(1, readings(7))
+        other_source = ingestor.ingest(1, readings(2, source="fitbit"))
+
+        assert (first.inserted, first.duplicates) == (5, 2)
+        assert (second.inserted, second.duplicates) == (2, 5)
+        assert other_source.inserted == 2
+        assert db.query(HealthData).count() == 9
+
+    def test_values_encrypted(self, db):
+        batch = readings(1)
+        batch[0]["notes"] = "after run"
+
+        result = HealthDataIngestor(db).ingest(1, batch)
+
+        row = db.get(HealthData, result.inserted_ids[0])
+        assert row.value != "60" and encryption_manager.decrypt_field(row.value) == 60
+        assert encryption_manager.decrypt_field(row.notes) == "after run"
+        assert row.source == "api"
+
+    def test_rollups_and_invalidation_once_per_batch(self, db):
+        HealthDataIngestor(db).ingest(1, readings(120))
+
+        assert db.query(HealthRollupBatch).count() == 1
+        assert db.query(HealthScoreInvalidation).filter_by(user_id=1).count() == 1
+        total = sum(row.count for row in db.query(HealthMetricRollup).filter_by(granularity="daily"))
+        assert total == 120
+
+    def test_large_batch(self, db):
+        ingestor = HealthDataIngestor(db, chunk_size=1000)
+
+        started = time.perf_counter()
+        result = ingestor.ingest(1, readings(10000))
+        elapsed = time.perf_counter() - started
+
+        assert result.inserted == 10000
+        assert result.inserted_ids == sorted(result.inserted_ids)
+        assert elapsed < 30
+        with pytest.raises(BatchTooLargeError):
+            ingestor.ingest(1, readings(10001))
@@ -0,0 +1,157 @@
+"""
+Test vectorized health time-series kernels.
+
+This module checks each kernel against the straightforward reference
+implementation it replaces.
+"""
+
+import pytest
+import statistics
+from datetime import datetime, timedelta
+import numpy as np
+from scipy import stats
+
+from app.services.enhanced import health_kernels as kernels
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(42)
+
+
+class TestTrendKernels:
+    """Test regression and moving-window kernels."""
+
+    def test_linear_trend_matches_linregress(self, rng):
+        x = np.sort(rng.uniform(0, 90, 500))
+        y = 0.3 * x + rng.normal(0, 5, 500)
+
+        fit = kernels.linear_trend(x, y)
+        reference = stats.linregress(x, y)
+
+        assert fit.slope == pytest.approx(reference.slope)
+        assert fit.intercept == pytest.approx(reference.intercept)
+        assert fit.r_value == pytest.approx(reference.rvalue)
+        assert fit.r_squared == pytest.approx(reference.rvalue ** 2)
+
+    def test_linear_trend_constant_values(self):
+        fit = kernels.linear_trend([0, 1, 2, 3], [5, 5, 5, 5])
+
+        assert fit.slope == 0.0
+        assert fit.intercept == 5.0
+        assert np.isnan(fit.r_value)
+
+    def test_centered_moving_mean_matches_loop(self, rng):
+        values = rng.normal(70, 10, 50)
+        half_window = 5
+
+        expected = [
+            statistics.mean(values[max(0, i - half_window):min(len(values), i + half_window + 1)])
+            for i in range(len(values))
+        ]
+
+        assert kernels.centered_moving_mean(values, half_window) == pytest.approx(expected)
+
+    def test_rolling_zscores_flag_spike(self, rng):
+        values = rng.normal(70, 1, 100)
+        values[50] = 120
+
+        z_scores = kernels.rolling_zscores(values, 5)
+
+        assert int(np.argmax(z_scores)) == 50
+        assert kernels.rolling_zscores(np.full(10, 3.0), 5).tolist() == [0.0] * 10
+
+
+class TestOutlierKernels:
+    """Test z-score and MAD outlier kernels."""
+
+    def test_zscores_match_statistics(self, rng):
+        values = rng.normal(0, 1, 20)
+        mean, std = statistics.mean(values), statistics.stdev(values)
+
+        assert kernels.zscores(values) == pytest.approx([abs((v - mean) / std) for v in values])
+
+    def test_mad_outliers_resist_masking(self):
+        """Two extreme readings inflate the std but not the MAD."""
+        values = np.array([70, 71, 69, 72, 70, 68, 71, 70, 250, 260], dtype=float)
+
+        assert not np.any(kernels.zscores(values) > 2.5)
+        assert kernels.mad_outliers(values).tolist() == [8, 9]
+
+
+class TestDistributionKernels:
+    """Test percentile, autocorrelation and seasonality kernels."""
+
+    def test_percentile_rank_matches_linear_scan(self, rng):
+        data = rng.normal(0, 1, 200).tolist()
+        sorted_data = sorted(data)
+
+        def reference(value):
+            for i, data_point in enumerate(sorted_data):
+                if value <= data_point:
+                    return i / len(sorted_data) * 100
+            return 100.0
+
+        for value in (-5.0, sorted_data[10], 0.0, 5.0):
+            assert kernels.percentile_rank(value, data) == pytest.approx(reference(value))
+        assert kernels.percentile_rank(1.0, []) == 50.0
+        assert kernels.percentile_rank(np.array([-5.0, 5.0]), data).tolist() == [0.0, 100.0]
+
+    def test_autocorrelation_matches_correlate(self, rng):
+        values = rng.normal(70, 5, 301)
+
+        expected = np.correlate(values, values, mode='full')[len(values) - 1:]
+
+        assert kernels.autocorrelation(values) == pytest.approx(expected, rel=1e-9)
+
+    def test_autocorrelation_finds_period(self):
+        values = np.sin(2 * np.pi * np.arange(140) / 7)
+
+        peaks = kernels.local_maxima(kernels.autocorrelation(values, demean=True))
+
+        assert peaks[0] == 7
+        assert np.all(np.diff(peaks) == 7)
+
+    def test_weekday_means(self):
+        start = datetime(2024, 1, 1)  # Monday
+        timestamps = [start + timedelta(days=i) for i in range(28)]
+        weekdays = np.array([ts.weekday() for ts in timestamps])
+        values = np.where(weekdays >= 5, 10.0, 5.0)
+
+        means, counts = kernels.weekday_means(weekdays, values)
+
+        assert counts.tolist() == [4] * 7
+        assert means.tolist() == [5.0] * 5 + [10.0] * 2
+        assert kernels.weekly_seasonality(weekdays, values) == pytest.approx(statistics.variance(means.tolist()))
+        assert np.isnan(kernels.weekly_seasonality(weekdays[:3], values[:3]))
+
+
+class TestChartKernels:
+    """Test downsampling and pairwise correlation."""
+
+    def test_lttb_keeps_endpoints_and_peaks(self, rng):
+        x = np.arange(1000, dtype=float)
+        y = rng.normal(0, 1, 1000)
+        y[400] = 50
+
+        keep = kernels.lttb(x, y, 100)
+
+        assert len(keep) == 100
+        assert keep[0] == 0 and keep[-1] == 999
+        assert np.all(np.diff(keep) > 0)
+        assert 400 in keep
+        assert kernels.lttb(x[:10], y[:10], 100).tolist() == list(range(10))
+
+    def test_pairwise_correlation(self, rng):
+        values = rng.normal(0, 1, (50, 3))
+        values[:, 1] += values[:, 0]
+
+        assert kernels.pairwise_correlation(values) == pytest.approx(np.corrcoef(values, rowvar=False))
+
+        gapped = values.copy()
+        gapped[::3, 2] = np.nan
+        result = kernels.pairwise_correlation(gapped)
+        shared = ~np.isnan(gapped[:, 2])
+        assert result[0, 2] == pytest.approx(np.corrcoef(values[shared, 0], values[shared, 2])[0, 1])
+        assert result[0, 1] == pytest.approx(np.corrcoef(values[:, 0], values[:, 1])[0, 1])
+        assert np.isnan(kernels.pairwise_correlation(np.array([[1.0, 2.0], [1.0, np.nan], [1.0, 3.0]]))[0, 1])
@@ -0,0 +1,135 @@
+"""
+Test resolution-aware series queries.
+
+This module checks that series come back raw, bucketed or LTTB-reduced
+within the point budget, and from rollup tiers once a window holds more
+readings than the service will scan and the rollup backfill has completed.
+"""
+
+import pytest
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.base import Base
+from app.models.health_data import HealthData
+from app.models.enhanced_health_models import EtlWatermark, HealthMetricRollup, HealthRollupBatch
+from app.services.enhanced.health_resolution import SeriesResolutionService
+from app.services.enhanced.health_rollups import HealthRollupStore, backfill_rollups
+
+
+@pytest.fixture
+def db():
+    """In-memory database with readings and rollup tables."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    tables = [HealthData.__table__, HealthMetricRollup.__table__, HealthRollupBatch.__table__, EtlWatermark.__table__]
+    Base.metadata.create_all(bind=engine, tables=tables)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def window():
+    end = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    return end - timedelta(days=4), end
+
+
+@pytest.fixture
+def readings(db, window):
+    """Heart rate every ten minutes across the window, stored raw and as rollups."""
+    start, end = window
+    rng = np.random.default_rng(5)
+    timestamps = [start + timedelta(minutes=10 * i) for i in range(int((end - start) / timedelta(minutes=10)))]
+    values = rng.normal(70, 6, len(timestamps)).round(1)
+    records = [("heart_rate", ts, float(value), "bpm") for ts, value in zip(timestamps, values)]
+    db.add_all([
+        HealthData(user_id=1, data_type=data_type, value=str(value), unit=unit, timestamp=ts)
+        for data_type, ts, value, unit in records
+    ])
+    db.commit()
+    HealthRollupStore(db).ingest_records(1, records)
+    backfill_rollups(db)
+    return np.array(timestamps, dtype="datetime64[s]"), values
+
+
+class TestSeriesResolutionService:
+    """Test routing between raw readings, reduced readings and rollups."""
+
+    def test_small_window_is_raw(self, db, readings, window):
+        start, end = window
+        result = SeriesResolutionService(db).get_series(1, "heart_rate", end - timedelta(hours=2), end, max_points=50)
+
+        assert result["resolution"] == "raw"
+        assert result["total_points"] == 12
+        assert [point["value"] for point in result["points"]] == readings[1][-12:].tolist()
+
+    def test_even_buckets_match_numpy(self, db, readings, window):
+        start, end = window
+        result = SeriesResolutionService(db).get_series(1, "heart_rate", start, end, max_points=96)
+
+        assert result["source"] == "readings"
+        assert result["resolution"] == "3600s"
+        assert len(result["points"]) == 96
+        hours = readings[1].reshape(96, 6)
+        assert [point["count"] for point in result["points"]] == [6] * 96
+        assert [point["mean"] for point in result["points"]] == pytest.approx(hours.mean(axis=1).tolist())
+        assert [point["min"] for point in result["points"]] == hours.min(axis=1).tolist()
+        assert [point["max"] for point in result["points"]] == hours.max(axis=1).tolist()
+
+    def test_lttb_respects_budget(self, db, readings, window):
+        start, end = window
+        result = SeriesResolutionService(db).get_series(1, "heart_rate", start, end, max_points=40, mode="lttb")
+
+        assert len(result["points"]) == 40
+        assert result["points"][0]["value"] == readings[1][0]
+        assert result["points"][-1]["value"] == readings[1][-1]
+
+    def test_large_window_reads_rollups(self, db, readings, window):
+        start, end = window
+        service = SeriesResolutionService(db, raw_scan_limit=100)
+
+        result = service.get_series(1, "heart_rate", start, end, max_points=200)
+
+        assert result["source"] == "rollups"
+        assert result["resolution"] == "hourly"
+        assert len(result["points"]) == 96
+        assert sum(point["count"] for point in result["points"]) == len(readings[1])
+        assert result["points"][0]["mean"] == pytest.approx(readings[1][:6].mean())
+
+        coarse = service.get_series(1, "heart_rate", start, end, max_points=10)
+        assert coarse["resolution"] == "daily"
+        assert sum(point["count"] for point in coarse["points"]) == len(readings[1])
+
+    def test_readings_until_backfill_completes(self, db, readings, window):
+        start, end = window
+        db.query(EtlWatermark).delete()
+        db.commit()
+        service = SeriesResolutionService(db, raw_scan_limit=100)
+        
+        result = service.get_series(1, "heart_rate", start, end, max_points=200)
+        assert result["source"] == "readings"
+        assert len(result["points"]) <= 200
+        
+        daily = service.get_series(1, "heart_rate", start, end, bucket="daily")
+        assert daily["source"] == "readings"
+        assert daily["resolution"] == "daily"
+        assert sum(point["count"] for point in daily["points"]) == len(readings[1])
+    
+    def test_explicit_buckets(self, db, readings, window):
+        start, end = window
+        service = SeriesResolutionService(db)
+
+        daily = service.get_series(1, "heart_rate", start, end, bucket="daily")
+        assert daily["resolution"] == "daily"
+        assert max(point["max"] for point in daily["points"]) == readings[1].max()
+
+        half_days = service.get_series(1, "heart_rate", start, end, bucket="43200")
+        assert half_days["resolution"] == "43200s"
+        assert len(half_days["points"]) == 8
+
+        with pytest.raises(ValueError):
+            service.get_series(1, "heart_rate", start, end, bucket="1")
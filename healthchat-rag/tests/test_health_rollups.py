@@ -0,0 +1,279 @@
+"""
+Test streaming health metric rollups.
+
+This module tests the t-digest sketch, bucket assignment, idempotent
+ingest, late data, corrections and the consumers that read rollups
+instead of raw readings.
+"""
+
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.base import Base
+from app.models.health_data import HealthData
+from app.models.enhanced_health_models import (
+    HealthMetricRollup, HealthRollupBatch, HealthMetricsAggregation, HealthScoreInvalidation
+)
+from app.services.enhanced.data_integration import HealthDataPoint, DataType, DataSourceType
+from app.services.enhanced.health_rollups import (
+    HealthRollupStore, RollupGranularity, RunningAggregate, bucket_starts, bucket_end
+)
+from app.services.enhanced.health_timeseries import HealthSeriesSet
+from app.utils.sketches import TDigest
+
+NOW = datetime(2024, 3, 20, 12, 0, 0)
+
+
+@pytest.fixture
+def db():
+    """In-memory database with the rollup tables."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    tables = [table.__table__ for table in (
+        HealthData, HealthMetricRollup, HealthRollupBatch, HealthMetricsAggregation, HealthScoreInvalidation
+    )]
+    Base.metadata.create_all(bind=engine, tables=tables)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def store(db):
+    return HealthRollupStore(db, hourly_retention_days=35)
+
+
+def heart_rate_series(start, values, step=timedelta(minutes=10)):
+    points = [
+        HealthDataPoint(user_id=1, data_type=DataType.HEART_RATE, value=value,
+                        timestamp=start + i * step, source=DataSourceType.MANUAL_ENTRY)
+        for i, value in enumerate(values)
+    ]
+    return HealthSeriesSet.from_points(1, points)
+
+
+class TestTDigest:
+    """Test the mergeable quantile sketch."""
+
+    def test_quantiles_within_tolerance(self):
+        values = np.random.default_rng(0).normal(70, 10, 100_000)
+        digest = TDigest().update(values)
+
+        assert digest.centroid_count <= 200
+        for q in (0.01, 0.5, 0.99):
+            assert digest.quantile(q) == pytest.approx(np.quantile(values, q), abs=0.5)
+        assert digest.quantile(0) == values.min()
+        assert digest.quantile(1) == values.max()
+
+    def test_merge_and_serialize(self):
+        values = np.random.default_rng(1).exponential(5, 20_000)
+        merged = TDigest()
+        for chunk in np.array_split(values, 50):
+            merged.merge(TDigest.from_dict(TDigest().update(chunk).to_dict()))
+
+        assert merged.count == 20_000
+        assert merged.quantile(0.5) == pytest.approx(np.median(values), rel=0.02)
+
+
+class TestBuckets:
+    """Test bucket assignment."""
+
+    def test_bucket_starts(self):
+        timestamps = np.array([datetime(2024, 3, 20, 13, 45), datetime(2024, 2, 29, 0, 5)], dtype="datetime64[s]")
+
+        assert bucket_starts(timestamps, "hourly").astype(datetime).tolist() == [
+            datetime(2024, 3, 20, 13), datetime(2024, 2, 29, 0)]
+        assert bucket_starts(timestamps, "weekly").astype(datetime).tolist() == [
+            datetime(2024, 3, 18), datetime(2024, 2, 26)]  # Mondays
+        assert bucket_starts(timestamps, "monthly").astype(datetime).tolist() == [
+            datetime(2024, 3, 1), datetime(2024, 2, 1)]
+        assert bucket_end(datetime(2024, 12, 1), "monthly") == datetime(2025, 1, 1)
+
+
+class TestHealthRollupStore:
+    """Test ingest, replay, late data and rebuilds."""
+
+    def test_ingest_creates_every_granularity(self, store, db):
+        values = [60, 70, 80, 90, 100, 110]
+        result = store.ingest(1, heart_rate_series(datetime(2024, 3, 20, 9, 30), values), now=NOW)
+
+        assert result['buckets_created'] == 2 + 1 + 1 + 1  # two hours, one day, week, month
+        daily = store.get_rollups(1, RollupGranularity.DAILY, datetime(2024, 3, 20), datetime(2024, 3, 21))
+        assert len(daily) == 1
+        aggregate = RunningAggregate.from_row(daily[0])
+        assert aggregate.count == 6
+        assert aggregate.mean == pytest.approx(np.mean(values))
+        assert aggregate.std == pytest.approx(np.std(values, ddof=1))
+        assert (aggregate.minimum, aggregate.maximum) == (60, 110)
+        assert aggregate.change == 50
+
+    def test_replayed_batch_is_ignored(self, store):
+        series = heart_rate_series(datetime(2024, 3, 20, 9, 0), [70, 72, 74])
+
+        store.ingest(1, series, now=NOW)
+        replay = store.ingest(1, series, now=NOW)
+
+        assert replay['duplicate'] is True
+        row = store.get_rollups(1, "daily", datetime(2024, 3, 20), datetime(2024, 3, 21))[0]
+        assert row.count == 3
+        assert row.revision == 1
+    
+    def test_conflict_keeps_callers_pending_work(self, store, db):
+        db.add(HealthData(user_id=1, data_type="heart_rate", value="70", timestamp=NOW, source="manual"))
+        db.flush()
+        merge = store._merge_partials
+        conflicts = iter([IntegrityError("INSERT", {}, Exception("concurrent insert"))])
+        
+        def merge_once_conflicting(*args):
+            for error in conflicts:
+                merge(*args)  # Leave partial writes for the savepoint to undo
+                raise error
+            return merge(*args)
+        
+        with patch.object(store, "_merge_partials", side_effect=merge_once_conflicting):
+            result = store.ingest(1, heart_rate_series(datetime(2024, 3, 20, 9, 0), [70, 72]), now=NOW, commit=False)
+        db.commit()
+        
+        assert result['duplicate'] is False
+        assert db.query(HealthData).count() == 1
+        row = store.get_rollups(1, "daily", datetime(2024, 3, 20), datetime(2024, 3, 21))[0]
+        assert (row.count, row.revision) == (2, 1)
+
+    def test_batches_merge_in_place(self, store):
+        store.ingest(1, heart_rate_series(datetime(2024, 3, 20, 8, 0), [60, 62]), now=NOW)
+        store.ingest(1, heart_rate_series(datetime(2024, 3, 20, 10, 0), [80, 82]), now=NOW)
+
+        rows = store.get_rollups(1, "daily", datetime(2024, 3, 20), datetime(2024, 3, 21))
+        assert len(rows) == 1
+        assert rows[0].count == 4
+        assert rows[0].total == 284
+        assert rows[0].revision == 2
+        assert rows[0].first_value == 60 and rows[0].last_value == 82
+
+    def test_late_data_merges_into_closed_buckets(self, store):
+        store.ingest(1, heart_rate_series(datetime(2024, 3, 15, 8, 0), [70]), now=NOW)
+        result = store.ingest(1, heart_rate_series(datetime(2024, 3, 15, 7, 0), [50]), now=NOW)
+
+        assert result['late_points'] == 1
+        row = store.get_rollups(1, "daily", datetime(2024, 3, 15), datetime(2024, 3, 16))[0]
+        assert row.count == 2
+        assert row.late_count == 2
+        assert row.first_value == 50
+
+    def test_hourly_retention(self, store):
+        store.ingest(1, heart_rate_series(datetime(2023, 12, 1, 8, 0), [70, 71]), now=NOW)
+
+        assert store.get_rollups(1, "hourly", datetime(2023, 12, 1), datetime(2023, 12, 2)) == []
+        assert len(store.get_rollups(1, "daily", datetime(2023, 12, 1), datetime(2023, 12, 2))) == 1
+
+    def test_rebuild_after_delete(self, store, db):
+        rows = [
+            HealthData(user_id=1, data_type="heart_rate", value=str(value), timestamp=datetime(2024, 3, 20, 8, i))
+            for i, value in enumerate([60, 70, 200])
+        ]
+        db.add_all(rows)
+        db.commit()
+        store.ingest_records(1, [(row.data_type, row.timestamp, value, None) for row, value in zip(rows, [60, 70, 200])])
+
+        db.delete(rows[2])
+        db.commit()
+        store.refresh_readings(1, "heart_rate", [datetime(2024, 3, 20, 8, 2)])
+
+        daily = store.get_rollups(1, "daily", datetime(2024, 3, 20), datetime(2024, 3, 21))[0]
+        assert (daily.count, daily.maximum) == (2, 70)
+        assert daily.revision == 2
+
+    def test_summarize_and_series(self, store):
+        store.ingest(1, heart_rate_series(datetime(2024, 3, 18, 8, 0), [60, 80], step=timedelta(days=1)), now=NOW)
+
+        summary = store.summarize(1, datetime(2024, 3, 18), datetime(2024, 3, 21))
+        assert summary[("heart_rate", "value")].mean == 70
+
+        starts, values = store.series(1, "heart_rate", "daily", datetime(2024, 3, 18), datetime(2024, 3, 21))
+        assert starts == [datetime(2024, 3, 18), datetime(2024, 3, 19)]
+        assert values.tolist() == [60, 80]
+
+
+class TestRollupConsumers:
+    """Test services that read rollups."""
+
+    @pytest.mark.asyncio
+    async def test_processor_upserts_daily_aggregation(self, db):
+        from app.services.enhanced.health_data_processing import HealthDataProcessor
+
+        processor = HealthDataProcessor(db)
+        start = datetime(2024, 3, 20, 8, 0)
+        batch = [
+            HealthDataPoint(user_id=1, data_type=DataType.HEART_RATE, value=value,
+                            timestamp=start + timedelta(hours=i), source=DataSourceType.MANUAL_ENTRY)
+            for i, value in enumerate([60, 80])
+        ]
+        blood_pressure = [
+            HealthDataPoint(user_id=1, data_type=DataType.BLOOD_PRESSURE, value={"systolic": 120, "diastolic": 80},
+                            timestamp=start, source=DataSourceType.MANUAL_ENTRY)
+        ]
+
+        await processor._store_data(1, batch, aggregate=True)
+        await processor._store_data(1, batch[1:], aggregate=True)  # replay, chunked differently
+        await processor._store_data(1, blood_pressure, aggregate=True)
+        
+        rows = db.query(HealthMetricsAggregation).all()
+        assert len(rows) == 1
+        assert rows[0].avg_heart_rate == 70
+        assert rows[0].max_heart_rate == 80
+        assert rows[0].avg_blood_pressure_systolic == 120
+    
+    @pytest.mark.asyncio
+    async def test_failed_storage_is_not_aggregated(self, db):
+        from app.services.enhanced.health_data_processing import HealthDataProcessor
+        
+        processor = HealthDataProcessor(db)
+        batch = [HealthDataPoint(user_id=1, data_type=DataType.HEART_RATE, value=70,
+                                 timestamp=NOW, source=DataSourceType.MANUAL_ENTRY)]
+        
+        with patch("app.services.enhanced.health_data_processing.upsert_readings",
+                   side_effect=RuntimeError("disk full")):
+            result = await processor._store_data(1, batch, aggregate=True)
+        
+        assert result['errors'] == ["Error storing data: disk full"]
+        assert db.query(HealthMetricRollup).count() == 0
+
+    @pytest.mark.asyncio
+    async def test_bi_reads_rollups(self, db):
+        from app.services.enhanced.business_intelligence import BusinessIntelligenceService, AggregationPeriod
+
+        service = BusinessIntelligenceService(db)
+        service.rollup_store.ingest(1, heart_rate_series(datetime(2024, 3, 18, 8, 0), [60, 70, 80, 90]), now=NOW)
+
+        result = await service.aggregate_health_metrics(
+            1, AggregationPeriod.WEEKLY, datetime(2024, 3, 18), datetime(2024, 3, 25)
+        )
+
+        assert result.avg_heart_rate == 75
+
+    @pytest.mark.asyncio
+    async def test_rolling_features_from_daily_rollups(self, db):
+        from app.services.enhanced.ml_data_preparation import FeatureEngineeringPipeline
+
+        with patch("app.services.enhanced.ml_data_preparation.get_business_intelligence_service"):
+            pipeline = FeatureEngineeringPipeline(db)
+        steps = np.arange(1, 15) * 1000
+        start = datetime(2024, 3, 1)
+        points = [
+            HealthDataPoint(user_id=1, data_type=DataType.STEPS, value=int(value),
+                            timestamp=start + timedelta(days=i, hours=20), source=DataSourceType.MANUAL_ENTRY)
+            for i, value in enumerate(steps)
+        ]
+        pipeline.rollup_store.ingest(1, HealthSeriesSet.from_points(1, points), now=NOW)
+
+        features = await pipeline._extract_rolling_features(1, start, start + timedelta(days=14))
+
+        assert features["total_steps_rolling_7_mean"] == steps[-7:].mean()
+        assert features["total_steps_rolling_14_mean"] == steps.mean()
+        assert "total_steps_rolling_30_mean" not in features
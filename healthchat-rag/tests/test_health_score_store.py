@@ -0,0 +1,239 @@
+"""
+Test materialized health scores.
+
+This module tests the invalidation queue, batch refreshes, versioning,
+stale reads and the profile-change hook of the health score store, and
+the write hooks routers run after storing, editing or deleting readings.
+"""
+
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.base import Base
+from app.models.health_data import HealthData, SymptomLog, MedicationLog
+from app.models.enhanced_health_models import (
+    HealthScoreSnapshot, HealthScoreInvalidation, HealthMetricsAggregation, UserHealthProfile,
+    HealthMetricRollup, HealthRollupBatch
+)
+from app.services.enhanced.health_rollups import HealthRollupStore, RollupGranularity
+from app.services.enhanced.health_score_store import HealthScoreStore, ScoreKind, readings_changed, readings_stored
+from app.services.enhanced.predictive_analytics import PredictionType, RiskAssessment, RiskLevel
+
+
+@pytest.fixture
+def db():
+    """In-memory database with the tables score computation reads and writes."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    tables = [table.__table__ for table in (
+        HealthData, SymptomLog, MedicationLog, HealthMetricsAggregation,
+        UserHealthProfile, HealthScoreSnapshot, HealthScoreInvalidation, HealthMetricRollup, HealthRollupBatch
+    )]
+    Base.metadata.create_all(bind=engine, tables=tables)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def risk(risk_type: PredictionType, score: float) -> RiskAssessment:
+    now = datetime.utcnow()
+    return RiskAssessment(
+        risk_type=risk_type, risk_level=RiskLevel.MODERATE, risk_score=score, confidence=0.8,
+        factors=["Age over 45"], recommendations=["Exercise"],
+        assessment_date=now, next_assessment_date=now + timedelta(days=90)
+    )
+
+
+@pytest.fixture
+def backend():
+    backend = MagicMock()
+    backend.assess_cardiovascular_risk = AsyncMock(side_effect=lambda uid: risk(PredictionType.CARDIOVASCULAR_RISK, 0.3))
+    backend.assess_diabetes_risk = AsyncMock(side_effect=lambda uid: risk(PredictionType.DIABETES_RISK, 0.2))
+    backend.assess_mental_health_risk = AsyncMock(side_effect=lambda uid: risk(PredictionType.MENTAL_HEALTH_RISK, 0.1))
+    return backend
+
+
+@pytest.fixture
+def store(db, backend):
+    return HealthScoreStore(db, predictive_backend=backend)
+
+
+def add_heart_rate(db, user_id: int, values):
+    start = datetime.utcnow() - timedelta(days=len(values))
+    db.add_all([
+        HealthData(user_id=user_id, data_type="heart_rate", value=str(value), timestamp=start + timedelta(days=i))
+        for i, value in enumerate(values)
+    ])
+    db.commit()
+
+
+class TestHealthScoreStore:
+    """Test queueing, refreshing and reading materialized scores."""
+
+    @pytest.mark.asyncio
+    async def test_refresh_materializes_every_kind(self, store, db, backend):
+        add_heart_rate(db, 1, [62, 64, 66, 65])
+        store.mark_dirty(1)
+        store.mark_dirty(1)  # coalesced into one recomputation
+
+        result = await store.refresh_dirty()
+
+        assert result == {'refreshed': 1, 'failed': 0, 'cleared': 2, 'pending': 0}
+        assert backend.assess_cardiovascular_risk.await_count == 1
+        for kind in ScoreKind:
+            snapshot = store.get(1, kind)
+            assert snapshot.version == 1
+            assert snapshot.stale is False
+        assert store.get(1, ScoreKind.CARDIOVASCULAR_RISK).payload['risk_level'] == "moderate"
+        assert store.get(1, ScoreKind.HEALTH_SCORE).payload['data_summary']['health_data_points'] == 4
+        assert 0 < store.get(1, ScoreKind.ANALYTICS_SCORE).payload['overall_score'] <= 1
+
+    @pytest.mark.asyncio
+    async def test_reads_are_stale_until_refreshed(self, store, db):
+        add_heart_rate(db, 1, [70, 72])
+        store.mark_dirty(1)
+        await store.refresh_dirty()
+        first = store.get(1, ScoreKind.HEALTH_SCORE)
+
+        add_heart_rate(db, 1, [74])
+        store.mark_dirty(1)
+        stale = store.get(1, ScoreKind.HEALTH_SCORE)
+        assert stale.stale is True
+        assert stale.version == 1
+        assert stale.payload == first.payload
+
+        await store.refresh_dirty()
+        fresh = store.get(1, ScoreKind.HEALTH_SCORE)
+        assert (fresh.version, fresh.stale) == (2, False)
+        assert fresh.payload['data_summary']['health_data_points'] == 3
+        assert fresh.computed_at >= first.computed_at
+
+    @pytest.mark.asyncio
+    async def test_invalidation_during_refresh_is_kept(self, store, db, backend):
+        def mark_while_computing(user_id):
+            store.mark_dirty(user_id, commit=False)
+            return risk(PredictionType.DIABETES_RISK, 0.2)
+        backend.assess_diabetes_risk.side_effect = mark_while_computing
+        store.mark_dirty(1)
+
+        result = await store.refresh_dirty()
+
+        assert result['pending'] == 1
+        assert store.get(1, ScoreKind.DIABETES_RISK).stale is True
+
+    @pytest.mark.asyncio
+    async def test_failed_kind_keeps_previous_snapshot(self, store, backend):
+        store.mark_dirty(1)
+        await store.refresh_dirty()
+
+        backend.assess_mental_health_risk.side_effect = RuntimeError("profile unavailable")
+        store.mark_dirty(1)
+        await store.refresh_dirty()
+
+        assert store.get(1, ScoreKind.MENTAL_HEALTH_RISK).version == 1
+        assert store.get(1, ScoreKind.CARDIOVASCULAR_RISK).version == 2
+    
+    @pytest.mark.asyncio
+    async def test_failed_kind_stays_queued_and_stale(self, store, backend):
+        store.mark_dirty(1)
+        await store.refresh_dirty()
+        
+        backend.assess_mental_health_risk.side_effect = RuntimeError("profile unavailable")
+        store.mark_dirty(1)
+        failed = await store.refresh_dirty()
+        
+        assert failed == {'refreshed': 0, 'failed': 1, 'cleared': 0, 'pending': 1}
+        assert store.get(1, ScoreKind.MENTAL_HEALTH_RISK).stale is True
+        assert store.get(1, ScoreKind.CARDIOVASCULAR_RISK).stale is False
+        
+        backend.assess_mental_health_risk.side_effect = lambda uid: risk(PredictionType.MENTAL_HEALTH_RISK, 0.4)
+        retried = await store.refresh_dirty()
+        
+        assert retried == {'refreshed': 1, 'failed': 0, 'cleared': 1, 'pending': 0}
+        snapshot = store.get(1, ScoreKind.MENTAL_HEALTH_RISK)
+        assert (snapshot.version, snapshot.stale) == (2, False)
+
+    @pytest.mark.asyncio
+    async def test_cold_read_computes_synchronously(self, store, db, backend):
+        assert store.get(5, ScoreKind.CARDIOVASCULAR_RISK) is None
+
+        snapshot = await store.get_or_compute(5, ScoreKind.CARDIOVASCULAR_RISK)
+
+        assert snapshot.version == 1
+        assert snapshot.payload['risk_score'] == 0.3
+        assert backend.assess_diabetes_risk.await_count == 0
+        with pytest.raises(LookupError):
+            await store.get_or_compute(5, ScoreKind.ANALYTICS_SCORE)  # no readings
+
+    def test_profile_write_queues_user(self, store, db):
+        profile = UserHealthProfile(user_id=7, height_cm=180.0)
+        db.add(profile)
+        db.commit()
+        profile.weight_kg = 80.0
+        db.commit()
+
+        reasons = [row.reason for row in db.query(HealthScoreInvalidation).filter_by(user_id=7)]
+        assert reasons == ["profile", "profile"]
+        assert store.pending_count() == 1
+
+
+class TestWriteHooks:
+    """Test the hooks run after readings are written."""
+
+    def daily_rollup(self, db, user_id: int, day: datetime):
+        rows = HealthRollupStore(db).get_rollups(user_id, RollupGranularity.DAILY, day, day + timedelta(days=1))
+        return [(row.data_type, row.count, row.total) for row in rows]
+
+    def test_stored_readings_update_rollups_and_queue_scores(self, store, db):
+        day = datetime(2024, 3, 1)
+        reading = HealthData(user_id=1, data_type="heart_rate", value="70", timestamp=day + timedelta(hours=8))
+        db.add(reading)
+        db.commit()
+        records = [("heart_rate", reading.timestamp, "70", "bpm")]
+
+        readings_stored(db, 1, records, batch_key=f"health_data:{reading.id}")
+        readings_stored(db, 1, records, batch_key=f"health_data:{reading.id}")  # retry is a no-op
+
+        assert self.daily_rollup(db, 1, day) == [("heart_rate", 1, 70.0)]
+        assert store.pending_count() == 1
+
+    def test_changed_readings_rebuild_rollups(self, store, db):
+        day = datetime(2024, 3, 1)
+        reading = HealthData(user_id=1, data_type="heart_rate", value="70", timestamp=day + timedelta(hours=8))
+        db.add(reading)
+        db.commit()
+        readings_stored(db, 1, [("heart_rate", reading.timestamp, "70", "bpm")])
+
+        previous = (reading.data_type, reading.timestamp)
+        reading.value, reading.timestamp = "90", day + timedelta(days=1)
+        db.commit()
+        readings_changed(db, 1, [previous, (reading.data_type, reading.timestamp)])
+
+        assert self.daily_rollup(db, 1, day) == []
+        assert self.daily_rollup(db, 1, day + timedelta(days=1)) == [("heart_rate", 1, 90.0)]
+
+    def test_rollup_failure_still_queues_scores(self, store, db):
+        with patch("app.services.enhanced.health_score_store.get_health_rollup_store",
+                   side_effect=RuntimeError("rollups unavailable")):
+            readings_stored(db, 2, [("heart_rate", datetime(2024, 3, 1), "70", "bpm")])
+            readings_changed(db, 3, [("heart_rate", datetime(2024, 3, 1))])
+
+        assert {row.user_id for row in db.query(HealthScoreInvalidation)} == {2, 3}
+
+    def test_stored_and_edited_readings_are_submitted_for_thresholds(self, store, db):
+        timestamp = datetime(2024, 3, 1, 8)
+        bp = {"systolic": 150, "diastolic": 95}
+        with patch("app.services.enhanced.health_score_store.threshold_monitor") as monitor:
+            readings_stored(db, 1, [("heart_rate", timestamp, "70", "bpm"), ("blood_pressure", timestamp, bp, "mmHg")])
+            readings_changed(db, 1, [("heart_rate", timestamp)], updated=[("heart_rate", timestamp, "130", "bpm")])
+            readings_changed(db, 1, [("heart_rate", timestamp)])  # deletion
+
+        assert [call.args for call in monitor.submit_readings.call_args_list] == [
+            (1, [("heart_rate", "70", timestamp), ("blood_pressure", bp, timestamp)]),
+            (1, [("heart_rate", "130", timestamp)]),
+            (1, []),
+        ]
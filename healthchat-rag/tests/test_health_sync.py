@@ -0,0 +1,158 @@
+"""
+Test incremental wearable sync.
+
+This module checks that streams fetch from their high-water marks, that
+re-fetched readings are no-ops, that revised readings are updated in
+place, and that natural keys dedupe sync against bulk ingestion.
+"""
+
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.base import Base
+from app.models.health_data import HealthData
+from app.models.enhanced_health_models import (
+    HealthMetricRollup, HealthRollupBatch, HealthScoreInvalidation, HealthSyncState
+)
+from app.services.enhanced.data_integration import (
+    BaseDataProvider, DataIntegrationService, DataSourceConfig, DataSourceType, DataType, HealthDataPoint
+)
+from app.services.enhanced.health_ingestion import HealthDataIngestor
+from app.services.enhanced.health_sync import HealthSyncEngine
+from app.utils.encryption_utils import encryption_manager
+
+
+class FakeProvider(BaseDataProvider):
+    """Serves a fixed set of readings and records the windows requested."""
+
+    def __init__(self, readings):
+        super().__init__(DataSourceConfig(DataSourceType.FITBIT, "key", "secret", "https://example.com"))
+        self.readings = readings
+        self.windows = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    async def authenticate(self):
+        return True
+
+    async def fetch_health_data(self, user_id, data_types, start_date, end_date):
+        self.windows.append((tuple(data_types), start_date))
+        return [
+            HealthDataPoint(user_id=user_id, source=DataSourceType.FITBIT, **reading)
+            for reading in self.readings
+            if reading["data_type"] in data_types and start_date <= reading["timestamp"] <= end_date
+        ]
+
+    def normalize_data(self, raw_data, data_type):
+        pass
+
+
+NOW = datetime(2024, 6, 10, 12)
+
+
+def steps(day, value, source_id=None):
+    return {"data_type": DataType.STEPS, "value": value, "unit": "steps",
+            "timestamp": NOW - timedelta(days=day), "source_id": source_id}
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    tables = [table.__table__ for table in (
+        HealthData, HealthMetricRollup, HealthRollupBatch, HealthScoreInvalidation, HealthSyncState
+    )]
+    Base.metadata.create_all(bind=engine, tables=tables)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def make_engine(db, provider):
+    service = DataIntegrationService()
+    service.register_provider(provider)
+    return HealthSyncEngine(db, service, overlap=timedelta(hours=48), initial_days=30)
+
+
+class TestHealthSyncEngine:
+    """Test high-water marks and keyed upserts."""
+
+    @pytest.mark.asyncio
+    async def test_resync_is_idempotent(self, db):
+        provider = FakeProvider([steps(day, 5000 + day) for day in range(10)])
+        engine = make_engine(db, provider)
+
+        first = await engine.sync_user(1, data_types=[DataType.STEPS], now=NOW)
+        second = await engine.sync_user(1, data_types=[DataType.STEPS], now=NOW)
+
+        assert (first.fetched, first.inserted) == (10, 10)
+        assert (second.fetched, second.inserted, second.updated) == (3, 0, 0)
+        assert db.query(HealthData).count() == 10
+        assert db.query(HealthScoreInvalidation).filter_by(user_id=1).count() == 1
+        assert provider.windows[0][1] == NOW - timedelta(days=30)
+        assert provider.windows[1][1] == NOW - timedelta(hours=48)
+        state = db.query(HealthSyncState).one()
+        assert (state.source, state.data_type, state.high_water_mark) == ("fitbit", "steps", NOW)
+
+    @pytest.mark.asyncio
+    async def test_new_readings_extend_the_mark(self, db):
+        provider = FakeProvider([steps(day, 5000) for day in range(3, 6)])
+        engine = make_engine(db, provider)
+        await engine.sync_user(1, data_types=[DataType.STEPS], now=NOW)
+
+        provider.readings += [steps(day, 7000 + day) for day in range(3)]
+        result = await engine.sync_user(1, data_types=[DataType.STEPS], now=NOW)
+
+        assert result.inserted == 3
+        assert db.query(HealthSyncState).one().high_water_mark == NOW
+        assert sum(row.count for row in db.query(HealthMetricRollup).filter_by(granularity="daily")) == 6
+
+    @pytest.mark.asyncio
+    async def test_revised_reading_updates_in_place(self, db):
+        provider = FakeProvider([steps(0, 4000, source_id="day-0")])
+        engine = make_engine(db, provider)
+        await engine.sync_user(1, data_types=[DataType.STEPS], now=NOW)
+
+        provider.readings = [steps(0, 9000, source_id="day-0")]
+        result = await engine.sync_user(1, data_types=[DataType.STEPS], now=NOW)
+
+        row = db.query(HealthData).one()
+        assert (result.inserted, result.updated) == (0, 1)
+        assert encryption_manager.decrypt_field(row.value) == 9000
+        daily = db.query(HealthMetricRollup).filter_by(granularity="daily").one()
+        assert (daily.count, daily.total) == (1, 9000)
+
+    @pytest.mark.asyncio
+    async def test_revised_reading_without_source_id_updates_in_place(self, db):
+        provider = FakeProvider([steps(0, 4000)])
+        engine = make_engine(db, provider)
+        await engine.sync_user(1, data_types=[DataType.STEPS], now=NOW)
+
+        provider.readings = [steps(0, 9000)]
+        result = await engine.sync_user(1, data_types=[DataType.STEPS], now=NOW)
+
+        row = db.query(HealthData).one()
+        assert (result.inserted, result.updated) == (0, 1)
+        assert encryption_manager.decrypt_field(row.value) == 9000
+        daily = db.query(HealthMetricRollup).filter_by(granularity="daily").one()
+        assert (daily.count, daily.total) == (1, 9000)
+
+    @pytest.mark.asyncio
+    async def test_bulk_uploads_and_syncs_share_keys(self, db):
+        reading = steps(1, 6000)
+        HealthDataIngestor(db).ingest(1, [{
+            "data_type": "steps", "value": 6000, "unit": "steps",
+            "timestamp": reading["timestamp"].isoformat(), "source": "fitbit"
+        }])
+
+        result = await make_engine(db, FakeProvider([reading])).sync_user(1, data_types=[DataType.STEPS], now=NOW)
+
+        assert (result.fetched, result.inserted) == (1, 0)
+        assert db.query(HealthData).count() == 1
@@ -0,0 +1,144 @@
+"""
+Test columnar health time series.
+
+This module tests reading parsing, series construction from data points
+and database rows, and the analytics stages that consume them.
+"""
+
+import pytest
+import json
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import numpy as np
+
+from app.services.enhanced.data_integration import HealthDataPoint, DataType, DataSourceType
+from app.services.enhanced.health_timeseries import HealthSeriesSet, HealthTimeSeries, parse_reading
+
+
+def make_point(data_type, value, timestamp):
+    return HealthDataPoint(
+        user_id=1, data_type=data_type, value=value,
+        timestamp=timestamp, source=DataSourceType.MANUAL_ENTRY
+    )
+
+
+class TestParseReading:
+    """Test raw reading parsing."""
+
+    def test_scalar_values(self):
+        assert parse_reading(72, ("value",)) == (72.0,)
+        assert parse_reading("72.5", ("value",)) == (72.5,)
+        assert parse_reading('{"reading": 5.4}', ("value",)) == (5.4,)
+        assert parse_reading("high", ("value",)) is None
+        assert parse_reading(True, ("value",)) is None
+
+    def test_multi_component_values(self):
+        components = ("systolic", "diastolic")
+        assert parse_reading({"systolic": 120, "diastolic": 80}, components) == (120.0, 80.0)
+        assert parse_reading(json.dumps({"systolic": 130, "diastolic": 85}), components) == (130.0, 85.0)
+        assert parse_reading({"systolic": 120}, components) is None
+        assert parse_reading(120, components) is None
+
+
+class TestHealthSeriesSet:
+    """Test series construction."""
+
+    @pytest.fixture
+    def start(self):
+        return datetime(2024, 1, 1, 8, 0, 0)
+
+    def test_from_points_groups_and_sorts(self, start):
+        """Points are grouped by type, sorted by time and non-numeric ones dropped."""
+        points = [
+            make_point(DataType.HEART_RATE, 80, start + timedelta(hours=2)),
+            make_point(DataType.HEART_RATE, 70, start),
+            make_point(DataType.HEART_RATE, "n/a", start + timedelta(hours=1)),
+            make_point(DataType.BLOOD_PRESSURE, {"systolic": 120, "diastolic": 80}, start),
+        ]
+
+        series_set = HealthSeriesSet.from_points(1, points)
+
+        heart_rate = series_set.get(DataType.HEART_RATE)
+        assert heart_rate.primary.tolist() == [70.0, 80.0]
+        assert heart_rate.timestamps.dtype == np.dtype("datetime64[s]")
+        assert heart_rate.to_datetimes() == [start, start + timedelta(hours=2)]
+
+        blood_pressure = series_set.get("blood_pressure")
+        assert blood_pressure.components == ("systolic", "diastolic")
+        assert blood_pressure.component("diastolic").tolist() == [80.0]
+        assert series_set.total_points == 3
+
+    def test_compact_storage(self, start):
+        """Each single-valued reading costs 16 bytes."""
+        timestamps = [start + timedelta(minutes=i) for i in range(1000)]
+        series = HealthTimeSeries.from_arrays(1, DataType.HEART_RATE, timestamps, np.full(1000, 70.0))
+
+        assert series.nbytes == 16 * 1000
+
+    def test_time_helpers(self, start):
+        """Elapsed days, weekdays and windows match datetime arithmetic."""
+        timestamps = [start + timedelta(days=i, hours=6) for i in range(10)]
+        series = HealthTimeSeries.from_arrays(1, DataType.STEPS, timestamps, range(10))
+
+        assert series.elapsed_days().tolist() == pytest.approx(list(range(10)))
+        assert series.weekdays().tolist() == [ts.weekday() for ts in timestamps]
+
+        window = series.window(start + timedelta(days=3), start + timedelta(days=6))
+        assert window.primary.tolist() == [3.0, 4.0, 5.0]
+
+    def test_from_health_data_rows_decrypts_once(self, start):
+        """ORM rows are decrypted once while building the series."""
+        decrypted = []
+
+        def row(value, offset):
+            record = SimpleNamespace(data_type="weight", value=value, unit="kg",
+                                     timestamp=start + timedelta(days=offset))
+            record.decrypt_sensitive_fields = lambda: decrypted.append(offset)
+            return record
+
+        series_set = HealthSeriesSet.from_health_data_rows(1, [row("70.5", 0), row('{"value": 70.1}', 1)])
+
+        assert series_set.get("weight").primary.tolist() == [70.5, 70.1]
+        assert series_set.get("weight").unit == "kg"
+        assert decrypted == [0, 1]
+
+
+class TestAnalyticsOnSeries:
+    """Test analytics stages consuming columnar series."""
+
+    @pytest.fixture
+    def engine(self):
+        from app.services.enhanced.health_analytics import HealthAnalyticsEngine
+        return HealthAnalyticsEngine(db_session=None)
+
+    @pytest.fixture
+    def series_set(self):
+        start = datetime(2024, 1, 1)
+        points = [
+            make_point(DataType.HEART_RATE, 60 + i, start + timedelta(days=i))
+            for i in range(30)
+        ] + [
+            make_point(DataType.STEPS, 5000 + 100 * i, start + timedelta(days=i))
+            for i in range(30)
+        ]
+        return HealthSeriesSet.from_points(1, points)
+
+    @pytest.mark.asyncio
+    async def test_trends_and_predictions(self, engine, series_set):
+        trends = await engine._analyze_trends(1, series_set)
+        by_type = {trend.data_type: trend for trend in trends}
+
+        assert by_type["heart_rate"].slope == pytest.approx(1.0)
+        assert by_type["heart_rate"].data_points == 30
+
+        predictions = await engine._generate_predictions(1, series_set)
+        assert predictions["steps"]["predicted_value"] == pytest.approx(5000 + 100 * 59)
+
+    @pytest.mark.asyncio
+    async def test_scores_and_correlations(self, engine, series_set):
+        score = await engine._calculate_health_score(1, series_set)
+        assert score.component_scores["heart_rate"] == 0.9
+        assert score.component_scores["steps"] == 0.7
+
+        patterns = engine._detect_correlation_patterns(series_set)
+        assert [p.pattern_name for p in patterns] == ["heart_rate_steps_correlation"]
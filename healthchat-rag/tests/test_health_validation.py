@@ -0,0 +1,135 @@
+"""
+Test batch health data validation.
+
+This module checks per-row reason codes for type, range, timestamp and
+blood pressure rules, aggregate quality metrics and messages, and that a
+large import validates in a few array passes.
+"""
+
+import time
+import numpy as np
+import pytest
+from datetime import datetime, timedelta
+
+from app.services.enhanced.data_integration import DataSourceType, DataType, HealthDataPoint
+from app.services.enhanced.health_validation import (
+    BatchValidator, ReadingColumns, to_datetime64
+)
+
+NOW = datetime(2024, 6, 1, 12)
+
+
+def point(data_type, value, minutes_ago=10, confidence=1.0):
+    return HealthDataPoint(
+        user_id=1, data_type=data_type, value=value, unit="", timestamp=NOW - timedelta(minutes=minutes_ago),
+        source=DataSourceType.FITBIT, confidence=confidence
+    )
+
+
+class TestReasonCodes:
+    """Test the rules applied to each row."""
+
+    def setup_method(self):
+        self.validator = BatchValidator()
+
+    def test_range_and_type_rules(self):
+        points = [
+            point(DataType.HEART_RATE, 72),
+            point(DataType.HEART_RATE, 250),
+            point(DataType.HEART_RATE, 45),
+            point(DataType.HEART_RATE, "fast"),
+            point(DataType.STEPS, 1200.5),
+            point(DataType.STEPS, np.int64(8000)),
+            point(DataType.WEIGHT, 5),
+            point(DataType.WEIGHT, None),
+        ]
+
+        result = self.validator.validate_points(points, now=NOW)
+
+        assert result.valid.tolist() == [True, False, True, False, False, True, False, False]
+        assert result.reasons(1) == ["above_max"]
+        assert result.reasons(2) == ["unusual_value"]
+        assert result.reasons(3) == ["non_numeric"]
+        assert result.reasons(4) == ["not_integer"]
+        assert result.reasons(6) == ["below_min"]
+        assert result.reasons(7) == ["missing_value"]
+
+    def test_sleep_minutes_converted(self):
+        result = self.validator.validate_points(
+            [point(DataType.SLEEP, 7.5), point(DataType.SLEEP, 450), point(DataType.SLEEP, 1600)], now=NOW
+        )
+
+        assert result.valid.tolist() == [True, True, False]
+
+    def test_blood_pressure_consistency(self):
+        points = [
+            point(DataType.BLOOD_PRESSURE, {"systolic": 120, "diastolic": 80}),
+            point(DataType.BLOOD_PRESSURE, {"systolic": 80, "diastolic": 90}),
+            point(DataType.BLOOD_PRESSURE, {"systolic": 120}),
+            point(DataType.BLOOD_PRESSURE, 120),
+            point(DataType.BLOOD_PRESSURE, {"systolic": 190, "diastolic": 50}),
+        ]
+
+        result = self.validator.validate_points(points, now=NOW)
+
+        assert result.valid.tolist() == [True, False, False, False, True]
+        assert result.reasons(1) == ["inverted_blood_pressure"]
+        assert "incomplete_blood_pressure" in result.reasons(2)
+        assert result.reasons(4) == ["unusual_ratio"]
+
+    def test_timestamps_and_confidence(self):
+        points = [
+            point(DataType.HEART_RATE, 70, minutes_ago=-60),
+            point(DataType.HEART_RATE, 70, confidence=0.3),
+            point(DataType.BLOOD_GLUCOSE, 95),
+        ]
+
+        result = self.validator.validate_points(points, now=NOW)
+
+        assert result.valid.tolist() == [False, True, True]
+        assert result.reasons(0) == ["future_timestamp"]
+        assert result.reasons(1) == ["low_confidence"]
+        assert result.reasons(2) == ["unknown_type"]
+
+    def test_records_with_string_timestamps(self):
+        columns = ReadingColumns.from_records([
+            {"data_type": "heart_rate", "value": 70, "timestamp": "2024-06-01T10:00:00Z"},
+            {"data_type": "heart_rate", "value": 70, "timestamp": None},
+        ])
+
+        result = BatchValidator().validate(columns, now=NOW)
+
+        assert result.reasons(1) == ["missing_timestamp"]
+        assert to_datetime64(["2024-06-01T12:00:00+02:00"])[0] == np.datetime64("2024-06-01T10:00:00")
+
+
+class TestAggregates:
+    """Test batch-level counts and metrics."""
+
+    def test_counts_messages_and_quality(self):
+        points = [point(DataType.HEART_RATE, 70, confidence=0.9)] * 8 + [
+            point(DataType.HEART_RATE, 300), point(DataType.STEPS, None)
+        ]
+
+        result = BatchValidator().validate_points(points, now=NOW)
+        errors, warnings = result.messages()
+        quality = result.quality()
+
+        assert result.reason_counts() == {"heart_rate": {"above_max": 1}, "steps": {"missing_value": 1}}
+        assert sorted(errors) == ["heart_rate: 1 reading with above_max", "steps: 1 reading with missing_value"]
+        assert warnings == []
+        assert quality["validity"] == pytest.approx(0.8)
+        assert quality["completeness"] == pytest.approx(0.9)
+
+    def test_large_import(self):
+        types = [DataType.HEART_RATE, DataType.STEPS, DataType.SLEEP, DataType.WEIGHT]
+        points = [point(types[i % 4], 20 + i % 300) for i in range(100_000)]
+        columns = ReadingColumns.from_points(points)
+
+        started = time.perf_counter()
+        result = BatchValidator().validate(columns, now=NOW)
+        elapsed = time.perf_counter() - started
+
+        assert len(result.codes) == 100_000
+        assert 0 < result.valid.sum() < 100_000
+        assert elapsed < 0.1
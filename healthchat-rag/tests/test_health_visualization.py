@@ -0,0 +1,145 @@
+"""
+Test dashboard chart generation.
+
+This module checks that the dashboard is built from a single load of the
+window, that correlations and downsampling match their NumPy references,
+and that results are cached per data version.
+"""
+
+import pytest
+import json
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.base import Base
+from app.models.health_data import HealthData, SymptomLog, MedicationLog
+from app.services.health_visualization import HealthVisualizationService
+
+
+class DictCache:
+    """In-process stand-in for the Redis cache manager."""
+
+    def __init__(self):
+        self.store = {}
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.store[key] = value
+        return True
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    tables = [HealthData.__table__, SymptomLog.__table__, MedicationLog.__table__]
+    Base.metadata.create_all(bind=engine, tables=tables)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def readings(db):
+    """Daily heart rate, steps and blood pressure with a few symptoms and medications."""
+    rng = np.random.default_rng(5)
+    start = datetime.utcnow().replace(hour=9, minute=0, second=0, microsecond=0) - timedelta(days=20)
+    heart_rate = rng.normal(70, 5, 20)
+    steps = 12000 - 40 * heart_rate + rng.normal(0, 100, 20)
+    rows = []
+    for day in range(20):
+        timestamp = start + timedelta(days=day)
+        rows.append(HealthData(user_id=1, data_type="heart_rate", value=str(heart_rate[day]), timestamp=timestamp))
+        rows.append(HealthData(user_id=1, data_type="steps", value=str(steps[day]), timestamp=timestamp))
+        if day % 2 == 0:
+            rows.append(HealthData(user_id=1, data_type="blood_pressure", timestamp=timestamp,
+                                   value=json.dumps({"systolic": 120 + day, "diastolic": 80})))
+    rows.append(HealthData(user_id=1, data_type="mood", value="good", timestamp=start))
+    rows += [
+        SymptomLog(user_id=1, symptom="headache", severity="mild", timestamp=start),
+        SymptomLog(user_id=1, symptom="headache", severity="severe", timestamp=start),
+        SymptomLog(user_id=1, symptom="nausea", severity="moderate", timestamp=start),
+        MedicationLog(user_id=1, medication_name="a", dosage="1", frequency="daily", taken_at=start),
+        MedicationLog(user_id=1, medication_name="b", dosage="1", frequency="daily", taken_at=start),
+        MedicationLog(user_id=1, medication_name="a", dosage="1", frequency="daily", taken_at=start + timedelta(days=1)),
+    ]
+    db.add_all(rows)
+    db.commit()
+    return {"heart_rate": heart_rate, "steps": steps}
+
+
+class TestDashboardCharts:
+    """Test the single-pass dashboard builder."""
+
+    def test_builds_every_chart_from_one_load(self, db, engine, readings):
+        statements = []
+        event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+        service = HealthVisualizationService(db, cache=DictCache())
+
+        result = service.generate_health_dashboard_charts(1, days=30)
+
+        # One version fingerprint plus one query per table
+        assert len(statements) == 4
+        charts = result["charts"]
+        trends = {d["label"]: d for d in charts["health_trends"]["datasets"]}
+        assert set(trends) == {"Heart Rate", "Steps", "Blood Pressure"}
+        assert trends["Blood Pressure"]["data"][0]["y"] == 120
+        completeness = charts["data_completeness"]["datasets"][0]
+        assert dict(zip(completeness["labels"], completeness["data"])) == {
+            "heart_rate": 20, "steps": 20, "blood_pressure": 10, "mood": 1}
+        assert charts["symptom_distribution"]["severity_distribution"]["datasets"][0]["data"] == [1, 1, 1]
+        assert [p["y"] for p in charts["medication_adherence"]["datasets"][0]["data"]] == [100.0, 50.0]
+
+    def test_correlation_matches_corrcoef(self, db, readings):
+        charts = HealthVisualizationService(db, cache=DictCache()).generate_health_dashboard_charts(1)["charts"]
+        matrix = charts["correlation_matrix"]
+        labels = matrix["labels"]
+
+        expected = np.corrcoef(readings["heart_rate"], readings["steps"])[0, 1]
+        assert matrix["data"][labels.index("heart_rate")][labels.index("steps")] == round(expected, 2)
+        assert matrix["data"][labels.index("steps")][labels.index("steps")] == 1.0
+        # Blood pressure shares only the even days with heart rate
+        assert -1 <= matrix["data"][labels.index("blood_pressure")][labels.index("heart_rate")] <= 1
+
+    def test_trends_are_downsampled(self, db, readings):
+        service = HealthVisualizationService(db, cache=DictCache(), max_points=5)
+
+        datasets = service.generate_health_dashboard_charts(1)["charts"]["health_trends"]["datasets"]
+        heart_rate = next(d for d in datasets if d["label"] == "Heart Rate")
+
+        assert len(heart_rate["data"]) == 5
+        assert heart_rate["total_points"] == 20
+        assert heart_rate["data"][0]["y"] == pytest.approx(readings["heart_rate"][0])
+
+    def test_cached_per_data_version(self, db, readings):
+        cache = DictCache()
+        service = HealthVisualizationService(db, cache=cache)
+
+        first = service.generate_health_dashboard_charts(1)
+        assert service.generate_health_dashboard_charts(1) is first
+
+        db.add(HealthData(user_id=1, data_type="weight", value="70", timestamp=datetime.utcnow()))
+        db.commit()
+        second = service.generate_health_dashboard_charts(1)
+
+        assert second["data_version"] != first["data_version"]
+        assert len(cache.store) == 2
+
+    def test_single_chart_loads_only_its_table(self, db, engine, readings):
+        statements = []
+        event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+        chart = HealthVisualizationService(db, cache=DictCache()).generate_export_data(1, "symptom_distribution")
+
+        assert chart["total_symptoms"] == 3
+        assert len(statements) == 1 and "symptom_logs" in statements[0]
@@ -0,0 +1,182 @@
+"""
+Test histogram-based metrics core.
+
+This module tests latency histograms, time-sliced rotation and the
+PerformanceMonitor summaries built on them.
+"""
+
+import pytest
+import random
+import threading
+
+from app.utils.metrics_core import LatencyHistogram, WindowedHistogramStore, bucket_index
+from app.utils.performance_monitoring import PerformanceMonitor
+
+
+class FakeClock:
+    """Manually advanced clock."""
+
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestLatencyHistogram:
+    """Test latency histogram accuracy."""
+
+    def test_percentiles_within_bucket_error(self):
+        """Percentiles stay within the bucket relative error."""
+        rng = random.Random(42)
+        values = [rng.lognormvariate(4, 1) for _ in range(20000)]
+        histogram = LatencyHistogram()
+        for value in values:
+            histogram.record(value)
+
+        ordered = sorted(values)
+        for percentile in (50, 95, 99):
+            exact = ordered[int(len(ordered) * percentile / 100) - 1]
+            assert histogram.percentile(percentile) == pytest.approx(exact, rel=0.05)
+
+        assert histogram.count == len(values)
+        assert histogram.min == min(values)
+        assert histogram.max == max(values)
+
+    def test_merge(self):
+        """Merged histograms equal one histogram of all values."""
+        left, right, combined = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+        for value in range(1, 101):
+            (left if value % 2 else right).record(value)
+            combined.record(value)
+
+        left.merge(right)
+
+        assert left.counts == combined.counts
+        assert left.percentile(95) == combined.percentile(95)
+
+    def test_count_above(self):
+        """Values above a threshold are counted by bucket."""
+        histogram = LatencyHistogram()
+        for value in (10, 20, 1500, 3000):
+            histogram.record(value)
+
+        assert histogram.count_above(1000) == 2
+
+    def test_bucket_index_monotonic(self):
+        """Larger values never map to smaller buckets."""
+        indexes = [bucket_index(value / 10) for value in range(1, 100000, 37)]
+        assert indexes == sorted(indexes)
+
+
+class TestWindowedHistogramStore:
+    """Test time-sliced rotation."""
+
+    def test_window_excludes_old_slices(self):
+        """Only slices inside the window are summarized."""
+        clock = FakeClock()
+        store = WindowedHistogramStore(slice_seconds=60, num_slices=10, clock=clock)
+
+        store.record("a", 100)
+        clock.now += 300
+        store.record("a", 200)
+
+        assert store.snapshot(60)["a"].count == 1
+        assert store.snapshot(600)["a"].count == 2
+
+    def test_slices_rotate_out(self):
+        """Values older than the retention are dropped."""
+        clock = FakeClock()
+        store = WindowedHistogramStore(slice_seconds=60, num_slices=5, clock=clock)
+
+        store.record("a", 100)
+        clock.now += 60 * 5
+        store.record("a", 200)
+
+        assert store.snapshot()["a"].count == 1
+
+    def test_concurrent_recording(self):
+        """Recording from many threads loses no samples."""
+        store = WindowedHistogramStore()
+
+        def worker():
+            for _ in range(5000):
+                store.record(("GET", "/x"), 12.5)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert store.snapshot()[("GET", "/x")].count == 40000
+
+    def test_exited_thread_shards_reclaimed(self):
+        """Shards of finished threads are folded away without losing samples in the window."""
+        clock = FakeClock()
+        store = WindowedHistogramStore(slice_seconds=60, num_slices=5, clock=clock)
+
+        def worker():
+            store.record("a", 100)
+
+        for _ in range(3):
+            thread = threading.Thread(target=worker)
+            thread.start()
+            thread.join()
+            clock.now += 60
+        store.record("a", 200)
+
+        assert store.snapshot()["a"].count == 4
+        assert len(store._shards) == 1
+        clock.now += 60 * 3
+        assert store.snapshot()["a"].count == 2
+
+
+class TestPerformanceMonitorSummaries:
+    """Test PerformanceMonitor summaries."""
+
+    @pytest.fixture
+    def monitor(self, monkeypatch):
+        """Create a monitor without the background system sampler."""
+        monkeypatch.setattr(PerformanceMonitor, "_start_system_monitoring", lambda self: None)
+        return PerformanceMonitor()
+
+    def test_api_summary(self, monitor):
+        """API summary reports percentiles, error rate and per-endpoint stats."""
+        for i in range(100):
+            monitor.record_api_metric("/chat/message", "POST", float(i + 1), 200)
+        monitor.record_api_metric("/chat/message", "POST", 2000.0, 500)
+
+        summary = monitor.get_api_performance_summary(hours=1)
+
+        assert summary["total_requests"] == 101
+        assert summary["error_rate"] == pytest.approx(1 / 101)
+        assert summary["slow_requests"] == 1
+        assert summary["p50_response_time"] == pytest.approx(51, rel=0.05)
+        assert summary["max_response_time"] == 2000.0
+        assert summary["endpoint_performance"]["/chat/message"]["count"] == 101
+        assert summary["status_class_counts"] == {"2xx": 100, "5xx": 1}
+
+    def test_db_summary(self, monitor):
+        """Database summary groups by table."""
+        monitor.record_db_metric("SELECT 1", 5.0, table_name="users")
+        monitor.record_db_metric("SELECT 2", 700.0)
+
+        summary = monitor.get_db_performance_summary(hours=1)
+
+        assert summary["total_queries"] == 2
+        assert summary["slow_queries"] == 1
+        assert list(summary["table_performance"]) == ["users"]
+
+    def test_empty_summaries(self, monitor):
+        """Summaries without data keep the existing message format."""
+        assert monitor.get_api_performance_summary() == {"message": "No API metrics available"}
+        assert monitor.get_db_performance_summary() == {"message": "No database metrics available"}
+
+    def test_raw_sample_buffer_bounded(self, monitor):
+        """Raw samples stay bounded while histograms keep every request."""
+        for _ in range(monitor.max_metrics + 50):
+            monitor.record_api_metric("/x", "GET", 1.0, 200)
+
+        assert len(monitor.api_metrics) == monitor.max_metrics
+        assert monitor.get_api_performance_summary()["total_requests"] == monitor.max_metrics + 50
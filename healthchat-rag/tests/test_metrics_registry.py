@@ -0,0 +1,104 @@
+"""
+Test Prometheus/OpenMetrics metrics registry.
+
+This module tests metric recording, scrape-time sources and text
+exposition in both Prometheus and OpenMetrics formats.
+"""
+
+import pytest
+from prometheus_client import CollectorRegistry
+from prometheus_client.core import GaugeMetricFamily
+
+from app.utils.metrics_registry import MetricsRegistry
+
+
+class TestMetricsRegistry:
+    """Test the unified metrics registry."""
+
+    @pytest.fixture
+    def metrics(self):
+        """Create a registry isolated from the global one."""
+        return MetricsRegistry(registry=CollectorRegistry())
+
+    def test_http_metrics_exposed(self, metrics):
+        """HTTP requests appear as a counter and a latency histogram."""
+        metrics.observe_http_request("POST", "/chat/message", 200, 120.0)
+        metrics.observe_http_request("POST", "/chat/message", 500, 2500.0)
+
+        payload, content_type = metrics.generate_latest()
+        text = payload.decode()
+
+        assert content_type.startswith("text/plain")
+        assert 'http_requests_total{endpoint="/chat/message",method="POST",status="200"} 1.0' in text
+        assert 'http_request_duration_seconds_count{endpoint="/chat/message",method="POST"} 2.0' in text
+        assert 'http_request_duration_seconds_bucket{endpoint="/chat/message",le="0.25",method="POST"} 1.0' in text
+
+    def test_openmetrics_negotiation(self, metrics):
+        """Scrapers asking for OpenMetrics get the OpenMetrics format."""
+        metrics.observe_db_query("users", 5.0)
+
+        payload, content_type = metrics.generate_latest("application/openmetrics-text; version=1.0.0")
+
+        assert content_type.startswith("application/openmetrics-text")
+        assert payload.decode().rstrip().endswith("# EOF")
+
+    def test_operation_and_celery_metrics(self, metrics):
+        """Custom operations and Celery tasks are recorded."""
+        metrics.observe_operation("embed_query", 40.0)
+        metrics.observe_operation("embed_query_error", 10.0, error=True)
+        metrics.observe_celery_task("app.tasks.sync", "SUCCESS", 3.2)
+
+        text = metrics.generate_latest()[0].decode()
+
+        assert 'healthmate_operation_duration_seconds_count{operation="embed_query"} 1.0' in text
+        assert 'healthmate_operation_errors_total{operation="embed_query_error"} 1.0' in text
+        assert 'healthmate_celery_tasks_total{state="SUCCESS",task="app.tasks.sync"} 1.0' in text
+
+    def test_scrape_time_sources(self, metrics):
+        """Registered sources are evaluated on every scrape."""
+        calls = []
+
+        def source():
+            calls.append(1)
+            family = GaugeMetricFamily("healthmate_test_gauge", "Test gauge")
+            family.add_metric([], len(calls))
+            return [family]
+
+        metrics.register_source("test", source)
+
+        assert "healthmate_test_gauge 1.0" in metrics.generate_latest()[0].decode()
+        assert "healthmate_test_gauge 2.0" in metrics.generate_latest()[0].decode()
+
+    def test_failing_source_does_not_break_scrape(self, metrics):
+        """A failing source is skipped."""
+        def broken():
+            raise RuntimeError("boom")
+
+        metrics.register_source("broken", broken)
+        metrics.observe_http_request("GET", "/", 200, 1.0)
+
+        assert "http_requests_total" in metrics.generate_latest()[0].decode()
+
+
+class TestPerformanceMetricsMiddleware:
+    """Test request timing middleware."""
+
+    def test_requests_recorded_by_route_template(self):
+        """Requests are labelled with the route template, not the raw path."""
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from app.utils.performance_monitoring import PerformanceMetricsMiddleware, performance_monitor
+
+        app = FastAPI()
+        app.add_middleware(PerformanceMetricsMiddleware)
+
+        @app.get("/items/{item_id}")
+        async def get_item(item_id: int):
+            return {"item_id": item_id}
+
+        client = TestClient(app)
+        client.get("/items/1")
+        client.get("/items/2")
+
+        histograms = performance_monitor.api_histograms.snapshot(3600)
+        assert histograms[("/items/{item_id}", "GET", "2xx")].count == 2
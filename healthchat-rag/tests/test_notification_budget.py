@@ -0,0 +1,167 @@
+"""
+Test notification budgets.
+
+This module checks the daily and sliding-window trigger counters, that
+many candidates are checked in one store round trip, that eligibility
+checks in SmartNotificationLogic no longer touch the database, and that
+reconciliation rebuilds the counters from sent notifications.
+"""
+
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.base import Base
+from app.config import settings
+from app.models.notification_models import (
+    Notification, NotificationChannel, NotificationStatus, NotificationType, UserNotificationPreference
+)
+from app.models.user import User
+from app.services.notification_budget import (
+    BudgetCheck, InMemoryBudgetStore, NotificationBudget
+)
+from app.services.smart_notification_logic import NotificationUrgency, SmartNotificationLogic
+
+NOW = datetime(2024, 6, 1, 12)
+HEART_RATE = dict(trigger_type="high_heart_rate", trigger_limit=2, trigger_window=timedelta(minutes=30))
+
+
+@pytest.fixture
+def budget():
+    return NotificationBudget(InMemoryBudgetStore(timedelta(hours=48)))
+
+
+class TestNotificationBudget:
+    """Test budget counters."""
+
+    def test_daily_limit_counts_today(self, budget):
+        budget.record_sent(1, 1, sent_at=NOW - timedelta(days=1))
+        for notification_id in (2, 3, 4):
+            budget.record_sent(1, notification_id, sent_at=NOW - timedelta(hours=notification_id))
+        budget.record_sent(1, 4, sent_at=NOW - timedelta(hours=4))  # Recorded twice, counted once
+
+        at_limit = budget.check(BudgetCheck(1, daily_limit=3), now=NOW)
+        under_limit = budget.check(BudgetCheck(1, daily_limit=4), now=NOW)
+
+        assert at_limit.daily_sent == 3 and at_limit.daily_exceeded and not at_limit.allowed
+        assert under_limit.allowed
+        assert budget.check(BudgetCheck(2, daily_limit=1), now=NOW).daily_sent == 0
+
+    def test_trigger_window_slides(self, budget):
+        budget.record_sent(1, 1, "high_heart_rate", NOW - timedelta(minutes=40))
+        budget.record_sent(1, 2, "high_heart_rate", NOW - timedelta(minutes=10))
+        budget.record_sent(1, 3, "medication_missed", NOW - timedelta(minutes=5))
+
+        status = budget.check(BudgetCheck(1, **HEART_RATE), now=NOW)
+        budget.record_sent(1, 4, "high_heart_rate", NOW)
+        exceeded = budget.check(BudgetCheck(1, **HEART_RATE), now=NOW)
+        later = budget.check(BudgetCheck(1, **HEART_RATE), now=NOW + timedelta(minutes=25))
+
+        assert status.trigger_sent == 1 and status.allowed
+        assert exceeded.trigger_sent == 2 and exceeded.trigger_exceeded
+        assert later.trigger_sent == 1 and later.allowed
+
+    def test_check_many_in_one_round_trip(self, budget):
+        for user_id in range(1, 51):
+            for notification_id in range(user_id % 3):
+                budget.record_sent(user_id, user_id * 10 + notification_id, "high_heart_rate", NOW)
+        budget.store.count = Mock(wraps=budget.store.count)
+
+        statuses = budget.check_many(
+            [BudgetCheck(user_id, daily_limit=2, **HEART_RATE) for user_id in range(1, 51)], now=NOW
+        )
+
+        assert budget.store.count.call_count == 1
+        assert [status.allowed for status in statuses[:6]] == [True, False, True, True, False, True]
+
+    def test_store_failure_allows(self, budget):
+        budget.store.count = Mock(side_effect=ConnectionError("store down"))
+
+        statuses = budget.check_many([BudgetCheck(1, daily_limit=0), BudgetCheck(2, daily_limit=0)], now=NOW)
+
+        assert all(status.allowed for status in statuses)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine, tables=[Notification.__table__])
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def notification(user_id, created_at, status=NotificationStatus.SENT, trigger_type=None):
+    return Notification(
+        user_id=user_id, type=NotificationType.HEALTH_ALERT, title="Alert", message="Check your readings",
+        channel=NotificationChannel.EMAIL, status=status, created_at=created_at,
+        template_data={"trigger_type": trigger_type} if trigger_type else None
+    )
+
+
+class TestReconcile:
+    """Test rebuilding the counters from the notifications table."""
+
+    def test_reconcile_rebuilds_counters(self, budget, db):
+        db.add_all([
+            notification(1, NOW - timedelta(hours=1)),
+            notification(1, NOW - timedelta(minutes=5), trigger_type="high_heart_rate"),
+            notification(1, NOW - timedelta(minutes=6), NotificationStatus.DELIVERED, "high_heart_rate"),
+            notification(1, NOW - timedelta(minutes=7), NotificationStatus.FAILED, "high_heart_rate"),
+            notification(2, NOW - timedelta(hours=2), NotificationStatus.PENDING),
+            notification(3, NOW - timedelta(hours=3)),
+        ])
+        db.commit()
+        budget.record_sent(2, 900, sent_at=NOW - timedelta(hours=1))  # No longer sent in the table
+        budget.record_sent(3, 901, sent_at=NOW + timedelta(seconds=1))  # Recorded after the rebuild started
+
+        reconciled = budget.reconcile(db, now=NOW, page_size=1)
+        statuses = budget.check_many(
+            [BudgetCheck(user_id, daily_limit=10, **HEART_RATE) for user_id in (1, 2, 3)],
+            now=NOW + timedelta(seconds=1)
+        )
+
+        assert reconciled == 3
+        assert [(s.daily_sent, s.trigger_sent) for s in statuses] == [(3, 2), (0, 0), (2, 0)]
+        assert budget.store.tracked_users() == {1, 3}
+
+
+class TestSmartNotificationBudgets:
+    """Test eligibility checks against budgets."""
+
+    @pytest.fixture
+    def user(self):
+        user = Mock(spec=User)
+        user.id = 1
+        user.notification_preferences = Mock(spec=UserNotificationPreference)
+        user.notification_preferences.max_daily_notifications = 3
+        user.notification_preferences.quiet_hours_start = None
+        user.notification_preferences.quiet_hours_end = None
+        user.notification_preferences.preferences = {}
+        return user
+
+    def test_limits_without_database(self, budget, user):
+        logic = SmartNotificationLogic(settings, budget=budget)
+        db = Mock()
+        context = {"trigger_type": "high_blood_glucose"}
+
+        def should_send():
+            return logic.should_send_notification(
+                user, NotificationType.HEALTH_ALERT, NotificationUrgency.HIGH, context, db
+            )
+
+        first = should_send()
+        budget.record_sent(1, 1, "high_blood_glucose")
+        budget.record_sent(1, 2, "high_blood_glucose")
+        frequency = should_send()
+        budget.record_sent(1, 3)
+        daily = should_send()
+
+        assert first == (True, "Notification allowed")
+        assert frequency == (False, "Frequency limit exceeded for trigger high_blood_glucose")
+        assert daily == (False, "Daily notification limit exceeded")
+        db.query.assert_not_called()
@@ -0,0 +1,141 @@
+"""
+Test fanned-out notification sweeps.
+
+This module checks that user IDs are split into keyset ranges at chunk
+boundaries, that chunks are dispatched as ranges rather than ID lists,
+that per-user failures are counted without stopping the chunk while the
+semaphore caps concurrency, and that chunk results are summed.
+"""
+
+import asyncio
+import pytest
+from unittest.mock import Mock, patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.base import Base
+from app.models.user import User
+from app.tasks import enhanced_notification_tasks as tasks
+from app.tasks.enhanced_notification_tasks import (
+    active_users, fan_out_user_sweep, summarize_user_sweep, sweep_users, user_id_ranges
+)
+
+# IDs 1-15 with gaps; 4 and 9 are inactive
+USER_IDS = [1, 2, 3, 4, 6, 7, 9, 10, 12, 15]
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine, tables=[User.__table__])
+    session = sessionmaker(bind=engine)()
+    session.execute(User.__table__.insert(), [
+        {"id": user_id, "email": f"user{user_id}@example.com", "is_active": user_id not in (4, 9)}
+        for user_id in USER_IDS
+    ])
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+class TestUserIdRanges:
+    """Test keyset ranges over user IDs."""
+
+    def test_ranges_split_at_chunk_boundaries(self, db):
+        ranges = list(user_id_ranges(active_users(db), 3))
+
+        assert ranges == [(0, 3, 3), (3, 10, 3), (10, 15, 2)]
+
+    def test_exact_multiple_has_no_empty_range(self, db):
+        ranges = list(user_id_ranges(active_users(db), 4))
+
+        assert ranges == [(0, 6, 4), (6, 15, 4)]
+
+    def test_no_users(self, db):
+        assert list(user_id_ranges(active_users(db).filter(User.id > 100), 3)) == []
+
+    def test_ranges_cover_every_user_once(self, db):
+        covered = [
+            user_id
+            for after_id, through_id, _ in user_id_ranges(active_users(db), 2)
+            for (user_id,) in active_users(db).filter(User.id > after_id, User.id <= through_id)
+        ]
+
+        assert sorted(covered) == [1, 2, 3, 6, 7, 10, 12, 15]
+
+
+class TestFanOut:
+    """Test dispatching a sweep as a chord of ranges."""
+
+    def test_dispatches_ranges(self, db):
+        chord = Mock()
+        chord.return_value.return_value.id = "summary-1"
+        settings = Mock(notification_sweep_chunk_size=5)
+
+        with patch.object(tasks, "chord", chord), patch.object(tasks, "Settings", return_value=settings):
+            result = fan_out_user_sweep("emergency_conditions", db)
+
+        header = chord.call_args.args[0]
+        assert [signature.args for signature in header] == [
+            ("emergency_conditions", 0, 7), ("emergency_conditions", 7, 15)
+        ]
+        assert result["total_users"] == 8 and result["chunks"] == 2
+        assert result["summary_task_id"] == "summary-1" and result["status"] == "dispatched"
+
+    def test_nothing_to_dispatch(self, db):
+        db.query(User).update({"is_active": False})
+        chord = Mock()
+
+        with patch.object(tasks, "chord", chord):
+            result = fan_out_user_sweep("emergency_conditions", db)
+
+        chord.assert_not_called()
+        assert result["status"] == "completed" and result["total_users"] == 0
+
+
+class TestSweepUsers:
+    """Test running a sweep for one chunk of users."""
+
+    @pytest.mark.asyncio
+    async def test_failures_counted_under_semaphore(self):
+        running, peak = 0, 0
+
+        async def check_emergency_conditions(user_id, db):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            if user_id % 3 == 0:
+                raise RuntimeError("service unavailable")
+            return [{"user_id": user_id}] * (user_id % 2)
+
+        service = Mock(check_emergency_conditions=check_emergency_conditions)
+        sessions = []
+        with patch.object(tasks, "EnhancedNotificationService", return_value=service), \
+                patch.object(tasks, "SessionLocal", side_effect=lambda: sessions.append(Mock()) or sessions[-1]):
+            result = await sweep_users("emergency_conditions", list(range(1, 11)), concurrency=2)
+
+        assert result == {"users": 10, "successful_users": 7, "failed_users": 3, "items": 3}
+        assert peak == 2
+        assert len(sessions) == 10 and all(session.close.called for session in sessions)
+
+
+class TestSummarizeUserSweep:
+    """Test aggregating chunk results."""
+
+    def test_sums_chunk_results(self):
+        results = [
+            {"users": 500, "successful_users": 498, "failed_users": 2, "items": 40},
+            {"users": 120, "successful_users": 120, "failed_users": 0, "items": 7},
+        ]
+
+        summary = summarize_user_sweep(results, "medication_reminders")
+
+        assert summary["chunks"] == 2
+        assert summary["total_users"] == 620
+        assert summary["successful_users"] == 618 and summary["failed_users"] == 2
+        assert summary["total_reminders"] == 47
+        assert summary["status"] == "completed"
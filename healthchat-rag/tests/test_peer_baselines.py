@@ -0,0 +1,138 @@
+"""
+Test peer group baselines.
+
+This module checks that nightly-built baselines reproduce each peer
+group's distribution of per-user means, that small groups fall back to
+broader ones, and that comparative analytics reads the shared store,
+comparing blood pressure per component.
+"""
+
+import pytest
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.base import Base
+from app.models.user import User
+from app.models.enhanced_health_models import (
+    ActivityLevel, Gender, HealthMetricRollup, HealthRollupBatch, HealthScoreInvalidation,
+    PeerBaseline, UserHealthProfile
+)
+from app.services.enhanced.health_rollups import HealthRollupStore
+from app.services.enhanced.health_timeseries import HealthSeriesSet
+from app.services.enhanced.peer_baselines import (
+    ANY, PeerBaselineStore, PeerGroup, age_band, get_peer_baseline_store, reset_peer_baseline_store
+)
+
+
+@pytest.fixture
+def db():
+    """In-memory database with users, profiles, rollups and baselines."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    tables = [table.__table__ for table in (
+        User, UserHealthProfile, HealthMetricRollup, HealthRollupBatch, HealthScoreInvalidation, PeerBaseline
+    )]
+    Base.metadata.create_all(bind=engine, tables=tables)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+    reset_peer_baseline_store()
+
+
+@pytest.fixture
+def population(db):
+    """40 users in their thirties and 3 in their sixties, with a week of daily heart rate."""
+    rng = np.random.default_rng(8)
+    store = HealthRollupStore(db)
+    start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=7)
+    means = {}
+    for user_id in range(1, 44):
+        age = 35 if user_id <= 40 else 65
+        gender = Gender.FEMALE if user_id % 2 else Gender.MALE
+        db.add(User(id=user_id, email=f"user{user_id}@example.com", age=age))
+        db.add(UserHealthProfile(user_id=user_id, gender=gender, activity_level=ActivityLevel.MODERATELY_ACTIVE))
+        values = rng.normal(60 + user_id / 2, 3, 7)
+        store.ingest_records(user_id, [
+            ("heart_rate", start + timedelta(days=day, hours=9), float(value), "bpm") for day, value in enumerate(values)
+        ], commit=False)
+        means[user_id] = float(values.mean())
+    db.commit()
+    return means
+
+
+class TestPeerBaselines:
+    """Test building and looking up baselines."""
+
+    def test_age_bands(self):
+        assert [age_band(age) for age in (None, 12, 18, 29, 30, 69, 70, 95)] == [
+            ANY, "<18", "18-29", "18-29", "30-39", "60-69", "70+", "70+"
+        ]
+
+    def test_build_matches_group_distribution(self, db, population):
+        written = PeerBaselineStore.build(db, days=30)
+        store = PeerBaselineStore.load(db, min_users=10)
+
+        # Four exact groups, then by age and gender, by age, and everyone
+        assert written == 4 + 4 + 2 + 1
+        women = PeerGroup("30-39", "female", "moderately_active")
+        baseline = store.lookup(women, "heart_rate")
+        assert baseline.group == women
+        female_means = np.array([mean for user_id, mean in population.items() if user_id <= 40 and user_id % 2])
+        assert baseline.user_count == 20
+        assert baseline.mean == pytest.approx(female_means.mean())
+        for value in np.percentile(female_means, [10, 50, 90]):
+            assert baseline.percentile(value) == pytest.approx((female_means <= value).mean() * 100, abs=5)
+
+    def test_small_groups_fall_back(self, db, population):
+        PeerBaselineStore.build(db, days=30)
+        store = PeerBaselineStore.load(db, min_users=10)
+
+        baseline = store.lookup(PeerGroup("60-69", "female", "moderately_active"), "heart_rate")
+
+        assert baseline.group == PeerGroup(ANY, ANY, ANY)
+        assert baseline.user_count == 43
+        assert store.lookup(PeerGroup("60-69", "male", ANY), "steps") is None
+
+    @pytest.mark.asyncio
+    async def test_comparative_analysis_uses_shared_store(self, db, population, monkeypatch):
+        from app.services.enhanced.health_analytics import HealthAnalyticsEngine
+        from app.services.enhanced import peer_baselines
+        PeerBaselineStore.build(db, days=30)
+        monkeypatch.setattr(peer_baselines.settings, "peer_baseline_min_users", 10)
+
+        engine = HealthAnalyticsEngine(db)
+        series_set = HealthSeriesSet.from_records(3, [("heart_rate", datetime.utcnow(), 200.0, "bpm")])
+        comparisons = await engine._perform_comparative_analysis(3, series_set)
+
+        assert len(comparisons) == 1
+        assert comparisons[0].peer_group == "30-39/female/moderately_active"
+        assert comparisons[0].user_percentile == 100.0
+        assert get_peer_baseline_store(db) is get_peer_baseline_store(db)
+
+    @pytest.mark.asyncio
+    async def test_blood_pressure_compared_per_component(self, db, population, monkeypatch):
+        from app.services.enhanced.health_analytics import HealthAnalyticsEngine
+        from app.services.enhanced import peer_baselines
+        store = HealthRollupStore(db)
+        yesterday = datetime.utcnow() - timedelta(days=1)
+        for user_id in range(1, 41):
+            reading = {"systolic": 100.0 + user_id, "diastolic": 60.0 + user_id / 2}
+            store.ingest_records(user_id, [("blood_pressure", yesterday, reading, "mmHg")], commit=False)
+        db.commit()
+        PeerBaselineStore.build(db, days=30)
+        monkeypatch.setattr(peer_baselines.settings, "peer_baseline_min_users", 10)
+
+        engine = HealthAnalyticsEngine(db)
+        series_set = HealthSeriesSet.from_records(3, [
+            ("blood_pressure", datetime.utcnow(), {"systolic": 200.0, "diastolic": 40.0}, "mmHg")
+        ])
+        comparisons = await engine._perform_comparative_analysis(3, series_set)
+
+        percentiles = {c.comparison_type: c.user_percentile for c in comparisons}
+        assert percentiles == {
+            "blood_pressure_systolic_peer_comparison": 100.0,
+            "blood_pressure_diastolic_peer_comparison": 0.0,
+        }
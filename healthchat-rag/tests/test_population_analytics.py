@@ -0,0 +1,119 @@
+"""
+Test population health statistics.
+
+This module checks that both the rollup and the streamed-readings paths
+reproduce the statistics numpy computes over the full table, and that
+rollups are only used once the backfill from stored readings completes.
+"""
+
+import pytest
+import json
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.base import Base
+from app.models.health_data import HealthData
+from app.models.enhanced_health_models import EtlWatermark, HealthMetricRollup, HealthRollupBatch
+from app.services.enhanced.health_rollups import HealthRollupStore, backfill_rollups
+from app.services.enhanced.population_analytics import PopulationSource, PopulationStatisticsEngine
+
+
+@pytest.fixture
+def db():
+    """In-memory database with readings and rollup tables."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    tables = [HealthData.__table__, HealthMetricRollup.__table__, HealthRollupBatch.__table__, EtlWatermark.__table__]
+    Base.metadata.create_all(bind=engine, tables=tables)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def population(db):
+    """Readings for three users across two months, stored raw and as rollups."""
+    rng = np.random.default_rng(11)
+    start = datetime(2024, 1, 20)
+    values = {"heart_rate": [], "blood_pressure_systolic": []}
+    store = HealthRollupStore(db)
+
+    for user_id in (1, 2, 3):
+        records = []
+        for i in range(400):
+            timestamp = start + timedelta(hours=3 * i)
+            heart_rate = float(rng.normal(70 + user_id, 8))
+            systolic = float(rng.normal(120, 12))
+            records.append(("heart_rate", timestamp, heart_rate, "bpm"))
+            records.append(("blood_pressure", timestamp, {"systolic": systolic, "diastolic": 80.0}, "mmHg"))
+            values["heart_rate"].append(heart_rate)
+            values["blood_pressure_systolic"].append(systolic)
+        db.add_all([
+            HealthData(user_id=user_id, data_type=data_type, value=json.dumps(value), unit=unit, timestamp=timestamp)
+            for data_type, timestamp, value, unit in records
+        ])
+        db.commit()
+        store.ingest_records(user_id, records)
+    
+    backfill_rollups(db)
+    return {key: np.array(series) for key, series in values.items()}
+
+
+class TestPopulationStatisticsEngine:
+    """Test both computation paths."""
+
+    @pytest.mark.parametrize("source", [PopulationSource.ROLLUPS, PopulationSource.READINGS])
+    def test_matches_numpy(self, db, population, source):
+        result = PopulationStatisticsEngine(db, chunk_size=97).compute(source)
+
+        assert result["source"] == source.value
+        assert result["total_users"] == 3
+        assert result["total_data_points"] == 2400
+        for metric, values in population.items():
+            stats = result["population_stats"][metric]
+            assert stats["count"] == len(values)
+            assert stats["mean"] == pytest.approx(np.mean(values))
+            assert stats["std"] == pytest.approx(np.std(values))
+            assert stats["min"] == pytest.approx(np.min(values))
+            assert stats["max"] == pytest.approx(np.max(values))
+            for p in ("25", "50", "75", "90", "95"):
+                assert stats["percentiles"][p] == pytest.approx(np.percentile(values, int(p)), abs=1.0)
+        assert result["population_stats"]["blood_pressure_diastolic"]["mean"] == pytest.approx(80.0)
+
+    def test_falls_back_to_readings_without_rollups(self, db):
+        db.add(HealthData(user_id=1, data_type="steps", value="8000", timestamp=datetime(2024, 1, 1)))
+        db.commit()
+
+        result = PopulationStatisticsEngine(db).compute()
+
+        assert result["source"] == PopulationSource.READINGS.value
+        assert result["population_stats"]["steps"]["median"] == 8000
+        assert result["population_stats"]["steps"]["std"] == 0
+
+    def test_readings_until_backfill_completes(self, db):
+        values = {1: [61.0, 75.0, 68.0], 2: [80.0, 72.0], 3: [90.0]}
+        for user_id, series in values.items():
+            db.add_all([
+                HealthData(user_id=user_id, data_type="heart_rate", value=str(value), timestamp=datetime(2024, 1, 1) + timedelta(days=20 * i))
+                for i, value in enumerate(series)
+            ])
+        db.commit()
+        engine = PopulationStatisticsEngine(db)
+
+        assert engine.compute()["source"] == PopulationSource.READINGS.value
+
+        progress = backfill_rollups(db, max_users=2)
+        assert progress == {"users": 2, "last_user_id": 2, "complete": False}
+        assert engine.compute()["source"] == PopulationSource.READINGS.value
+
+        progress = backfill_rollups(db, max_users=2)
+        assert progress == {"users": 1, "last_user_id": 3, "complete": True}
+        result = engine.compute()
+        everything = [value for series in values.values() for value in series]
+        assert result["source"] == PopulationSource.ROLLUPS.value
+        assert result["population_stats"]["heart_rate"]["count"] == 6
+        assert result["population_stats"]["heart_rate"]["mean"] == pytest.approx(np.mean(everything))
+        assert result["population_stats"]["heart_rate"]["max"] == 90.0
@@ -0,0 +1,123 @@
+"""
+Test concurrent provider fetches.
+
+This module checks the shared token bucket, date range windowing, that
+data types and windows are fetched concurrently, and that providers run
+in parallel over pooled sessions.
+"""
+
+import asyncio
+import time
+import pytest
+from datetime import datetime, timedelta
+
+from app.services.enhanced.data_integration import (
+    DataIntegrationService, DataSourceConfig, DataSourceType, DataType, FitbitDataProvider, TokenBucket,
+    close_client_sessions, get_client_session, get_token_bucket, split_date_range
+)
+
+
+class SlowFitbit(FitbitDataProvider):
+    """Fitbit provider answering every request after a fixed latency."""
+
+    def __init__(self, latency=0.1, base_url="https://fitbit.example.com"):
+        super().__init__(DataSourceConfig(DataSourceType.FITBIT, "token", "refresh", base_url,
+                                          rate_limit_per_minute=6000))
+        self.latency = latency
+        self.urls = []
+
+    async def _make_request(self, method, url, **kwargs):
+        await self._rate_limit_check()
+        self.urls.append(url)
+        await asyncio.sleep(self.latency)
+        *_, start, end = url.removesuffix(".json").split("/")
+        start, end = datetime.strptime(start, "%Y-%m-%d"), datetime.strptime(end, "%Y-%m-%d")
+        days = [(start + timedelta(days=i)).strftime("%Y-%m-%d") for i in range((end - start).days + 1)]
+        return {"activities-steps": [{"dateTime": day, "value": "1000"} for day in days]}
+
+
+class TestTokenBucket:
+    """Test the shared request budget."""
+
+    def test_burst_then_paced(self):
+        bucket = TokenBucket(rate_per_minute=60, burst=3)
+
+        waits = [bucket.reserve() for _ in range(5)]
+
+        assert waits[:3] == [0.0, 0.0, 0.0]
+        assert waits[3] == pytest.approx(1.0, abs=0.05)
+        assert waits[4] == pytest.approx(2.0, abs=0.05)
+
+    def test_shared_per_provider(self):
+        config = DataSourceConfig(DataSourceType.FITBIT, "a", "b", "https://shared.example.com")
+
+        assert get_token_bucket(config) is SlowFitbit(base_url="https://shared.example.com").rate_limiter
+
+
+class TestDateWindows:
+    """Test date range splitting."""
+
+    def test_windows_cover_range_without_overlap(self):
+        start = datetime(2024, 1, 1)
+        windows = split_date_range(start, start + timedelta(days=89), 30)
+
+        assert len(windows) == 3
+        assert windows[0] == (start, start + timedelta(days=29))
+        assert windows[1][0] == start + timedelta(days=30)
+        assert windows[-1][1] == start + timedelta(days=89)
+        assert split_date_range(start, start, 30) == [(start, start)]
+
+
+class TestConcurrentFetch:
+    """Test request fan-out."""
+
+    @pytest.mark.asyncio
+    async def test_windows_fetched_in_parallel(self):
+        provider = SlowFitbit(latency=0.2)
+        start = datetime(2024, 1, 1)
+
+        started = time.perf_counter()
+        async with provider as p:
+            points = await p.fetch_health_data(1, [DataType.STEPS], start, start + timedelta(days=89))
+        elapsed = time.perf_counter() - started
+
+        assert len(provider.urls) == 3
+        assert len(points) == 90
+        assert len({point.timestamp for point in points}) == 90
+        assert elapsed < 0.5
+        await close_client_sessions()
+
+    @pytest.mark.asyncio
+    async def test_providers_fetched_in_parallel(self):
+        class SlowApple(SlowFitbit):
+            def __init__(self):
+                super().__init__(latency=0.3, base_url="https://apple.example.com")
+                self.config.source_type = DataSourceType.APPLE_HEALTH
+
+        service = DataIntegrationService()
+        service.register_provider(SlowFitbit(latency=0.3))
+        service.register_provider(SlowApple())
+        start = datetime(2024, 1, 1)
+
+        started = time.perf_counter()
+        points = await service.fetch_user_health_data(
+            1, [DataType.STEPS], [DataSourceType.FITBIT, DataSourceType.APPLE_HEALTH], start, start + timedelta(days=9)
+        )
+        elapsed = time.perf_counter() - started
+
+        assert len(points) == 20
+        assert elapsed < 0.55
+        await close_client_sessions()
+
+    @pytest.mark.asyncio
+    async def test_sessions_pooled_per_provider(self):
+        first, second = SlowFitbit(), SlowFitbit()
+
+        async with first as a, second as b:
+            assert a.session is b.session
+        assert not a.session.closed
+
+        await close_client_sessions()
+        assert a.session.closed
+        assert get_client_session(first.config) is not a.session
+        await close_client_sessions()
@@ -0,0 +1,136 @@
+"""
+Test the streaming stage pipeline.
+
+This module checks that stages overlap and respect their concurrency,
+that bounded queues keep the source from running ahead, that failed
+chunks are counted without stopping the run, and that the health data
+processor streams points through to real storage.
+"""
+
+import asyncio
+import time
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.base import Base
+from app.models.health_data import HealthData
+from app.services.enhanced.data_integration import DataSourceType, DataType, HealthDataPoint
+from app.services.enhanced.health_data_processing import HealthDataProcessor, ProcessingStage
+from app.services.enhanced.stream_pipeline import Stage, StreamingPipeline, chunked
+
+
+def sleeper(seconds, keep=None):
+    async def stage(chunk):
+        await asyncio.sleep(seconds)
+        return {'data': [item for item in chunk if keep is None or keep(item)]}
+    return stage
+
+
+class TestStreamingPipeline:
+    """Test chunk flow between stages."""
+
+    @pytest.mark.asyncio
+    async def test_stages_overlap(self):
+        pipeline = StreamingPipeline([Stage("a", sleeper(0.05)), Stage("b", sleeper(0.05))], chunk_size=10)
+
+        started = time.perf_counter()
+        run = await pipeline.run(range(100))
+        elapsed = time.perf_counter() - started
+
+        assert run.items_read == 100 and run.items_out == 100
+        assert run.stage("a").chunks == 10
+        assert elapsed < 0.8  # Sequential whole-list stages would take 1.0s
+
+    @pytest.mark.asyncio
+    async def test_stage_concurrency(self):
+        pipeline = StreamingPipeline([Stage("slow", sleeper(0.1), concurrency=5)], chunk_size=1, queue_size=5)
+
+        started = time.perf_counter()
+        run = await pipeline.run(range(10))
+
+        assert run.items_out == 10
+        assert time.perf_counter() - started < 0.5
+
+    @pytest.mark.asyncio
+    async def test_backpressure_bounds_read_ahead(self):
+        read, ahead = [0], []
+
+        def source():
+            for i in range(1000):
+                read[0] += 1
+                yield i
+
+        async def sink(chunk):
+            ahead.append(read[0] - chunk[-1])
+            await asyncio.sleep(0.001)
+
+        pipeline = StreamingPipeline([Stage("pass", sleeper(0)), Stage("pass2", sleeper(0))],
+                                     chunk_size=10, queue_size=2)
+        await pipeline.run(source(), sink=sink)
+
+        assert max(ahead) <= 10 * (3 * 2 + 3)
+
+    @pytest.mark.asyncio
+    async def test_failed_chunks_counted(self):
+        async def picky(chunk):
+            if 5 in chunk:
+                raise ValueError("bad chunk")
+            return {'data': chunk, 'warnings': [f"saw {len(chunk)}"]}
+
+        run = await StreamingPipeline([Stage("picky", picky), Stage("keep_odd", sleeper(0, lambda i: i % 2))],
+                                      chunk_size=5, max_messages=2).run(range(20))
+
+        assert run.stage("picky").failures == 1
+        assert run.stage("keep_odd").items_in == 15
+        assert run.items_out == 7
+        assert len(run.errors) == 1 and len(run.warnings) == 1
+        assert run.dropped_messages == 2
+
+    @pytest.mark.asyncio
+    async def test_chunked_async_source(self):
+        async def source():
+            for i in range(7):
+                yield i
+
+        assert [chunk async for chunk in chunked(source(), 3)] == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine, tables=[HealthData.__table__])
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def points(count, start=datetime(2024, 5, 1)):
+    for i in range(count):
+        yield HealthDataPoint(
+            user_id=1, data_type=DataType.HEART_RATE, value=300 if i % 10 == 0 else 60 + i % 40, unit="bpm",
+            timestamp=start + timedelta(minutes=i), source=DataSourceType.FITBIT, confidence=0.9
+        )
+
+
+class TestStreamingProcessor:
+    """Test HealthDataProcessor over the streaming pipeline."""
+
+    @pytest.mark.asyncio
+    async def test_points_stored_in_chunks(self, db):
+        processor = HealthDataProcessor(db)
+        stages = [ProcessingStage.INGESTION, ProcessingStage.VALIDATION,
+                  ProcessingStage.TRANSFORMATION, ProcessingStage.STORAGE]
+
+        result = await processor.process_health_data(1, points(2000), stages=stages, chunk_size=250)
+        again = await processor.process_health_data(1, points(2000), stages=stages, chunk_size=250)
+
+        assert (result.data_points_processed, result.data_points_valid, result.data_points_invalid) == (2000, 1800, 200)
+        assert db.query(HealthData).count() == 1800
+        assert again.data_points_valid == 1800 and db.query(HealthData).count() == 1800
+        storage = next(s for s in result.metadata['stage_stats'] if s['stage'] == 'storage')
+        assert storage['chunks'] == 8 and storage['items_in'] == 1800
+        assert 0 < result.quality_score < 1
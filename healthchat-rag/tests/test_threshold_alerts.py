@@ -0,0 +1,197 @@
+"""
+Test threshold alerts on ingest.
+
+This module checks level changes with hysteresis, deduplication within
+the cooldown (including alerts already stored as notifications), that
+backfilled readings update state without alerting, that idle state is
+evicted, and that the monitor micro-batches readings from many users and alerts well under a second
+after they are submitted.
+"""
+
+import asyncio
+import time
+import pytest
+from unittest.mock import AsyncMock
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.base import Base
+from app.config import settings
+from app.models.notification_models import (
+    Notification, NotificationChannel, NotificationStatus, NotificationType
+)
+from app.services.smart_notification_logic import NotificationUrgency, SmartNotificationLogic
+from app.services.threshold_alerts import (
+    ThresholdAlertMonitor, ThresholdEvaluator, metric_readings, recent_threshold_alerts
+)
+
+NOW = datetime(2024, 6, 1, 12)
+
+
+def evaluator(**kwargs):
+    return ThresholdEvaluator(SmartNotificationLogic(settings).health_thresholds, **kwargs)
+
+
+def heart_rates(values, user_id=1, start=NOW - timedelta(minutes=30)):
+    return [
+        reading for i, value in enumerate(values)
+        for reading in metric_readings(user_id, "heart_rate", value, start + timedelta(minutes=i))
+    ]
+
+
+class TestThresholdEvaluator:
+    """Test per-user rule state."""
+
+    def test_escalation_and_alert_shape(self):
+        alerts = evaluator().evaluate(heart_rates([80, 110, 120, 160]), now=NOW)
+
+        assert [alert["type"] for alert in alerts] == ["high", "critical_high"]
+        assert alerts[0]["threshold"] == 100 and alerts[0]["unit"] == "bpm"
+        assert alerts[1]["urgency"] == NotificationUrgency.CRITICAL
+        assert alerts[1]["description"] == "Critical high Heart rate"
+        assert alerts[1]["user_id"] == 1
+
+    def test_hysteresis_prevents_flapping(self):
+        rules = evaluator(hysteresis=0.05, cooldown=timedelta(0))
+
+        flapping = rules.evaluate(heart_rates([101, 99, 101, 99, 101]), now=NOW)
+        state = rules.states[(1, "heart_rate")].level
+        recovered = rules.evaluate(heart_rates([95, 101], start=NOW - timedelta(minutes=10)), now=NOW)
+
+        assert len(flapping) == 1 and state == "high"
+        assert [alert["type"] for alert in recovered] == ["high"]  # 95 is 2.5 below the limit: cleared
+
+    def test_dedup_within_cooldown(self):
+        rules = evaluator(cooldown=timedelta(hours=1))
+
+        first = rules.evaluate(heart_rates([110, 80, 110, 30]), now=NOW)
+        later = rules.evaluate(heart_rates([110], start=NOW - timedelta(minutes=5)), now=NOW + timedelta(hours=2))
+
+        assert [alert["type"] for alert in first] == ["high", "critical_low"]
+        assert [alert["type"] for alert in later] == ["high"]
+
+    def test_seeded_alerts_and_backfill(self):
+        rules = evaluator()
+        rules.seed({(1, "heart_rate"): ("high", NOW - timedelta(minutes=10))})
+
+        backfill = rules.evaluate(heart_rates([30, 30], user_id=2, start=NOW - timedelta(days=3)), now=NOW)
+        seeded = rules.evaluate(heart_rates([115]), now=NOW)
+        escalated = rules.evaluate(heart_rates([170], start=NOW), now=NOW)
+
+        assert backfill == [] and rules.states[(2, "heart_rate")].level == "critical_low"
+        assert seeded == []
+        assert [alert["type"] for alert in escalated] == ["critical_high"]
+
+    def test_evict_idle_state(self):
+        rules = evaluator(cooldown=timedelta(hours=1), max_age=timedelta(hours=24))
+        rules.evaluate(heart_rates([120], user_id=1, start=NOW - timedelta(hours=26)), now=NOW - timedelta(hours=26))
+        rules.evaluate(heart_rates([120], user_id=2, start=NOW - timedelta(hours=24)), now=NOW - timedelta(hours=24))
+
+        evicted = rules.evict_idle(now=NOW)
+
+        assert evicted == 1
+        assert rules.tracked_users() == {2}
+
+    def test_metric_readings(self):
+        assert [(r.metric, r.value) for r in metric_readings(1, "blood_pressure", '{"systolic": 150, "diastolic": 95}', NOW)] == [
+            ("blood_pressure_systolic", 150.0), ("blood_pressure_diastolic", 95.0)
+        ]
+        assert metric_readings(1, "heart_rate", "fast", NOW) == []
+        assert metric_readings(1, "steps", 9000, NOW) == []
+
+
+class TestRecentAlerts:
+    """Test seeding dedup state from stored notifications."""
+
+    def test_latest_alert_per_metric(self):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=engine, tables=[Notification.__table__])
+        db = sessionmaker(bind=engine)()
+        for minutes, alert_type, trigger in [(50, "high", "health_metric_threshold"),
+                                             (20, "critical_high", "health_metric_threshold"),
+                                             (5, "high", "health_metric_update")]:
+            db.add(Notification(
+                user_id=1, type=NotificationType.HEALTH_ALERT, title="Health Alert", message="...",
+                channel=NotificationChannel.PUSH, status=NotificationStatus.SENT,
+                template_data={"metric": "heart_rate", "alert_type": alert_type, "trigger_type": trigger},
+                created_at=NOW - timedelta(minutes=minutes)
+            ))
+        db.commit()
+
+        recent = recent_threshold_alerts(db, [1, 2], NOW - timedelta(hours=1))
+
+        assert recent == {(1, "heart_rate"): ("critical_high", NOW - timedelta(minutes=20))}
+        db.close()
+        engine.dispose()
+
+
+class TestThresholdAlertMonitor:
+    """Test micro-batched evaluation across users."""
+
+    @pytest.mark.asyncio
+    async def test_micro_batches_across_users(self):
+        sent, batches = [], []
+
+        async def send_alert(alert):
+            sent.append((alert["user_id"], alert["type"], time.perf_counter()))
+
+        monitor = ThresholdAlertMonitor(evaluator(), send_alert=send_alert, batch_size=1000, max_wait=0.05)
+        monitor._load_recent_alerts = lambda user_ids: batches.append(user_ids) or {}
+        monitor.start()
+        
+        now = datetime.utcnow()
+        submitted = time.perf_counter()
+        for user_id in range(200):
+            value = 120 if user_id % 10 == 0 else 75
+            monitor.submit_readings(user_id, [("heart_rate", value, now), ("steps", 4000, now)])
+        await monitor.flush()
+        monitor.submit_readings(0, [("heart_rate", 125, now + timedelta(seconds=1))])
+        await monitor.stop()
+
+        assert sorted(user for user, _, _ in sent) == list(range(0, 200, 10))
+        assert max(at for _, _, at in sent) - submitted < 0.5
+        assert len(batches) == 1 and len(batches[0]) == 200  # One dedup lookup for the whole micro-batch
+        assert not monitor.running
+
+    @pytest.mark.asyncio
+    async def test_evicted_users_are_seeded_again(self):
+        seeded = []
+        monitor = ThresholdAlertMonitor(evaluator(), send_alert=AsyncMock())
+        monitor._load_recent_alerts = lambda user_ids: seeded.append(user_ids) or {}
+        now = datetime.utcnow()
+
+        await monitor.process(heart_rates([120], user_id=1, start=now - timedelta(days=3))
+                              + heart_rates([80], user_id=2, start=now))
+        monitor.evict_idle()
+        await monitor.process(heart_rates([80], user_id=1, start=now) + heart_rates([80], user_id=2, start=now))
+
+        assert seeded == [[1, 2], [1]]
+        assert monitor.evaluator.tracked_users() == {1, 2}
+
+    def test_not_running_drops_readings(self):
+        monitor = ThresholdAlertMonitor(evaluator())
+        
+        assert monitor.submit_readings(1, [("heart_rate", 180, NOW)]) == 0
+        assert monitor.evaluator.states == {}
+    
+    @pytest.mark.asyncio
+    async def test_failed_send_does_not_stop_monitor(self):
+        async def send_alert(alert):
+            if alert["user_id"] == 1:
+                raise RuntimeError("push service down")
+
+        monitor = ThresholdAlertMonitor(evaluator(), send_alert=send_alert, max_wait=0.01)
+        monitor._load_recent_alerts = lambda user_ids: {}
+        monitor.start()
+        now = datetime.utcnow()
+
+        monitor.submit_readings(1, [("heart_rate", 30, now)])
+        await monitor.flush()
+        monitor.submit_readings(2, [("blood_glucose", 350, now)])
+        await monitor.flush()
+
+        assert monitor.running
+        assert monitor.evaluator.states[(2, "blood_glucose")].last_alert_level == "critical_high"
+        await monitor.stop()
@@ -0,0 +1,138 @@
+"""
+Test request tracing.
+
+This module tests span nesting, correlation id propagation, tail sampling
+and the per-stage breakdowns stored in PerformanceMonitor.
+"""
+
+import pytest
+import uuid
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.utils.correlation_id_middleware import CorrelationIdMiddleware, correlation_id_ctx_var
+from app.utils.performance_monitoring import PerformanceMonitor
+from app.utils.tracing import InMemorySpanExporter, Tracer, TracingMiddleware, trace_id_from_correlation_id
+
+
+@pytest.fixture
+def monitor(monkeypatch):
+    """Create a monitor without the background system sampler."""
+    monkeypatch.setattr(PerformanceMonitor, "_start_system_monitoring", lambda self: None)
+    return PerformanceMonitor()
+
+
+@pytest.fixture
+def exporter():
+    return InMemorySpanExporter()
+
+
+class TestTracer:
+    """Test span creation and trace recording."""
+
+    def test_spans_nest_under_root(self, monitor, exporter):
+        """Child spans share the trace id and point at their parent."""
+        tracer = Tracer(sample_rate=1.0, monitor=monitor, exporters=[exporter])
+
+        with tracer.start_trace("chat.message", correlation_id=str(uuid.uuid4())) as root:
+            with tracer.span("retrieval") as retrieval:
+                with tracer.span("retrieval.embed"):
+                    pass
+            with tracer.span("llm.chat_completion"):
+                pass
+
+        spans = {span.name: span for span in exporter.get_finished_spans()}
+        assert set(spans) == {"chat.message", "retrieval", "retrieval.embed", "llm.chat_completion"}
+        assert {span.trace_id for span in spans.values()} == {root.trace_id}
+        assert spans["retrieval.embed"].parent_span_id == retrieval.span_id
+        assert spans["retrieval"].parent_span_id == root.span_id
+        assert len(root.trace_id) == 32 and len(root.span_id) == 16
+
+    def test_trace_id_follows_correlation_id(self, monitor):
+        """The active correlation id becomes the trace id."""
+        tracer = Tracer(monitor=monitor)
+        correlation_id = str(uuid.uuid4())
+        token = correlation_id_ctx_var.set(correlation_id)
+        try:
+            with tracer.start_trace("chat.message") as root:
+                pass
+        finally:
+            correlation_id_ctx_var.reset(token)
+
+        assert root.trace_id == uuid.UUID(correlation_id).hex
+        assert root.attributes["correlation_id"] == correlation_id
+        assert trace_id_from_correlation_id("not-a-uuid") == trace_id_from_correlation_id("not-a-uuid")
+
+    def test_span_without_trace_is_noop(self, monitor, exporter):
+        """Instrumented code outside a trace records nothing."""
+        tracer = Tracer(sample_rate=1.0, monitor=monitor, exporters=[exporter])
+
+        with tracer.span("retrieval") as span:
+            span.set_attribute("ignored", True)
+
+        assert not span.is_recording
+        assert exporter.get_finished_spans() == []
+
+    def test_stage_histograms_always_recorded(self, monitor, exporter):
+        """Unsampled traces feed stage histograms but keep no breakdown."""
+        tracer = Tracer(sample_rate=0.0, monitor=monitor, exporters=[exporter], slow_threshold_ms=10_000)
+
+        for _ in range(3):
+            with tracer.start_trace("chat.message"):
+                with tracer.span("moderation"):
+                    pass
+
+        summary = monitor.get_trace_summary(hours=1)["traces"]["chat.message"]
+        assert summary["total"]["count"] == 3
+        assert summary["stages"]["moderation"]["count"] == 3
+        assert monitor.get_trace_samples() == []
+        assert exporter.get_finished_spans() == []
+
+    def test_failed_traces_always_sampled(self, monitor, exporter):
+        """Errors are kept regardless of the sample rate."""
+        tracer = Tracer(sample_rate=0.0, monitor=monitor, exporters=[exporter], slow_threshold_ms=10_000)
+
+        with pytest.raises(RuntimeError):
+            with tracer.start_trace("chat.message"):
+                with tracer.span("llm.chat_completion"):
+                    raise RuntimeError("upstream timeout")
+
+        samples = monitor.get_trace_samples(name="chat.message")
+        assert len(samples) == 1
+        assert samples[0]["status"] == "ERROR"
+        llm = next(span for span in samples[0]["spans"] if span["name"] == "llm.chat_completion")
+        assert llm["events"][0]["attributes"]["exception.message"] == "upstream timeout"
+
+
+class TestTracingMiddleware:
+    """Test root spans opened by the middleware."""
+
+    def test_route_traced_with_correlation_id(self, monitor, exporter):
+        """Selected routes are traced under the request's correlation id."""
+        tracer = Tracer(sample_rate=1.0, monitor=monitor, exporters=[exporter])
+        app = FastAPI()
+
+        @app.post("/chat/message")
+        async def chat_message():
+            with tracer.span("retrieval"):
+                pass
+            return {"response": "ok"}
+
+        @app.get("/other")
+        async def other():
+            return {}
+
+        app.add_middleware(TracingMiddleware, routes={"/chat/message": "chat.message"}, tracer=tracer)
+        app.add_middleware(CorrelationIdMiddleware)
+        client = TestClient(app)
+
+        correlation_id = str(uuid.uuid4())
+        response = client.post("/chat/message", headers={"X-Correlation-ID": correlation_id})
+        client.get("/other")
+
+        assert response.headers["X-Trace-ID"] == uuid.UUID(correlation_id).hex
+        samples = monitor.get_trace_samples()
+        assert len(samples) == 1
+        assert samples[0]["correlation_id"] == correlation_id
+        assert [span["name"] for span in samples[0]["spans"]] == ["chat.message", "retrieval"]
+        assert samples[0]["spans"][0]["attributes"]["http.status_code"] == 200
@@ -0,0 +1,244 @@
+"""
+Test WebSocket Pub/Sub Backplane.
+
+This module tests cross-worker routing of user and topic messages and
+presence tracking through the in-memory and Redis backplanes.
+"""
+
+import pytest
+import json
+from unittest.mock import Mock, AsyncMock, patch
+from fastapi import WebSocket
+
+from app.websocket.connection_manager import ConnectionManager, ConnectionState
+from app.websocket.pubsub import InMemoryBroker, InMemoryPubSubBackend, RedisPubSubBackend, user_channel
+
+
+def make_websocket():
+    """Create a mock WebSocket."""
+    websocket = Mock(spec=WebSocket)
+    websocket.accept = AsyncMock()
+    websocket.send_text = AsyncMock()
+    websocket.close = AsyncMock()
+    return websocket
+
+
+def sent_types(websocket):
+    """Return the message types sent over a mock WebSocket."""
+    return [json.loads(call.args[0])["type"] for call in websocket.send_text.call_args_list]
+
+
+async def attach_user(manager, websocket, user_id):
+    """Connect a WebSocket and mark it authenticated for a user."""
+    await manager.start_backplane()  # Started by the app lifespan
+    connection_id = await manager.connect(websocket)
+    info = manager.active_connections[connection_id]
+    info.user_id = user_id
+    info.state = ConnectionState.AUTHENTICATED
+    manager.user_connections.setdefault(user_id, set()).add(connection_id)
+    await manager._backplane_subscribe(user_channel(user_id))
+    await manager._update_presence(user_id)
+    return connection_id
+
+
+class TestWebSocketPubSub:
+    """Test the WebSocket pub/sub backplane."""
+
+    @pytest.fixture
+    def broker(self):
+        """Create a broker shared by two simulated workers."""
+        return InMemoryBroker()
+
+    @pytest.fixture
+    def workers(self, broker):
+        """Create two connection managers on the same backplane."""
+        return (
+            ConnectionManager(backplane=InMemoryPubSubBackend(broker), node_id="worker-a"),
+            ConnectionManager(backplane=InMemoryPubSubBackend(broker), node_id="worker-b"),
+        )
+
+    @pytest.mark.asyncio
+    async def test_send_to_user_reaches_other_worker(self, workers):
+        """A message sent on one worker reaches a socket held by another."""
+        worker_a, worker_b = workers
+        websocket = make_websocket()
+        await attach_user(worker_b, websocket, user_id=7)
+        await worker_a.start_backplane()
+
+        delivered = await worker_a.send_to_user(7, {"type": "notification"})
+
+        assert delivered
+        assert sent_types(websocket).count("notification") == 1
+        assert worker_b.backplane_stats["delivered_remote"] == 1
+
+    @pytest.mark.asyncio
+    async def test_connect_does_not_start_backplane(self, workers):
+        """The backplane is started by the app lifespan, not by the first socket."""
+        worker_a, _ = workers
+        await worker_a.connect(make_websocket())
+        
+        assert not worker_a.backplane.started
+    
+    @pytest.mark.asyncio
+    async def test_local_delivery_not_duplicated(self, workers):
+        """A worker does not redeliver its own published messages."""
+        worker_a, _ = workers
+        websocket = make_websocket()
+        await attach_user(worker_a, websocket, user_id=3)
+
+        await worker_a.send_to_user(3, {"type": "notification"})
+
+        assert sent_types(websocket).count("notification") == 1
+
+    @pytest.mark.asyncio
+    async def test_send_to_offline_user(self, workers):
+        """Sending to a user with no sockets anywhere reports no delivery."""
+        worker_a, _ = workers
+        await worker_a.start_backplane()
+
+        assert not await worker_a.send_to_user(99, {"type": "notification"})
+
+    @pytest.mark.asyncio
+    async def test_topic_broadcast_across_workers(self, workers):
+        """Topic broadcasts reach subscribers on every worker."""
+        worker_a, worker_b = workers
+        websocket_a = make_websocket()
+        websocket_b = make_websocket()
+        connection_a = await attach_user(worker_a, websocket_a, user_id=1)
+        connection_b = await attach_user(worker_b, websocket_b, user_id=2)
+        await worker_a.subscribe(connection_a, "health:alerts")
+        await worker_b.subscribe(connection_b, "health:alerts")
+
+        await worker_a.broadcast({"type": "health_alert"}, "health:alerts")
+
+        assert sent_types(websocket_a).count("health_alert") == 1
+        assert sent_types(websocket_b).count("health_alert") == 1
+
+    @pytest.mark.asyncio
+    async def test_presence_tracking(self, workers):
+        """Presence reflects connections held on each worker."""
+        worker_a, worker_b = workers
+        await attach_user(worker_a, make_websocket(), user_id=5)
+        connection_b = await attach_user(worker_b, make_websocket(), user_id=5)
+
+        assert await worker_a.get_user_presence(5) == {"worker-a": 1, "worker-b": 1}
+
+        await worker_b.disconnect(connection_b)
+
+        assert await worker_a.get_user_presence(5) == {"worker-a": 1}
+        assert await worker_b.is_user_online(5)
+
+    @pytest.mark.asyncio
+    async def test_disconnect_unsubscribes_channel(self, workers, broker):
+        """The last local socket for a user releases the user channel."""
+        worker_a, _ = workers
+        connection_id = await attach_user(worker_a, make_websocket(), user_id=4)
+
+        assert user_channel(4) in broker.subscribers
+
+        await worker_a.disconnect(connection_id)
+
+        assert user_channel(4) not in broker.subscribers
+
+    @pytest.mark.asyncio
+    async def test_without_backplane(self):
+        """The manager still delivers locally without a backplane."""
+        manager = ConnectionManager()
+        websocket = make_websocket()
+        await attach_user(manager, websocket, user_id=8)
+
+        assert await manager.send_to_user(8, {"type": "notification"})
+        assert await manager.get_user_presence(8) == {manager.node_id: 1}
+        assert manager.get_connection_stats()["backplane"] is None
+
+
+class FakeRedis:
+    """Async Redis stand-in supporting the commands used for presence."""
+
+    def __init__(self):
+        self.zsets = {}
+        self.hashes = {}
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    def zrem(self, key, *members):
+        for member in members:
+            self.zsets.get(key, {}).pop(member, None)
+
+    def zrangebyscore(self, key, low, high):
+        return [member for member, score in self.zsets.get(key, {}).items() if score >= low]
+
+    def zremrangebyscore(self, key, low, high):
+        zset = self.zsets.get(key, {})
+        for member in [member for member, score in zset.items() if score <= high]:
+            del zset[member]
+
+    def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = str(value)
+
+    def hdel(self, key, *fields):
+        for field in fields:
+            self.hashes.get(key, {}).pop(field, None)
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def expire(self, key, ttl):
+        pass
+
+
+class FakePipeline:
+    """Queue commands and run them against a FakeRedis on execute."""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.commands.append((getattr(self.redis, name), args))
+
+    async def execute(self):
+        return [command(*args) for command, args in self.commands]
+
+
+class TestRedisPresence:
+    """Test per-node presence expiry in the Redis backplane."""
+
+    @pytest.fixture
+    def backends(self):
+        """Create two Redis backends sharing one fake server."""
+        redis = FakeRedis()
+        backends = (RedisPubSubBackend("redis://fake", presence_ttl=60), RedisPubSubBackend("redis://fake", presence_ttl=60))
+        for backend in backends:
+            backend.redis_client = redis
+        return backends
+
+    @pytest.mark.asyncio
+    async def test_crashed_node_expires_while_others_refresh(self, backends):
+        """A node that stops refreshing drops out even though the user's keys stay alive."""
+        node_a, node_b = backends
+        with patch("app.websocket.pubsub.time.time", return_value=1000.0):
+            await node_a.set_presence(5, "worker-a", 2)
+            await node_b.set_presence(5, "worker-b", 1)
+        with patch("app.websocket.pubsub.time.time", return_value=1050.0):
+            await node_a.set_presence(5, "worker-a", 2)
+
+        with patch("app.websocket.pubsub.time.time", return_value=1070.0):
+            presence = await node_a.get_presence(5)
+
+        assert presence == {"worker-a": 2}
+        assert "worker-b" not in node_a.redis_client.hashes["ws:presence:5:counts"]
+        assert "worker-b" not in node_a.redis_client.zsets["ws:presence:5:nodes"]
+
+    @pytest.mark.asyncio
+    async def test_zero_count_removes_node(self, backends):
+        """Recording no connections removes a node's entry."""
+        node_a, _ = backends
+        await node_a.set_presence(6, "worker-a", 1)
+        await node_a.set_presence(6, "worker-a", 0)
+
+        assert await node_a.get_presence(6) == {}
@@ -0,0 +1,197 @@
+"""
+Test WebSocket Timer Wheel.
+
+This module tests the timing wheel and the per-connection heartbeat,
+idle timeout and lifecycle statistics built on it.
+"""
+
+import pytest
+import json
+import time
+from datetime import datetime, timedelta
+from unittest.mock import Mock, AsyncMock
+from fastapi import WebSocket
+
+from app.websocket.connection_manager import ConnectionManager, ConnectionState
+from app.websocket.timer_wheel import TimerWheel
+
+
+class FakeClock:
+    """Manually advanced clock."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTimerWheel:
+    """Test the timing wheel."""
+
+    @pytest.fixture
+    def clock(self):
+        return FakeClock()
+
+    @pytest.fixture
+    def wheel(self, clock):
+        return TimerWheel(tick_interval=1.0, wheel_size=8, clock=clock)
+
+    def test_timer_expires_at_deadline(self, wheel, clock):
+        """Timers expire on the tick of their deadline, not before."""
+        wheel.schedule("a", 3)
+
+        clock.now = 2.5
+        assert wheel.advance() == []
+
+        clock.now = 3.0
+        assert wheel.advance() == ["a"]
+        assert len(wheel) == 0
+
+    def test_timer_longer_than_one_revolution(self, wheel, clock):
+        """Timers beyond the wheel size wait for their round."""
+        wheel.schedule("long", 20)
+
+        clock.now = 12
+        assert wheel.advance() == []
+
+        clock.now = 20
+        assert wheel.advance() == ["long"]
+
+    def test_long_timers_not_rescanned(self, wheel, clock):
+        """Timers beyond the current revolution wait outside the slots until it begins."""
+        wheel.schedule("long", 20)
+        wheel.schedule("cancelled", 30)
+        wheel.schedule("short", 3)
+
+        assert all("long" not in slot for slot in wheel.slots)
+        assert wheel.cancel("cancelled")
+        assert 3 not in wheel.overflow
+
+        clock.now = 16
+        assert wheel.advance() == ["short"]
+        assert wheel.slots[20 % 8] == {"long": 20} and wheel.overflow == {}
+
+        clock.now = 20
+        assert wheel.advance() == ["long"]
+
+    def test_reschedule_and_cancel(self, wheel, clock):
+        """Rescheduling replaces the previous deadline and cancel removes it."""
+        wheel.schedule("a", 2)
+        wheel.schedule("a", 5)
+        wheel.schedule("b", 2)
+        assert wheel.cancel("b")
+        assert not wheel.cancel("missing")
+
+        clock.now = 2
+        assert wheel.advance() == []
+
+        clock.now = 5
+        assert wheel.advance() == ["a"]
+
+    def test_stalled_clock_catches_up(self, wheel, clock):
+        """All timers due during a long stall expire on the next advance."""
+        for i in range(30):
+            wheel.schedule(i, i + 1)
+
+        clock.now = 100
+        assert sorted(wheel.advance()) == list(range(30))
+
+
+class TestConnectionTimers:
+    """Test per-connection deadlines in the connection manager."""
+
+    @pytest.fixture
+    def manager(self):
+        manager = ConnectionManager()
+        manager.timer_wheel = TimerWheel(tick_interval=1.0, clock=FakeClock())
+        return manager
+
+    @pytest.fixture
+    def mock_websocket(self):
+        websocket = Mock(spec=WebSocket)
+        websocket.accept = AsyncMock()
+        websocket.send_text = AsyncMock()
+        websocket.close = AsyncMock()
+        return websocket
+
+    async def _advance(self, manager, seconds):
+        manager.timer_wheel.clock.now += seconds
+        await manager._process_timers(manager.timer_wheel.advance())
+
+    @pytest.mark.asyncio
+    async def test_connect_schedules_deadlines(self, manager, mock_websocket):
+        """Each connection gets its own heartbeat and idle timers."""
+        connection_id = await manager.connect(mock_websocket)
+
+        assert ("heartbeat", connection_id) in manager.timer_wheel
+        assert ("idle", connection_id) in manager.timer_wheel
+        assert manager.get_lifecycle_stats()["connections_opened"] == 1
+
+    @pytest.mark.asyncio
+    async def test_heartbeat_sent_when_quiet(self, manager, mock_websocket):
+        """Quiet authenticated connections receive a heartbeat."""
+        connection_id = await manager.connect(mock_websocket)
+        info = manager.active_connections[connection_id]
+        info.state = ConnectionState.AUTHENTICATED
+        info.last_sent = time.monotonic() - manager.heartbeat_interval
+
+        await self._advance(manager, manager.heartbeat_interval)
+
+        sent = [json.loads(call.args[0])["type"] for call in mock_websocket.send_text.call_args_list]
+        assert sent.count("heartbeat") == 1
+        assert manager.lifecycle_stats["heartbeats_sent"] == 1
+        assert ("heartbeat", connection_id) in manager.timer_wheel
+
+    @pytest.mark.asyncio
+    async def test_heartbeat_coalesced_with_recent_traffic(self, manager, mock_websocket):
+        """Connections that just sent a frame skip the heartbeat."""
+        connection_id = await manager.connect(mock_websocket)
+        manager.active_connections[connection_id].state = ConnectionState.AUTHENTICATED
+
+        await self._advance(manager, manager.heartbeat_interval)
+
+        assert manager.lifecycle_stats["heartbeats_sent"] == 0
+        assert manager.lifecycle_stats["heartbeats_coalesced"] == 1
+
+    @pytest.mark.asyncio
+    async def test_idle_connection_disconnected(self, manager, mock_websocket):
+        """Connections idle past the timeout are closed."""
+        connection_id = await manager.connect(mock_websocket)
+        info = manager.active_connections[connection_id]
+        info.last_activity = datetime.utcnow() - timedelta(seconds=manager.connection_timeout)
+
+        await self._advance(manager, manager.connection_timeout)
+
+        assert connection_id not in manager.active_connections
+        stats = manager.get_lifecycle_stats()
+        assert stats["idle_timeouts"] == 1
+        assert stats["disconnect_reasons"] == {"Connection timeout": 1}
+        assert stats["pending_timers"] == 0
+
+    @pytest.mark.asyncio
+    async def test_quiet_connection_kept_alive_by_heartbeats(self, manager, mock_websocket):
+        """Successful heartbeats keep a quiet connection past the idle timeout."""
+        connection_id = await manager.connect(mock_websocket)
+        info = manager.active_connections[connection_id]
+        info.state = ConnectionState.AUTHENTICATED
+
+        for _ in range(1, manager.connection_timeout // manager.heartbeat_interval + 2):
+            # Fake the wall clocks the manager reads, one heartbeat interval at a time
+            info.last_activity -= timedelta(seconds=manager.heartbeat_interval)
+            info.last_sent -= manager.heartbeat_interval
+            await self._advance(manager, manager.heartbeat_interval)
+        
+        assert connection_id in manager.active_connections
+        assert manager.lifecycle_stats["heartbeats_sent"] >= 1
+        assert manager.lifecycle_stats["idle_timeouts"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_active_connection_idle_deadline_rearmed(self, manager, mock_websocket):
+        """Recent activity pushes the idle deadline out instead of closing."""
+        connection_id = await manager.connect(mock_websocket)
+
+        await self._advance(manager, manager.connection_timeout)
+
+        assert connection_id in manager.active_connections
+        assert ("idle", connection_id) in manager.timer_wheel